@@ -0,0 +1,261 @@
+"""Compact binary batch format for ``POST /api/v1/location-check/binary``.
+
+All integers are little-endian. A batch is a header, per-device bases, a
+device id table and fixed-width fix records::
+
+    header   4s magic b"GFBT", u8 version (1), u8 flags, u16 device count,
+             u32 fix count
+    bases    per device: i32 lat, i32 lon
+    devices  per device: u8 length, UTF-8 device id (1-255 bytes)
+    fixes    per fix: u16 device table index, lat, lon
+
+Device ids may repeat in the table.
+
+Coordinates are integers in units of 1e-7 degrees (about 1 cm). With the
+``DELTAS`` flag each fix stores i16 differences from the previous fix of the
+same table entry, an entry's first fix from its base (6 bytes per fix). A
+tracker's consecutive fixes are meters apart, well within the +-3.2 km an
+i16 delta covers, even when a gateway interleaves many trackers; a device
+that jumps farther gets another table entry with the same id and a new base.
+Without the flag fixes hold absolute i32 coordinates (10 bytes per fix) and
+the bases are zero. The encoder picks whichever is smaller. Device ids are
+sent once per table entry however many fixes they have.
+
+Decoding maps the bases and records with ``np.frombuffer`` over the request
+body and rebuilds coordinates with vectorized per-device cumulative sums,
+without per-fix objects; only the id table is read in Python, once per
+distinct device.
+"""
+import struct
+from typing import List, Sequence
+
+import numpy as np
+
+
+MAGIC = b"GFBT"
+VERSION = 1
+DELTAS = 0x01
+MEDIA_TYPE = "application/x-geofence-batch"
+
+COORDINATE_SCALE = 10_000_000
+MAX_DEVICES = 0xFFFF
+MAX_DEVICE_ID_BYTES = 255
+
+_HEADER = struct.Struct("<4sBBHI")
+_BASES = np.dtype([("lat", "<i4"), ("lon", "<i4")])
+_RECORDS = {
+    True: np.dtype([("device", "<u2"), ("lat", "<i2"), ("lon", "<i2")]),
+    False: np.dtype([("device", "<u2"), ("lat", "<i4"), ("lon", "<i4")]),
+}
+_MAX_LAT = 90 * COORDINATE_SCALE
+_MAX_LON = 180 * COORDINATE_SCALE
+_SIZE_MISMATCH = "batch size does not match its device table and fix count"
+
+
+class BinaryBatchError(ValueError):
+    """Raised when a binary batch is malformed or holds invalid fixes."""
+
+
+class BinaryBatch:
+    """Decoded batch: interned device table plus per-fix arrays."""
+    __slots__ = ("device_table", "device_index", "lats", "lons")
+
+    def __init__(
+        self,
+        device_table: List[str],
+        device_index: np.ndarray,
+        lats: np.ndarray,
+        lons: np.ndarray
+    ):
+        self.device_table = device_table
+        self.device_index = device_index
+        self.lats = lats
+        self.lons = lons
+
+    def __len__(self) -> int:
+        return len(self.device_index)
+
+    @property
+    def device_ids(self) -> List[str]:
+        """Device id of every fix; the strings are shared with the table."""
+        table = self.device_table
+        return [table[i] for i in self.device_index.tolist()]
+
+
+def encode_batch(
+    device_ids: Sequence[str],
+    lats: Sequence[float] | np.ndarray,
+    lons: Sequence[float] | np.ndarray
+) -> bytes:
+    """Encode parallel sequences of fixes, rounding coordinates to 1e-7 degrees."""
+    if not len(device_ids) == len(lats) == len(lons):
+        raise BinaryBatchError("device_ids, lats and lons differ in length")
+
+    table = list(dict.fromkeys(device_ids))
+    if len(table) > MAX_DEVICES:
+        raise BinaryBatchError(f"more than {MAX_DEVICES} devices in one batch")
+    positions = {device_id: i for i, device_id in enumerate(table)}
+    encoded_ids = []
+    for device_id in table:
+        raw = device_id.encode()
+        if not 0 < len(raw) <= MAX_DEVICE_ID_BYTES:
+            raise BinaryBatchError(f"device id must be 1-{MAX_DEVICE_ID_BYTES} bytes: {device_id!r}")
+        encoded_ids.append(bytes((len(raw),)) + raw)
+
+    lat_units = np.rint(np.asarray(lats, dtype=np.float64) * COORDINATE_SCALE).astype(np.int64)
+    lon_units = np.rint(np.asarray(lons, dtype=np.float64) * COORDINATE_SCALE).astype(np.int64)
+    if (np.abs(lat_units) > _MAX_LAT).any() or (np.abs(lon_units) > _MAX_LON).any():
+        raise BinaryBatchError("coordinates out of range")
+    device_index = np.array([positions[device_id] for device_id in device_ids], dtype=np.int64)
+
+    entry_devices, entry_index, bases, dlat, dlon = _delta_entries(device_index, lat_units, lon_units)
+    delta_size = (
+        len(entry_devices) * _BASES.itemsize
+        + sum(len(encoded_ids[device]) for device in entry_devices.tolist())
+        + len(device_ids) * _RECORDS[True].itemsize
+    )
+    absolute_size = (
+        len(table) * _BASES.itemsize
+        + sum(len(encoded) for encoded in encoded_ids)
+        + len(device_ids) * _RECORDS[False].itemsize
+    )
+
+    if len(entry_devices) <= MAX_DEVICES and delta_size <= absolute_size:
+        records = np.empty(len(device_ids), dtype=_RECORDS[True])
+        records["device"] = entry_index
+        records["lat"] = dlat
+        records["lon"] = dlon
+        header = _HEADER.pack(MAGIC, VERSION, DELTAS, len(entry_devices), len(device_ids))
+        entry_ids = b"".join(encoded_ids[device] for device in entry_devices.tolist())
+        return header + bases.tobytes() + entry_ids + records.tobytes()
+
+    records = np.empty(len(device_ids), dtype=_RECORDS[False])
+    records["device"] = device_index
+    records["lat"] = lat_units
+    records["lon"] = lon_units
+    header = _HEADER.pack(MAGIC, VERSION, 0, len(table), len(device_ids))
+    return header + bytes(len(table) * _BASES.itemsize) + b"".join(encoded_ids) + records.tobytes()
+
+
+def _delta_entries(device_index: np.ndarray, lat_units: np.ndarray, lon_units: np.ndarray):
+    """Split each device's fixes into table entries whose steps fit i16 deltas.
+
+    A device gets a new entry, with the jump's fix as base, wherever it moves
+    farther than one delta can express. Returns the device of each entry,
+    the entry of each fix, entry bases and per-fix deltas.
+    """
+    order = np.argsort(device_index, kind="stable")
+    ordered_index = device_index[order]
+    ordered_lat = lat_units[order]
+    ordered_lon = lon_units[order]
+
+    step_lat = np.diff(ordered_lat, prepend=0)
+    step_lon = np.diff(ordered_lon, prepend=0)
+    limit = np.iinfo(np.int16).max
+    starts = (np.abs(step_lat) > limit) | (np.abs(step_lon) > limit)
+    if len(order):
+        starts[0] = True
+        starts[1:] |= ordered_index[1:] != ordered_index[:-1]
+    step_lat[starts] = 0
+    step_lon[starts] = 0
+
+    bases = np.zeros(int(starts.sum()), dtype=_BASES)
+    bases["lat"] = ordered_lat[starts]
+    bases["lon"] = ordered_lon[starts]
+    entry_index = np.empty(len(order), dtype=np.int64)
+    entry_index[order] = np.cumsum(starts) - 1
+    dlat = np.empty(len(order), dtype=np.int64)
+    dlat[order] = step_lat
+    dlon = np.empty(len(order), dtype=np.int64)
+    dlon[order] = step_lon
+    return ordered_index[starts], entry_index, bases, dlat, dlon
+
+
+def _entry_cumsum(entry_index: np.ndarray, deltas: np.ndarray, bases: np.ndarray) -> np.ndarray:
+    """Per-entry running sums of (n, 2) deltas, starting from each entry's base."""
+    order = np.argsort(entry_index, kind="stable")
+    ordered_index = entry_index[order]
+    ordered = deltas[order]
+    sums = np.cumsum(ordered, axis=0)
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = ordered_index[1:] != ordered_index[:-1]
+    # Position of each fix's entry start, to subtract the sums of earlier entries.
+    entry_start = np.maximum.accumulate(np.where(first, np.arange(len(order)), 0))
+    units = np.empty_like(sums)
+    units[order] = sums - (sums - ordered)[entry_start] + bases[ordered_index]
+    return units
+
+
+def _decode_device_table(raw: bytes, device_count: int) -> List[str]:
+    table = []
+    offset = 0
+    for _ in range(device_count):
+        if offset >= len(raw):
+            raise BinaryBatchError(_SIZE_MISMATCH)
+        length = raw[offset]
+        end = offset + 1 + length
+        if length == 0:
+            raise BinaryBatchError("empty device id")
+        if end > len(raw):
+            raise BinaryBatchError(_SIZE_MISMATCH)
+        try:
+            table.append(raw[offset + 1:end].decode())
+        except UnicodeDecodeError:
+            raise BinaryBatchError("device id is not valid UTF-8") from None
+        offset = end
+    if offset != len(raw):
+        raise BinaryBatchError(_SIZE_MISMATCH)
+    return table
+
+
+def decode_batch(data: bytes | memoryview, max_fixes: int = 10_000) -> BinaryBatch:
+    """Decode and validate a batch; raises ``BinaryBatchError`` if it is invalid."""
+    view = memoryview(data)
+    if len(view) < _HEADER.size:
+        raise BinaryBatchError("batch shorter than its header")
+    magic, version, flags, device_count, fix_count = _HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise BinaryBatchError("not a binary location batch")
+    if version != VERSION:
+        raise BinaryBatchError(f"unsupported batch version {version}")
+    if flags & ~DELTAS:
+        raise BinaryBatchError(f"unknown flags {flags:#x}")
+    if fix_count > max_fixes:
+        raise BinaryBatchError(f"batch holds {fix_count} fixes, the limit is {max_fixes}")
+
+    deltas = bool(flags & DELTAS)
+    dtype = _RECORDS[deltas]
+    # Bases and records are fixed width; the id table fills the space between.
+    table_start = _HEADER.size + device_count * _BASES.itemsize
+    records_start = len(view) - fix_count * dtype.itemsize
+    if records_start < table_start:
+        raise BinaryBatchError(_SIZE_MISMATCH)
+    bases = np.frombuffer(view, dtype=_BASES, count=device_count, offset=_HEADER.size)
+    table = _decode_device_table(bytes(view[table_start:records_start]), device_count)
+    records = np.frombuffer(view, dtype=dtype, count=fix_count, offset=records_start)
+
+    device_index = records["device"]
+    if fix_count and int(device_index.max()) >= device_count:
+        raise BinaryBatchError("fix refers to a device missing from the table")
+
+    if deltas:
+        units = _entry_cumsum(
+            device_index,
+            np.stack((records["lat"], records["lon"]), axis=1).astype(np.int64),
+            np.stack((bases["lat"], bases["lon"]), axis=1).astype(np.int64)
+        )
+        lat_units, lon_units = units[:, 0], units[:, 1]
+    else:
+        lat_units = records["lat"].astype(np.int64)
+        lon_units = records["lon"].astype(np.int64)
+    if fix_count and (
+        np.abs(lat_units).max() > _MAX_LAT or np.abs(lon_units).max() > _MAX_LON
+    ):
+        raise BinaryBatchError("coordinates out of range")
+
+    return BinaryBatch(
+        table,
+        device_index,
+        lat_units / COORDINATE_SCALE,
+        lon_units / COORDINATE_SCALE
+    )
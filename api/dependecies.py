@@ -1,12 +1,175 @@
+from typing import AbstractSet, Any, AsyncIterator, Dict, Optional
 from fastapi import HTTPException
+from starlette.requests import HTTPConnection
+from config.settings import settings
+from database.db_setup import DatabaseManager
 from domain.geofence_calculator import GeofenceCalculator
-from repositories.geofence_repository import GeofenceRepository
+from repositories.geofence_repository import GeofenceRepository, pool_wait_listeners
+from services.admission import AdmissionController
+from services.cold_start import ColdStart
+from services.device_sequencer import DeviceSequencer
+from services.device_state_cache import DeviceStateCache
+from services.geofence_cache import GeofenceCache
+from services.geofence_import import GeofenceImporter
 from services.geofence_service import GeofenceService
-from services.event_publisher import MockEventPublisher
+from services.location_history import LocationHistoryWriter
+from services.outbox_dispatcher import OutboxDispatcher
+from services.state_write_buffer import DeviceStateWriteBuffer
+from services.event_publisher import EventPublisher, MockEventPublisher, RedisEventPublisher
+from services.fence_membership import FenceMembershipIndex
+from services.metrics import registry
+from services.profiler import SamplingProfiler
 
 
-geofence_calculator = GeofenceCalculator()
-event_publisher = MockEventPublisher()
+database: Optional[DatabaseManager] = None
+geofence_calculator = GeofenceCalculator(cell_size_deg=settings.geofence_index_cell_deg)
+event_publisher: EventPublisher = MockEventPublisher()
+geofence_cache: Optional[GeofenceCache] = None
+state_buffer: Optional[DeviceStateWriteBuffer] = None
+outbox_dispatcher: Optional[OutboxDispatcher] = None
+location_history: Optional[LocationHistoryWriter] = None
+cold_start: Optional[ColdStart] = None
+state_cache: Optional[DeviceStateCache] = (
+    DeviceStateCache(
+        max_entries=settings.device_state_cache_size,
+        ttl_seconds=settings.device_state_cache_ttl_seconds
+    )
+    if settings.device_state_cache_size > 0 else None
+)
+fence_memberships: Optional[FenceMembershipIndex] = (
+    FenceMembershipIndex() if settings.fence_membership_index else None
+)
+device_sequencer: Optional[DeviceSequencer] = (
+    DeviceSequencer(shards=settings.device_shards, queue_size=settings.device_shard_queue_size)
+    if settings.device_shards > 0 else None
+)
+profiler: Optional[SamplingProfiler] = (
+    SamplingProfiler(interval_seconds=settings.profiler_interval_seconds)
+    if settings.profiler_enabled else None
+)
+admission_controller: Optional[AdmissionController] = (
+    AdmissionController(
+        initial_limit=settings.admission_initial_limit,
+        min_limit=settings.admission_min_limit,
+        max_limit=settings.admission_max_limit,
+        latency_target_seconds=settings.admission_latency_target_seconds,
+        pool_wait_target_seconds=settings.admission_pool_wait_target_seconds,
+        queue_timeout_seconds=settings.admission_queue_timeout_seconds,
+        retry_after_seconds=settings.admission_retry_after_seconds
+    )
+    if settings.admission_control else None
+)
+if admission_controller is not None:
+    pool_wait_listeners.append(admission_controller.observe_pool_wait)
+
+
+def init_database() -> DatabaseManager:
+    """Create the process-wide database manager with the configured pool."""
+    global database
+    database = DatabaseManager(
+        settings.database_url,
+        min_size=settings.db_pool_min_size,
+        max_size=settings.db_pool_max_size,
+        statement_cache_size=settings.db_statement_cache_size,
+        command_timeout=settings.db_command_timeout_seconds or None,
+        max_queries=settings.db_connection_max_queries,
+        max_inactive_connection_lifetime=settings.db_connection_max_idle_seconds
+    )
+    return database
+
+
+def init_geofence_cache(db_pool) -> GeofenceCache:
+    """Create the process-wide geofence cache bound to the given pool."""
+    global geofence_cache
+    geofence_cache = GeofenceCache(
+        GeofenceRepository(db_pool),
+        geofence_calculator,
+        ttl_seconds=settings.geofence_cache_ttl_seconds,
+        index_dir=settings.shared_index_dir or None
+    )
+    geofence_cache.removal_listeners.append(release_geofences)
+    return geofence_cache
+
+
+def release_geofences(geofence_ids: AbstractSet[int]) -> None:
+    """Drop deleted fences from the process-wide device states, buffers and indexes."""
+    if state_cache is not None:
+        state_cache.release_geofences(geofence_ids)
+    if state_buffer is not None:
+        state_buffer.release_geofences(geofence_ids)
+    if fence_memberships is not None:
+        fence_memberships.release_geofences(geofence_ids)
+
+
+def init_cold_start(db_pool) -> ColdStart:
+    """Create the snapshot loader for the process-wide fence and state caches."""
+    global cold_start
+    cold_start = ColdStart(
+        GeofenceRepository(db_pool),
+        geofence_cache,
+        # Single-query checks do not read the state cache.
+        state_cache=None if settings.single_query_check else state_cache,
+        state_overlap_seconds=settings.snapshot_state_overlap_seconds,
+        max_states=settings.device_state_cache_size,
+        memberships=fence_memberships
+    )
+    return cold_start
+
+
+def is_ready() -> bool:
+    """False while the process is still catching up from a snapshot."""
+    return cold_start is None or cold_start.ready
+
+
+def init_event_publisher() -> EventPublisher:
+    """Select the event publisher: Redis Streams when REDIS_URL is set."""
+    global event_publisher
+    if settings.redis_url:
+        event_publisher = RedisEventPublisher(
+            settings.redis_url,
+            queue_name=settings.redis_stream,
+            max_queue_size=settings.event_queue_size,
+            batch_size=settings.event_batch_size
+        )
+    else:
+        event_publisher = MockEventPublisher()
+    return event_publisher
+
+
+def init_state_buffer(db_pool) -> DeviceStateWriteBuffer:
+    """Create the process-wide write-behind buffer for device states."""
+    global state_buffer
+    state_buffer = DeviceStateWriteBuffer(
+        GeofenceRepository(db_pool),
+        max_pending=settings.state_flush_max_pending,
+        flush_interval_seconds=settings.state_flush_interval_seconds
+    )
+    return state_buffer
+
+
+def init_outbox_dispatcher(db_pool, publisher: EventPublisher) -> OutboxDispatcher:
+    """Create the process-wide dispatcher draining the event outbox."""
+    global outbox_dispatcher
+    outbox_dispatcher = OutboxDispatcher(
+        GeofenceRepository(db_pool),
+        publisher,
+        batch_size=settings.outbox_batch_size,
+        poll_interval_seconds=settings.outbox_poll_interval_seconds
+    )
+    return outbox_dispatcher
+
+
+def init_location_history(db_pool) -> LocationHistoryWriter:
+    """Create the process-wide location history writer."""
+    global location_history
+    location_history = LocationHistoryWriter(
+        GeofenceRepository(db_pool),
+        flush_interval_seconds=settings.location_history_flush_interval_seconds,
+        batch_size=settings.location_history_batch_size,
+        max_pending=settings.location_history_max_pending,
+        retention_days=settings.location_history_retention_days
+    )
+    return location_history
 
 
 def get_geofence_service(db_pool) -> GeofenceService:
@@ -14,5 +177,109 @@ def get_geofence_service(db_pool) -> GeofenceService:
     if not db_pool:
         raise HTTPException(status_code=500, detail="Database not initialized")
     
-    repository = GeofenceRepository(db_pool)
-    return GeofenceService(repository, geofence_calculator, event_publisher)
\ No newline at end of file
+    repository = GeofenceRepository(
+        db_pool, postgis=settings.postgis_enabled, outbox=outbox_dispatcher is not None,
+        acquire_timeout=settings.db_pool_acquire_timeout_seconds or None
+    )
+    # Single-query checks write device states directly, so in-process state
+    # copies would go stale; only the fence cache is kept (for batches).
+    single_query = settings.single_query_check
+    return GeofenceService(
+        repository,
+        geofence_calculator,
+        event_publisher,
+        geofence_cache=geofence_cache,
+        state_buffer=None if single_query else state_buffer,
+        state_cache=None if single_query else state_cache,
+        fast_path=settings.device_fast_path,
+        single_query=single_query,
+        sequencer=device_sequencer,
+        outbox=outbox_dispatcher,
+        history=location_history,
+        memberships=fence_memberships
+    )
+
+
+async def provide_geofence_service(connection: HTTPConnection) -> AsyncIterator[GeofenceService]:
+    """FastAPI dependency resolving a GeofenceService for the app's pool.
+    
+    Accepts any HTTP connection so WebSocket routes can use it too. Within
+    an HTTP request the repository calls share one pooled connection; a
+    WebSocket would hold it for its lifetime, so its calls acquire per call.
+    """
+    service = get_geofence_service(getattr(connection.app.state, "db_pool", None))
+    if connection.scope["type"] != "http":
+        yield service
+        return
+    async with service.repository.request_scope():
+        yield service
+
+
+def provide_geofence_repository(connection: HTTPConnection) -> GeofenceRepository:
+    """FastAPI dependency for fence management on the app's pool."""
+    db_pool = getattr(connection.app.state, "db_pool", None)
+    if not db_pool:
+        raise HTTPException(status_code=500, detail="Database not initialized")
+    return GeofenceRepository(db_pool, acquire_timeout=settings.db_pool_acquire_timeout_seconds or None)
+
+
+def provide_geofence_cache() -> Optional[GeofenceCache]:
+    """FastAPI dependency for the process-wide fence cache, None before startup."""
+    return geofence_cache
+
+
+def provide_geofence_importer(connection: HTTPConnection) -> GeofenceImporter:
+    """FastAPI dependency for a bulk fence importer on the app's pool."""
+    return GeofenceImporter(
+        provide_geofence_repository(connection),
+        geofence_cache=geofence_cache,
+        chunk_size=settings.geofence_import_chunk_size
+    )
+
+
+def provide_admission_controller() -> Optional[AdmissionController]:
+    """FastAPI dependency for the admission controller, None when disabled."""
+    return admission_controller
+
+
+def get_component_stats() -> Dict[str, Any]:
+    """Counters of the process-wide caches and buffers that are enabled."""
+    stats: Dict[str, Any] = {}
+    if database is not None and database.pool is not None:
+        stats["db_pool"] = database.stats()
+    if geofence_cache is not None:
+        stats["geofence_cache"] = geofence_cache.stats()
+    if state_cache is not None:
+        stats["device_state_cache"] = state_cache.stats()
+    if state_buffer is not None:
+        stats["device_state_buffer"] = state_buffer.stats()
+    if device_sequencer is not None:
+        stats["device_sequencer"] = device_sequencer.stats()
+    if isinstance(event_publisher, RedisEventPublisher):
+        stats["event_publisher"] = event_publisher.stats()
+    if outbox_dispatcher is not None:
+        stats["outbox_dispatcher"] = outbox_dispatcher.stats()
+    if admission_controller is not None:
+        stats["admission"] = admission_controller.stats()
+    if location_history is not None:
+        stats["location_history"] = location_history.stats()
+    if cold_start is not None:
+        stats["cold_start"] = cold_start.stats()
+    if fence_memberships is not None:
+        stats["fence_memberships"] = fence_memberships.stats()
+    return stats
+
+
+def _component_samples():
+    """Numeric component stats as gauge samples for /metrics."""
+    for component, stats in get_component_stats().items():
+        for stat, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                yield {"component": component, "stat": stat}, value
+
+
+registry.register_collector(
+    "geofence_component_stat",
+    "Counters and gauges of the in-process caches, buffers and publisher.",
+    _component_samples
+)
@@ -0,0 +1,344 @@
+"""Device-affinity front for a multi-process deployment (see ``cluster.py``).
+
+Every location check is forwarded to the worker process that owns its device
+on a consistent hash ring, so one process sees all of a device's fixes: its
+state cache stays authoritative and its device sequencer orders them. Batches
+and streamed micro-batches are split per worker, sent concurrently and
+reassembled in input order.
+"""
+import asyncio
+import heapq
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Sequence
+
+import httpx
+import numpy as np
+import orjson
+from fastapi import FastAPI, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse
+
+from api.binary_batch import MEDIA_TYPE, BinaryBatchError, decode_batch, encode_batch
+from api.routers.ingest import (
+    MAX_MICRO_BATCH, DuplexStreamingResponse, LineTooLongError, NdjsonSplitter, _encode_ndjson,
+    stream_results
+)
+from api.routers.location import MAX_BATCH_SIZE
+from services.hash_ring import HashRing
+
+
+logger = logging.getLogger(__name__)
+
+_FORWARDED_HEADERS = ("content-type", "retry-after")
+
+
+def _response(upstream: httpx.Response) -> Response:
+    headers = {k: upstream.headers[k] for k in _FORWARDED_HEADERS if k in upstream.headers}
+    return Response(content=upstream.content, status_code=upstream.status_code, headers=headers)
+
+
+def _device_id(item: Any) -> Any:
+    return item.get("device_id") if isinstance(item, dict) else None
+
+
+def merge_results(
+    device_ids: Sequence[str], workers: List[int], positions: List[List[int]], responses: List[Response]
+) -> Response:
+    """Reassemble per-worker JSON result lists into input order.
+
+    The other workers have applied their shares when one fails, so its
+    fixes get an error entry in place and the answer is 207: clients retry
+    only the fixes with an ``error``. When every worker failed, the first
+    failure is returned as is.
+    """
+    failed = [response for response in responses if response.status_code != 200]
+    if len(failed) == len(responses):
+        return failed[0]
+    results: List[Any] = [None] * len(device_ids)
+    for worker, slots, response in zip(workers, positions, responses):
+        if response.status_code == 200:
+            for i, result in zip(slots, orjson.loads(response.body)):
+                results[i] = result
+            continue
+        for i in slots:
+            results[i] = {
+                "device_id": device_ids[i],
+                "error": f"worker {worker} failed with status {response.status_code}",
+                "status": response.status_code,
+            }
+    return Response(orjson.dumps(results), status_code=207 if failed else 200, media_type="application/json")
+
+
+def merge_devices(geofence_id: int, limit: int, responses: List[Response]) -> Response:
+    """Merge per-worker devices-in-fence answers: counts add up, id lists merge in order."""
+    answers = [orjson.loads(response.body) for response in responses]
+    device_ids = list(heapq.merge(*(answer["device_ids"] for answer in answers)))[:limit]
+    return Response(
+        orjson.dumps({
+            "geofence_id": geofence_id,
+            "count": sum(answer["count"] for answer in answers),
+            "device_ids": device_ids,
+        }),
+        media_type="application/json"
+    )
+
+
+def create_front_app(workers: Sequence[httpx.AsyncClient]) -> FastAPI:
+    """Front app routing requests to ``workers`` by device id.
+
+    Worker clients are closed when the app shuts down.
+    """
+    ring = HashRing(list(range(len(workers))))
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        yield
+        await asyncio.gather(*(client.aclose() for client in workers))
+
+    app = FastAPI(title="Geo-fence Alert Service front", lifespan=lifespan)
+    app.state.ring = ring
+
+    async def forward(
+        worker: int, method: str, path: str, content: bytes = b"", content_type: str = "application/json"
+    ) -> Response:
+        try:
+            upstream = await workers[worker].request(
+                method, path, content=content,
+                headers={"content-type": content_type} if content else None
+            )
+        except httpx.TransportError as e:
+            logger.error(f"Worker {worker} unavailable for {path}: {e}")
+            return JSONResponse({"detail": f"Worker {worker} unavailable"}, status_code=502)
+        return _response(upstream)
+
+    @app.post("/api/v1/location-check")
+    async def check_location(request: Request) -> Response:
+        """Forward a single check to its device's worker."""
+        body = await request.body()
+        try:
+            device_id = _device_id(orjson.loads(body))
+        except orjson.JSONDecodeError:
+            device_id = None
+        # Payloads without a usable device id are left to a worker to reject.
+        worker = ring.position_for(device_id) if isinstance(device_id, str) else 0
+        return await forward(worker, "POST", "/api/v1/location-check", body)
+
+    @app.post("/api/v1/location-check/batch")
+    async def check_location_batch(request: Request) -> Response:
+        """Split a batch per worker and merge the results in input order (see ``merge_results``)."""
+        body = await request.body()
+        try:
+            fixes = orjson.loads(body)
+        except orjson.JSONDecodeError:
+            fixes = None
+        if (
+            not isinstance(fixes, list)
+            or len(fixes) > MAX_BATCH_SIZE
+            or not all(isinstance(_device_id(fix), str) for fix in fixes)
+        ):
+            return await forward(0, "POST", "/api/v1/location-check/batch", body)
+
+        positions: Dict[int, List[int]] = {}
+        for i, fix in enumerate(fixes):
+            positions.setdefault(ring.position_for(fix["device_id"]), []).append(i)
+        if len(positions) == 1:
+            worker = next(iter(positions))
+            return await forward(worker, "POST", "/api/v1/location-check/batch", body)
+
+        workers_used = list(positions)
+        responses = await asyncio.gather(*(
+            forward(
+                worker, "POST", "/api/v1/location-check/batch",
+                orjson.dumps([fixes[i] for i in positions[worker]])
+            )
+            for worker in workers_used
+        ))
+        return merge_results(
+            [fix["device_id"] for fix in fixes], workers_used,
+            [positions[worker] for worker in workers_used], responses
+        )
+
+    @app.post("/api/v1/location-check/binary")
+    async def check_location_binary(request: Request) -> Response:
+        """Split a binary batch per worker, re-encoding each worker's share."""
+        path = "/api/v1/location-check/binary"
+        body = await request.body()
+        try:
+            batch = decode_batch(body, max_fixes=MAX_BATCH_SIZE)
+        except BinaryBatchError:
+            return await forward(0, "POST", path, body, MEDIA_TYPE)
+
+        device_workers = np.array(
+            [ring.position_for(device_id) for device_id in batch.device_table], dtype=np.int64
+        )
+        fix_workers = device_workers[batch.device_index]
+        workers_used = np.unique(fix_workers).tolist()
+        if len(workers_used) <= 1:
+            return await forward(workers_used[0] if workers_used else 0, "POST", path, body, MEDIA_TYPE)
+
+        device_ids = batch.device_ids
+        shares = [np.flatnonzero(fix_workers == worker) for worker in workers_used]
+        responses = await asyncio.gather(*(
+            forward(
+                worker, "POST", path,
+                encode_batch([device_ids[i] for i in share.tolist()], batch.lats[share], batch.lons[share]),
+                MEDIA_TYPE
+            )
+            for worker, share in zip(workers_used, shares)
+        ))
+        return merge_results(device_ids, workers_used, [share.tolist() for share in shares], responses)
+
+    @app.get("/api/v1/devices/{device_id}/track")
+    async def get_device_track(device_id: str, request: Request) -> Response:
+        """Forward a track query to its device's worker."""
+        path = request.url.path
+        if request.url.query:
+            path = f"{path}?{request.url.query}"
+        return await forward(ring.position_for(device_id), "GET", path)
+
+    async def check_lines(lines: List[bytes], first_line_no: int) -> List[Dict[str, Any]]:
+        """Check a micro-batch of stream lines on their devices' workers, in line order."""
+        positions: Dict[int, List[int]] = {}
+        for i, line in enumerate(lines):
+            try:
+                device_id = _device_id(orjson.loads(line))
+            except orjson.JSONDecodeError:
+                device_id = None
+            # Lines without a usable device id are left to a worker to reject.
+            worker = ring.position_for(device_id) if isinstance(device_id, str) else 0
+            positions.setdefault(worker, []).append(i)
+
+        workers_used = list(positions)
+        responses = await asyncio.gather(*(
+            forward(
+                worker, "POST", "/api/v1/location-stream",
+                b"\n".join(lines[i] for i in positions[worker]), "application/x-ndjson"
+            )
+            for worker in workers_used
+        ))
+        results: List[Optional[Dict[str, Any]]] = [None] * len(lines)
+        for worker, response in zip(workers_used, responses):
+            slots = positions[worker]
+            if response.status_code == 200:
+                for slot, line in zip(slots, response.body.splitlines()):
+                    result = orjson.loads(line)
+                    # Workers number the lines of their share; renumber for the stream.
+                    if "line" in result:
+                        result["line"] = first_line_no + slot
+                    results[slot] = result
+            for slot in slots:
+                if results[slot] is None:
+                    results[slot] = {
+                        "line": first_line_no + slot,
+                        "error": f"worker {worker} failed with status {response.status_code}"
+                        if response.status_code != 200 else "Internal server error",
+                    }
+        return results
+
+    @app.post("/api/v1/location-stream")
+    async def ingest_stream(request: Request) -> Response:
+        """Check each streamed micro-batch on its devices' workers and stream the results back."""
+        return DuplexStreamingResponse(
+            stream_results(request.stream(), check_lines), media_type="application/x-ndjson"
+        )
+
+    @app.websocket("/api/v1/location-stream/ws")
+    async def ingest_websocket(websocket: WebSocket) -> None:
+        """Route each frame's fixes per worker; one frame is handled at a time, throttling the sender."""
+        await websocket.accept()
+        splitter = NdjsonSplitter()
+        line_no = 1
+        try:
+            while True:
+                lines = splitter.feed((await websocket.receive_text()).encode() + b"\n")
+                for start in range(0, len(lines), MAX_MICRO_BATCH):
+                    batch = lines[start:start + MAX_MICRO_BATCH]
+                    results = await check_lines(batch, line_no)
+                    line_no += len(batch)
+                    await websocket.send_text(_encode_ndjson(results).decode())
+        except WebSocketDisconnect:
+            pass
+        except LineTooLongError as e:
+            logger.warning(f"Closing location websocket: {e}")
+            await websocket.close(code=1009)
+        except Exception as e:
+            logger.error(f"Error routing location websocket: {e}")
+            await websocket.close(code=1011)
+
+    @app.post("/api/v1/geofences/import")
+    async def import_geofences() -> Response:
+        """Imports are long streamed uploads; clients send them to a worker."""
+        return JSONResponse(
+            {"detail": "Geofence imports are not routed by the front; post to a worker or use import_geofences.py"},
+            status_code=501
+        )
+
+    @app.get("/api/v1/geofences/{geofence_id}/devices")
+    async def devices_in_geofence(geofence_id: int, request: Request) -> Response:
+        """Each worker knows the devices it owns; ask them all and merge."""
+        path = request.url.path
+        if request.url.query:
+            path = f"{path}?{request.url.query}"
+        responses = await asyncio.gather(*(
+            forward(worker, "GET", path) for worker in range(len(workers))
+        ))
+        for response in responses:
+            if response.status_code != 200:
+                return response
+        # The workers have validated the limit.
+        limit = int(request.query_params.get("limit", 1000))
+        return merge_devices(geofence_id, limit, responses)
+
+    @app.api_route("/api/v1/geofences", methods=["GET", "POST"])
+    @app.api_route("/api/v1/geofences/{geofence_id}", methods=["GET", "PUT", "DELETE"])
+    async def manage_geofences(request: Request) -> Response:
+        """Fence management goes to the first worker; the rest follow the change NOTIFY."""
+        path = request.url.path
+        if request.url.query:
+            path = f"{path}?{request.url.query}"
+        body = await request.body()
+        return await forward(0, request.method, path, body)
+
+    async def probe(path: str) -> Response:
+        statuses = await asyncio.gather(*(
+            forward(worker, "GET", path) for worker in range(len(workers))
+        ))
+        healthy = all(status.status_code == 200 for status in statuses)
+        return JSONResponse(
+            {
+                "status": "healthy" if healthy else "degraded",
+                "workers": [status.status_code for status in statuses],
+            },
+            status_code=200 if healthy else 503
+        )
+
+    @app.get("/health")
+    async def health_check() -> Response:
+        """Healthy only while every worker is."""
+        return await probe("/health")
+
+    @app.get("/ready")
+    async def readiness_check() -> Response:
+        """Ready only once every worker is."""
+        return await probe("/ready")
+
+    @app.get("/workers/{worker}/{path:path}")
+    async def worker_passthrough(worker: int, path: str) -> Response:
+        """GET a worker endpoint, e.g. ``/workers/0/metrics`` or ``/workers/1/stats``."""
+        if not 0 <= worker < len(workers):
+            return JSONResponse({"detail": f"No worker {worker}"}, status_code=404)
+        return await forward(worker, "GET", f"/{path}")
+
+    return app
+
+
+def uds_clients(socket_paths: Sequence[str], timeout: float = 30.0) -> List[httpx.AsyncClient]:
+    """HTTP clients for workers listening on Unix domain sockets."""
+    return [
+        httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(uds=path),
+            base_url="http://worker",
+            timeout=timeout
+        )
+        for path in socket_paths
+    ]
@@ -0,0 +1,140 @@
+import logging
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from typing import Any, Dict, List, Optional
+
+from api.dependecies import (
+    provide_geofence_cache, provide_geofence_importer, provide_geofence_repository,
+    provide_geofence_service
+)
+from models.geofence import GeofenceInputModel, GeofenceModel
+from repositories.geofence_repository import GeofenceRepository
+from services.geofence_cache import GeofenceCache
+from services.geofence_import import IMPORT_FORMATS, GeofenceImporter, GeofenceImportError
+from services.geofence_service import GeofenceService
+
+
+router = APIRouter(prefix="/api/v1", tags=["geofences"])
+logger = logging.getLogger(__name__)
+
+MAX_PAGE_SIZE = 10_000
+MAX_NEAREST = 100
+
+
+def _fence_changed(cache: Optional[GeofenceCache]) -> None:
+    """Reload this process's fences on the next check, without waiting for the NOTIFY."""
+    if cache is not None:
+        cache.invalidate()
+
+
+@router.get("/geofences", response_model=List[GeofenceModel])
+async def list_geofences(
+    after_id: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=MAX_PAGE_SIZE),
+    repository: GeofenceRepository = Depends(provide_geofence_repository)
+) -> List[GeofenceModel]:
+    """Geofences in id order; pass the last id seen as ``after_id`` for the next page."""
+    return await repository.list_geofences(after_id, limit)
+
+
+@router.get("/geofences/nearest", response_model=Dict[str, Any])
+async def nearest_geofences(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    k: int = Query(5, ge=1, le=MAX_NEAREST),
+    service: GeofenceService = Depends(provide_geofence_service)
+) -> Dict[str, Any]:
+    """The ``k`` fences with the nearest boundaries, from the in-memory index.
+
+    ``distance_km`` is negative for fences containing the point.
+    """
+    return await service.nearest_geofences(lat, lon, k)
+
+
+@router.get("/geofences/{geofence_id}/devices", response_model=Dict[str, Any])
+async def devices_in_geofence(
+    geofence_id: int,
+    limit: int = Query(1000, ge=1, le=MAX_PAGE_SIZE),
+    service: GeofenceService = Depends(provide_geofence_service)
+) -> Dict[str, Any]:
+    """Devices this process last saw inside a fence, in id order, with their total count."""
+    if service.memberships is None:
+        raise HTTPException(status_code=501, detail="Fence membership index is disabled")
+    devices = await service.devices_in_geofence(geofence_id, limit)
+    if devices is None:
+        raise HTTPException(status_code=404, detail="Geofence not found")
+    return devices
+
+
+@router.get("/geofences/{geofence_id}", response_model=GeofenceModel)
+async def get_geofence(
+    geofence_id: int,
+    repository: GeofenceRepository = Depends(provide_geofence_repository)
+) -> GeofenceModel:
+    """Get one geofence."""
+    fence = await repository.get_geofence(geofence_id)
+    if fence is None:
+        raise HTTPException(status_code=404, detail="Geofence not found")
+    return fence
+
+
+@router.post("/geofences", response_model=GeofenceModel, status_code=201)
+async def create_geofence(
+    fence: GeofenceInputModel,
+    repository: GeofenceRepository = Depends(provide_geofence_repository),
+    cache: Optional[GeofenceCache] = Depends(provide_geofence_cache)
+) -> GeofenceModel:
+    """Create a geofence."""
+    created = await repository.create_geofence(fence)
+    _fence_changed(cache)
+    logger.info(f"Geofence {created.id} created")
+    return created
+
+
+@router.put("/geofences/{geofence_id}", response_model=GeofenceModel)
+async def update_geofence(
+    geofence_id: int,
+    fence: GeofenceInputModel,
+    repository: GeofenceRepository = Depends(provide_geofence_repository),
+    cache: Optional[GeofenceCache] = Depends(provide_geofence_cache)
+) -> GeofenceModel:
+    """Replace a geofence's name and shape; its id is kept."""
+    updated = await repository.update_geofence(geofence_id, fence)
+    if updated is None:
+        raise HTTPException(status_code=404, detail="Geofence not found")
+    _fence_changed(cache)
+    logger.info(f"Geofence {geofence_id} updated")
+    return updated
+
+
+@router.delete("/geofences/{geofence_id}", status_code=204)
+async def delete_geofence(
+    geofence_id: int,
+    repository: GeofenceRepository = Depends(provide_geofence_repository),
+    cache: Optional[GeofenceCache] = Depends(provide_geofence_cache)
+) -> Response:
+    """Delete a geofence; devices inside it are no longer counted as inside it."""
+    if not await repository.delete_geofence(geofence_id):
+        raise HTTPException(status_code=404, detail="Geofence not found")
+    _fence_changed(cache)
+    logger.info(f"Geofence {geofence_id} deleted")
+    return Response(status_code=204)
+
+
+@router.post("/geofences/import", response_model=Dict[str, Any])
+async def import_geofences(
+    request: Request,
+    format: str = Query(..., pattern=f"^({'|'.join(IMPORT_FORMATS)})$"),
+    replace: bool = False,
+    strict: bool = False,
+    importer: GeofenceImporter = Depends(provide_geofence_importer)
+) -> Dict[str, Any]:
+    """Bulk-load fences from a streamed CSV, GeoJSON or GeoJSON-sequence body.
+
+    Fences are matched by name: existing ones are updated in place, new ones
+    inserted and, with ``replace``, the rest deleted, all in one transaction.
+    Invalid records are skipped and reported unless ``strict`` is set.
+    """
+    try:
+        return await importer.run(request.stream(), format, replace=replace, strict=strict)
+    except GeofenceImportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
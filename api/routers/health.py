@@ -1,5 +1,7 @@
-from fastapi import APIRouter
-from typing import Dict
+from fastapi import APIRouter, Response, status
+from typing import Any, Dict
+
+from api.dependecies import get_component_stats, is_ready
 
 
 router = APIRouter(tags=["health"])
@@ -12,6 +14,15 @@ async def health_check() -> Dict[str, str]:
 
 
 @router.get("/ready")
-async def readiness_check() -> Dict[str, str]:
-    """Readiness check endpoint."""
-    return {"status": "ready", "service": "geofence-alert-service"}
\ No newline at end of file
+async def readiness_check(response: Response) -> Dict[str, str]:
+    """Readiness check endpoint; 503 until startup from a snapshot has caught up."""
+    if not is_ready():
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return {"status": "starting", "service": "geofence-alert-service"}
+    return {"status": "ready", "service": "geofence-alert-service"}
+
+
+@router.get("/stats")
+async def component_stats() -> Dict[str, Any]:
+    """Cache and buffer counters (hit ratios, memory per cached device)."""
+    return get_component_stats()
@@ -0,0 +1,43 @@
+import logging
+from datetime import datetime, timezone
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Any, Dict
+
+from api.dependecies import provide_geofence_service
+from services.geofence_service import GeofenceService
+
+
+router = APIRouter(prefix="/api/v1", tags=["history"])
+logger = logging.getLogger(__name__)
+
+MAX_TRACK_POINTS = 100_000
+
+
+def _utc(value: datetime) -> datetime:
+    """Timestamps without an offset are taken as UTC."""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+@router.get("/devices/{device_id}/track", response_model=Dict[str, Any])
+async def get_device_track(
+    device_id: str,
+    start: datetime,
+    end: datetime,
+    max_points: int = Query(1000, ge=2, le=MAX_TRACK_POINTS),
+    tolerance_m: float = Query(0.0, ge=0.0),
+    service: GeofenceService = Depends(provide_geofence_service)
+) -> Dict[str, Any]:
+    """Recorded track of a device in [start, end), downsampled to about ``max_points``.
+
+    Fence transitions are always included; ``tolerance_m`` additionally
+    drops points within that many metres of the simplified line.
+    """
+    start, end = _utc(start), _utc(end)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+
+    try:
+        return await service.get_device_track(device_id, start, end, max_points, tolerance_m)
+    except Exception as e:
+        logger.error(f"Error reading track for device {device_id}: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
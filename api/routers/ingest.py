@@ -0,0 +1,215 @@
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import orjson
+from fastapi import APIRouter, Depends, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from starlette.requests import ClientDisconnect
+from starlette.types import Receive, Scope, Send
+
+from api.dependecies import provide_geofence_service
+from models.geofence import DeviceLocationModel
+from services.geofence_service import GeofenceService
+
+
+router = APIRouter(prefix="/api/v1", tags=["ingest"])
+logger = logging.getLogger(__name__)
+
+# Fixes handed to the service in one call; bursts are coalesced up to this size.
+MAX_MICRO_BATCH = 500
+# Lines a WebSocket connection may have queued before its reader stops reading.
+MAX_PENDING_LINES = 2000
+MAX_LINE_BYTES = 64 * 1024
+
+
+class LineTooLongError(ValueError):
+    """Raised when an NDJSON line exceeds MAX_LINE_BYTES."""
+
+
+class NdjsonSplitter:
+    """Incremental newline splitter holding at most one partial line."""
+
+    def __init__(self, max_line_bytes: int = MAX_LINE_BYTES):
+        self.max_line_bytes = max_line_bytes
+        self._partial = bytearray()
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        """Return the complete, non-empty lines finished by this chunk."""
+        self._partial += chunk
+        *lines, rest = self._partial.split(b"\n")
+        if any(len(line) > self.max_line_bytes for line in lines) or len(rest) > self.max_line_bytes:
+            raise LineTooLongError(f"line exceeds {self.max_line_bytes} bytes")
+        self._partial = rest
+        return [line for line in (bytes(line).strip() for line in lines) if line]
+
+    def finish(self) -> List[bytes]:
+        """Return the trailing line, if the stream did not end with a newline."""
+        line = bytes(self._partial).strip()
+        self._partial = bytearray()
+        return [line] if line else []
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """StreamingResponse whose body iterator may keep reading the request.
+    
+    The stock response watches ``receive()`` for disconnects while streaming,
+    which would steal request body chunks from an iterator that is still
+    consuming them; here the iterator owns ``receive()`` and sees disconnects
+    as ``ClientDisconnect`` from ``request.stream()``.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.stream_response(send)
+
+
+async def _process_lines(
+    service: GeofenceService,
+    lines: List[bytes],
+    first_line_no: int
+) -> List[Dict[str, Any]]:
+    """Validate lines and run the valid fixes through one service batch.
+
+    Results keep line order; invalid lines yield an error entry in place.
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * len(lines)
+    fixes = []
+    slots = []
+    for slot, line in enumerate(lines):
+        try:
+            fixes.append(DeviceLocationModel.model_validate_json(line))
+            slots.append(slot)
+        except ValidationError as e:
+            results[slot] = {
+                "line": first_line_no + slot,
+                "error": "invalid location",
+                "detail": [err["msg"] for err in e.errors()]
+            }
+
+    if fixes:
+        for slot, result in zip(slots, await service.check_device_locations(fixes)):
+            results[slot] = result
+    return results
+
+
+def _encode_ndjson(results: List[Dict[str, Any]]) -> bytes:
+    return b"".join(orjson.dumps(result) + b"\n" for result in results)
+
+
+async def stream_results(
+    chunks: AsyncIterator[bytes],
+    process: Callable[[List[bytes], int], Awaitable[List[Dict[str, Any]]]]
+) -> AsyncIterator[bytes]:
+    """NDJSON results of ``process`` over the lines of ``chunks``, one micro-batch at a time.
+
+    ``process`` gets the lines of a micro-batch and the stream line number
+    of the first. Stream-level failures end the output with an error line.
+    """
+    splitter = NdjsonSplitter()
+    line_no = 1
+    try:
+        async for chunk in chunks:
+            lines = splitter.feed(chunk)
+            for start in range(0, len(lines), MAX_MICRO_BATCH):
+                batch = lines[start:start + MAX_MICRO_BATCH]
+                yield _encode_ndjson(await process(batch, line_no))
+                line_no += len(batch)
+        tail = splitter.finish()
+        if tail:
+            yield _encode_ndjson(await process(tail, line_no))
+    except ClientDisconnect:
+        logger.info("Location stream client disconnected")
+    except LineTooLongError as e:
+        yield _encode_ndjson([{"line": line_no, "error": str(e)}])
+    except Exception as e:
+        logger.error(f"Error processing location stream: {e}")
+        yield _encode_ndjson([{"line": line_no, "error": "Internal server error"}])
+
+
+@router.post("/location-stream")
+async def ingest_ndjson(
+    request: Request,
+    service: GeofenceService = Depends(provide_geofence_service)
+) -> DuplexStreamingResponse:
+    """Stream NDJSON fixes in and NDJSON results out.
+
+    The request body is parsed incrementally as it arrives and is only read
+    as fast as results are produced, so memory per connection stays bounded
+    by one chunk plus one partial line.
+    """
+    async def process(lines: List[bytes], first_line_no: int) -> List[Dict[str, Any]]:
+        return await _process_lines(service, lines, first_line_no)
+
+    return DuplexStreamingResponse(
+        stream_results(request.stream(), process), media_type="application/x-ndjson"
+    )
+
+
+@router.websocket("/location-stream/ws")
+async def ingest_websocket(
+    websocket: WebSocket,
+    service: GeofenceService = Depends(provide_geofence_service)
+) -> None:
+    """Persistent ingestion channel for gateways.
+
+    Each text frame carries one or more newline-separated JSON fixes; each
+    processed micro-batch is answered with one frame of NDJSON results in
+    input order. A bounded queue sits between the socket reader and the
+    processor: when it is full the reader stops receiving, so a fast sender
+    is throttled by TCP flow control instead of growing server memory.
+    A line over the size limit ends the stream: the lines before it are
+    still answered, then the socket is closed with 1009.
+    """
+    await websocket.accept()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=MAX_PENDING_LINES)
+    client_gone = asyncio.Event()
+    close_code = 1000
+
+    async def read_frames() -> None:
+        nonlocal close_code
+        splitter = NdjsonSplitter()
+        try:
+            while True:
+                message = await websocket.receive_text()
+                for line in splitter.feed(message.encode() + b"\n"):
+                    await queue.put(line)
+        except WebSocketDisconnect:
+            client_gone.set()
+        except LineTooLongError as e:
+            logger.warning(f"Closing location websocket: {e}")
+            close_code = 1009
+        except Exception as e:
+            logger.error(f"Error reading location websocket: {e}")
+            client_gone.set()
+            await websocket.close(code=1011)
+        # Not reached when cancelled, so a full queue cannot block the reader for good.
+        await queue.put(None)
+
+    reader = asyncio.create_task(read_frames())
+    line_no = 1
+    try:
+        done = False
+        while not done:
+            batch = [await queue.get()]
+            while len(batch) < MAX_MICRO_BATCH and not queue.empty():
+                batch.append(queue.get_nowait())
+            if batch[-1] is None:
+                batch.pop()
+                done = True
+            if batch:
+                # Fixes already received are applied even if the client left.
+                results = await _process_lines(service, batch, line_no)
+                line_no += len(batch)
+                if not client_gone.is_set():
+                    await websocket.send_text(_encode_ndjson(results).decode())
+        if not client_gone.is_set():
+            await websocket.close(code=close_code)
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"Error processing location websocket: {e}")
+        if not client_gone.is_set():
+            await websocket.close(code=1011)
+    finally:
+        reader.cancel()
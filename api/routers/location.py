@@ -1,25 +1,115 @@
 import logging
-from fastapi import APIRouter, HTTPException, Depends
-from typing import Dict, Any
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, Body, HTTPException, Depends, Request, Response
+from fastapi.responses import ORJSONResponse
+from typing import AsyncIterator, Dict, Any, List, Optional
 
+from api.binary_batch import MEDIA_TYPE, BinaryBatchError, decode_batch
+from api.dependecies import provide_admission_controller, provide_geofence_service
 from models.geofence import DeviceLocationModel
+from services.admission import AdmissionController, AdmissionRejected
 from services.geofence_service import GeofenceService
 
 
 router = APIRouter(prefix="/api/v1", tags=["location"])
 logger = logging.getLogger(__name__)
 
+MAX_BATCH_SIZE = 10_000
+
+
+@asynccontextmanager
+async def admitted(admission: Optional[AdmissionController], priority: bool) -> AsyncIterator[None]:
+    """Hold an admission slot for the block; 429 with Retry-After when shed."""
+    if admission is None:
+        yield
+        return
+    try:
+        started = await admission.acquire(priority)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=429, detail="Too many location checks, retry later",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    try:
+        yield
+    finally:
+        admission.release(started)
+
 
 @router.post("/location-check", response_model=Dict[str, Any])
 async def check_location(
     location: DeviceLocationModel,
-    service: GeofenceService = Depends() 
-) -> Dict[str, Any]:
-    """Check if device location is within any geofence."""
+    service: GeofenceService = Depends(provide_geofence_service),
+    admission: Optional[AdmissionController] = Depends(provide_admission_controller)
+) -> Response:
+    """Check if device location is within any geofence.
+
+    The result is written with orjson directly; ``response_model`` only
+    documents it, so the generic encoder and response validation are skipped.
+    """
+    priority = admission is not None and not service.is_routine_fix(
+        location.device_id, location.lat, location.lon
+    )
+    async with admitted(admission, priority):
+        try:
+            result = await service.check_device_location(location)
+            logger.info(f"Location check completed for device {location.device_id}")
+            return ORJSONResponse(result)
+        except Exception as e:
+            logger.error(f"Error checking location for device {location.device_id}: {e}")
+            raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.post("/location-check/batch", response_model=List[Dict[str, Any]])
+async def check_location_batch(
+    locations: List[DeviceLocationModel] = Body(..., max_length=MAX_BATCH_SIZE),
+    service: GeofenceService = Depends(provide_geofence_service),
+    admission: Optional[AdmissionController] = Depends(provide_admission_controller)
+) -> Response:
+    """Check a batch of device locations; results are returned in input order."""
+    priority = admission is not None and not all(
+        service.is_routine_fix(location.device_id, location.lat, location.lon) for location in locations
+    )
+    async with admitted(admission, priority):
+        try:
+            results = await service.check_device_locations(locations)
+            logger.info(f"Batch location check completed for {len(locations)} fixes")
+            return ORJSONResponse(results)
+        except Exception as e:
+            logger.error(f"Error checking batch of {len(locations)} locations: {e}")
+            raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.post(
+    "/location-check/binary",
+    response_model=List[Dict[str, Any]],
+    openapi_extra={"requestBody": {"content": {MEDIA_TYPE: {"schema": {"type": "string", "format": "binary"}}}}}
+)
+async def check_location_binary(
+    request: Request,
+    service: GeofenceService = Depends(provide_geofence_service),
+    admission: Optional[AdmissionController] = Depends(provide_admission_controller)
+) -> Response:
+    """Check a batch in the compact binary format (see ``api.binary_batch``).
+
+    Fixes are decoded straight into coordinate arrays; results are the same
+    JSON list, in input order, as for the JSON batch endpoint.
+    """
     try:
-        result = await service.check_device_location(location)
-        logger.info(f"Location check completed for device {location.device_id}")
-        return result
-    except Exception as e:
-        logger.error(f"Error checking location for device {location.device_id}: {e}")
-        raise HTTPException(status_code=500, detail="Internal server error")
\ No newline at end of file
+        batch = decode_batch(await request.body(), max_fixes=MAX_BATCH_SIZE)
+    except BinaryBatchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    device_ids = batch.device_ids
+    priority = admission is not None and not all(
+        service.is_routine_fix(device_id, lat, lon)
+        for device_id, lat, lon in zip(device_ids, batch.lats.tolist(), batch.lons.tolist())
+    )
+    async with admitted(admission, priority):
+        try:
+            results = await service.check_device_arrays(device_ids, batch.lats, batch.lons)
+            logger.info(f"Binary batch location check completed for {len(batch)} fixes")
+            return ORJSONResponse(results)
+        except Exception as e:
+            logger.error(f"Error checking binary batch of {len(batch)} locations: {e}")
+            raise HTTPException(status_code=500, detail="Internal server error")
@@ -0,0 +1,38 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from typing import Any, Dict
+
+from api import dependecies
+from services.metrics import registry
+from services.profiler import ProfilerBusyError
+
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics() -> PlainTextResponse:
+    """Stage timings, counters and component stats in Prometheus text format."""
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@router.get("/debug/profile", response_model=None)
+async def capture_profile(
+    seconds: float = Query(5.0, gt=0, le=60),
+    format: str = Query("json", pattern="^(json|folded)$")
+) -> Dict[str, Any] | PlainTextResponse:
+    """Sample the location-check path for a while (PROFILER_ENABLED only).
+
+    ``format=folded`` returns folded stacks for flame graph tools.
+    """
+    if dependecies.profiler is None:
+        raise HTTPException(status_code=404, detail="Profiler disabled")
+    try:
+        profile = await dependecies.profiler.capture(seconds)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if format == "folded":
+        return PlainTextResponse(profile["folded"])
+    return profile
@@ -0,0 +1,464 @@
+"""Offline replay of historical fixes: regenerate fence enter and exit events and final device states.
+
+Fixes are streamed from a JSONL file (one ``{"device_id", "lat", "lon"}``
+object per line, optionally wrapped in a request ``body`` and carrying a
+``timestamp``) or from a CSV export of a Postgres table, e.g.
+
+    \\copy (SELECT device_id, lat, lon, recorded_at AS timestamp FROM fixes
+            ORDER BY recorded_at) TO 'fixes.csv' CSV HEADER
+
+and checked with the ``GeofenceService`` batch path in worker processes.
+Devices are assigned to workers with the same consistent hash ring as
+``cluster.py``, so each device's fixes are replayed by one worker in file
+order. The parent reads the input line by line and hands fixed-size chunks
+to each worker over a bounded queue; workers spool events and final states
+to CSV files. Memory therefore grows with the number of devices (one state
+each), not with the number of fixes.
+
+Replays start from no device state. With ``--load`` the spooled files are
+loaded with COPY in one transaction: events are appended to ``fence_events``
+and final states are upserted into ``device_states`` unless the live state
+is newer. Run from the repository root:
+
+    python backfill.py --input fixes.jsonl --output-dir /tmp/backfill
+    python backfill.py --input fixes.csv --workers 8 --load
+"""
+import argparse
+import asyncio
+import csv
+import logging
+import multiprocessing
+import os
+import queue
+import resource
+import shutil
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import asyncpg
+import orjson
+
+from config.settings import settings
+from database.db_setup import DatabaseManager
+from domain.geofence_calculator import GeofenceCalculator
+from domain.shared_index import write_index_file
+from models.geofence import GeofenceModel
+from models.records import DeviceStateRecord
+from repositories.geofence_repository import GeofenceRepository
+from services.event_publisher import EventPublisher
+from services.geofence_cache import GeofenceCache
+from services.geofence_service import GeofenceService
+from services.hash_ring import HashRing
+
+
+logger = logging.getLogger("backfill")
+
+Fix = Tuple[str, float, float, Optional[str]]
+
+EVENT_COLUMNS = ("event_type", "device_id", "latitude", "longitude", "geofence_name", "event_time", "run_id")
+STATE_COLUMNS = (
+    "device_id", "last_lat", "last_lon", "is_inside_fence", "last_geofence_id", "geofence_ids", "last_updated"
+)
+
+
+def _fix_from_record(record: Any) -> Optional[Fix]:
+    if isinstance(record, dict) and isinstance(record.get("body"), dict):
+        record = record["body"]
+    if not isinstance(record, dict):
+        return None
+    try:
+        device_id = record["device_id"]
+        lat = float(record["lat"])
+        lon = float(record["lon"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not device_id or not isinstance(device_id, str) or abs(lat) > 90 or abs(lon) > 180:
+        return None
+    return device_id, lat, lon, record.get("timestamp") or None
+
+
+def iter_fixes(path: str, skipped: Optional[List[int]] = None) -> Iterator[Fix]:
+    """Stream (device_id, lat, lon, timestamp) from a JSONL or CSV file.
+
+    Lines that are not valid fixes are skipped and counted in ``skipped[0]``.
+    """
+    skipped = skipped if skipped is not None else [0]
+    with open(path, newline="") as f:
+        if path.endswith(".csv"):
+            records = csv.DictReader(f)
+        else:
+            records = (_load_json(line) for line in f)
+        for record in records:
+            fix = _fix_from_record(record)
+            if fix is None:
+                skipped[0] += 1
+            else:
+                yield fix
+
+
+def _load_json(line: str) -> Any:
+    try:
+        return orjson.loads(line)
+    except orjson.JSONDecodeError:
+        return None
+
+
+class ReplayStateStore:
+    """Repository stand-in holding the replayed state of each device.
+
+    Fences come from the shared index file, so only the version is served.
+    """
+
+    def __init__(self, fence_version: int):
+        self.fence_version = fence_version
+        self.states: Dict[str, DeviceStateRecord] = {}
+
+    async def get_geofence_version(self) -> int:
+        return self.fence_version
+
+    async def get_all_geofences(self) -> List[GeofenceModel]:
+        raise RuntimeError("backfill workers load fences from the shared index file")
+
+    async def get_device_states(self, device_ids: Sequence[str]) -> Dict[str, DeviceStateRecord]:
+        states = self.states
+        return {device_id: states[device_id] for device_id in device_ids if device_id in states}
+
+    async def update_device_states(
+        self,
+        states: Sequence[Tuple[str, float, float, bool, Optional[int], Sequence[int]]]
+    ) -> None:
+        for device_id, lat, lon, inside, geofence_id, geofence_ids in states:
+            self.states[device_id] = DeviceStateRecord(device_id, lat, lon, inside, geofence_id, geofence_ids)
+
+
+class SpoolEventPublisher(EventPublisher):
+    """Appends events to a CSV file in ``EVENT_COLUMNS`` order.
+
+    Events are stamped with the time of the fix that caused them when the
+    input has timestamps. The service publishes in fix order, so the fix is
+    found by scanning forward through the current chunk; one fix may cause
+    several events, so the scan resumes at the last match.
+    """
+
+    def __init__(self, f, run_id: str):
+        self.writer = csv.writer(f)
+        self.run_id = run_id
+        self.published = 0
+        self._chunk: Tuple[Sequence[str], Sequence[float], Sequence[float], Sequence[Optional[str]]] = ((), (), (), ())
+        self._cursor = 0
+
+    def start_chunk(self, device_ids, lats, lons, timestamps) -> None:
+        self._chunk = (device_ids, lats, lons, timestamps)
+        self._cursor = 0
+
+    def _fix_time(self, device_id: str, lat: float, lon: float) -> Optional[str]:
+        device_ids, lats, lons, timestamps = self._chunk
+        for i in range(self._cursor, len(device_ids)):
+            if device_ids[i] == device_id and lats[i] == lat and lons[i] == lon:
+                self._cursor = i
+                return timestamps[i]
+        return None
+
+    async def publish_geo_event(self, event_data: Dict[str, Any]) -> None:
+        fix_time = self._fix_time(event_data["device_id"], event_data["latitude"], event_data["longitude"])
+        self.writer.writerow((
+            event_data["event_type"],
+            event_data["device_id"],
+            event_data["latitude"],
+            event_data["longitude"],
+            event_data["geofence_name"],
+            fix_time or event_data["timestamp"],
+            self.run_id
+        ))
+        self.published += 1
+
+
+async def replay_partition(
+    position: int,
+    chunks: "multiprocessing.Queue",
+    index_dir: str,
+    fence_version: int,
+    cell_size: float,
+    output_dir: str,
+    run_id: str
+) -> Dict[str, Any]:
+    """Replay the chunks sent to one worker until a ``None`` arrives."""
+    store = ReplayStateStore(fence_version)
+    calculator = GeofenceCalculator(cell_size_deg=cell_size)
+    cache = GeofenceCache(store, calculator, ttl_seconds=float("inf"), index_dir=index_dir)
+    await cache.get_index()
+    if cache.file_loads != 1:
+        raise RuntimeError("worker did not load the shared index file")
+
+    events_path = os.path.join(output_dir, f"events-{position}.csv")
+    states_path = os.path.join(output_dir, f"states-{position}.csv")
+    last_times: Dict[str, Optional[str]] = {}
+    fixes = 0
+    with open(events_path, "w", newline="") as events_file:
+        publisher = SpoolEventPublisher(events_file, run_id)
+        service = GeofenceService(store, calculator, publisher, geofence_cache=cache)
+        while (chunk := chunks.get()) is not None:
+            device_ids, lats, lons, timestamps = chunk
+            publisher.start_chunk(device_ids, lats, lons, timestamps)
+            await service.check_device_arrays(device_ids, lats, lons)
+            last_times.update(zip(device_ids, timestamps))
+            fixes += len(device_ids)
+
+    with open(states_path, "w", newline="") as states_file:
+        writer = csv.writer(states_file)
+        for state in store.states.values():
+            writer.writerow((
+                state.device_id, state.last_lat, state.last_lon,
+                state.is_inside_fence, state.last_geofence_id,
+                "{" + ",".join(map(str, state.geofence_ids)) + "}", last_times.get(state.device_id)
+            ))
+
+    return {
+        "position": position,
+        "fixes": fixes,
+        "devices": len(store.states),
+        "events": publisher.published,
+        "events_path": events_path,
+        "states_path": states_path,
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def _worker(position: int, chunks, index_dir: str, fence_version: int, cell_size: float,
+            output_dir: str, run_id: str, results) -> None:
+    logging.basicConfig(level=logging.WARNING)
+    try:
+        results.put(asyncio.run(replay_partition(
+            position, chunks, index_dir, fence_version, cell_size, output_dir, run_id
+        )))
+    except Exception as e:
+        results.put({"position": position, "error": repr(e)})
+        raise
+
+
+def _put(chunks, item, process, timeout: float = 1.0) -> None:
+    """Blocking put that gives up if the worker behind the queue has died."""
+    while True:
+        try:
+            chunks.put(item, timeout=timeout)
+            return
+        except queue.Full:
+            if not process.is_alive():
+                raise RuntimeError(f"backfill worker exited with code {process.exitcode}")
+
+
+def run_backfill(
+    fixes: Iterator[Fix],
+    fences: List[GeofenceModel],
+    fence_version: int,
+    output_dir: str,
+    workers: int = 1,
+    chunk_size: int = 2000,
+    queue_chunks: int = 4,
+    cell_size: float = 0.1,
+    run_id: str = "backfill"
+) -> Dict[str, Any]:
+    """Replay fixes over ``workers`` processes, spooling results to ``output_dir``.
+
+    Each worker has at most ``queue_chunks`` chunks of ``chunk_size`` fixes
+    waiting; the reader blocks beyond that.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    context = multiprocessing.get_context("spawn")
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="geofence-backfill-") as index_dir:
+        write_index_file(GeofenceCalculator(cell_size_deg=cell_size).build_index(fences), index_dir, fence_version)
+
+        results = context.Queue()
+        queues = [context.Queue(maxsize=queue_chunks) for _ in range(workers)]
+        processes = [
+            context.Process(
+                target=_worker,
+                args=(i, queues[i], index_dir, fence_version, cell_size, output_dir, run_id, results)
+            )
+            for i in range(workers)
+        ]
+        for process in processes:
+            process.start()
+
+        try:
+            ring = HashRing(list(range(workers)))
+            # Devices are looked up once; the ring hash is the costliest step per fix.
+            positions: Dict[str, int] = {}
+            pending = [([], [], [], []) for _ in range(workers)]
+            for device_id, lat, lon, timestamp in fixes:
+                position = positions.get(device_id)
+                if position is None:
+                    position = positions[device_id] = ring.position_for(device_id)
+                chunk = pending[position]
+                chunk[0].append(device_id)
+                chunk[1].append(lat)
+                chunk[2].append(lon)
+                chunk[3].append(timestamp)
+                if len(chunk[0]) >= chunk_size:
+                    _put(queues[position], chunk, processes[position])
+                    pending[position] = ([], [], [], [])
+
+            for position, chunk in enumerate(pending):
+                if chunk[0]:
+                    _put(queues[position], chunk, processes[position])
+                _put(queues[position], None, processes[position])
+
+            reports = []
+            while len(reports) < workers:
+                try:
+                    reports.append(results.get(timeout=1.0))
+                except queue.Empty:
+                    if all(not process.is_alive() for process in processes):
+                        raise RuntimeError("backfill workers exited without reporting")
+        finally:
+            for process in processes:
+                process.join(timeout=10)
+                if process.is_alive():
+                    process.terminate()
+
+    errors = [report["error"] for report in reports if "error" in report]
+    if errors:
+        raise RuntimeError(f"backfill worker failed: {errors[0]}")
+
+    reports.sort(key=lambda report: report["position"])
+    elapsed = time.perf_counter() - start
+    total = sum(report["fixes"] for report in reports)
+    return {
+        "fixes": total,
+        "devices": sum(report["devices"] for report in reports),
+        "events": sum(report["events"] for report in reports),
+        "elapsed_s": round(elapsed, 3),
+        "fixes_per_s": round(total / elapsed, 1) if elapsed else 0.0,
+        "max_rss_kb": max(
+            [resource.getrusage(resource.RUSAGE_SELF).ru_maxrss]
+            + [report["max_rss_kb"] for report in reports]
+        ),
+        "workers": reports,
+    }
+
+
+async def load_results(conn: asyncpg.Connection, reports: List[Dict[str, Any]]) -> None:
+    """COPY spooled events and final states into Postgres in one transaction.
+
+    A final state replaces the live one only if it is not older; states
+    without a fix timestamp are stamped with the load time.
+    """
+    async with conn.transaction():
+        for report in reports:
+            await conn.copy_to_table(
+                "fence_events", source=report["events_path"], columns=list(EVENT_COLUMNS), format="csv"
+            )
+
+        await conn.execute(
+            "CREATE TEMP TABLE backfill_states (LIKE device_states INCLUDING DEFAULTS) ON COMMIT DROP"
+        )
+        for report in reports:
+            await conn.copy_to_table(
+                "backfill_states", source=report["states_path"], columns=list(STATE_COLUMNS), format="csv"
+            )
+        await conn.execute("""
+            INSERT INTO device_states
+            (device_id, last_lat, last_lon, is_inside_fence, last_geofence_id, geofence_ids, last_updated)
+            SELECT device_id, last_lat, last_lon, is_inside_fence, last_geofence_id, geofence_ids,
+                   COALESCE(last_updated, NOW())
+            FROM backfill_states
+            ON CONFLICT (device_id) DO UPDATE SET
+                last_lat = EXCLUDED.last_lat,
+                last_lon = EXCLUDED.last_lon,
+                is_inside_fence = EXCLUDED.is_inside_fence,
+                last_geofence_id = EXCLUDED.last_geofence_id,
+                geofence_ids = EXCLUDED.geofence_ids,
+                last_updated = EXCLUDED.last_updated
+            WHERE device_states.last_updated IS NULL
+                OR device_states.last_updated <= EXCLUDED.last_updated
+        """)
+
+
+def _read_fences(path: str) -> List[GeofenceModel]:
+    with open(path, "rb") as f:
+        return [GeofenceModel(**fence) for fence in orjson.loads(f.read())]
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    db_manager = None
+    if args.load or not args.fences:
+        db_manager = DatabaseManager(args.database_url)
+        await db_manager.create_pool()
+        await db_manager.create_tables(postgis=settings.postgis_enabled)
+
+    try:
+        if args.fences:
+            fences, fence_version = _read_fences(args.fences), 1
+        else:
+            repository = GeofenceRepository(db_manager.pool)
+            fences = await repository.get_all_geofences()
+            fence_version = await repository.get_geofence_version()
+        logger.info(f"Replaying {args.input} against {len(fences)} fences with {args.workers} workers")
+
+        skipped = [0]
+        output_dir = args.output_dir or tempfile.mkdtemp(prefix="geofence-backfill-out-")
+        try:
+            # Workers run in their own processes; keep the event loop free meanwhile.
+            summary = await asyncio.to_thread(
+                run_backfill,
+                iter_fixes(args.input, skipped),
+                fences,
+                fence_version,
+                output_dir,
+                workers=args.workers,
+                chunk_size=args.chunk_size,
+                queue_chunks=args.queue_chunks,
+                cell_size=args.cell_size,
+                run_id=args.run_id
+            )
+            print(
+                f"{summary['fixes']} fixes ({skipped[0]} skipped), {summary['devices']} devices, "
+                f"{summary['events']} fence events in {summary['elapsed_s']:.1f}s "
+                f"({summary['fixes_per_s']:.0f} fixes/s, max RSS {summary['max_rss_kb'] // 1024} MiB)"
+            )
+            for report in summary["workers"]:
+                print(f"  worker {report['position']}: {report['fixes']} fixes, {report['devices']} devices")
+
+            if args.load:
+                start = time.perf_counter()
+                async with db_manager.pool.acquire() as conn:
+                    await load_results(conn, summary["workers"])
+                print(f"Loaded events and states in {time.perf_counter() - start:.1f}s (run {args.run_id})")
+            else:
+                print(f"Events and states written to {output_dir}")
+        finally:
+            if not args.output_dir:
+                shutil.rmtree(output_dir, ignore_errors=True)
+    finally:
+        if db_manager is not None:
+            await db_manager.close_pool()
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", required=True, help="JSONL or CSV (.csv) file of fixes")
+    parser.add_argument("--fences", help="JSON list of fences; default reads the geofences table")
+    parser.add_argument("--output-dir", help="keep the spooled event and state CSV files here")
+    parser.add_argument("--load", action="store_true", help="COPY events and final states into Postgres")
+    parser.add_argument("--database-url", default=settings.database_url)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--queue-chunks", type=int, default=4, help="chunks buffered per worker")
+    parser.add_argument("--cell-size", type=float, default=settings.geofence_index_cell_deg)
+    parser.add_argument("--run-id", default=f"backfill-{datetime.utcnow():%Y%m%dT%H%M%S}")
+    args = parser.parse_args(argv)
+    if not args.load and not args.output_dir:
+        parser.error("nothing to do: pass --load, --output-dir or both")
+    return args
+
+
+def main(argv=None) -> None:
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(main_async(parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
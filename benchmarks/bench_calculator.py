@@ -0,0 +1,157 @@
+"""Microbenchmarks for GeofenceCalculator over synthetic distributions.
+
+Each scenario times the linear scan, the indexed single-point lookup, the
+vectorized batch lookup and the safe-radius computation, reporting ns per
+point as the median of several repeats. Run from the repository root:
+
+    python -m benchmarks.bench_calculator --output calculator.json
+"""
+import argparse
+import random
+import statistics
+import time
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from benchmarks.harness import compare_results, write_results
+from domain.geofence_calculator import GeofenceCalculator
+from models.geofence import DeviceLocationModel, GeofenceModel
+
+
+def uniform_fences(rng: random.Random, count: int) -> List[GeofenceModel]:
+    """Fences scattered uniformly over a 10x10 degree region."""
+    return [
+        GeofenceModel(
+            id=i + 1, name=f"Field {i + 1}",
+            center_lat=rng.uniform(35.0, 45.0),
+            center_lon=rng.uniform(-100.0, -90.0),
+            radius_km=rng.uniform(0.2, 3.0)
+        )
+        for i in range(count)
+    ]
+
+
+def clustered_fences(rng: random.Random, count: int) -> List[GeofenceModel]:
+    """Fences in a few dense farm clusters, many of them overlapping."""
+    clusters = [(rng.uniform(35.0, 45.0), rng.uniform(-100.0, -90.0)) for _ in range(8)]
+    fences = []
+    for i in range(count):
+        lat, lon = rng.choice(clusters)
+        fences.append(GeofenceModel(
+            id=i + 1, name=f"Field {i + 1}",
+            center_lat=lat + rng.gauss(0, 0.05),
+            center_lon=lon + rng.gauss(0, 0.05),
+            radius_km=rng.uniform(0.2, 1.5)
+        ))
+    return fences
+
+
+def uniform_points(rng: random.Random, fences: List[GeofenceModel], count: int):
+    return [(rng.uniform(35.0, 45.0), rng.uniform(-100.0, -90.0)) for _ in range(count)]
+
+
+def near_fence_points(rng: random.Random, fences: List[GeofenceModel], count: int):
+    """Points within a few km of a random fence, as devices working a field."""
+    points = []
+    for _ in range(count):
+        fence = rng.choice(fences)
+        points.append((fence.center_lat + rng.gauss(0, 0.02), fence.center_lon + rng.gauss(0, 0.02)))
+    return points
+
+
+SCENARIOS = {
+    "uniform": (uniform_fences, uniform_points),
+    "clustered": (clustered_fences, near_fence_points),
+}
+
+
+def median_ns_per_point(fn: Callable[[], Any], points: int, repeats: int) -> float:
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter_ns()
+        fn()
+        samples.append((time.perf_counter_ns() - start) / points)
+    return statistics.median(samples)
+
+
+def run_scenario(
+    calculator: GeofenceCalculator,
+    fences: List[GeofenceModel],
+    points: List[tuple],
+    repeats: int
+) -> Dict[str, float]:
+    locations = [DeviceLocationModel(device_id="d", lat=lat, lon=lon) for lat, lon in points]
+    lats = np.array([p[0] for p in points])
+    lons = np.array([p[1] for p in points])
+
+    start = time.perf_counter_ns()
+    index = calculator.build_index(fences)
+    build_ms = (time.perf_counter_ns() - start) / 1e6
+
+    # The linear scan is O(fences); keep its sample small for large sets.
+    linear = locations[:max(20, len(locations) * 200 // max(len(fences), 1))]
+
+    return {
+        "build_ms": round(build_ms, 3),
+        "linear_ns_per_point": round(median_ns_per_point(
+            lambda: [calculator.find_containing_geofence(loc, fences) for loc in linear],
+            len(linear), repeats
+        ), 1),
+        "index_ns_per_point": round(median_ns_per_point(
+            lambda: [calculator.find_containing_geofence(loc, index) for loc in locations],
+            len(locations), repeats
+        ), 1),
+        "batch_ns_per_point": round(median_ns_per_point(
+            lambda: calculator.find_containing_geofences_batch(lats, lons, index),
+            len(locations), repeats
+        ), 1),
+        "safe_radius_ns_per_point": round(median_ns_per_point(
+            lambda: [calculator.safe_radius_km(lat, lon, index) for lat, lon in points],
+            len(points), repeats
+        ), 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--counts", default="100,1000,10000")
+    parser.add_argument("--points", type=int, default=2000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--cell-size", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="save results as JSON")
+    parser.add_argument("--baseline", help="compare against a saved JSON result")
+    args = parser.parse_args()
+
+    calculator = GeofenceCalculator(cell_size_deg=args.cell_size)
+    results = {}
+    print(
+        f"{'scenario':<18} {'build ms':>9} {'linear ns':>11} {'index ns':>10} "
+        f"{'batch ns':>10} {'safe r ns':>10}"
+    )
+    for scenario in args.scenarios.split(","):
+        make_fences, make_points = SCENARIOS[scenario]
+        for count in [int(c) for c in args.counts.split(",")]:
+            rng = random.Random(args.seed)
+            fences = make_fences(rng, count)
+            points = make_points(rng, fences, args.points)
+            name = f"{scenario}-{count}"
+            result = run_scenario(calculator, fences, points, args.repeats)
+            results[name] = result
+            print(
+                f"{name:<18} {result['build_ms']:>9.2f} {result['linear_ns_per_point']:>11.0f} "
+                f"{result['index_ns_per_point']:>10.0f} {result['batch_ns_per_point']:>10.0f} "
+                f"{result['safe_radius_ns_per_point']:>10.0f}"
+            )
+
+    if args.output:
+        write_results(args.output, "calculator", vars(args), results)
+        print(f"Results written to {args.output}")
+    if args.baseline:
+        print("\n".join(compare_results(args.baseline, results)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""Per-fix cost of pydantic models and the generic encoder against records and orjson.
+
+Each stage runs the same inputs through the previous and the current hot-path
+representation and reports ns and traced bytes per operation for both:
+
+    state-row      device state row -> DeviceStateModel / DeviceStateRecord
+    fence-row      fence row -> GeofenceModel / GeofenceRecord (per rebuild)
+    response       check result -> response_model validation, jsonable_encoder
+                   and JSONResponse / ORJSONResponse
+    asgi           POST /location-check end to end: the route returning a dict
+                   over a repository of models, against the current app
+
+Rows are dicts shaped like asyncpg records (DECIMAL columns as Decimal, the
+polygon as a JSON string). The end-to-end stage runs without the device state
+cache, so every fix reads its state from the in-memory repository. Run from
+the repository root:
+
+    python -m benchmarks.bench_codec --output codec.json
+"""
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import time
+import tracemalloc
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import httpx
+import orjson
+from fastapi import APIRouter, Depends, FastAPI
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter
+
+from api.dependecies import provide_admission_controller, provide_geofence_service
+from api.routers import location
+from benchmarks.harness import (
+    compare_results, latency_summary, measure_allocations, run_timed, write_results
+)
+from benchmarks.in_memory_repository import InMemoryGeofenceRepository
+from benchmarks.replay import CountingEventPublisher, generate_fences, generate_trace
+from domain.geofence_calculator import GeofenceCalculator
+from models.geofence import DeviceLocationModel, DeviceStateModel, GeofenceModel
+from repositories.geofence_repository import _fence_record_from_row, _geofence_from_row, _state_from_row
+from services.geofence_cache import GeofenceCache
+from services.geofence_service import GeofenceService
+
+
+_RESULT = TypeAdapter(Dict[str, Any])
+
+
+class ModelRepository(InMemoryGeofenceRepository):
+    """In-memory repository returning pydantic models, as before records."""
+
+    async def get_all_geofences(self) -> List[GeofenceModel]:
+        return list(self.geofences)
+
+    def _record(self, device_id: str) -> Optional[DeviceStateModel]:
+        row = self.states.get(device_id)
+        if row is None:
+            return None
+        lat, lon, inside, geofence_id, geofence_ids, updated = row
+        return DeviceStateModel(
+            device_id=device_id, last_lat=lat, last_lon=lon, is_inside_fence=inside,
+            last_geofence_id=geofence_id, geofence_ids=geofence_ids, last_updated=updated
+        )
+
+
+def state_rows(trace: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [
+        {
+            "device_id": fix["device_id"],
+            "last_lat": Decimal(str(fix["lat"])),
+            "last_lon": Decimal(str(fix["lon"])),
+            "is_inside_fence": i % 3 == 0,
+            "last_geofence_id": i if i % 3 == 0 else None,
+            "geofence_ids": [i] if i % 3 == 0 else [],
+            "last_updated": None,
+        }
+        for i, fix in enumerate(trace)
+    ]
+
+
+def fence_rows(fences: List[GeofenceModel]) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": fence.id,
+            "name": fence.name,
+            "center_lat": Decimal(f"{fence.center_lat:.8f}"),
+            "center_lon": Decimal(f"{fence.center_lon:.8f}"),
+            "radius_km": Decimal(f"{fence.radius_km:.3f}"),
+            "polygon": orjson.dumps(fence.polygon).decode() if fence.polygon else None,
+        }
+        for fence in fences
+    ]
+
+
+def check_results(trace: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [
+        {
+            "device_id": fix["device_id"],
+            "inside_geofence": i % 3 == 0,
+            "geofence_name": f"Field {i}" if i % 3 == 0 else None,
+            "geofence_names": [f"Field {i}"] if i % 3 == 0 else [],
+            "state_changed": i % 10 == 0,
+        }
+        for i, fix in enumerate(trace)
+    ]
+
+
+def generic_response(result: Dict[str, Any]) -> JSONResponse:
+    """What FastAPI does with a dict returned from a ``response_model`` route."""
+    return JSONResponse(jsonable_encoder(_RESULT.validate_python(result)))
+
+
+STAGES: Dict[str, tuple] = {
+    "state-row": (state_rows, lambda row: DeviceStateModel(**row), _state_from_row),
+    "fence-row": (fence_rows, _geofence_from_row, _fence_record_from_row),
+    "response": (check_results, generic_response, ORJSONResponse),
+}
+
+
+def time_per_op(fn: Callable[[Any], Any], items: Sequence[Any], repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for item in items:
+            fn(item)
+        samples.append((time.perf_counter_ns() - start) / len(items))
+    return statistics.median(samples)
+
+
+def bytes_per_op(fn: Callable[[Any], Any], items: Sequence[Any]) -> float:
+    """Mean traced peak per call; the result is dropped before the next one."""
+    peaks = []
+    tracemalloc.start()
+    try:
+        for item in items:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            fn(item)
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+    return statistics.fmean(peaks)
+
+
+def compare_stage(make_items, before, after, inputs, args) -> Dict[str, float]:
+    items = make_items(inputs)
+    sample = items[:args.alloc_sample]
+    return {
+        "models_ns_per_op": round(time_per_op(before, items, args.repeat), 1),
+        "records_ns_per_op": round(time_per_op(after, items, args.repeat), 1),
+        "models_bytes_per_op": round(bytes_per_op(before, sample), 1),
+        "records_bytes_per_op": round(bytes_per_op(after, sample), 1),
+    }
+
+
+def build_app(router: APIRouter, service: GeofenceService) -> FastAPI:
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[provide_geofence_service] = lambda: service
+    return app
+
+
+def legacy_router() -> APIRouter:
+    """The single-check route as it was: a dict through the generic encoder."""
+    router = APIRouter(prefix="/api/v1")
+
+    @router.post("/location-check", response_model=Dict[str, Any])
+    async def check_location(
+        fix: DeviceLocationModel,
+        service: GeofenceService = Depends(provide_geofence_service),
+        admission=Depends(provide_admission_controller)
+    ) -> Dict[str, Any]:
+        priority = admission is not None and not service.is_routine_fix(fix.device_id, fix.lat, fix.lon)
+        async with location.admitted(admission, priority):
+            return await service.check_device_location(fix)
+
+    return router
+
+
+async def run_asgi(repository, router: APIRouter, trace, args) -> Dict[str, float]:
+    """Latency and traced bytes per request of single checks through an app."""
+    async def prepare():
+        fresh = type(repository)(repository.geofences)
+        calculator = GeofenceCalculator(cell_size_deg=args.cell_size)
+        service = GeofenceService(
+            fresh, calculator, CountingEventPublisher(),
+            geofence_cache=GeofenceCache(fresh, calculator)
+        )
+        await service.geofence_cache.get_index()
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=build_app(router, service)), base_url="http://bench")
+
+    async def post(client, fix):
+        response = await client.post("/api/v1/location-check", json=fix)
+        response.raise_for_status()
+
+    client = await prepare()
+    warmup = max(1, len(trace) // 20)
+    await run_timed(lambda fix: post(client, fix), trace[:warmup])
+    timed = await run_timed(lambda fix: post(client, fix), trace[warmup:])
+    await client.aclose()
+    latency = latency_summary(timed["latencies_ns"])
+
+    client = await prepare()
+    allocations = await measure_allocations(lambda fix: post(client, fix), trace[:args.alloc_sample])
+    await client.aclose()
+    return {
+        "p50_ms": latency["p50_ms"],
+        "p99_ms": latency["p99_ms"],
+        "throughput_per_s": round(timed["requests"] / timed["wall_s"], 1),
+        "alloc_peak_bytes_per_request": allocations["alloc_peak_bytes_per_request"],
+    }
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    fences = generate_fences(rng, args.fences, args.polygon_share)
+    trace = generate_trace(rng, fences, args.devices, args.fixes, args.step_m)
+    inputs = {"state-row": trace, "fence-row": fences, "response": trace}
+
+    results = {}
+    print(f"{len(trace)} fixes, {len(fences)} fences")
+    print(
+        f"{'stage':<10} {'models ns':>10} {'records ns':>11} {'speedup':>8} "
+        f"{'models B':>9} {'records B':>10}"
+    )
+    for stage, (make_items, before, after) in STAGES.items():
+        summary = compare_stage(make_items, before, after, inputs[stage], args)
+        results[stage] = summary
+        print(
+            f"{stage:<10} {summary['models_ns_per_op']:>10.0f} {summary['records_ns_per_op']:>11.0f} "
+            f"{summary['models_ns_per_op'] / summary['records_ns_per_op']:>7.1f}x "
+            f"{summary['models_bytes_per_op']:>9.0f} {summary['records_bytes_per_op']:>10.0f}"
+        )
+
+    print(f"\n{'app':<14} {'p50 ms':>9} {'p99 ms':>9} {'fixes/s':>10} {'alloc B/req':>12}")
+    for name, repository, router in (
+        ("asgi-models", ModelRepository(fences), legacy_router()),
+        ("asgi-records", InMemoryGeofenceRepository(fences), location.router),
+    ):
+        summary = await run_asgi(repository, router, trace, args)
+        results[name] = summary
+        print(
+            f"{name:<14} {summary['p50_ms']:>9.3f} {summary['p99_ms']:>9.3f} "
+            f"{summary['throughput_per_s']:>10.0f} {summary['alloc_peak_bytes_per_request']:>12.0f}"
+        )
+
+    if args.output:
+        write_results(args.output, "codec", vars(args), results)
+        print(f"Results written to {args.output}")
+    if args.baseline:
+        print("\n".join(compare_results(args.baseline, results)))
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fences", type=int, default=500)
+    parser.add_argument("--polygon-share", type=float, default=0.2)
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--fixes", type=int, default=5000)
+    parser.add_argument("--step-m", type=float, default=15.0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--alloc-sample", type=int, default=500)
+    parser.add_argument("--cell-size", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="save results as JSON")
+    parser.add_argument("--baseline", help="compare against a saved JSON result")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(main_async(parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
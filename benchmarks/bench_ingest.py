@@ -0,0 +1,154 @@
+"""Parse cost and wire size of the binary batch format against JSON.
+
+Parse modes decode the same batches without checking them:
+
+    json-batch     json.loads + pydantic list validation, as FastAPI does
+                   for POST /location-check/batch
+    json-validate  pydantic validate_json straight from bytes
+    ndjson         one model_validate_json per line, as the stream ingest
+    binary         api.binary_batch.decode_batch plus device id expansion
+
+The ``asgi-*`` modes post the batches through the app (in-memory repository)
+to compare end-to-end throughput of the two batch endpoints. Run from the
+repository root:
+
+    python -m benchmarks.bench_ingest --output ingest.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+from typing import Any, Callable, Dict, List
+
+import httpx
+import orjson
+from pydantic import TypeAdapter
+
+from api.binary_batch import MEDIA_TYPE, decode_batch, encode_batch
+from benchmarks.harness import compare_results, run_timed, summarize, write_results
+from benchmarks.replay import batches, build_app, build_service, generate_fences, generate_trace
+from models.geofence import DeviceLocationModel
+
+
+_LOCATIONS = TypeAdapter(List[DeviceLocationModel])
+
+
+def encode_bodies(chunks: List[List[Dict[str, Any]]]) -> Dict[str, List[bytes]]:
+    """Request bodies of every format for each batch."""
+    return {
+        "json": [orjson.dumps(chunk) for chunk in chunks],
+        "ndjson": [b"".join(orjson.dumps(fix) + b"\n" for fix in chunk) for chunk in chunks],
+        "binary": [
+            encode_batch(
+                [fix["device_id"] for fix in chunk],
+                [fix["lat"] for fix in chunk],
+                [fix["lon"] for fix in chunk]
+            )
+            for chunk in chunks
+        ],
+    }
+
+
+PARSERS: Dict[str, tuple] = {
+    "json-batch": ("json", lambda body: _LOCATIONS.validate_python(json.loads(body))),
+    "json-validate": ("json", _LOCATIONS.validate_json),
+    "ndjson": ("ndjson", lambda body: [
+        DeviceLocationModel.model_validate_json(line) for line in body.splitlines()
+    ]),
+    "binary": ("binary", lambda body: decode_batch(body).device_ids),
+}
+
+
+def time_parser(parse: Callable[[bytes], Any], bodies: List[bytes], fixes: int, repeat: int) -> Dict[str, float]:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for body in bodies:
+            parse(body)
+        best = min(best, time.perf_counter_ns() - start)
+    return {
+        "ns_per_fix": round(best / fixes, 1),
+        "parse_fixes_per_s": round(fixes / (best / 1e9), 1),
+        "bytes_per_fix": round(sum(len(body) for body in bodies) / fixes, 2),
+    }
+
+
+async def run_asgi(fences, trace, bodies: List[bytes], path: str, content_type: str, args) -> Dict[str, Any]:
+    service = build_service(fences, args)
+    await service.geofence_cache.get_index()
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=build_app(service)), base_url="http://bench")
+
+    async def post(body: bytes) -> None:
+        response = await client.post(path, content=body, headers={"content-type": content_type})
+        response.raise_for_status()
+
+    warmup = max(1, len(bodies) // 20)
+    await run_timed(post, bodies[:warmup], 1)
+    summary = summarize(await run_timed(post, bodies[warmup:], 1), items_per_request=args.batch_size)
+    await client.aclose()
+    if service.sequencer is not None:
+        await service.sequencer.close()
+    return summary
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    fences = generate_fences(rng, args.fences, args.polygon_share)
+    trace = generate_trace(rng, fences, args.devices, args.fixes, args.step_m)
+    chunks = batches(trace, args.batch_size)
+    bodies = encode_bodies(chunks)
+
+    results = {}
+    print(f"{len(trace)} fixes in batches of {args.batch_size}, {args.devices} devices")
+    print(f"{'mode':<14} {'ns/fix':>9} {'fixes/s':>11} {'bytes/fix':>10}")
+    for mode, (body_format, parse) in PARSERS.items():
+        summary = time_parser(parse, bodies[body_format], len(trace), args.repeat)
+        results[mode] = summary
+        print(
+            f"{mode:<14} {summary['ns_per_fix']:>9.0f} {summary['parse_fixes_per_s']:>11.0f} "
+            f"{summary['bytes_per_fix']:>10.1f}"
+        )
+
+    for mode, body_format, path, content_type in (
+        ("asgi-json", "json", "/api/v1/location-check/batch", "application/json"),
+        ("asgi-binary", "binary", "/api/v1/location-check/binary", MEDIA_TYPE),
+    ):
+        summary = await run_asgi(fences, trace, bodies[body_format], path, content_type, args)
+        results[mode] = summary
+        print(f"{mode:<14} {'':>9} {summary['throughput_per_s']:>11.0f}   (end to end)")
+
+    if args.output:
+        write_results(args.output, "ingest", vars(args), results)
+        print(f"Results written to {args.output}")
+    if args.baseline:
+        print("\n".join(compare_results(args.baseline, results)))
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fences", type=int, default=500)
+    parser.add_argument("--polygon-share", type=float, default=0.2)
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--fixes", type=int, default=50000)
+    parser.add_argument("--step-m", type=float, default=15.0)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--cell-size", type=float, default=0.1)
+    parser.add_argument("--state-cache-size", type=int, default=100_000)
+    parser.add_argument("--no-fast-path", action="store_true")
+    parser.add_argument("--shards", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="save results as JSON")
+    parser.add_argument("--baseline", help="compare against a saved JSON result")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(main_async(parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
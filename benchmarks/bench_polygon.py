@@ -0,0 +1,77 @@
+"""Microbenchmark: reference crossing-number scan vs. PreparedPolygon.
+
+Sweeps vertex count on random concave polygons, timing the single-point
+test, the vectorized batch test and the one-off compile cost. Run from the
+repository root:
+
+    python -m benchmarks.bench_polygon
+"""
+import argparse
+import math
+import random
+import time
+
+import numpy as np
+
+from domain.polygon import PreparedPolygon, crossing_number_contains
+
+
+def generate_polygon(rng: random.Random, vertices: int, jitter: float):
+    """Star-shaped polygon of ~5 km radius with jittered vertex radii."""
+    angles = sorted(rng.uniform(0, 2 * math.pi) for _ in range(vertices))
+    return [
+        (40.0 + r * math.sin(a), -95.0 + r * math.cos(a))
+        for a, r in ((a, 0.05 * rng.uniform(1.0 - jitter, 1.0)) for a in angles)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vertices", default="10,100,1000,10000")
+    parser.add_argument("--points", type=int, default=5000)
+    parser.add_argument("--jitter", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    # Points spread over twice the polygon's bbox, as with devices near a field.
+    lats = np.array([rng.uniform(39.9, 40.1) for _ in range(args.points)])
+    lons = np.array([rng.uniform(-95.1, -94.9) for _ in range(args.points)])
+    points = list(zip(lats.tolist(), lons.tolist()))
+
+    print(
+        f"{'vertices':>9} {'compile ms':>11} {'boundary':>9} {'naive us/pt':>12} "
+        f"{'single us/pt':>13} {'batch us/pt':>12} {'speedup':>9}"
+    )
+    for count in [int(v) for v in args.vertices.split(",")]:
+        polygon = generate_polygon(rng, count, args.jitter)
+
+        start = time.perf_counter()
+        prepared = PreparedPolygon(polygon)
+        compile_s = time.perf_counter() - start
+
+        naive_points = points[:max(50, args.points * 100 // count)]
+        start = time.perf_counter()
+        expected = [crossing_number_contains(polygon, lat, lon) for lat, lon in naive_points]
+        naive_s = (time.perf_counter() - start) / len(naive_points)
+
+        start = time.perf_counter()
+        single = [prepared.contains(lat, lon) for lat, lon in points]
+        single_s = (time.perf_counter() - start) / len(points)
+
+        start = time.perf_counter()
+        batch = prepared.contains_many(lats, lons)
+        batch_s = (time.perf_counter() - start) / len(points)
+
+        assert single[:len(expected)] == expected
+        assert batch.tolist() == single
+
+        print(
+            f"{count:>9} {compile_s * 1e3:>11.2f} {prepared.boundary_cell_ratio:>9.2f} "
+            f"{naive_s * 1e6:>12.2f} {single_s * 1e6:>13.2f} {batch_s * 1e6:>12.2f} "
+            f"{naive_s / single_s:>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
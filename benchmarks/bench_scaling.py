@@ -0,0 +1,176 @@
+"""Throughput scaling over 1..N worker processes with device affinity.
+
+The fence index is built once and written to a file; each worker process
+maps it (no rebuild, one copy in the page cache) and checks the fixes of the
+devices the consistent hash ring assigns to it, exactly as ``cluster.py``
+routes them. Workers start together on a barrier and the wall time runs
+from the first start to the last finish. Run from the repository root:
+
+    python -m benchmarks.bench_scaling --max-workers 8 --output scaling.json
+
+Scaling is bounded by the physical cores available; the report includes
+the machine's CPU count.
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import random
+import resource
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from benchmarks.harness import compare_results, write_results
+from benchmarks.in_memory_repository import InMemoryGeofenceRepository
+from benchmarks.replay import CountingEventPublisher, batches, generate_fences, generate_trace
+from domain.geofence_calculator import GeofenceCalculator
+from domain.shared_index import load_index_file, write_index_file
+from models.geofence import DeviceLocationModel
+from services.device_sequencer import DeviceSequencer
+from services.device_state_cache import DeviceStateCache
+from services.geofence_cache import GeofenceCache
+from services.geofence_service import GeofenceService
+from services.hash_ring import HashRing
+
+
+def partition(trace: List[Dict[str, Any]], workers: int) -> List[List[Dict[str, Any]]]:
+    """Split a trace per worker by device, keeping each device's fix order."""
+    ring = HashRing(list(range(workers)))
+    parts: List[List[Dict[str, Any]]] = [[] for _ in range(workers)]
+    for fix in trace:
+        parts[ring.position_for(fix["device_id"])].append(fix)
+    return parts
+
+
+async def _check_all(index_dir: str, fixes: List[Dict[str, Any]], args: argparse.Namespace, barrier) -> Dict[str, Any]:
+    repository = InMemoryGeofenceRepository([])
+    calculator = GeofenceCalculator(cell_size_deg=args.cell_size)
+    cache = GeofenceCache(repository, calculator, index_dir=index_dir)
+    service = GeofenceService(
+        repository,
+        calculator,
+        CountingEventPublisher(),
+        geofence_cache=cache,
+        state_cache=DeviceStateCache(),
+        sequencer=DeviceSequencer(shards=args.shards) if args.shards else None
+    )
+    load_start = time.perf_counter()
+    await cache.get_index()
+    load_s = time.perf_counter() - load_start
+    if cache.file_loads != 1:
+        raise RuntimeError("worker did not load the shared index file")
+
+    locations = [DeviceLocationModel(**fix) for fix in fixes]
+    barrier.wait()
+    start = time.time()
+    if args.batch_size > 1:
+        for batch in batches(locations, args.batch_size):
+            await service.check_device_locations(batch)
+    else:
+        for location in locations:
+            await service.check_device_location(location)
+    end = time.time()
+    if service.sequencer is not None:
+        await service.sequencer.close()
+    return {
+        "fixes": len(fixes),
+        "start": start,
+        "end": end,
+        "load_s": load_s,
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def _worker(index_dir: str, fixes: List[Dict[str, Any]], args: argparse.Namespace, barrier, results) -> None:
+    logging.basicConfig(level=logging.WARNING)
+    results.put(asyncio.run(_check_all(index_dir, fixes, args, barrier)))
+
+
+def run_workers(index_dir: str, trace: List[Dict[str, Any]], workers: int, args: argparse.Namespace) -> Dict[str, Any]:
+    """Run one measurement with ``workers`` processes."""
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=_worker, args=(index_dir, part, args, barrier, results))
+        for part in partition(trace, workers)
+    ]
+    for process in processes:
+        process.start()
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    wall_s = max(r["end"] for r in reports) - min(r["start"] for r in reports)
+    fixes = sum(r["fixes"] for r in reports)
+    return {
+        "workers": workers,
+        "wall_s": round(wall_s, 4),
+        "throughput_per_s": round(fixes / (wall_s or 1e-9), 1),
+        "largest_share": round(max(r["fixes"] for r in reports) / fixes, 3),
+        "index_load_ms": round(max(r["load_s"] for r in reports) * 1000, 2),
+        "max_rss_kb": max(r["max_rss_kb"] for r in reports),
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--fences", type=int, default=2000)
+    parser.add_argument("--polygon-share", type=float, default=0.2)
+    parser.add_argument("--devices", type=int, default=5000)
+    parser.add_argument("--fixes", type=int, default=100_000)
+    parser.add_argument("--step-m", type=float, default=15.0)
+    parser.add_argument("--batch-size", type=int, default=100, help="1 runs single checks")
+    parser.add_argument("--shards", type=int, default=16)
+    parser.add_argument("--cell-size", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="save results as JSON")
+    parser.add_argument("--baseline", help="compare against a saved JSON result")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    rng = random.Random(args.seed)
+    fences = generate_fences(rng, args.fences, args.polygon_share)
+    trace = generate_trace(rng, fences, args.devices, args.fixes, args.step_m)
+    calculator = GeofenceCalculator(cell_size_deg=args.cell_size)
+
+    with tempfile.TemporaryDirectory(prefix="geofence-scaling-") as index_dir:
+        start = time.perf_counter()
+        index = calculator.build_index(fences)
+        build_s = time.perf_counter() - start
+        # The in-memory repository reports fence set version 1.
+        path = write_index_file(index, index_dir, 1)
+        start = time.perf_counter()
+        load_index_file(path)
+        load_s = time.perf_counter() - start
+
+        print(f"{len(trace)} fixes, {len(fences)} fences, {os.cpu_count()} CPUs")
+        print(f"index build {build_s * 1000:.1f} ms, file load {load_s * 1000:.1f} ms, "
+              f"file size {os.path.getsize(path) / 1024:.0f} KiB")
+        print(f"{'workers':>7} {'fixes/s':>10} {'speedup':>8} {'largest share':>14} {'load ms':>8}")
+
+        results = {}
+        base = None
+        for workers in range(1, args.max_workers + 1):
+            summary = run_workers(index_dir, trace, workers, args)
+            base = base or summary["throughput_per_s"]
+            summary["speedup"] = round(summary["throughput_per_s"] / base, 2)
+            results[f"workers-{workers}"] = summary
+            print(
+                f"{workers:>7} {summary['throughput_per_s']:>10.0f} {summary['speedup']:>8.2f} "
+                f"{summary['largest_share']:>14.3f} {summary['index_load_ms']:>8.1f}"
+            )
+
+    results["index"] = {"build_ms": round(build_s * 1000, 2), "load_ms": round(load_s * 1000, 2)}
+    if args.output:
+        write_results(args.output, "scaling", {**vars(args), "cpu_count": os.cpu_count()}, results)
+        print(f"Results written to {args.output}")
+    if args.baseline:
+        print("\n".join(compare_results(args.baseline, results)))
+
+
+if __name__ == "__main__":
+    main()
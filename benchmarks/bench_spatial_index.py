@@ -0,0 +1,81 @@
+"""Microbenchmark: linear Haversine scan vs. grid index, sweeping fence count.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_spatial_index
+"""
+import argparse
+import random
+import time
+
+from domain.geofence_calculator import GeofenceCalculator
+from models.geofence import GeofenceModel, DeviceLocationModel
+
+
+def generate_fences(rng: random.Random, count: int):
+    """Fences scattered over a ~10x10 degree farming region."""
+    return [
+        GeofenceModel(
+            id=i + 1, name=f"Field {i + 1}",
+            center_lat=rng.uniform(35.0, 45.0),
+            center_lon=rng.uniform(-100.0, -90.0),
+            radius_km=rng.uniform(0.2, 3.0)
+        )
+        for i in range(count)
+    ]
+
+
+def generate_points(rng: random.Random, count: int):
+    return [
+        DeviceLocationModel(
+            device_id=f"device_{i}",
+            lat=rng.uniform(35.0, 45.0),
+            lon=rng.uniform(-100.0, -90.0)
+        )
+        for i in range(count)
+    ]
+
+
+def time_lookups(calculator, points, fences) -> float:
+    start = time.perf_counter()
+    for point in points:
+        calculator.find_containing_geofence(point, fences)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--counts", default="10,100,1000,10000,50000")
+    parser.add_argument("--points", type=int, default=2000)
+    parser.add_argument("--cell-size", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    calculator = GeofenceCalculator(cell_size_deg=args.cell_size)
+    points = generate_points(rng, args.points)
+
+    print(f"{'fences':>8} {'build ms':>10} {'linear us/pt':>14} {'index us/pt':>13} {'speedup':>9}")
+    for count in [int(c) for c in args.counts.split(",")]:
+        fences = generate_fences(rng, count)
+
+        start = time.perf_counter()
+        index = calculator.build_index(fences)
+        build_s = time.perf_counter() - start
+
+        linear_points = points[:max(50, args.points * 1000 // max(count, 1))]
+        linear_s = time_lookups(calculator, linear_points, fences) / len(linear_points)
+        index_s = time_lookups(calculator, points, index) / len(points)
+
+        for point in linear_points:
+            assert (calculator.find_containing_geofence(point, fences)
+                    == calculator.find_containing_geofence(point, index))
+
+        print(
+            f"{count:>8} {build_s * 1e3:>10.2f} {linear_s * 1e6:>14.2f} "
+            f"{index_s * 1e6:>13.2f} {linear_s / index_s:>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Single-statement SQL check versus the multi-query flow, against Postgres.
+
+Modes run the same trace of fixes through GeofenceService backed by a real
+database (a throwaway schema that is dropped afterwards):
+
+    three-query    fences, device state and upsert as separate queries
+    cached-fences  fences from GeofenceCache; state read and upsert queries
+    single-query   one CTE statement per fix (SINGLE_QUERY_CHECK)
+    single-postgis the same with the PostGIS envelope index (if installed)
+
+Run from the repository root:
+
+    python -m benchmarks.bench_sql_check --database-url postgresql://... --output sql.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import uuid
+from typing import Any, Dict, List
+
+import asyncpg
+
+from benchmarks.harness import compare_results, run_timed, summarize, write_results
+from benchmarks.replay import CountingEventPublisher, generate_fences, generate_trace
+from database.db_setup import DatabaseManager
+from domain.geofence_calculator import GeofenceCalculator
+from models.geofence import DeviceLocationModel, GeofenceModel
+from repositories.geofence_repository import GeofenceRepository
+from services.geofence_cache import GeofenceCache
+from services.geofence_service import GeofenceService
+
+
+MODES = ("three-query", "cached-fences", "single-query", "single-postgis")
+
+
+async def insert_fences(pool: asyncpg.Pool, fences: List[GeofenceModel]) -> None:
+    async with pool.acquire() as conn:
+        await conn.executemany(
+            "INSERT INTO geofences (id, name, center_lat, center_lon, radius_km, polygon) "
+            "VALUES ($1, $2, $3, $4, $5, $6::jsonb)",
+            [
+                (
+                    fence.id, fence.name, fence.center_lat, fence.center_lon, fence.radius_km,
+                    json.dumps(fence.polygon) if fence.polygon else None
+                )
+                for fence in fences
+            ]
+        )
+
+
+async def postgis_available(database_url: str) -> bool:
+    conn = await asyncpg.connect(database_url)
+    try:
+        return bool(await conn.fetchval(
+            "SELECT count(*) FROM pg_available_extensions WHERE name = 'postgis'"
+        ))
+    finally:
+        await conn.close()
+
+
+async def run_mode(
+    mode: str,
+    fences: List[GeofenceModel],
+    trace: List[Dict[str, Any]],
+    args: argparse.Namespace
+) -> Dict[str, Any]:
+    postgis = mode == "single-postgis"
+    schema = f"bench_sql_check_{uuid.uuid4().hex[:8]}"
+    admin = await asyncpg.connect(args.database_url)
+    await admin.execute(f"CREATE SCHEMA {schema}")
+    manager = DatabaseManager(args.database_url)
+    manager.pool = await asyncpg.create_pool(
+        args.database_url,
+        min_size=args.concurrency,
+        max_size=args.concurrency,
+        server_settings={"search_path": f"{schema},public"}
+    )
+    try:
+        await manager.create_tables(postgis=postgis)
+        await insert_fences(manager.pool, fences)
+        async with manager.pool.acquire() as conn:
+            await conn.execute("ANALYZE geofences")
+
+        repository = GeofenceRepository(manager.pool, postgis=postgis)
+        calculator = GeofenceCalculator()
+        service = GeofenceService(
+            repository,
+            calculator,
+            CountingEventPublisher(),
+            geofence_cache=GeofenceCache(repository, calculator) if mode == "cached-fences" else None,
+            single_query=mode.startswith("single")
+        )
+        locations = [DeviceLocationModel(**fix) for fix in trace]
+        for location in locations[:args.warmup]:
+            await service.check_device_location(location)
+
+        timed = await run_timed(
+            service.check_device_location, locations[args.warmup:], args.concurrency
+        )
+        return summarize(timed)
+    finally:
+        await manager.close_pool()
+        await admin.execute(f"DROP SCHEMA {schema} CASCADE")
+        await admin.close()
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    fences = generate_fences(rng, args.fences, args.polygon_share)
+    trace = generate_trace(rng, fences, args.devices, args.fixes + args.warmup, args.step_m)
+
+    modes = args.modes.split(",")
+    if "single-postgis" in modes and not await postgis_available(args.database_url):
+        print("PostGIS is not installed; skipping single-postgis")
+        modes.remove("single-postgis")
+
+    results = {}
+    print(f"{args.fixes} fixes, {len(fences)} fences, concurrency {args.concurrency}")
+    print(f"{'mode':<16} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'fixes/s':>10}")
+    for mode in modes:
+        if mode not in MODES:
+            raise SystemExit(f"Unknown mode {mode!r}; choose from {', '.join(MODES)}")
+        summary = await run_mode(mode, fences, trace, args)
+        results[mode] = summary
+        print(
+            f"{mode:<16} {summary['p50_ms']:>9.3f} {summary['p95_ms']:>9.3f} "
+            f"{summary['p99_ms']:>9.3f} {summary['throughput_per_s']:>10.0f}"
+        )
+
+    if args.output:
+        config = {key: value for key, value in vars(args).items() if key != "database_url"}
+        write_results(args.output, "sql_check", config, results)
+        print(f"Results written to {args.output}")
+    if args.baseline:
+        print("\n".join(compare_results(args.baseline, results)))
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--database-url",
+        default=os.getenv("TEST_DATABASE_URL") or os.getenv("DATABASE_URL"),
+        help="defaults to TEST_DATABASE_URL, then DATABASE_URL"
+    )
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--fences", type=int, default=500)
+    parser.add_argument("--polygon-share", type=float, default=0.2)
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--fixes", type=int, default=5000)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--step-m", type=float, default=15.0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="save results as JSON")
+    parser.add_argument("--baseline", help="compare against a saved JSON result")
+    args = parser.parse_args(argv)
+    if not args.database_url:
+        parser.error("--database-url is required (or set TEST_DATABASE_URL)")
+    return args
+
+
+def main(argv=None) -> None:
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(main_async(parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
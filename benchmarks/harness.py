@@ -0,0 +1,146 @@
+"""Shared helpers for benchmark scripts: timing, summaries and JSON results."""
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+
+# Metrics compared against a baseline, by name suffix; rates are better higher.
+COMPARED_SUFFIXES = ("_ms", "_ns_per_point", "_ns_per_op", "_per_s", "_bytes_per_request", "_bytes_per_op")
+
+
+def latency_summary(latencies_ns: Sequence[int]) -> Dict[str, float]:
+    """Percentiles of a latency sample, in milliseconds."""
+    if not len(latencies_ns):
+        return {}
+    values = np.asarray(latencies_ns, dtype=np.float64) / 1e6
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "p50_ms": round(float(p50), 4),
+        "p95_ms": round(float(p95), 4),
+        "p99_ms": round(float(p99), 4),
+        "max_ms": round(float(values.max()), 4),
+        "mean_ms": round(float(values.mean()), 4),
+    }
+
+
+async def run_timed(
+    handler: Callable[[Any], Awaitable[Any]],
+    requests: Iterable[Any],
+    concurrency: int = 1
+) -> Dict[str, Any]:
+    """Run ``handler`` over the requests with N concurrent workers.
+
+    Returns per-request latencies (ns), request count and wall time.
+    """
+    iterator = iter(requests)
+    latencies: List[int] = []
+
+    async def worker() -> None:
+        for request in iterator:
+            start = time.perf_counter_ns()
+            await handler(request)
+            latencies.append(time.perf_counter_ns() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall_s = time.perf_counter() - start
+    return {"latencies_ns": latencies, "requests": len(latencies), "wall_s": wall_s}
+
+
+async def measure_allocations(
+    handler: Callable[[Any], Awaitable[Any]],
+    requests: Sequence[Any]
+) -> Dict[str, float]:
+    """Peak traced allocation and retained memory per request, via tracemalloc.
+
+    Run separately from the timed pass because tracing slows everything down.
+    """
+    peaks = []
+    retained = []
+    tracemalloc.start()
+    try:
+        for request in requests:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            await handler(request)
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(current - before)
+    finally:
+        tracemalloc.stop()
+
+    if not peaks:
+        return {}
+    return {
+        "alloc_peak_bytes_per_request": round(float(np.mean(peaks)), 1),
+        "retained_bytes_per_request": round(float(np.mean(retained)), 1),
+    }
+
+
+def summarize(timed: Dict[str, Any], items_per_request: float = 1.0) -> Dict[str, Any]:
+    """Latency percentiles plus request and item throughput of a timed run."""
+    wall_s = timed["wall_s"] or 1e-9
+    summary = {
+        "requests": timed["requests"],
+        "wall_s": round(wall_s, 4),
+        "throughput_per_s": round(timed["requests"] * items_per_request / wall_s, 1),
+    }
+    summary.update(latency_summary(timed["latencies_ns"]))
+    return summary
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(path: str, benchmark: str, config: Dict[str, Any], results: Dict[str, Any]) -> None:
+    """Save results with enough context to diff them against a later run."""
+    document = {
+        "benchmark": benchmark,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "config": config,
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(document, f, indent=2, sort_keys=True)
+
+
+def compare_results(baseline_path: str, results: Dict[str, Dict[str, Any]]) -> List[str]:
+    """Lines describing each compared metric's change against a saved run."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+
+    lines = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric, value in current.items():
+            if not metric.endswith(COMPARED_SUFFIXES) or not previous.get(metric):
+                continue
+            higher_is_better = metric.endswith("_per_s")
+            change = (value - previous[metric]) / previous[metric] * 100
+            worse = change < 0 if higher_is_better else change > 0
+            flag = "  REGRESSION" if worse and abs(change) >= 10 else ""
+            lines.append(
+                f"{name:<16} {metric:<30} {previous[metric]:>12} -> {value:>12} "
+                f"({change:+.1f}%){flag}"
+            )
+    return lines
@@ -0,0 +1,72 @@
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from models.geofence import GeofenceModel
+from models.records import DeviceStateRecord, GeofenceRecord, membership
+
+
+class InMemoryGeofenceRepository:
+    """Dict-backed stand-in for ``GeofenceRepository`` used by benchmarks.
+
+    Fences and states are returned as fresh records like the asyncpg-backed
+    repository, so the service does the same per-row work; only the network
+    round trip is missing. Call counters show how often each query would
+    have hit Postgres.
+    """
+
+    def __init__(self, geofences: List[GeofenceModel]):
+        self.geofences = list(geofences)
+        self.version = 1
+        self.states: Dict[str, Tuple[float, float, bool, Optional[int], Tuple[int, ...], datetime]] = {}
+        self.reads = 0
+        self.writes = 0
+
+    async def get_all_geofences(self) -> List[GeofenceRecord]:
+        return [GeofenceRecord.from_model(fence) for fence in self.geofences]
+
+    async def get_geofence_version(self) -> int:
+        return self.version
+
+    def _record(self, device_id: str) -> Optional[DeviceStateRecord]:
+        row = self.states.get(device_id)
+        if row is None:
+            return None
+        lat, lon, inside, geofence_id, geofence_ids, _ = row
+        return DeviceStateRecord(device_id, lat, lon, inside, geofence_id, geofence_ids)
+
+    async def get_device_state(self, device_id: str) -> Optional[DeviceStateRecord]:
+        self.reads += 1
+        return self._record(device_id)
+
+    async def get_device_states(self, device_ids: Sequence[str]) -> Dict[str, DeviceStateRecord]:
+        self.reads += 1
+        states = {}
+        for device_id in device_ids:
+            state = self._record(device_id)
+            if state is not None:
+                states[device_id] = state
+        return states
+
+    async def update_device_state(
+        self,
+        device_id: str,
+        lat: float,
+        lon: float,
+        is_inside_fence: bool,
+        geofence_id: Optional[int] = None,
+        geofence_ids: Optional[Sequence[int]] = None
+    ) -> None:
+        self.writes += 1
+        self.states[device_id] = (
+            lat, lon, is_inside_fence, geofence_id,
+            membership(geofence_id, geofence_ids), datetime.now(timezone.utc)
+        )
+
+    async def update_device_states(
+        self,
+        states: Sequence[Tuple[str, float, float, bool, Optional[int], Sequence[int]]]
+    ) -> None:
+        self.writes += 1
+        now = datetime.now(timezone.utc)
+        for device_id, lat, lon, inside, geofence_id, geofence_ids in states:
+            self.states[device_id] = (lat, lon, inside, geofence_id, tuple(geofence_ids), now)
@@ -0,0 +1,273 @@
+"""End-to-end replay: push location fixes through GeofenceService and the ASGI app.
+
+Fixes come from a JSONL trace (one ``{"device_id", "lat", "lon"}`` object per
+line; other lines are skipped) or from generated device random walks around
+synthetic fences. Each mode runs on a fresh service backed by an in-memory
+repository, so database latency is excluded and the numbers measure the
+service's own cost. Run from the repository root:
+
+    python -m benchmarks.replay --output results.json
+    python -m benchmarks.replay --trace fixes.jsonl --baseline results.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import random
+from typing import Any, Dict, List
+
+import httpx
+
+from api.dependecies import provide_geofence_service
+from benchmarks.harness import (
+    compare_results, measure_allocations, run_timed, summarize, write_results
+)
+from benchmarks.in_memory_repository import InMemoryGeofenceRepository
+from domain.geofence_calculator import GeofenceCalculator
+from models.geofence import DeviceLocationModel, GeofenceModel
+from services.device_sequencer import DeviceSequencer
+from services.device_state_cache import DeviceStateCache
+from services.event_publisher import EventPublisher
+from services.geofence_cache import GeofenceCache
+from services.geofence_service import GeofenceService
+
+
+MODES = ("service", "service-batch", "asgi", "asgi-batch")
+
+
+class CountingEventPublisher(EventPublisher):
+    """Publisher that only counts events."""
+
+    def __init__(self):
+        self.published = 0
+
+    async def publish_geo_event(self, event_data: Dict[str, Any]) -> None:
+        self.published += 1
+
+
+def generate_fences(rng: random.Random, count: int, polygon_share: float) -> List[GeofenceModel]:
+    """Fields packed into a ~1x1 degree farming region; some are polygons."""
+    fences = []
+    for i in range(count):
+        lat = rng.uniform(40.0, 41.0)
+        lon = rng.uniform(-96.0, -95.0)
+        if rng.random() < polygon_share:
+            angles = sorted(rng.uniform(0, 2 * math.pi) for _ in range(rng.randint(8, 64)))
+            polygon = [
+                (lat + r * math.sin(a), lon + r * math.cos(a))
+                for a, r in ((a, rng.uniform(0.005, 0.02)) for a in angles)
+            ]
+            fences.append(GeofenceModel(id=i + 1, name=f"Field {i + 1}", polygon=polygon))
+        else:
+            fences.append(GeofenceModel(
+                id=i + 1, name=f"Field {i + 1}",
+                center_lat=lat, center_lon=lon, radius_km=rng.uniform(0.3, 2.0)
+            ))
+    return fences
+
+
+def generate_trace(
+    rng: random.Random,
+    fences: List[GeofenceModel],
+    devices: int,
+    fixes: int,
+    step_m: float
+) -> List[Dict[str, Any]]:
+    """Interleaved random walks: small steps, occasional moves to another field."""
+    positions = {}
+    for i in range(devices):
+        fence = rng.choice(fences)
+        positions[f"device_{i:05d}"] = (fence.center_lat, fence.center_lon)
+
+    device_ids = list(positions)
+    step_deg = step_m / 111_195
+    trace = []
+    for _ in range(fixes):
+        device_id = rng.choice(device_ids)
+        lat, lon = positions[device_id]
+        if rng.random() < 0.01:
+            fence = rng.choice(fences)
+            lat, lon = fence.center_lat, fence.center_lon
+        else:
+            lat += rng.gauss(0, step_deg)
+            lon += rng.gauss(0, step_deg) / math.cos(math.radians(lat))
+        positions[device_id] = (lat, lon)
+        trace.append({"device_id": device_id, "lat": round(lat, 7), "lon": round(lon, 7)})
+    return trace
+
+
+def load_trace(path: str) -> List[Dict[str, Any]]:
+    """Location fixes from a JSONL file; lines that are not fixes are skipped."""
+    fixes = []
+    skipped = 0
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                skipped += 1
+                continue
+            if isinstance(record, dict) and isinstance(record.get("body"), dict):
+                record = record["body"]
+            if isinstance(record, dict) and {"device_id", "lat", "lon"} <= record.keys():
+                fixes.append({k: record[k] for k in ("device_id", "lat", "lon")})
+            else:
+                skipped += 1
+    if skipped:
+        logging.getLogger(__name__).warning(f"Skipped {skipped} trace lines that are not location fixes")
+    return fixes
+
+
+def build_service(fences: List[GeofenceModel], args: argparse.Namespace) -> GeofenceService:
+    repository = InMemoryGeofenceRepository(fences)
+    calculator = GeofenceCalculator(cell_size_deg=args.cell_size)
+    return GeofenceService(
+        repository,
+        calculator,
+        CountingEventPublisher(),
+        geofence_cache=GeofenceCache(repository, calculator),
+        state_cache=DeviceStateCache(max_entries=args.state_cache_size) if args.state_cache_size else None,
+        fast_path=not args.no_fast_path,
+        sequencer=DeviceSequencer(shards=args.shards) if args.shards else None
+    )
+
+
+def build_app(service: GeofenceService):
+    from main import create_app
+
+    app = create_app()
+    app.dependency_overrides[provide_geofence_service] = lambda: service
+    return app
+
+
+def batches(items: List[Any], size: int) -> List[List[Any]]:
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+async def run_mode(mode: str, fences: List[GeofenceModel], trace: List[Dict[str, Any]], args) -> Dict[str, Any]:
+    """Warm up, time the trace, then measure allocations on a fresh service."""
+    async def prepare():
+        service = build_service(fences, args)
+        await service.geofence_cache.get_index()
+        client = None
+        if mode.startswith("asgi"):
+            client = httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=build_app(service)), base_url="http://bench"
+            )
+        return service, client
+
+    async def close(service, client):
+        if client is not None:
+            await client.aclose()
+        if service.sequencer is not None:
+            await service.sequencer.close()
+
+    def requests_for(service, client):
+        if mode == "service":
+            items = [DeviceLocationModel(**fix) for fix in trace]
+            return service.check_device_location, items, 1
+        if mode == "service-batch":
+            items = batches([DeviceLocationModel(**fix) for fix in trace], args.batch_size)
+            return service.check_device_locations, items, args.batch_size
+
+        async def post_one(fix):
+            response = await client.post("/api/v1/location-check", json=fix)
+            response.raise_for_status()
+
+        async def post_batch(fixes):
+            response = await client.post("/api/v1/location-check/batch", json=fixes)
+            response.raise_for_status()
+
+        if mode == "asgi":
+            return post_one, trace, 1
+        return post_batch, batches(trace, args.batch_size), args.batch_size
+
+    service, client = await prepare()
+    handler, items, per_request = requests_for(service, client)
+    warmup = max(1, len(items) // 20)
+    await run_timed(handler, items[:warmup], 1)
+    timed = await run_timed(handler, items[warmup:], args.concurrency)
+    summary = summarize(timed, items_per_request=per_request)
+    summary["items_per_request"] = per_request
+    summary["repository_reads"] = service.repository.reads
+    summary["repository_writes"] = service.repository.writes
+    summary["events_published"] = service.event_publisher.published
+    if service.state_cache is not None:
+        summary["fast_path_hits"] = service.state_cache.fast_path_hits
+    await close(service, client)
+
+    service, client = await prepare()
+    handler, items, _ = requests_for(service, client)
+    summary.update(await measure_allocations(handler, items[:args.alloc_sample]))
+    await close(service, client)
+    return summary
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    fences = generate_fences(rng, args.fences, args.polygon_share)
+    if args.trace:
+        trace = load_trace(args.trace)
+        if not trace:
+            raise SystemExit(f"No location fixes found in {args.trace}")
+    else:
+        trace = generate_trace(rng, fences, args.devices, args.fixes, args.step_m)
+        if args.save_trace:
+            with open(args.save_trace, "w") as f:
+                f.writelines(json.dumps(fix) + "\n" for fix in trace)
+
+    results = {}
+    print(f"{len(trace)} fixes, {len(fences)} fences")
+    print(
+        f"{'mode':<14} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'fixes/s':>10} "
+        f"{'alloc B/req':>12} {'db writes':>10}"
+    )
+    for mode in args.modes.split(","):
+        if mode not in MODES:
+            raise SystemExit(f"Unknown mode {mode!r}; choose from {', '.join(MODES)}")
+        summary = await run_mode(mode, fences, trace, args)
+        results[mode] = summary
+        print(
+            f"{mode:<14} {summary['p50_ms']:>9.3f} {summary['p95_ms']:>9.3f} "
+            f"{summary['p99_ms']:>9.3f} {summary['throughput_per_s']:>10.0f} "
+            f"{summary.get('alloc_peak_bytes_per_request', 0):>12.0f} {summary['repository_writes']:>10}"
+        )
+
+    if args.output:
+        write_results(args.output, "replay", vars(args), results)
+        print(f"Results written to {args.output}")
+    if args.baseline:
+        print("\n".join(compare_results(args.baseline, results)))
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trace", help="JSONL file of location fixes to replay")
+    parser.add_argument("--save-trace", help="write the generated trace here")
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--fences", type=int, default=500)
+    parser.add_argument("--polygon-share", type=float, default=0.2)
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--fixes", type=int, default=20000)
+    parser.add_argument("--step-m", type=float, default=15.0)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--alloc-sample", type=int, default=500)
+    parser.add_argument("--cell-size", type=float, default=0.1)
+    parser.add_argument("--state-cache-size", type=int, default=100_000)
+    parser.add_argument("--no-fast-path", action="store_true")
+    parser.add_argument("--shards", type=int, default=16, help="device sequencer shards; 0 disables")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="save results as JSON")
+    parser.add_argument("--baseline", help="compare against a saved JSON result")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(main_async(parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
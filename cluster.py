@@ -0,0 +1,87 @@
+"""Run the service as N worker processes behind a device-affinity front.
+
+Each worker is a normal ``main:app`` process listening on a Unix socket; the
+front (``api.front``) listens on HOST:PORT and hashes every device onto one
+worker. Workers share fence indexes through mapped files in
+SHARED_INDEX_DIR, so a fence change is compiled by one process and mapped
+by the rest. Run from the repository root:
+
+    CLUSTER_WORKERS=4 python cluster.py
+"""
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import time
+from typing import List
+
+import uvicorn
+
+from config.settings import settings
+
+
+logger = logging.getLogger("cluster")
+
+
+def spawn_workers(count: int, socket_dir: str, index_dir: str) -> List[subprocess.Popen]:
+    """Start ``count`` uvicorn workers, one socket each."""
+    os.makedirs(socket_dir, exist_ok=True)
+    env = {**os.environ, "SHARED_INDEX_DIR": index_dir}
+    workers = []
+    for i in range(count):
+        path = os.path.join(socket_dir, f"worker-{i}.sock")
+        if os.path.exists(path):
+            os.unlink(path)
+        workers.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--uds", path, "--no-access-log"],
+            env=env
+        ))
+    return workers
+
+
+def wait_for_sockets(paths: List[str], workers: List[subprocess.Popen], timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while not all(os.path.exists(path) for path in paths):
+        if any(worker.poll() is not None for worker in workers):
+            raise SystemExit("A worker exited during startup")
+        if time.monotonic() > deadline:
+            raise SystemExit(f"Workers did not start within {timeout:.0f}s")
+        time.sleep(0.1)
+
+
+def stop_workers(workers: List[subprocess.Popen]) -> None:
+    for worker in workers:
+        worker.terminate()
+    for worker in workers:
+        try:
+            worker.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            worker.kill()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=settings.cluster_workers)
+    parser.add_argument("--socket-dir", default=settings.cluster_socket_dir)
+    parser.add_argument("--startup-timeout", type=float, default=60.0)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    index_dir = settings.shared_index_dir or os.path.join(args.socket_dir, "index")
+    paths = [os.path.join(args.socket_dir, f"worker-{i}.sock") for i in range(args.workers)]
+
+    workers = spawn_workers(args.workers, args.socket_dir, index_dir)
+    try:
+        wait_for_sockets(paths, workers, args.startup_timeout)
+        logger.info(f"{args.workers} workers up, front on {settings.host}:{settings.port}")
+
+        from api.front import create_front_app, uds_clients
+
+        uvicorn.run(create_front_app(uds_clients(paths)), host=settings.host, port=settings.port)
+    finally:
+        stop_workers(workers)
+
+
+if __name__ == "__main__":
+    main()
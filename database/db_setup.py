@@ -1,30 +1,83 @@
 import asyncpg
-from typing import Optional
+from typing import Any, Dict, Optional
 
+from domain.spatial_index import EARTH_RADIUS_KM
+
+
+GEOFENCE_CHANGES_CHANNEL = "geofences_changed"
+
+KM_PER_DEGREE = EARTH_RADIUS_KM * 3.141592653589793 / 180
 
 class DatabaseManager:
-    """Manages database connections and setup."""
+    """Manages database connections and setup.
     
-    def __init__(self, database_url: str):
+    Queries run with their SQL text go through asyncpg's statement cache,
+    which belongs to each underlying connection and outlives pool checkouts:
+    a hot-path statement is prepared on its first use on a connection and
+    reused after that, up to ``statement_cache_size`` statements.
+    """
+    
+    def __init__(
+        self,
+        database_url: str,
+        min_size: int = 1,
+        max_size: int = 10,
+        statement_cache_size: int = 100,
+        command_timeout: Optional[float] = None,
+        max_queries: int = 50000,
+        max_inactive_connection_lifetime: float = 300.0
+    ):
         self.database_url = database_url
+        self.min_size = min_size
+        self.max_size = max_size
+        self.statement_cache_size = statement_cache_size
+        self.command_timeout = command_timeout
+        self.max_queries = max_queries
+        self.max_inactive_connection_lifetime = max_inactive_connection_lifetime
         self.pool: Optional[asyncpg.Pool] = None
     
     async def create_pool(self) -> asyncpg.Pool:
         """Create database connection pool."""
         self.pool = await asyncpg.create_pool(
             self.database_url,
-            min_size=1,
-            max_size=10
+            min_size=self.min_size,
+            max_size=self.max_size,
+            max_queries=self.max_queries,
+            max_inactive_connection_lifetime=self.max_inactive_connection_lifetime,
+            statement_cache_size=self.statement_cache_size,
+            command_timeout=self.command_timeout
         )
         return self.pool
     
+    def stats(self) -> Dict[str, Any]:
+        """Pool occupancy, for sizing ``min_size`` and ``max_size``."""
+        if self.pool is None:
+            return {}
+        size = self.pool.get_size()
+        in_use = size - self.pool.get_idle_size()
+        return {
+            "size": size,
+            "in_use": in_use,
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "utilization": in_use / self.max_size,
+        }
+    
+    async def create_connection(self) -> asyncpg.Connection:
+        """Open a dedicated connection outside the pool (e.g. for LISTEN)."""
+        return await asyncpg.connect(self.database_url)
+    
     async def close_pool(self) -> None:
         """Close database connection pool."""
         if self.pool:
             await self.pool.close()
     
-    async def create_tables(self) -> None:
-        """Create required database tables."""
+    async def create_tables(self, postgis: bool = False) -> None:
+        """Create required database tables.
+        
+        With ``postgis`` the extension is enabled and fence envelopes get a
+        GiST index for the single-query location check.
+        """
         if not self.pool:
             raise RuntimeError("Database pool not initialized")
         
@@ -36,10 +89,17 @@ class DatabaseManager:
                     center_lat DECIMAL(10, 8) NOT NULL,
                     center_lon DECIMAL(11, 8) NOT NULL,
                     radius_km DECIMAL(10, 3) NOT NULL,
+                    polygon JSONB,
                     created_at TIMESTAMP DEFAULT NOW()
                 )
             """)
             
+            # Polygon fences: [[lat, lon], ...]; the circle columns then hold
+            # an enclosing circle used as the spatial prefilter.
+            await conn.execute(
+                "ALTER TABLE geofences ADD COLUMN IF NOT EXISTS polygon JSONB"
+            )
+            
             await conn.execute("""
                 CREATE TABLE IF NOT EXISTS device_states (
                     device_id VARCHAR(255) PRIMARY KEY,
@@ -47,6 +107,149 @@ class DatabaseManager:
                     last_lon DECIMAL(11, 8),
                     is_inside_fence BOOLEAN DEFAULT FALSE,
                     last_geofence_id INTEGER REFERENCES geofences(id),
+                    geofence_ids INTEGER[],
                     last_updated TIMESTAMP DEFAULT NOW()
                 )
-            """)
\ No newline at end of file
+            """)
+            
+            # Every fence containing the device, ascending; last_geofence_id
+            # is one of them. NULL on rows written before the column existed.
+            await conn.execute(
+                "ALTER TABLE device_states ADD COLUMN IF NOT EXISTS geofence_ids INTEGER[]"
+            )
+            
+            # Events written with the state change that caused them, until
+            # the OutboxDispatcher has handed them to the publisher.
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS event_outbox (
+                    id BIGSERIAL PRIMARY KEY,
+                    event_type VARCHAR(32) NOT NULL,
+                    device_id VARCHAR(255) NOT NULL,
+                    payload JSONB NOT NULL,
+                    created_at TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp()
+                )
+            """)
+
+            # Every checked fix, appended in bulk by LocationHistoryWriter into
+            # daily partitions (GeofenceRepository.create_history_partitions).
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS location_history (
+                    device_id VARCHAR(255) NOT NULL,
+                    recorded_at TIMESTAMPTZ NOT NULL,
+                    lat DOUBLE PRECISION NOT NULL,
+                    lon DOUBLE PRECISION NOT NULL,
+                    is_inside_fence BOOLEAN NOT NULL,
+                    geofence_id INTEGER
+                ) PARTITION BY RANGE (recorded_at)
+            """)
+
+            await conn.execute("""
+                CREATE INDEX IF NOT EXISTS location_history_device_time_idx
+                ON location_history (device_id, recorded_at)
+            """)
+
+            # Events regenerated by backfill.py, one run_id per replay.
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS fence_events (
+                    id BIGSERIAL PRIMARY KEY,
+                    event_type VARCHAR(32) NOT NULL,
+                    device_id VARCHAR(255) NOT NULL,
+                    latitude DOUBLE PRECISION NOT NULL,
+                    longitude DOUBLE PRECISION NOT NULL,
+                    geofence_name VARCHAR(255),
+                    event_time TIMESTAMPTZ NOT NULL,
+                    run_id VARCHAR(64)
+                )
+            """)
+
+            await conn.execute("""
+                CREATE INDEX IF NOT EXISTS fence_events_device_time_idx
+                ON fence_events (device_id, event_time)
+            """)
+
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS geofence_version (
+                    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+                    version BIGINT NOT NULL DEFAULT 0
+                )
+            """)
+            
+            await conn.execute("""
+                INSERT INTO geofence_version (id, version) VALUES (TRUE, 0)
+                ON CONFLICT (id) DO NOTHING
+            """)
+            
+            await conn.execute(f"""
+                CREATE OR REPLACE FUNCTION bump_geofence_version() RETURNS trigger AS $$
+                DECLARE
+                    new_version BIGINT;
+                BEGIN
+                    UPDATE geofence_version SET version = version + 1 WHERE id
+                    RETURNING version INTO new_version;
+                    PERFORM pg_notify('{GEOFENCE_CHANGES_CHANNEL}', new_version::text);
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql
+            """)
+            
+            await conn.execute("""
+                CREATE OR REPLACE TRIGGER geofences_changed
+                AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON geofences
+                FOR EACH STATEMENT EXECUTE FUNCTION bump_geofence_version()
+            """)
+            
+            # Crossing-number test over [[lat, lon], ...], the same edges and
+            # arithmetic as domain.polygon.crossing_number_contains.
+            await conn.execute("""
+                CREATE OR REPLACE FUNCTION geofence_polygon_contains(
+                    polygon JSONB, lat DOUBLE PRECISION, lon DOUBLE PRECISION
+                ) RETURNS BOOLEAN AS $$
+                    SELECT COUNT(*) FILTER (
+                        WHERE CASE WHEN (yi > lat) <> (yj > lat)
+                                   THEN lon < (xj - xi) * (lat - yi) / (yj - yi) + xi
+                                   ELSE FALSE END
+                    ) % 2 = 1
+                    FROM (
+                        SELECT (v->>0)::float8 AS yi,
+                               (v->>1)::float8 AS xi,
+                               (LAG(v, 1, polygon->-1) OVER (ORDER BY n)->>0)::float8 AS yj,
+                               (LAG(v, 1, polygon->-1) OVER (ORDER BY n)->>1)::float8 AS xj
+                        FROM jsonb_array_elements(polygon) WITH ORDINALITY AS vertex(v, n)
+                    ) AS edges
+                $$ LANGUAGE SQL IMMUTABLE PARALLEL SAFE
+            """)
+            
+            if postgis:
+                await self._create_postgis_index(conn)
+    
+    async def _create_postgis_index(self, conn: asyncpg.Connection) -> None:
+        """Index a lat/lon envelope around every fence circle.
+        
+        The envelope is widened by the smallest cos(lat) the circle reaches
+        and padded by 1%, so it always encloses the circle; the exact
+        Haversine test runs on the rows the index returns.
+        """
+        await conn.execute("CREATE EXTENSION IF NOT EXISTS postgis")
+        await conn.execute(f"""
+            CREATE OR REPLACE FUNCTION geofence_envelope(
+                center_lat DOUBLE PRECISION, center_lon DOUBLE PRECISION, radius_km DOUBLE PRECISION
+            ) RETURNS geometry AS $$
+                SELECT ST_MakeEnvelope(
+                    center_lon - d_lon, center_lat - d_lat,
+                    center_lon + d_lon, center_lat + d_lat,
+                    4326
+                )
+                FROM (
+                    SELECT radius_km * 1.01 / {KM_PER_DEGREE} AS d_lat,
+                           radius_km * 1.01 / ({KM_PER_DEGREE} * GREATEST(
+                               cos(radians(LEAST(abs(center_lat) + radius_km * 1.01 / {KM_PER_DEGREE}, 90))),
+                               0.001
+                           )) AS d_lon
+                ) AS extent
+            $$ LANGUAGE SQL IMMUTABLE PARALLEL SAFE
+        """)
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS geofences_envelope_idx ON geofences USING GIST (
+                geofence_envelope(center_lat::float8, center_lon::float8, radius_km::float8)
+            )
+        """)
@@ -5,6 +5,11 @@ INSERT INTO geofences (name, center_lat, center_lon, radius_km) VALUES
 ('Warehouse Area', 40.7505, -73.9934, 1.0),
 ('Maintenance Zone', 40.7580, -73.9855, 0.3);
 
+-- Polygon fence: vertices are [lat, lon]; the circle columns enclose them.
+INSERT INTO geofences (name, center_lat, center_lon, radius_km, polygon) VALUES
+('Orchard', 40.7700, -73.9520, 0.755,
+ '[[40.770, -73.960], [40.776, -73.952], [40.772, -73.944], [40.764, -73.948], [40.766, -73.956]]');
+
 INSERT INTO device_states (device_id, last_lat, last_lon, is_inside_fence, last_geofence_id) VALUES
 ('tractor_001', 40.7831, -73.9712, true, 1),
 ('plough_002', 40.7489, -73.9857, true, 2),
@@ -1,10 +1,27 @@
 import math
-from typing import List
-from models.geofence import GeofenceModel, DeviceLocationModel
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+from models.geofence import DeviceLocationModel
+from models.records import Geofence
+from domain.polygon import prepared_polygon
+from domain.spatial_index import GeofenceGridIndex
+
+
+# Upper bound for safe radii; keeps the planar polygon distance bounds valid.
+MAX_SAFE_RADIUS_KM = 25.0
+# Below this many candidates a Python loop beats numpy call overhead.
+_VECTORIZE_MIN_CANDIDATES = 32
 
 
 class GeofenceCalculator:
-    """Handles geofence calculations using Haversine formula."""
+    """Handles geofence calculations using Haversine formula.
+    
+    Polygon fences are tested against their compiled ``PreparedPolygon``.
+    """
+    
+    def __init__(self, cell_size_deg: float = 0.1, max_cells_per_fence: int = 1024):
+        self.cell_size_deg = cell_size_deg
+        self.max_cells_per_fence = max_cells_per_fence
     
     @staticmethod
     def calculate_distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
@@ -24,19 +41,292 @@ class GeofenceCalculator:
         
         return earth_radius_km * c
     
+    @staticmethod
+    def calculate_distance_km_pairs(
+        lats: np.ndarray,
+        lons: np.ndarray,
+        center_lats: np.ndarray,
+        center_lons: np.ndarray
+    ) -> np.ndarray:
+        """Vectorized Haversine distances between aligned arrays of points."""
+        earth_radius_km = 6371.0
+        
+        lat1_rad = np.radians(lats)
+        lat2_rad = np.radians(center_lats)
+        delta_lat = np.radians(center_lats - lats)
+        delta_lon = np.radians(center_lons - lons)
+        
+        a = (np.sin(delta_lat / 2) ** 2 +
+             np.cos(lat1_rad) * np.cos(lat2_rad) *
+             np.sin(delta_lon / 2) ** 2)
+        
+        c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+        
+        return earth_radius_km * c
+    
+    def build_index(self, geofences: Iterable[Geofence]) -> GeofenceGridIndex:
+        """Build a spatial index over the given geofences.
+        
+        The index can be passed to ``find_containing_geofence`` in place of the
+        list and should be reused until the fence set changes. Polygon fences
+        are compiled here so lookups never pay for it.
+        """
+        geofences = list(geofences)
+        for geofence in geofences:
+            if geofence.polygon:
+                prepared_polygon(geofence)
+        return GeofenceGridIndex(
+            geofences,
+            cell_size_deg=self.cell_size_deg,
+            max_cells_per_fence=self.max_cells_per_fence
+        )
+    
     def find_containing_geofence(
         self, 
         location: DeviceLocationModel, 
-        geofences: List[GeofenceModel]
-    ) -> GeofenceModel | None:
-        """Find the first geofence that contains the given location."""
-        for geofence in geofences:
-            distance = self.calculate_distance_km(
-                location.lat, location.lon,
-                geofence.center_lat, geofence.center_lon
-            )
-            
-            if distance <= geofence.radius_km:
+        geofences: List[Geofence] | GeofenceGridIndex
+    ) -> Geofence | None:
+        """Find the first geofence that contains the given location.
+        
+        With a plain list every fence is checked; with a ``GeofenceGridIndex``
+        only the fences near the location are.
+        """
+        if isinstance(geofences, GeofenceGridIndex):
+            candidates = geofences.candidates(location.lat, location.lon)
+        else:
+            candidates = geofences
+        
+        for geofence in candidates:
+            if self.contains(geofence, location.lat, location.lon):
                 return geofence
                 
-        return None
\ No newline at end of file
+        return None
+    
+    def find_containing_geofences(
+        self,
+        location: DeviceLocationModel,
+        geofences: List[Geofence] | GeofenceGridIndex
+    ) -> List[Geofence]:
+        """Find every geofence that contains the location, in list order.
+        
+        One pass over the same candidates as ``find_containing_geofence``;
+        its result is the first element of this one.
+        """
+        if isinstance(geofences, GeofenceGridIndex):
+            candidates = geofences.candidates(location.lat, location.lon)
+        else:
+            candidates = geofences
+        return [
+            geofence for geofence in candidates
+            if self.contains(geofence, location.lat, location.lon)
+        ]
+    
+    def contains(self, geofence: Geofence, lat: float, lon: float) -> bool:
+        """Check whether a single fence contains the point."""
+        if geofence.polygon:
+            return prepared_polygon(geofence).contains(lat, lon)
+        
+        distance = self.calculate_distance_km(
+            lat, lon, geofence.center_lat, geofence.center_lon
+        )
+        return distance <= geofence.radius_km
+    
+    def safe_radius_km(
+        self,
+        lat: float,
+        lon: float,
+        geofences: List[Geofence] | GeofenceGridIndex
+    ) -> float:
+        """Distance the point can move without changing any fence membership.
+        
+        This is a lower bound on the distance to the nearest fence boundary:
+        every fix closer than it to the point gets the same result from
+        ``find_containing_geofence``. With an index, fences outside the
+        point's cell are covered by the distance to the cell edge.
+        """
+        if isinstance(geofences, GeofenceGridIndex):
+            radius = min(MAX_SAFE_RADIUS_KM, geofences.cell_clearance_km(lat, lon))
+            positions = list(geofences.candidate_positions(lat, lon))
+            candidates = [geofences.geofences[p] for p in positions]
+            if len(positions) > _VECTORIZE_MIN_CANDIDATES:
+                # Crowded cells: circles in one kernel call, polygons below.
+                positions = np.asarray(positions, dtype=np.int64)
+                circles = positions[~geofences.polygon_mask[positions]]
+                if len(circles):
+                    distances = self.calculate_distance_km_pairs(
+                        np.full(len(circles), lat), np.full(len(circles), lon),
+                        geofences.center_lats[circles], geofences.center_lons[circles]
+                    )
+                    radius = min(radius, float(np.abs(distances - geofences.radii_km[circles]).min()))
+                candidates = [g for g in candidates if g.polygon]
+        else:
+            radius = MAX_SAFE_RADIUS_KM
+            candidates = geofences
+        
+        for geofence in candidates:
+            if geofence.polygon:
+                distance = prepared_polygon(geofence).boundary_distance_km(lat, lon, radius)
+            else:
+                distance = abs(self.calculate_distance_km(
+                    lat, lon, geofence.center_lat, geofence.center_lon
+                ) - geofence.radius_km)
+            radius = min(radius, distance)
+        
+        # Keep a millimetre of slack for floating point noise.
+        return max(radius - 1e-6, 0.0)
+    
+    def signed_distance_km(self, geofence: Geofence, lat: float, lon: float) -> float:
+        """Distance from the point to the fence boundary, negative inside the fence.
+        
+        Polygon distances are ``PreparedPolygon.edge_distance_km`` estimates,
+        never below the distance to the fence's enclosing circle.
+        """
+        center_km = self.calculate_distance_km(lat, lon, geofence.center_lat, geofence.center_lon)
+        if not geofence.polygon:
+            return center_km - geofence.radius_km
+        
+        polygon = prepared_polygon(geofence)
+        # Polygons never cross the antimeridian; measure from the nearer copy of the point.
+        lon += 360.0 * round((geofence.center_lon - lon) / 360.0)
+        if polygon.contains(lat, lon):
+            return -polygon.edge_distance_km(lat, lon)
+        return max(polygon.edge_distance_km(lat, lon), center_km - geofence.radius_km)
+    
+    def nearest_geofences(
+        self,
+        lat: float,
+        lon: float,
+        index: GeofenceGridIndex,
+        k: int = 5
+    ) -> List[Tuple[Geofence, float]]:
+        """The ``k`` fences with the nearest boundaries and their signed distances in km.
+        
+        Fences containing the point come first, deepest first. Only polygons
+        that could make the result have their edges measured.
+        """
+        fences = index.geofences
+        nearest = index.center_tree().nearest(
+            lat, lon, k,
+            lambda position: self.signed_distance_km(fences[position], lat, lon)
+        )
+        return [(fences[position], distance) for distance, position in nearest]
+    
+    def find_containing_geofences_batch(
+        self,
+        lats: Sequence[float] | np.ndarray,
+        lons: Sequence[float] | np.ndarray,
+        geofences: List[Geofence] | GeofenceGridIndex,
+        max_matrix_size: int = 1_000_000
+    ) -> List[Optional[Geofence]]:
+        """Find the first containing geofence for each point of a batch.
+        
+        Points are grouped by grid cell and paired with their cell's candidate
+        fences; all (point, fence) pairs are tested with one vectorized
+        Haversine kernel call per ``max_matrix_size`` pairs. For polygon fences
+        the distance check is an enclosing-circle prefilter and the surviving
+        pairs run the vectorized polygon test. Results match
+        ``find_containing_geofence`` point by point.
+        """
+        results: List[Optional[Geofence]] = [None] * len(lats)
+        for fences, hit_points, hit_positions in self._batch_hits(lats, lons, geofences, max_matrix_size):
+            # The first inside pair of each point is its earliest fence in list order.
+            first_points, first = np.unique(hit_points, return_index=True)
+            for point, position in zip(first_points.tolist(), hit_positions[first].tolist()):
+                results[point] = fences[position]
+        return results
+    
+    def find_all_containing_geofences_batch(
+        self,
+        lats: Sequence[float] | np.ndarray,
+        lons: Sequence[float] | np.ndarray,
+        geofences: List[Geofence] | GeofenceGridIndex,
+        max_matrix_size: int = 1_000_000
+    ) -> List[List[Geofence]]:
+        """Every containing geofence of each point of a batch, in list order.
+        
+        The same single pass as ``find_containing_geofences_batch``, keeping
+        all inside pairs; results match ``find_containing_geofences``.
+        """
+        results: List[List[Geofence]] = [[] for _ in range(len(lats))]
+        for fences, hit_points, hit_positions in self._batch_hits(lats, lons, geofences, max_matrix_size):
+            for point, position in zip(hit_points.tolist(), hit_positions.tolist()):
+                results[point].append(fences[position])
+        return results
+    
+    def _batch_hits(
+        self,
+        lats: Sequence[float] | np.ndarray,
+        lons: Sequence[float] | np.ndarray,
+        geofences: List[Geofence] | GeofenceGridIndex,
+        max_matrix_size: int
+    ) -> Iterator[Tuple[Sequence[Geofence], np.ndarray, np.ndarray]]:
+        """Yield (fences, points, positions) of the inside pairs, chunk by chunk.
+        
+        Within a chunk the pairs of one point are contiguous and in ascending
+        fence position, and every point appears in one chunk only.
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        if len(lats) == 0 or len(geofences) == 0:
+            return
+        
+        index = geofences if isinstance(geofences, GeofenceGridIndex) else self.build_index(geofences)
+        overflow = index.overflow_positions
+        
+        keys = index.cell_keys(lats, lons)
+        order = np.argsort(keys, kind="stable")
+        unique_keys, starts = np.unique(keys[order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+        
+        pair_points: List[np.ndarray] = []
+        pair_positions: List[np.ndarray] = []
+        pair_count = 0
+        
+        for key, start, end in zip(unique_keys.tolist(), starts.tolist(), ends.tolist()):
+            positions = index.cell_positions(key)
+            if overflow:
+                positions = sorted(set(positions).union(overflow))
+            if not positions:
+                continue
+            
+            points = order[start:end]
+            candidates = np.asarray(positions, dtype=np.int64)
+            pair_points.append(np.repeat(points, len(candidates)))
+            pair_positions.append(np.tile(candidates, len(points)))
+            pair_count += len(points) * len(candidates)
+            
+            if pair_count >= max_matrix_size:
+                yield (index.geofences, *self._inside_pairs(index, lats, lons, pair_points, pair_positions))
+                pair_points, pair_positions, pair_count = [], [], 0
+        
+        if pair_points:
+            yield (index.geofences, *self._inside_pairs(index, lats, lons, pair_points, pair_positions))
+    
+    def _inside_pairs(
+        self,
+        index: GeofenceGridIndex,
+        lats: np.ndarray,
+        lons: np.ndarray,
+        pair_points: List[np.ndarray],
+        pair_positions: List[np.ndarray]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        points = np.concatenate(pair_points)
+        positions = np.concatenate(pair_positions)
+        
+        distances = self.calculate_distance_km_pairs(
+            lats[points], lons[points],
+            index.center_lats[positions], index.center_lons[positions]
+        )
+        inside = distances <= index.radii_km[positions]
+        
+        geofences = index.geofences
+        polygon_pairs = np.nonzero(inside & index.polygon_mask[positions])[0]
+        if len(polygon_pairs):
+            pair_fences = positions[polygon_pairs]
+            for position in np.unique(pair_fences).tolist():
+                selected = polygon_pairs[pair_fences == position]
+                inside[selected] = prepared_polygon(geofences[position]).contains_many(
+                    lats[points[selected]], lons[points[selected]]
+                )
+        
+        return points[inside], positions[inside]
@@ -0,0 +1,319 @@
+import math
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from domain.spatial_index import EARTH_RADIUS_KM
+from models.records import Geofence
+
+
+# Cell states of the inside/outside grid.
+CELL_OUTSIDE = 0
+CELL_INSIDE = 1
+CELL_BOUNDARY = 2
+
+# Bounding circles are padded so that they always enclose the polygon even
+# though polygon edges are straight in lat/lon rather than great circles.
+_CIRCLE_PAD = 1.01
+# Fences are stored with radius_km as DECIMAL(10, 3) and centres to 1e-8
+# degrees (about a millimetre), so radii are rounded up to whole metres,
+# after a centimetre of slack for the centre, to stay enclosing once stored.
+_CENTER_SLACK_KM = 1e-5
+_PLANAR_SLACK = 0.99
+
+
+def crossing_number_contains(
+    vertices: Sequence[Tuple[float, float]],
+    lat: float,
+    lon: float
+) -> bool:
+    """Reference crossing-number test over every edge (lat/lon as planar y/x)."""
+    inside = False
+    j = len(vertices) - 1
+    for i in range(len(vertices)):
+        yi, xi = vertices[i]
+        yj, xj = vertices[j]
+        if (yi > lat) != (yj > lat):
+            x_cross = (xj - xi) * (lat - yi) / (yj - yi) + xi
+            if lon < x_cross:
+                inside = not inside
+        j = i
+    return inside
+
+
+def bounding_circle(vertices: Sequence[Tuple[float, float]]) -> Tuple[float, float, float]:
+    """Return (center_lat, center_lon, radius_km) of a circle enclosing the polygon.
+
+    The radius is a whole number of metres, at least one.
+    """
+    lats = [v[0] for v in vertices]
+    lons = [v[1] for v in vertices]
+    center_lat = (min(lats) + max(lats)) / 2
+    center_lon = (min(lons) + max(lons)) / 2
+
+    radius = 0.0
+    lat1_rad = math.radians(center_lat)
+    for lat, lon in vertices:
+        delta_lat = math.radians(lat - center_lat)
+        delta_lon = math.radians(lon - center_lon)
+        a = (math.sin(delta_lat / 2) ** 2 +
+             math.cos(lat1_rad) * math.cos(math.radians(lat)) *
+             math.sin(delta_lon / 2) ** 2)
+        radius = max(radius, EARTH_RADIUS_KM * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a)))
+
+    metres = math.ceil((radius * _CIRCLE_PAD + _CENTER_SLACK_KM) * 1000)
+    return center_lat, center_lon, max(metres, 1) / 1000
+
+
+def _normalized_vertices(vertices: Sequence[Tuple[float, float]]) -> List[Tuple[float, float]]:
+    """Vertices as float pairs, without a repeated closing vertex."""
+    points = [(float(lat), float(lon)) for lat, lon in vertices]
+    if len(points) > 3 and points[0] == points[-1]:
+        points.pop()
+    return points
+
+
+class PreparedPolygon:
+    """Polygon compiled once for fast repeated point-in-polygon tests.
+
+    Vertices are (lat, lon) pairs treated as planar y/x, which is accurate for
+    field-sized polygons; polygons must not cross the antimeridian. The
+    bounding box is split into ``grid_size`` latitude bands, each holding the
+    edges that span it, and each band into ``grid_size`` cells. Cells that no
+    edge touches are classified once as fully inside or outside, so most
+    points are answered by the bbox test or a cell lookup; the rest run the
+    crossing-number test over their band's edges only. Results are identical
+    to ``crossing_number_contains``.
+    """
+
+    def __init__(
+        self,
+        vertices: Sequence[Tuple[float, float]],
+        grid_size: Optional[int] = None
+    ):
+        points = _normalized_vertices(vertices)
+        if len(points) < 3:
+            raise ValueError("a polygon needs at least 3 vertices")
+
+        self.vertices: List[Tuple[float, float]] = points
+        lats = np.array([p[0] for p in points], dtype=np.float64)
+        lons = np.array([p[1] for p in points], dtype=np.float64)
+
+        # Edge i joins vertex i-1 to vertex i, matching the reference loop.
+        self.y1, self.x1 = lats, lons
+        self.y2, self.x2 = np.roll(lats, 1), np.roll(lons, 1)
+
+        self.lat_min = float(lats.min())
+        self.lat_max = float(lats.max())
+        self.lon_min = float(lons.min())
+        self.lon_max = float(lons.max())
+
+        if grid_size is None:
+            grid_size = min(max(int(math.sqrt(len(points))), 4), 128)
+        self.grid_size = grid_size
+        self._cell_h = (self.lat_max - self.lat_min) / grid_size or 1.0
+        self._cell_w = (self.lon_max - self.lon_min) / grid_size or 1.0
+
+        self._build_bands()
+        self._build_cells()
+
+    def __len__(self) -> int:
+        return len(self.vertices)
+
+    @classmethod
+    def from_compiled(
+        cls,
+        vertices: Sequence[Tuple[float, float]],
+        cells: np.ndarray,
+        bands: List[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]
+    ) -> "PreparedPolygon":
+        """Rebuild from ``compiled_parts`` output without recompiling.
+
+        ``vertices`` must be the polygon the parts were compiled from.
+        """
+        prepared = cls.__new__(cls)
+        prepared.vertices = _normalized_vertices(vertices)
+        lats = np.array([p[0] for p in prepared.vertices], dtype=np.float64)
+        lons = np.array([p[1] for p in prepared.vertices], dtype=np.float64)
+        prepared.y1, prepared.x1 = lats, lons
+        prepared.y2, prepared.x2 = np.roll(lats, 1), np.roll(lons, 1)
+        prepared.lat_min = float(lats.min())
+        prepared.lat_max = float(lats.max())
+        prepared.lon_min = float(lons.min())
+        prepared.lon_max = float(lons.max())
+        prepared.grid_size = cells.shape[0]
+        prepared._cell_h = (prepared.lat_max - prepared.lat_min) / prepared.grid_size or 1.0
+        prepared._cell_w = (prepared.lon_max - prepared.lon_min) / prepared.grid_size or 1.0
+        prepared._cells = cells
+        prepared._bands = bands
+        return prepared
+
+    def compiled_parts(self) -> Tuple[np.ndarray, List[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]]:
+        """Cell grid and per-band (x1, y1, x2, y2) edge arrays, for serialization."""
+        return self._cells, self._bands
+
+    def _rows(self, lats: np.ndarray) -> np.ndarray:
+        rows = np.floor((lats - self.lat_min) / self._cell_h).astype(np.int64)
+        return np.clip(rows, 0, self.grid_size - 1)
+
+    def _cols(self, lons: np.ndarray) -> np.ndarray:
+        cols = np.floor((lons - self.lon_min) / self._cell_w).astype(np.int64)
+        return np.clip(cols, 0, self.grid_size - 1)
+
+    def _build_bands(self) -> None:
+        # Rows are monotonic in latitude, so an edge spanning [y_lo, y_hi] only
+        # matters to points whose row lies between the rows of y_lo and y_hi.
+        row_lo = self._rows(np.minimum(self.y1, self.y2))
+        row_hi = self._rows(np.maximum(self.y1, self.y2))
+        self._bands = []
+        for row in range(self.grid_size):
+            edges = np.nonzero((row_lo <= row) & (row_hi >= row))[0]
+            self._bands.append((self.x1[edges], self.y1[edges], self.x2[edges], self.y2[edges]))
+
+    def _build_cells(self) -> None:
+        g = self.grid_size
+        cells = np.zeros((g, g), dtype=np.int8)
+
+        # Mark every cell an edge's bounding box overlaps as boundary.
+        row_lo = self._rows(np.minimum(self.y1, self.y2))
+        row_hi = self._rows(np.maximum(self.y1, self.y2))
+        col_lo = self._cols(np.minimum(self.x1, self.x2))
+        col_hi = self._cols(np.maximum(self.x1, self.x2))
+        for r0, r1, c0, c1 in zip(row_lo.tolist(), row_hi.tolist(), col_lo.tolist(), col_hi.tolist()):
+            cells[r0:r1 + 1, c0:c1 + 1] = CELL_BOUNDARY
+
+        # Classify the remaining cells by testing their centers.
+        centers_lat = self.lat_min + (np.arange(g) + 0.5) * self._cell_h
+        centers_lon = self.lon_min + (np.arange(g) + 0.5) * self._cell_w
+        center_cols = self._cols(centers_lon)
+        for row in range(g):
+            free = np.nonzero(cells[row] != CELL_BOUNDARY)[0]
+            if not len(free):
+                continue
+            lat = centers_lat[row]
+            # A center that rounds into a neighbouring cell cannot vouch for this one.
+            if self._rows(np.array([lat]))[0] != row:
+                cells[row, free] = CELL_BOUNDARY
+                continue
+            valid = free[center_cols[free] == free]
+            cells[row, np.setdiff1d(free, valid)] = CELL_BOUNDARY
+            if len(valid):
+                inside = self._crossing_many(np.full(len(valid), lat), centers_lon[valid], row)
+                cells[row, valid] = np.where(inside, CELL_INSIDE, CELL_OUTSIDE)
+
+        self._cells = cells
+
+    def _crossing_many(self, lats: np.ndarray, lons: np.ndarray, row: int) -> np.ndarray:
+        """Vectorized crossing-number test of points in one band."""
+        x1, y1, x2, y2 = self._bands[row]
+        if not len(x1):
+            return np.zeros(len(lats), dtype=bool)
+
+        lat = lats[:, None]
+        spans = (y1 > lat) != (y2 > lat)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_cross = (x2 - x1) * (lat - y1) / (y2 - y1) + x1
+        crossings = np.count_nonzero(spans & (lons[:, None] < x_cross), axis=1)
+        return (crossings & 1).astype(bool)
+
+    def in_bbox(self, lat: float, lon: float) -> bool:
+        return self.lat_min <= lat <= self.lat_max and self.lon_min <= lon <= self.lon_max
+
+    def contains(self, lat: float, lon: float) -> bool:
+        """Point-in-polygon test for a single point."""
+        if not (self.lat_min <= lat <= self.lat_max and self.lon_min <= lon <= self.lon_max):
+            return False
+
+        row = min(max(int(math.floor((lat - self.lat_min) / self._cell_h)), 0), self.grid_size - 1)
+        col = min(max(int(math.floor((lon - self.lon_min) / self._cell_w)), 0), self.grid_size - 1)
+        state = self._cells[row, col]
+        if state != CELL_BOUNDARY:
+            return state == CELL_INSIDE
+
+        x1, y1, x2, y2 = self._bands[row]
+        inside = False
+        for xi, yi, xj, yj in zip(x1.tolist(), y1.tolist(), x2.tolist(), y2.tolist()):
+            if (yi > lat) != (yj > lat):
+                if lon < (xj - xi) * (lat - yi) / (yj - yi) + xi:
+                    inside = not inside
+        return inside
+
+    def contains_many(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        """Vectorized point-in-polygon test; returns a boolean array."""
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        result = np.zeros(len(lats), dtype=bool)
+
+        in_box = np.nonzero(
+            (lats >= self.lat_min) & (lats <= self.lat_max) &
+            (lons >= self.lon_min) & (lons <= self.lon_max)
+        )[0]
+        if not len(in_box):
+            return result
+
+        rows = self._rows(lats[in_box])
+        states = self._cells[rows, self._cols(lons[in_box])]
+        result[in_box[states == CELL_INSIDE]] = True
+
+        boundary = states == CELL_BOUNDARY
+        for row in np.unique(rows[boundary]).tolist():
+            points = in_box[boundary & (rows == row)]
+            result[points] = self._crossing_many(lats[points], lons[points], row)
+        return result
+
+    def boundary_distance_km(self, lat: float, lon: float, max_km: float) -> float:
+        """Lower bound on the distance from a point to the polygon boundary.
+        
+        Edges are straight in lat/lon, so distances are measured in that plane
+        with longitudes scaled by the cosine of the highest latitude within
+        ``max_km``, which never overestimates the great-circle distance. The
+        result is capped at ``max_km``.
+        """
+        reach_deg = math.degrees(max_km / EARTH_RADIUS_KM)
+        lon_scale = math.cos(math.radians(min(abs(lat) + reach_deg, 90.0)))
+
+        # Distance to the bounding box bounds the distance to every edge.
+        gap_lat = max(self.lat_min - lat, lat - self.lat_max, 0.0)
+        gap_lon = max(self.lon_min - lon, lon - self.lon_max, 0.0) * lon_scale
+        if math.hypot(gap_lat, gap_lon) >= reach_deg:
+            return max_km
+
+        distance_deg = self._edge_distance_deg(lat, lon, lon_scale)
+
+        # Small-angle slack between the scaled plane and the sphere.
+        return min(math.radians(distance_deg) * EARTH_RADIUS_KM * _PLANAR_SLACK, max_km)
+
+    def edge_distance_km(self, lat: float, lon: float) -> float:
+        """Distance from a point to the nearest edge, measured at the point's latitude.
+
+        Longitudes are scaled by the cosine of ``lat``, which is accurate to
+        well under a percent for field-sized polygons near the point; unlike
+        ``boundary_distance_km`` it is an estimate, not a bound.
+        """
+        lon_scale = math.cos(math.radians(lat))
+        return math.radians(self._edge_distance_deg(lat, lon, lon_scale)) * EARTH_RADIUS_KM
+
+    def _edge_distance_deg(self, lat: float, lon: float, lon_scale: float) -> float:
+        dx = (self.x2 - self.x1) * lon_scale
+        dy = self.y2 - self.y1
+        px = (lon - self.x1) * lon_scale
+        py = lat - self.y1
+        length_sq = dx * dx + dy * dy
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = np.where(length_sq > 0, (px * dx + py * dy) / length_sq, 0.0)
+        np.clip(t, 0.0, 1.0, out=t)
+        return float(np.hypot(px - t * dx, py - t * dy).min())
+
+    @property
+    def boundary_cell_ratio(self) -> float:
+        """Share of grid cells that need an edge test."""
+        return float(np.count_nonzero(self._cells == CELL_BOUNDARY)) / self._cells.size
+
+
+def prepared_polygon(geofence: Geofence) -> PreparedPolygon:
+    """Return the fence's compiled polygon, compiling it on first use."""
+    prepared = geofence._prepared
+    if prepared is None:
+        prepared = PreparedPolygon(geofence.polygon)
+        geofence._prepared = prepared
+    return prepared
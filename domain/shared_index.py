@@ -0,0 +1,213 @@
+import mmap
+import os
+import struct
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import orjson
+
+from domain.polygon import PreparedPolygon, prepared_polygon
+from domain.spatial_index import GeofenceGridIndex
+from models.records import GeofenceRecord
+
+
+_MAGIC = b"GFIDX001"
+_PREAMBLE = struct.Struct("<8sQ")
+_ALIGN = 64
+
+
+def index_path(directory: str, version: int) -> str:
+    """File holding the index of a given fence set version."""
+    return os.path.join(directory, f"geofence-index-{version}.bin")
+
+
+def _aligned(offset: int) -> int:
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def _fence_arrays(index: GeofenceGridIndex) -> Dict[str, np.ndarray]:
+    fences = index.geofences
+    polygon_sizes = [len(fence.polygon) if fence.polygon else 0 for fence in fences]
+    polygon_offsets = np.zeros(len(fences) + 1, dtype=np.int64)
+    np.cumsum(polygon_sizes, out=polygon_offsets[1:])
+    vertices = [vertex for fence in fences if fence.polygon for vertex in fence.polygon]
+    grid_sizes = np.zeros(len(fences), dtype=np.int64)
+    cells = []
+    band_sizes = []
+    band_edges = []
+    for i, fence in enumerate(fences):
+        if not fence.polygon:
+            continue
+        fence_cells, bands = prepared_polygon(fence).compiled_parts()
+        grid_sizes[i] = fence_cells.shape[0]
+        cells.append(fence_cells.ravel())
+        for band in bands:
+            band_sizes.append(len(band[0]))
+            band_edges.append(np.stack(band, axis=1))
+    band_offsets = np.zeros(len(band_sizes) + 1, dtype=np.int64)
+    np.cumsum(band_sizes, out=band_offsets[1:])
+
+    return {
+        "ids": np.array([fence.id for fence in fences], dtype=np.int64),
+        "center_lats": index.center_lats,
+        "center_lons": index.center_lons,
+        "radii_km": index.radii_km,
+        "polygon_offsets": polygon_offsets,
+        "polygon_vertices": np.array(vertices, dtype=np.float64).reshape(-1, 2),
+        "polygon_grid_sizes": grid_sizes,
+        "polygon_cells": np.concatenate(cells) if cells else np.zeros(0, dtype=np.int8),
+        "band_offsets": band_offsets,
+        # Rows of (x1, y1, x2, y2), one block per band of every polygon.
+        "band_edges": np.concatenate(band_edges) if band_edges else np.zeros((0, 4)),
+    }
+
+
+def write_array_file(path: str, magic: bytes, header: Dict[str, Any], arrays: Dict[str, np.ndarray]) -> str:
+    """Write named arrays behind a JSON header, each aligned for mapping.
+
+    The file is written under a temporary name and renamed into place, so
+    readers never see a partial file.
+    """
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        arrays[name] = array
+        layout[name] = (offset, array.dtype.str, list(array.shape))
+        offset = _aligned(offset + array.nbytes)
+
+    encoded = orjson.dumps({**header, "arrays": layout})
+    data_start = _aligned(_PREAMBLE.size + len(encoded))
+
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_PREAMBLE.pack(magic, len(encoded)))
+            f.write(encoded)
+            for name, array in arrays.items():
+                f.seek(data_start + layout[name][0])
+                f.write(array.tobytes())
+            f.truncate(data_start + offset)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return path
+
+
+def map_array_file(path: str, magic: bytes) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    """Map a ``write_array_file`` file read-only; arrays are views of the mapping."""
+    with open(path, "rb") as f:
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    found, header_size = _PREAMBLE.unpack_from(mapping, 0)
+    if found != magic:
+        raise ValueError(f"{path} is not a {magic.decode()} file")
+    header = orjson.loads(mapping[_PREAMBLE.size:_PREAMBLE.size + header_size])
+    data_start = _aligned(_PREAMBLE.size + header_size)
+
+    arrays = {}
+    for name, (offset, dtype, shape) in header["arrays"].items():
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape))
+        arrays[name] = np.frombuffer(
+            mapping, dtype=dtype, count=count, offset=data_start + offset
+        ).reshape(shape)
+    return header, arrays
+
+
+def index_arrays(index: GeofenceGridIndex) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    """Header fields and arrays that ``index_from_arrays`` rebuilds the index from."""
+    header = {
+        "cell_size_deg": index.cell_size_deg,
+        "max_cells_per_fence": index.max_cells_per_fence,
+        "names": [fence.name for fence in index.geofences],
+    }
+    return header, {**_fence_arrays(index), **index.pack()}
+
+
+def index_from_arrays(header: Dict[str, Any], arrays: Dict[str, np.ndarray]) -> GeofenceGridIndex:
+    """Rebuild an index around mapped arrays, without building or compiling anything."""
+    index = GeofenceGridIndex(
+        _fence_records(header["names"], arrays),
+        cell_size_deg=header["cell_size_deg"],
+        max_cells_per_fence=header["max_cells_per_fence"],
+        packed=arrays
+    )
+    _attach_polygons(index.geofences, arrays)
+    return index
+
+
+def write_index_file(index: GeofenceGridIndex, directory: str, version: int) -> str:
+    """Serialize an index for ``load_index_file``; returns the file path."""
+    header, arrays = index_arrays(index)
+    return write_array_file(index_path(directory, version), _MAGIC, {**header, "version": version}, arrays)
+
+
+def load_index_file(path: str) -> GeofenceGridIndex:
+    """Map an index file read-only and rebuild the index around it.
+
+    The cell map and the compiled polygon grids and edge bands are used in
+    place from the mapping, so every process that loads the same file shares
+    one copy in the page cache and none recompiles polygons. Fence records
+    are per process.
+    """
+    header, arrays = map_array_file(path, _MAGIC)
+    index = index_from_arrays(header, arrays)
+    index.version = header["version"]
+    return index
+
+
+def _fence_records(names: List[str], arrays: Dict[str, np.ndarray]) -> List[GeofenceRecord]:
+    offsets = arrays["polygon_offsets"].tolist()
+    vertices = arrays["polygon_vertices"]
+    fences = []
+    for i, (fence_id, lat, lon, radius) in enumerate(zip(
+        arrays["ids"].tolist(),
+        arrays["center_lats"].tolist(),
+        arrays["center_lons"].tolist(),
+        arrays["radii_km"].tolist()
+    )):
+        polygon: Optional[List[Tuple[float, float]]] = None
+        if offsets[i + 1] > offsets[i]:
+            polygon = [tuple(vertex) for vertex in vertices[offsets[i]:offsets[i + 1]].tolist()]
+        # Values were validated when the index was first built.
+        fences.append(GeofenceRecord(fence_id, names[i], lat, lon, radius, polygon))
+    return fences
+
+
+def _attach_polygons(fences: List[GeofenceRecord], arrays: Dict[str, np.ndarray]) -> None:
+    """Give polygon fences compiled polygons whose grids and bands are views."""
+    grid_sizes = arrays["polygon_grid_sizes"].tolist()
+    cells = arrays["polygon_cells"]
+    band_offsets = arrays["band_offsets"].tolist()
+    edges = arrays["band_edges"]
+    cell_start = 0
+    band = 0
+    for fence, grid_size in zip(fences, grid_sizes):
+        if not grid_size:
+            continue
+        cell_end = cell_start + grid_size * grid_size
+        bands = []
+        for _ in range(grid_size):
+            block = edges[band_offsets[band]:band_offsets[band + 1]]
+            bands.append((block[:, 0], block[:, 1], block[:, 2], block[:, 3]))
+            band += 1
+        fence._prepared = PreparedPolygon.from_compiled(
+            fence.polygon, cells[cell_start:cell_end].reshape(grid_size, grid_size), bands
+        )
+        cell_start = cell_end
+
+
+def remove_stale_index_files(directory: str, keep_versions: Tuple[int, ...]) -> int:
+    """Delete index files of other versions; processes mapping them are unaffected."""
+    keep = {os.path.basename(index_path(directory, version)) for version in keep_versions}
+    removed = 0
+    for name in os.listdir(directory):
+        if name.startswith("geofence-index-") and name.endswith(".bin") and name not in keep:
+            os.unlink(os.path.join(directory, name))
+            removed += 1
+    return removed
@@ -0,0 +1,119 @@
+from datetime import datetime
+from typing import Dict, Iterator, Optional, Sequence
+
+import numpy as np
+
+from domain.shared_index import index_arrays, index_from_arrays, map_array_file, write_array_file
+from domain.spatial_index import GeofenceGridIndex
+from models.records import DeviceState, DeviceStateRecord, membership
+
+
+_MAGIC = b"GFSNAP01"
+_STATE_PREFIX = "state_"
+
+
+def _state_arrays(states: Sequence[DeviceState]) -> Dict[str, np.ndarray]:
+    device_ids = [state.device_id.encode() for state in states]
+    id_offsets = np.zeros(len(states) + 1, dtype=np.int64)
+    np.cumsum([len(device_id) for device_id in device_ids], out=id_offsets[1:])
+    fence_ids = [membership(state.last_geofence_id, state.geofence_ids) for state in states]
+    fence_offsets = np.zeros(len(states) + 1, dtype=np.int64)
+    np.cumsum([len(ids) for ids in fence_ids], out=fence_offsets[1:])
+
+    return {
+        "device_ids": np.frombuffer(b"".join(device_ids), dtype=np.uint8),
+        "device_id_offsets": id_offsets,
+        # NaN for states without a position.
+        "lats": np.array([state.last_lat for state in states], dtype=np.float64),
+        "lons": np.array([state.last_lon for state in states], dtype=np.float64),
+        "inside": np.array([state.is_inside_fence for state in states], dtype=np.uint8),
+        # -1 when the device is in no fence.
+        "last_geofence_ids": np.array(
+            [-1 if state.last_geofence_id is None else state.last_geofence_id for state in states],
+            dtype=np.int64
+        ),
+        "fence_id_offsets": fence_offsets,
+        "fence_ids": np.array([i for ids in fence_ids for i in ids], dtype=np.int64),
+    }
+
+
+class Snapshot:
+    """Fence index and recent device states mapped from a snapshot file.
+
+    ``fence_version`` is the fence set version the index was built from and
+    ``states_as_of`` the database time the states were read at; changes
+    after either are caught up from Postgres.
+    """
+
+    def __init__(
+        self,
+        index: GeofenceGridIndex,
+        fence_version: int,
+        states_as_of: Optional[datetime],
+        state_arrays: Dict[str, np.ndarray]
+    ):
+        self.index = index
+        self.fence_version = fence_version
+        self.states_as_of = states_as_of
+        self._states = state_arrays
+
+    def __len__(self) -> int:
+        """Number of device states in the snapshot."""
+        return len(self._states["lats"])
+
+    def states(self) -> Iterator[DeviceStateRecord]:
+        """Build device state records one at a time from the mapped arrays."""
+        arrays = self._states
+        blob = arrays["device_ids"].tobytes()
+        id_offsets = arrays["device_id_offsets"].tolist()
+        fence_offsets = arrays["fence_id_offsets"].tolist()
+        fence_ids = arrays["fence_ids"].tolist()
+        for i, (lat, lon, inside, geofence_id) in enumerate(zip(
+            arrays["lats"].tolist(),
+            arrays["lons"].tolist(),
+            arrays["inside"].tolist(),
+            arrays["last_geofence_ids"].tolist()
+        )):
+            yield DeviceStateRecord(
+                blob[id_offsets[i]:id_offsets[i + 1]].decode(),
+                None if lat != lat else lat,
+                None if lon != lon else lon,
+                bool(inside),
+                None if geofence_id < 0 else geofence_id,
+                tuple(fence_ids[fence_offsets[i]:fence_offsets[i + 1]])
+            )
+
+
+def write_snapshot(
+    path: str,
+    index: GeofenceGridIndex,
+    fence_version: int,
+    states: Sequence[DeviceState] = (),
+    states_as_of: Optional[datetime] = None
+) -> str:
+    """Write a fence index and device states for ``load_snapshot``; returns the path."""
+    header, arrays = index_arrays(index)
+    arrays.update({_STATE_PREFIX + name: array for name, array in _state_arrays(states).items()})
+    header.update({
+        "fence_version": fence_version,
+        "states_as_of": states_as_of.isoformat() if states_as_of else None,
+    })
+    return write_array_file(path, _MAGIC, header, arrays)
+
+
+def load_snapshot(path: str) -> Snapshot:
+    """Map a snapshot file read-only; the index is used in place like a shared index file."""
+    header, arrays = map_array_file(path, _MAGIC)
+    state_arrays = {
+        name[len(_STATE_PREFIX):]: array
+        for name, array in arrays.items() if name.startswith(_STATE_PREFIX)
+    }
+    index = index_from_arrays(header, arrays)
+    index.version = header["fence_version"]
+    states_as_of = header["states_as_of"]
+    return Snapshot(
+        index,
+        header["fence_version"],
+        datetime.fromisoformat(states_as_of) if states_as_of else None,
+        state_arrays
+    )
@@ -0,0 +1,382 @@
+import heapq
+import math
+from heapq import merge
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from models.records import Geofence
+
+
+EARTH_RADIUS_KM = 6371.0
+
+# Relative and absolute padding applied to bounding boxes so that points lying
+# exactly on a fence boundary are never dropped by floating point noise.
+_BBOX_REL_PAD = 1e-9
+_BBOX_ABS_PAD_DEG = 1e-9
+
+
+def circle_bounding_box(
+    lat: float,
+    lon: float,
+    radius_km: float
+) -> Tuple[float, float, float, float]:
+    """Return (lat_min, lat_max, lon_min, lon_max) enclosing a spherical cap.
+
+    Longitudes are not wrapped, so lon_min may be below -180 and lon_max above
+    180 for fences that straddle the antimeridian. Caps that contain a pole
+    span the full longitude range.
+    """
+    delta = radius_km / EARTH_RADIUS_KM
+    delta_deg = math.degrees(delta) * (1 + _BBOX_REL_PAD) + _BBOX_ABS_PAD_DEG
+    lat_min = lat - delta_deg
+    lat_max = lat + delta_deg
+
+    cos_lat = math.cos(math.radians(lat))
+    if lat_max >= 90 or lat_min <= -90 or math.sin(delta) >= cos_lat:
+        return max(lat_min, -90.0), min(lat_max, 90.0), -180.0, 180.0
+
+    delta_lon = math.degrees(math.asin(math.sin(delta) / cos_lat))
+    delta_lon = delta_lon * (1 + _BBOX_REL_PAD) + _BBOX_ABS_PAD_DEG
+    return lat_min, lat_max, lon - delta_lon, lon + delta_lon
+
+
+class PackedCells:
+    """Read-only cell -> positions map over CSR arrays.
+
+    ``keys`` is sorted; the positions of ``keys[i]`` are
+    ``positions[offsets[i]:offsets[i + 1]]``. Used for indexes attached from
+    a mapped index file, where the arrays are views that no process copies.
+    """
+
+    def __init__(self, keys: np.ndarray, offsets: np.ndarray, positions: np.ndarray):
+        self.keys = keys
+        self.offsets = offsets
+        self.positions = positions
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def get(self, key: int, default: Sequence[int] = ()) -> Sequence[int]:
+        i = int(np.searchsorted(self.keys, key))
+        if i < len(self.keys) and self.keys[i] == key:
+            return self.positions[self.offsets[i]:self.offsets[i + 1]].tolist()
+        return default
+
+
+def unit_vectors(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Points on the unit sphere as (n, 3) x/y/z rows."""
+    lat = np.radians(lats)
+    lon = np.radians(lons)
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+class CenterTree:
+    """KD-tree over fence centers on the unit sphere, for nearest-fence queries.
+
+    Chord length between unit vectors grows with great-circle distance, so a
+    point's distance to a node's 3-D box bounds its distance to every center
+    in the node, with no special cases at the poles or the antimeridian.
+    Each node also keeps the largest radius below it: a fence's signed
+    boundary distance is at least its center distance minus its radius
+    (polygon fences lie inside their enclosing circle), so a best-first
+    search can stop once no node can beat the k-th fence found. Circles are
+    finished from the center distance; polygons ask ``polygon_distance``.
+    """
+
+    def __init__(
+        self,
+        lats: np.ndarray,
+        lons: np.ndarray,
+        radii_km: np.ndarray,
+        polygon_mask: np.ndarray,
+        leaf_size: int = 16
+    ):
+        order = np.arange(len(lats))
+        points = unit_vectors(lats, lons)
+        self._lo: List[Tuple[float, float, float]] = []
+        self._hi: List[Tuple[float, float, float]] = []
+        self._max_radius: List[float] = []
+        self._ranges: List[Tuple[int, int]] = []
+        self._children: List[Optional[Tuple[int, int]]] = []
+
+        def build(start: int, end: int) -> int:
+            node = len(self._ranges)
+            members = order[start:end]
+            lo = points[members].min(axis=0)
+            hi = points[members].max(axis=0)
+            self._lo.append(tuple(lo.tolist()))
+            self._hi.append(tuple(hi.tolist()))
+            self._max_radius.append(float(radii_km[members].max()))
+            self._ranges.append((start, end))
+            self._children.append(None)
+            if end - start > leaf_size:
+                axis = int(np.argmax(hi - lo))
+                middle = (end - start) // 2
+                order[start:end] = members[np.argpartition(points[members, axis], middle)]
+                self._children[node] = (build(start, start + middle), build(start + middle, end))
+            return node
+
+        if len(order):
+            build(0, len(order))
+        # Leaf members are contiguous in tree order.
+        self.positions = order
+        self.points = points[order]
+        self.radii_km = radii_km[order]
+        self.polygon_mask = polygon_mask[order]
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def _lower_bound_km(self, node: int, query: Tuple[float, float, float]) -> float:
+        gap_sq = 0.0
+        for q, lo, hi in zip(query, self._lo[node], self._hi[node]):
+            if q < lo:
+                gap_sq += (lo - q) ** 2
+            elif q > hi:
+                gap_sq += (q - hi) ** 2
+        chord = math.sqrt(gap_sq)
+        return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2)) - self._max_radius[node]
+
+    def nearest(
+        self,
+        lat: float,
+        lon: float,
+        k: int,
+        polygon_distance: Callable[[int], float]
+    ) -> List[Tuple[float, int]]:
+        """(signed distance km, fence position) of the ``k`` nearest fences, nearest first.
+
+        ``polygon_distance`` gives the signed boundary distance of the polygon
+        fence at a position.
+        """
+        if not len(self) or k <= 0:
+            return []
+        query = tuple(unit_vectors(np.array([lat]), np.array([lon]))[0].tolist())
+        query_vector = np.array(query)
+        # Max-heap of the best k as (-distance, position).
+        best: List[Tuple[float, int]] = []
+        frontier = [(self._lower_bound_km(0, query), 0)]
+        while frontier:
+            bound, node = heapq.heappop(frontier)
+            if len(best) == k and bound >= -best[0][0]:
+                break
+            children = self._children[node]
+            if children is not None:
+                for child in children:
+                    heapq.heappush(frontier, (self._lower_bound_km(child, query), child))
+                continue
+
+            start, end = self._ranges[node]
+            chords = np.linalg.norm(self.points[start:end] - query_vector, axis=1)
+            center_km = 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(1.0, chords / 2))
+            bounds = (center_km - self.radii_km[start:end]).tolist()
+            polygons = self.polygon_mask[start:end].tolist()
+            for i, (distance, polygon) in enumerate(zip(bounds, polygons)):
+                if len(best) == k and distance >= -best[0][0]:
+                    continue
+                position = int(self.positions[start + i])
+                if polygon:
+                    distance = polygon_distance(position)
+                if len(best) < k:
+                    heapq.heappush(best, (-distance, position))
+                elif distance < -best[0][0]:
+                    heapq.heapreplace(best, (-distance, position))
+        return sorted((-distance, position) for distance, position in best)
+
+
+class GeofenceGridIndex:
+    """Uniform lat/lon grid over geofence bounding boxes.
+
+    Every fence is registered in each grid cell its bounding box overlaps, so
+    a point lookup only needs exact distance checks for the fences sharing its
+    cell. Fences covering more than ``max_cells_per_fence`` cells (very large
+    radii, polar caps) go to a small overflow list that is always checked.
+
+    Candidates are yielded in the original list order, so the first exact
+    match is the same fence a linear scan would return. The fence list is
+    copied on construction; build a new index when fences change.
+
+    ``pack`` exports the cell map as flat arrays; passing them back as
+    ``packed`` (with the same fences and cell size) skips the build.
+    """
+
+    def __init__(
+        self,
+        geofences: Iterable[Geofence],
+        cell_size_deg: float = 0.1,
+        max_cells_per_fence: int = 1024,
+        packed: Optional[Dict[str, np.ndarray]] = None
+    ):
+        if cell_size_deg <= 0:
+            raise ValueError("cell_size_deg must be positive")
+
+        self.geofences: List[Geofence] = list(geofences)
+        self.cell_size_deg = cell_size_deg
+        self.max_cells_per_fence = max_cells_per_fence
+
+        self._rows = math.ceil(180 / cell_size_deg)
+        self._cols = math.ceil(360 / cell_size_deg)
+        self._cells: Dict[int, List[int]] | PackedCells = {}
+        self._overflow: List[int] = []
+        self._by_id: Dict[int, Geofence] = {}
+
+        for position, geofence in enumerate(self.geofences):
+            self._by_id.setdefault(geofence.id, geofence)
+            if packed is None:
+                self._insert(position, geofence)
+
+        if packed is not None:
+            self._cells = PackedCells(
+                packed["cell_keys"], packed["cell_offsets"], packed["cell_positions"]
+            )
+            self._overflow = packed["overflow"].tolist()
+
+        # Column arrays for the vectorized batch kernel.
+        self.center_lats = np.array([g.center_lat for g in self.geofences], dtype=np.float64)
+        self.center_lons = np.array([g.center_lon for g in self.geofences], dtype=np.float64)
+        self.radii_km = np.array([g.radius_km for g in self.geofences], dtype=np.float64)
+        self.polygon_mask = np.array([bool(g.polygon) for g in self.geofences], dtype=bool)
+        self._center_tree: Optional[CenterTree] = None
+
+    def __len__(self) -> int:
+        return len(self.geofences)
+
+    def pack(self) -> Dict[str, np.ndarray]:
+        """Cell map as CSR arrays plus the overflow positions."""
+        if isinstance(self._cells, PackedCells):
+            cells = self._cells
+            return {
+                "cell_keys": cells.keys,
+                "cell_offsets": cells.offsets,
+                "cell_positions": cells.positions,
+                "overflow": np.asarray(self._overflow, dtype=np.int32),
+            }
+
+        keys = np.array(sorted(self._cells), dtype=np.int64)
+        sizes = np.array([len(self._cells[key]) for key in keys.tolist()], dtype=np.int64)
+        offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=offsets[1:])
+        positions = np.fromiter(
+            (position for key in keys.tolist() for position in self._cells[key]),
+            dtype=np.int32,
+            count=int(offsets[-1])
+        )
+        return {
+            "cell_keys": keys,
+            "cell_offsets": offsets,
+            "cell_positions": positions,
+            "overflow": np.asarray(self._overflow, dtype=np.int32),
+        }
+
+    def __iter__(self) -> Iterator[Geofence]:
+        return iter(self.geofences)
+
+    @property
+    def cell_count(self) -> int:
+        """Number of non-empty grid cells."""
+        return len(self._cells)
+
+    @property
+    def overflow_count(self) -> int:
+        """Number of fences checked for every point."""
+        return len(self._overflow)
+
+    def _row(self, lat: float) -> int:
+        row = int(math.floor((lat + 90) / self.cell_size_deg))
+        return min(max(row, 0), self._rows - 1)
+
+    def _col(self, lon: float) -> int:
+        return int(math.floor((lon + 180) / self.cell_size_deg)) % self._cols
+
+    def _insert(self, position: int, geofence: Geofence) -> None:
+        lat_min, lat_max, lon_min, lon_max = circle_bounding_box(
+            geofence.center_lat, geofence.center_lon, geofence.radius_km
+        )
+
+        row_min = self._row(lat_min)
+        row_max = self._row(lat_max)
+        col_start = int(math.floor((lon_min + 180) / self.cell_size_deg))
+        col_end = int(math.floor((lon_max + 180) / self.cell_size_deg))
+        col_span = min(col_end - col_start + 1, self._cols)
+
+        if (row_max - row_min + 1) * col_span > self.max_cells_per_fence:
+            self._overflow.append(position)
+            return
+
+        cells = self._cells
+        for row in range(row_min, row_max + 1):
+            base = row * self._cols
+            for offset in range(col_span):
+                key = base + (col_start + offset) % self._cols
+                bucket = cells.get(key)
+                if bucket is None:
+                    cells[key] = [position]
+                else:
+                    bucket.append(position)
+
+    def candidate_positions(self, lat: float, lon: float) -> Iterable[int]:
+        """Positions of fences whose bounding box may contain the point, ascending."""
+        bucket: Sequence[int] = self._cells.get(
+            self._row(lat) * self._cols + self._col(lon), ()
+        )
+        if not self._overflow:
+            return bucket
+        if not bucket:
+            return self._overflow
+        return merge(bucket, self._overflow)
+
+    def cell_clearance_km(self, lat: float, lon: float) -> float:
+        """Lower bound on the distance from a point to the edge of its grid cell.
+        
+        Fences not registered in the point's cell lie entirely outside it, so
+        the point cannot reach them without moving at least this far.
+        """
+        lat_lo = -90 + self._row(lat) * self.cell_size_deg
+        lat_gap = max(min(lat - lat_lo, lat_lo + self.cell_size_deg - lat), 0.0)
+
+        offset = (lon + 180) / self.cell_size_deg
+        offset -= math.floor(offset)
+        lon_gap = min(offset, 1 - offset) * self.cell_size_deg
+
+        lat_km = math.radians(lat_gap) * EARTH_RADIUS_KM
+        # Shortest distance to a meridian lon_gap degrees away.
+        lon_km = EARTH_RADIUS_KM * math.asin(
+            math.sin(math.radians(min(lon_gap, 90.0))) * math.cos(math.radians(lat))
+        )
+        return max(min(lat_km, lon_km), 0.0)
+
+    def cell_keys(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        """Vectorized grid cell keys for arrays of points."""
+        rows = np.floor((lats + 90) / self.cell_size_deg).astype(np.int64)
+        np.clip(rows, 0, self._rows - 1, out=rows)
+        cols = np.floor((lons + 180) / self.cell_size_deg).astype(np.int64) % self._cols
+        return rows * self._cols + cols
+
+    def cell_positions(self, key: int) -> Sequence[int]:
+        """Positions registered in a grid cell, excluding the overflow list."""
+        return self._cells.get(key, ())
+
+    @property
+    def overflow_positions(self) -> Sequence[int]:
+        """Positions checked for every point."""
+        return self._overflow
+
+    def candidates(self, lat: float, lon: float) -> Iterator[Geofence]:
+        """Fences whose bounding box may contain the point, in list order."""
+        geofences = self.geofences
+        for position in self.candidate_positions(lat, lon):
+            yield geofences[position]
+
+    def get(self, geofence_id: int) -> Optional[Geofence]:
+        """Look up a fence by id."""
+        return self._by_id.get(geofence_id)
+
+    def center_tree(self) -> CenterTree:
+        """KD-tree over the fence centers, built on first use."""
+        if self._center_tree is None:
+            self._center_tree = CenterTree(
+                self.center_lats, self.center_lons, self.radii_km, self.polygon_mask
+            )
+        return self._center_tree
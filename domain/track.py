@@ -0,0 +1,59 @@
+import math
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from domain.spatial_index import EARTH_RADIUS_KM
+
+
+_M_PER_DEG = EARTH_RADIUS_KM * 1000 * math.pi / 180
+
+
+def simplify_track(
+    lats: Sequence[float],
+    lons: Sequence[float],
+    tolerance_m: float,
+    keep: Optional[Sequence[bool]] = None
+) -> List[int]:
+    """Indices of the points a Douglas-Peucker simplification keeps.
+
+    Points are projected onto a local equirectangular plane around the
+    track's mean latitude, which is accurate to well under a percent for a
+    vehicle track. The first and last points, and those flagged in ``keep``
+    (e.g. fence transitions), are always kept; the track is simplified
+    between them so no kept point moves.
+    """
+    n = len(lats)
+    if n <= 2 or tolerance_m <= 0:
+        return list(range(n))
+
+    lat = np.asarray(lats, dtype=np.float64)
+    y = lat * _M_PER_DEG
+    x = np.asarray(lons, dtype=np.float64) * _M_PER_DEG * math.cos(math.radians(float(lat.mean())))
+
+    kept = np.zeros(n, dtype=bool)
+    kept[0] = kept[-1] = True
+    if keep is not None:
+        kept |= np.asarray(keep, dtype=bool)
+
+    anchors = np.flatnonzero(kept).tolist()
+    stack = list(zip(anchors[:-1], anchors[1:]))
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        px, py = x[start + 1:end] - x[start], y[start + 1:end] - y[start]
+        length = math.hypot(dx, dy)
+        if length == 0:
+            distances = np.hypot(px, py)
+        else:
+            distances = np.abs(px * dy - py * dx) / length
+        farthest = int(distances.argmax())
+        if distances[farthest] > tolerance_m:
+            split = start + 1 + farthest
+            kept[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+
+    return np.flatnonzero(kept).tolist()
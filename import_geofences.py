@@ -0,0 +1,116 @@
+"""Bulk-load geofences from a CSV, GeoJSON or GeoJSON-sequence file.
+
+The file is streamed in blocks through the same ``GeofenceImporter`` as
+``POST /api/v1/geofences/import``: records are validated in chunks, COPYed
+into a staging table and merged into ``geofences`` by name in one
+transaction. Running services rebuild their fence index once, on the change
+notification. Run from the repository root:
+
+    python import_geofences.py --input fences.geojson
+    python import_geofences.py --input fences.csv --replace --strict
+
+CSV files have a header with ``name`` and ``center_lat, center_lon,
+radius_km`` and/or ``polygon`` (a JSON ``[[lat, lon], ...]`` string).
+GeoJSON features need a ``name`` property and a Polygon geometry, or a
+Point geometry with a ``radius_km`` property.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+from typing import AsyncIterator
+
+from config.settings import settings
+from database.db_setup import DatabaseManager
+from repositories.geofence_repository import GeofenceRepository
+from services.geofence_import import IMPORT_FORMATS, GeofenceImporter, GeofenceImportError
+
+
+logger = logging.getLogger("import_geofences")
+
+READ_BLOCK_BYTES = 1024 * 1024
+
+_EXTENSION_FORMATS = {
+    ".csv": "csv",
+    ".geojson": "geojson",
+    ".json": "geojson",
+    ".geojsonl": "geojsonseq",
+    ".geojsons": "geojsonseq",
+    ".ndjson": "geojsonseq",
+}
+
+
+def infer_format(path: str) -> str:
+    """Import format from the file extension."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in _EXTENSION_FORMATS:
+        raise ValueError(f"cannot infer the format of {path}; pass --format")
+    return _EXTENSION_FORMATS[extension]
+
+
+async def read_blocks(path: str, block_size: int = READ_BLOCK_BYTES) -> AsyncIterator[bytes]:
+    """Yield the file in blocks, reading off the event loop."""
+    with open(path, "rb") as f:
+        while True:
+            block = await asyncio.to_thread(f.read, block_size)
+            if not block:
+                return
+            yield block
+
+
+async def main_async(args: argparse.Namespace) -> int:
+    db_manager = DatabaseManager(args.database_url)
+    await db_manager.create_pool()
+    try:
+        await db_manager.create_tables(postgis=settings.postgis_enabled)
+        importer = GeofenceImporter(GeofenceRepository(db_manager.pool), chunk_size=args.chunk_size)
+        try:
+            report = await importer.run(
+                read_blocks(args.input), args.format, replace=args.replace, strict=args.strict
+            )
+        except GeofenceImportError as e:
+            print(f"Import aborted, nothing changed: {e}", file=sys.stderr)
+            return 1
+    finally:
+        await db_manager.close_pool()
+
+    print(
+        f"{report['rows']} records: {report['loaded']} loaded, {report['rejected']} rejected; "
+        f"{report['inserted']} inserted, {report['updated']} updated, {report['deleted']} deleted"
+    )
+    print(
+        f"load {report['load_seconds']:.2f}s, merge {report['merge_seconds']:.2f}s "
+        f"({report['rows_per_second']:.0f} rows/s)"
+    )
+    for error in report["errors"]:
+        print(f"  record {error['row']}: {error['error']}")
+    if report["rejected"] > len(report["errors"]):
+        print(f"  ... and {report['rejected'] - len(report['errors'])} more")
+    return 0
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", required=True, help="CSV, GeoJSON or GeoJSON-sequence file of fences")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="default inferred from the file extension")
+    parser.add_argument("--replace", action="store_true", help="delete fences whose name is not in the file")
+    parser.add_argument("--strict", action="store_true", help="import nothing if any record is invalid")
+    parser.add_argument("--chunk-size", type=int, default=settings.geofence_import_chunk_size)
+    parser.add_argument("--database-url", default=settings.database_url)
+    args = parser.parse_args(argv)
+    if args.format is None:
+        try:
+            args.format = infer_format(args.input)
+        except ValueError as e:
+            parser.error(str(e))
+    return args
+
+
+def main(argv=None) -> int:
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    return asyncio.run(main_async(parse_args(argv)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,17 @@
 import logging
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 
 from config.settings import settings
-from database.db_setup import DatabaseManager
-from api.dependencies import get_geofence_service
-from api.routers import location, health
-from services.geofence_service import GeofenceService
+from api.dependecies import (
+    device_sequencer, fence_memberships, init_cold_start, init_database, init_event_publisher, init_geofence_cache,
+    init_location_history, init_outbox_dispatcher, init_state_buffer
+)
+from services.event_publisher import RedisEventPublisher
+from api.routers import geofences, health, history, ingest, location, metrics
 
-db_manager = DatabaseManager(settings.database_url)
+db_manager = init_database()
 
 logging.basicConfig(
     level=logging.INFO if not settings.debug else logging.DEBUG,
@@ -22,11 +25,58 @@ async def lifespan(app: FastAPI):
     """Application lifespan manager."""
     # Startup
     await db_manager.create_pool()
-    await db_manager.create_tables()
+    await db_manager.create_tables(postgis=settings.postgis_enabled)
+    app.state.db_pool = db_manager.pool
     logger.info("Database initialized successfully")
     
+    event_publisher = init_event_publisher()
+    if isinstance(event_publisher, RedisEventPublisher):
+        event_publisher.start()
+    
+    outbox_dispatcher = None
+    if settings.event_outbox:
+        outbox_dispatcher = init_outbox_dispatcher(db_manager.pool, event_publisher)
+        outbox_dispatcher.start()
+    
+    geofence_cache = init_geofence_cache(db_manager.pool)
+    await geofence_cache.start_listening(await db_manager.create_connection())
+    # From a snapshot the app serves at once and /ready waits for the catch-up.
+    cold_start = init_cold_start(db_manager.pool) if settings.snapshot_path else None
+    if cold_start is not None and cold_start.load(settings.snapshot_path):
+        cold_start.start()
+    else:
+        await geofence_cache.get_index()
+        if fence_memberships is not None:
+            fence_memberships.load(await geofence_cache.repository.get_fence_memberships())
+    
+    state_buffer = None
+    if settings.state_write_behind:
+        state_buffer = init_state_buffer(db_manager.pool)
+        state_buffer.start()
+    
+    location_history = None
+    if settings.location_history:
+        location_history = init_location_history(db_manager.pool)
+        await location_history.start()
+    
+    if device_sequencer is not None:
+        device_sequencer.start()
+    
     yield
     
+    if cold_start is not None:
+        await cold_start.close()
+    if device_sequencer is not None:
+        await device_sequencer.close()
+    if state_buffer is not None:
+        await state_buffer.close()
+    if location_history is not None:
+        await location_history.close()
+    if outbox_dispatcher is not None:
+        await outbox_dispatcher.close()
+    await geofence_cache.stop_listening()
+    if isinstance(event_publisher, RedisEventPublisher):
+        await event_publisher.close()
     await db_manager.close_pool()
     logger.info("Application shutdown complete")
 
@@ -38,16 +88,16 @@ def create_app() -> FastAPI:
         description="Service for monitoring device locations within geo-fenced areas",
         version=settings.app_version,
         lifespan=lifespan,
-        debug=settings.debug
+        debug=settings.debug,
+        default_response_class=ORJSONResponse
     )
     
-    def get_service() -> GeofenceService:
-        return get_geofence_service(db_manager.pool)
-    
-    location.router.dependencies = [Depends(get_service)]
-    
     app.include_router(health.router)
+    app.include_router(metrics.router)
     app.include_router(location.router)
+    app.include_router(ingest.router)
+    app.include_router(history.router)
+    app.include_router(geofences.router)
     
     return app
 
@@ -1,14 +1,69 @@
-from typing import Optional
-from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+from pydantic import BaseModel, Field, PrivateAttr, field_validator, model_validator
 
 
 class GeofenceModel(BaseModel):
-    """Model representing a geofence boundary."""
+    """Model representing a geofence boundary.
+    
+    A fence is a circle, or a polygon of (lat, lon) vertices when ``polygon``
+    is set; for polygons the circle fields always hold the enclosing circle
+    derived from the vertices, replacing any circle given with them, since
+    the grid index, batch prefilter and safe radius all trust that circle.
+    """
     id: int
     name: str
     center_lat: float = Field(..., ge=-90, le=90)
     center_lon: float = Field(..., ge=-180, le=180)
     radius_km: float = Field(..., gt=0)
+    polygon: Optional[List[Tuple[float, float]]] = None
+    
+    _prepared: Any = PrivateAttr(default=None)
+    
+    @model_validator(mode="before")
+    @classmethod
+    def derive_polygon_circle(cls, data: Any) -> Any:
+        if isinstance(data, dict) and data.get("polygon"):
+            from domain.polygon import bounding_circle
+            center_lat, center_lon, radius_km = bounding_circle(data["polygon"])
+            data = {**data, "center_lat": center_lat, "center_lon": center_lon, "radius_km": radius_km}
+        return data
+    
+    @field_validator("polygon")
+    @classmethod
+    def check_polygon(cls, polygon: Optional[List[Tuple[float, float]]]) -> Optional[List[Tuple[float, float]]]:
+        if polygon is None:
+            return None
+        if len(polygon) < 3:
+            raise ValueError("polygon needs at least 3 vertices")
+        for lat, lon in polygon:
+            if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                raise ValueError(f"polygon vertex ({lat}, {lon}) out of range")
+        return polygon
+
+
+class GeofenceInputModel(BaseModel):
+    """A geofence as submitted for creation, update or import, without an id.
+    
+    Validated like ``GeofenceModel``; a polygon fence's circle fields are
+    always filled with its enclosing circle, whatever was submitted.
+    """
+    name: str = Field(..., min_length=1, max_length=255)
+    center_lat: Optional[float] = None
+    center_lon: Optional[float] = None
+    radius_km: Optional[float] = None
+    polygon: Optional[List[Tuple[float, float]]] = None
+    
+    @model_validator(mode="after")
+    def complete_circle(self) -> "GeofenceInputModel":
+        fields = self.model_dump()
+        if self.polygon:
+            fields.update(center_lat=None, center_lon=None, radius_km=None)
+        fence = GeofenceModel(id=0, **fields)
+        self.center_lat = fence.center_lat
+        self.center_lon = fence.center_lon
+        self.radius_km = fence.radius_km
+        return self
 
 
 class DeviceLocationModel(BaseModel):
@@ -19,10 +74,21 @@ class DeviceLocationModel(BaseModel):
 
 
 class DeviceStateModel(BaseModel):
-    """Model representing device's last known state."""
+    """Model representing device's last known state.
+    
+    ``geofence_ids`` lists every fence containing the device, ascending;
+    rows written before it was stored get ``(last_geofence_id,)``.
+    """
     device_id: str
     last_lat: Optional[float]
     last_lon: Optional[float]
     is_inside_fence: bool
     last_geofence_id: Optional[int]
-    last_updated: Optional[str]
\ No newline at end of file
+    geofence_ids: Optional[Tuple[int, ...]] = None
+    last_updated: Optional[datetime]
+    
+    @model_validator(mode="after")
+    def default_geofence_ids(self) -> "DeviceStateModel":
+        if self.geofence_ids is None:
+            self.geofence_ids = () if self.last_geofence_id is None else (self.last_geofence_id,)
+        return self
\ No newline at end of file
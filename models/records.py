@@ -0,0 +1,122 @@
+from typing import AbstractSet, Any, List, Optional, Sequence, Tuple, Union
+
+from models.geofence import DeviceStateModel, GeofenceModel
+
+
+def membership(
+    geofence_id: Optional[int],
+    geofence_ids: Optional[Sequence[int]] = None
+) -> Tuple[int, ...]:
+    """Sorted ids of the fences containing a device.
+
+    States written before fence sets were tracked only have
+    ``geofence_id``; it stands for a set of one.
+    """
+    if geofence_ids is not None:
+        return tuple(geofence_ids)
+    return () if geofence_id is None else (geofence_id,)
+
+
+def without_geofences(geofence_ids: Sequence[int], removed: AbstractSet[int]) -> Tuple[int, ...]:
+    """A membership with deleted fences dropped, as the fence delete does in Postgres."""
+    return tuple(i for i in geofence_ids if i not in removed)
+
+
+class GeofenceRecord:
+    """Compact fence used by the fence index and containment checks.
+
+    Same attributes as ``GeofenceModel`` without validation or pydantic's
+    per-instance overhead, for fences that were validated when written:
+    rows read back from the table and fences mapped from a shared index.
+    ``_prepared`` holds the compiled polygon once one is needed.
+    """
+    __slots__ = ("id", "name", "center_lat", "center_lon", "radius_km", "polygon", "_prepared")
+
+    def __init__(
+        self,
+        id: int,
+        name: str,
+        center_lat: float,
+        center_lon: float,
+        radius_km: float,
+        polygon: Optional[List[Tuple[float, float]]] = None
+    ):
+        self.id = id
+        self.name = name
+        self.center_lat = center_lat
+        self.center_lon = center_lon
+        self.radius_km = radius_km
+        self.polygon = polygon
+        self._prepared: Any = None
+
+    def __repr__(self) -> str:
+        return (
+            f"GeofenceRecord(id={self.id}, name={self.name!r}, center_lat={self.center_lat}, "
+            f"center_lon={self.center_lon}, radius_km={self.radius_km}, "
+            f"polygon={'None' if self.polygon is None else f'<{len(self.polygon)} vertices>'})"
+        )
+
+    @classmethod
+    def from_model(cls, fence: GeofenceModel) -> "GeofenceRecord":
+        return cls(fence.id, fence.name, fence.center_lat, fence.center_lon, fence.radius_km, fence.polygon)
+
+
+class DeviceStateRecord:
+    """Compact, mutable device state used by in-process caches and buffers.
+
+    Exposes the same attributes the service reads from ``DeviceStateModel``
+    without pydantic's per-instance overhead. ``geofence_ids`` is the sorted
+    tuple of every fence containing the device (the shared empty tuple when
+    it is in none); ``last_geofence_id`` is the one reported as its fence.
+    ``safe_radius_km`` is how far the device may move from (last_lat,
+    last_lon) without changing fence membership, valid for fence set
+    ``fence_generation``; 0 means unknown.
+    """
+    __slots__ = (
+        "device_id", "last_lat", "last_lon",
+        "is_inside_fence", "last_geofence_id", "geofence_ids", "cached_at",
+        "safe_radius_km", "fence_generation"
+    )
+
+    def __init__(
+        self,
+        device_id: str,
+        last_lat: Optional[float],
+        last_lon: Optional[float],
+        is_inside_fence: bool,
+        last_geofence_id: Optional[int],
+        geofence_ids: Optional[Sequence[int]] = None,
+        cached_at: float = 0.0
+    ):
+        self.device_id = device_id
+        self.last_lat = last_lat
+        self.last_lon = last_lon
+        self.is_inside_fence = is_inside_fence
+        self.last_geofence_id = last_geofence_id
+        self.geofence_ids = membership(last_geofence_id, geofence_ids)
+        self.cached_at = cached_at
+        self.safe_radius_km = 0.0
+        self.fence_generation = -1
+
+    def __repr__(self) -> str:
+        return (
+            f"DeviceStateRecord(device_id={self.device_id!r}, last_lat={self.last_lat}, "
+            f"last_lon={self.last_lon}, is_inside_fence={self.is_inside_fence}, "
+            f"last_geofence_id={self.last_geofence_id}, geofence_ids={self.geofence_ids})"
+        )
+
+    @classmethod
+    def from_model(cls, state: DeviceStateModel, cached_at: float = 0.0) -> "DeviceStateRecord":
+        return cls(
+            state.device_id,
+            state.last_lat,
+            state.last_lon,
+            state.is_inside_fence,
+            state.last_geofence_id,
+            state.geofence_ids,
+            cached_at
+        )
+
+
+DeviceState = Union[DeviceStateModel, DeviceStateRecord]
+Geofence = Union[GeofenceModel, GeofenceRecord]
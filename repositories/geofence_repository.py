@@ -1,38 +1,663 @@
+import asyncio
 import asyncpg
-from typing import List, Optional
-from models.geofence import GeofenceModel, DeviceStateModel
+import orjson
+import re
+from contextlib import asynccontextmanager, nullcontext
+from datetime import date, datetime, timedelta
+from time import perf_counter_ns
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+from domain.spatial_index import EARTH_RADIUS_KM
+from models.geofence import GeofenceInputModel, GeofenceModel
+from models.records import DeviceStateRecord, GeofenceRecord, membership
+from services.metrics import registry
+
+
+_POOL_ACQUIRE = registry.histogram(
+    "geofence_db_pool_acquire_seconds", "Time waiting for a pooled connection."
+)
+# Called with every pool acquire wait in ns, e.g. by the admission controller.
+pool_wait_listeners: List[Callable[[int], None]] = []
+
+
+_POOL_TIMEOUTS = registry.counter(
+    "geofence_db_pool_acquire_timeouts_total", "Pool acquires that gave up after the acquire timeout."
+)
+_CONNECTION_REUSES = registry.counter(
+    "geofence_db_connection_reuses_total", "Repository calls served by their request's connection."
+)
+
+
+def _observe_pool_wait(elapsed_ns: int) -> None:
+    _POOL_ACQUIRE.observe_ns(elapsed_ns)
+    for listener in pool_wait_listeners:
+        listener(elapsed_ns)
+
+
+async def _acquire_from(pool: asyncpg.Pool, timeout: Optional[float]) -> asyncpg.Connection:
+    start = perf_counter_ns()
+    try:
+        conn = await pool.acquire(timeout=timeout)
+    except asyncio.TimeoutError:
+        _POOL_TIMEOUTS.inc()
+        raise
+    _observe_pool_wait(perf_counter_ns() - start)
+    return conn
+
+
+class RequestConnection:
+    """One pooled connection shared by the repository calls of a request.
+
+    It is acquired on first use, so requests answered from caches take none,
+    and released when the request ends. Calls take turns on it; a call still
+    running at that point (sequenced work of a client that went away)
+    releases it when it finishes.
+    """
+
+    def __init__(self, pool: asyncpg.Pool, timeout: Optional[float] = None):
+        self.pool = pool
+        self.timeout = timeout
+        self._conn: Optional[asyncpg.Connection] = None
+        self._lock = asyncio.Lock()
+        self._closed = False
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[asyncpg.Connection]:
+        async with self._lock:
+            if self._conn is not None and self._conn.is_closed():
+                await self._release()
+            if self._conn is None:
+                self._conn = await _acquire_from(self.pool, self.timeout)
+            else:
+                _CONNECTION_REUSES.inc()
+            try:
+                yield self._conn
+            finally:
+                if self._closed:
+                    await self._release()
+
+    async def _release(self) -> None:
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            await self.pool.release(conn)
+
+    async def close(self) -> None:
+        """Release the connection now, or after the call holding it."""
+        self._closed = True
+        if not self._lock.locked():
+            await self._release()
+
+
+def _geofence_from_row(row: asyncpg.Record) -> GeofenceModel:
+    return GeofenceModel(**{
+        **dict(row),
+        "polygon": orjson.loads(row["polygon"]) if row["polygon"] else None
+    })
+
+
+def _fence_record_from_row(row: asyncpg.Record) -> GeofenceRecord:
+    """Slotted fence from a table row; the values were validated when written."""
+    polygon = row["polygon"]
+    return GeofenceRecord(
+        row["id"], row["name"],
+        float(row["center_lat"]), float(row["center_lon"]), float(row["radius_km"]),
+        [tuple(vertex) for vertex in orjson.loads(polygon)] if polygon else None
+    )
+
+
+def _state_from_row(row: asyncpg.Record) -> DeviceStateRecord:
+    lat, lon = row["last_lat"], row["last_lon"]
+    return DeviceStateRecord(
+        row["device_id"],
+        None if lat is None else float(lat),
+        None if lon is None else float(lon),
+        row["is_inside_fence"],
+        row["last_geofence_id"],
+        row["geofence_ids"]
+    )
+
+
+def _geofence_values(fence: GeofenceInputModel) -> Tuple[Any, ...]:
+    """(name, center_lat, center_lon, radius_km, polygon) as written to the table."""
+    return (
+        fence.name, fence.center_lat, fence.center_lon, fence.radius_km,
+        orjson.dumps(fence.polygon).decode() if fence.polygon else None
+    )
+
+
+def _row_count(status: str) -> int:
+    """Rows affected, from a command status such as ``UPDATE 3``."""
+    return int(status.rsplit(" ", 1)[-1])
+
+
+_QUERY = registry.histograms(
+    "geofence_db_query_seconds", "Database round trip per repository query.", "query",
+    (
+        "get_all_geofences", "get_device_state", "get_device_states",
+        "update_device_state", "update_device_states", "get_geofence_version",
+        "check_device_location", "insert_outbox_events", "dispatch_outbox",
+        "copy_location_history", "get_location_track", "get_geofence", "list_geofences",
+        "write_geofence", "copy_geofence_import", "merge_geofence_import",
+        "read_snapshot", "get_device_states_since", "get_fence_memberships"
+    )
+)
+_MODELS = registry.histograms(
+    "geofence_db_model_build_seconds", "Building models from fetched rows.", "model",
+    ("geofences", "device_states")
+)
+
+_HAVERSINE_KM = (
+    f"2 * {EARTH_RADIUS_KM} * asin(LEAST(1, sqrt("
+    "power(sin(radians(g.center_lat::float8 - $2::float8) / 2), 2)"
+    " + cos(radians($2::float8)) * cos(radians(g.center_lat::float8))"
+    " * power(sin(radians(g.center_lon::float8 - $3::float8) / 2), 2))))"
+)
+
+# GiST-indexed envelope prefilter, see DatabaseManager._create_postgis_index.
+_ENVELOPE_MATCH = (
+    "geofence_envelope(g.center_lat::float8, g.center_lon::float8, g.radius_km::float8)"
+    " && ST_SetSRID(ST_MakePoint($3::float8, $2::float8), 4326)\n            AND "
+)
+
+# Queues the fence events of the check, with the payloads
+# GeoEventData.create_fence_exit_event / create_fence_enter_event would build.
+_OUTBOX_CHANGES = """
+    outbox AS (
+        INSERT INTO event_outbox (event_type, device_id, payload)
+        SELECT changes.event_type, $1::varchar, jsonb_build_object(
+            'event_type', changes.event_type,
+            'device_id', $1::varchar,
+            'latitude', $2::float8,
+            'longitude', $3::float8,
+            'geofence_id', changes.geofence_id,
+            'geofence_name', changes.geofence_name,
+            'timestamp', to_char(NOW() AT TIME ZONE 'UTC', 'YYYY-MM-DD"T"HH24:MI:SS.US"Z"')
+        )
+        FROM changes
+        ORDER BY changes.kind, changes.geofence_id
+    ),"""
+
+_INSERT_OUTBOX_SQL = """
+    INSERT INTO event_outbox (event_type, device_id, payload)
+    SELECT * FROM unnest($1::varchar[], $2::varchar[], $3::jsonb[])
+"""
+
+# Claims the oldest events no other dispatcher holds; they are deleted when
+# the transaction commits and come back if it rolls back.
+_DISPATCH_OUTBOX_SQL = """
+    DELETE FROM event_outbox
+    WHERE id IN (
+        SELECT id FROM event_outbox
+        ORDER BY id
+        LIMIT $1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, payload, EXTRACT(EPOCH FROM clock_timestamp() - created_at)::float8 AS lag_seconds
+"""
+
+HISTORY_COLUMNS = ("device_id", "recorded_at", "lat", "lon", "is_inside_fence", "geofence_id")
+
+_HISTORY_PARTITION = re.compile(r"^location_history_p(\d{8})$")
+
+_GEOFENCE_COLUMNS = "id, name, center_lat, center_lon, radius_km, polygon"
+_STATE_COLUMNS = (
+    "device_id, last_lat, last_lon, is_inside_fence, last_geofence_id, geofence_ids, last_updated"
+)
+
+# Per-fix statements, run by their SQL text so that each pooled connection's
+# statement cache prepares them once (see database.db_setup).
+_GET_DEVICE_STATE_SQL = f"SELECT {_STATE_COLUMNS} FROM device_states WHERE device_id = $1"
+_GET_DEVICE_STATES_SQL = (
+    f"SELECT {_STATE_COLUMNS} FROM device_states WHERE device_id = ANY($1::varchar[])"
+)
+_UPSERT_STATE_UPDATE = """
+    ON CONFLICT (device_id) DO UPDATE SET
+        last_lat = EXCLUDED.last_lat,
+        last_lon = EXCLUDED.last_lon,
+        is_inside_fence = EXCLUDED.is_inside_fence,
+        last_geofence_id = EXCLUDED.last_geofence_id,
+        geofence_ids = EXCLUDED.geofence_ids,
+        last_updated = EXCLUDED.last_updated
+"""
+_UPSERT_DEVICE_STATE_SQL = f"""
+    INSERT INTO device_states
+    (device_id, last_lat, last_lon, is_inside_fence, last_geofence_id,
+     geofence_ids, last_updated)
+    VALUES ($1, $2, $3, $4, $5, $6, NOW())
+    {_UPSERT_STATE_UPDATE}
+"""
+_UPSERT_DEVICE_STATES_SQL = f"""
+    INSERT INTO device_states
+    (device_id, last_lat, last_lon, is_inside_fence, last_geofence_id,
+     geofence_ids, last_updated)
+    SELECT device_id, last_lat, last_lon, is_inside_fence, last_geofence_id,
+           geofence_ids::int[], NOW()
+    FROM unnest(
+        $1::varchar[], $2::float8[], $3::float8[], $4::bool[], $5::int[], $6::text[]
+    ) AS t(device_id, last_lat, last_lon, is_inside_fence, last_geofence_id, geofence_ids)
+    {_UPSERT_STATE_UPDATE}
+"""
+_GEOFENCE_VERSION_SQL = "SELECT version FROM geofence_version WHERE id"
+
+# Removes deleted fences ($1) from the device states that reference them, so
+# the foreign key holds; the reported fence becomes the lowest remaining id.
+_RELEASE_GEOFENCES_SQL = """
+    UPDATE device_states s SET
+        geofence_ids = kept.ids,
+        last_geofence_id = kept.ids[1],
+        is_inside_fence = cardinality(kept.ids) > 0
+    FROM (
+        SELECT device_id, ARRAY(
+            SELECT id FROM unnest(COALESCE(geofence_ids, ARRAY[last_geofence_id])) AS id
+            WHERE id IS NOT NULL AND id <> ALL($1::int[])
+            ORDER BY id
+        ) AS ids
+        FROM device_states
+        WHERE COALESCE(geofence_ids, ARRAY[last_geofence_id]) && $1::int[]
+    ) AS kept
+    WHERE s.device_id = kept.device_id
+"""
+
+# Staged import rows update the fences with the same name and are inserted
+# otherwise; unchanged fences are not rewritten.
+_MERGE_IMPORT_UPDATE_SQL = """
+    UPDATE geofences g SET
+        center_lat = i.center_lat,
+        center_lon = i.center_lon,
+        radius_km = i.radius_km,
+        polygon = i.polygon
+    FROM geofence_import i
+    WHERE g.name = i.name
+        AND (g.center_lat, g.center_lon, g.radius_km, g.polygon) IS DISTINCT FROM (
+            i.center_lat::DECIMAL(10, 8), i.center_lon::DECIMAL(11, 8),
+            i.radius_km::DECIMAL(10, 3), i.polygon
+        )
+"""
+
+_MERGE_IMPORT_INSERT_SQL = """
+    INSERT INTO geofences (name, center_lat, center_lon, radius_km, polygon)
+    SELECT i.name, i.center_lat, i.center_lon, i.radius_km, i.polygon
+    FROM geofence_import i
+    WHERE NOT EXISTS (SELECT 1 FROM geofences g WHERE g.name = i.name)
+"""
+
+# Takes the last fix of every time bucket plus each fix whose fence
+# membership differs from the fix before it, so downsampling never hides an
+# enter or exit. The window runs in Postgres; only the kept rows are sent.
+_TRACK_SQL = """
+    WITH fixes AS (
+        SELECT recorded_at, lat, lon, is_inside_fence, geofence_id,
+               (is_inside_fence, geofence_id) IS DISTINCT FROM
+                   (LAG(is_inside_fence) OVER w, LAG(geofence_id) OVER w) AS transition,
+               ROW_NUMBER() OVER (
+                   PARTITION BY floor(extract(epoch FROM recorded_at - $2::timestamptz) / $4::float8)
+                   ORDER BY recorded_at DESC
+               ) AS from_bucket_end,
+               COUNT(*) OVER () AS total
+        FROM location_history
+        WHERE device_id = $1 AND recorded_at >= $2 AND recorded_at < $3
+        WINDOW w AS (ORDER BY recorded_at)
+    )
+    SELECT recorded_at, lat, lon, is_inside_fence, geofence_id, transition, total
+    FROM fixes
+    WHERE transition OR from_bucket_end = 1
+    ORDER BY recorded_at
+"""
+
+# Reads the previous state, finds every containing fence, diffs the two
+# fence sets into exit and enter changes, upserts the new state and returns
+# all of it. The reported fence is the lowest id, as with the calculator over
+# the id-ordered list from get_all_geofences. Every CTE sees the snapshot taken before the
+# upsert.
+_CHECK_LOCATION_SQL = """
+    WITH previous AS (
+        SELECT COALESCE(
+            s.geofence_ids,
+            CASE WHEN s.last_geofence_id IS NULL THEN '{{}}'::int[] ELSE ARRAY[s.last_geofence_id] END
+        ) AS geofence_ids
+        FROM device_states s
+        WHERE s.device_id = $1::varchar
+    ),
+    hits AS (
+        SELECT g.id, g.name
+        FROM geofences g
+        WHERE {envelope_match}{haversine} <= g.radius_km::float8
+            AND (g.polygon IS NULL OR geofence_polygon_contains(g.polygon, $2::float8, $3::float8))
+    ),
+    membership AS (
+        SELECT COALESCE(array_agg(id ORDER BY id), '{{}}'::int[]) AS geofence_ids,
+               COALESCE(array_agg(name ORDER BY id), '{{}}'::varchar[]) AS geofence_names
+        FROM hits
+    ),
+    changes AS (
+        SELECT 'fence_exit' AS event_type, 0 AS kind, p.id AS geofence_id, g.name AS geofence_name
+        FROM previous
+        CROSS JOIN LATERAL unnest(previous.geofence_ids) AS p(id)
+        LEFT JOIN geofences g ON g.id = p.id
+        WHERE p.id NOT IN (SELECT id FROM hits)
+        UNION ALL
+        SELECT 'fence_enter', 1, hits.id, hits.name
+        FROM hits, previous
+        WHERE NOT hits.id = ANY(previous.geofence_ids)
+    ),{outbox}
+    upsert AS (
+        INSERT INTO device_states 
+        (device_id, last_lat, last_lon, is_inside_fence, last_geofence_id, geofence_ids, last_updated)
+        SELECT $1::varchar, $2::float8, $3::float8,
+               cardinality(geofence_ids) > 0, geofence_ids[1], geofence_ids, NOW()
+        FROM membership
+        ON CONFLICT (device_id) DO UPDATE SET
+            last_lat = EXCLUDED.last_lat,
+            last_lon = EXCLUDED.last_lon,
+            is_inside_fence = EXCLUDED.is_inside_fence,
+            last_geofence_id = EXCLUDED.last_geofence_id,
+            geofence_ids = EXCLUDED.geofence_ids,
+            last_updated = EXCLUDED.last_updated
+        RETURNING is_inside_fence, last_geofence_id, geofence_ids
+    )
+    SELECT previous.geofence_ids AS previous_geofence_ids,
+           upsert.geofence_ids,
+           upsert.is_inside_fence,
+           upsert.last_geofence_id AS geofence_id,
+           membership.geofence_names[1] AS geofence_name,
+           membership.geofence_names,
+           (
+               SELECT jsonb_agg(jsonb_build_object(
+                   'event_type', event_type,
+                   'geofence_id', geofence_id,
+                   'geofence_name', geofence_name
+               ) ORDER BY kind, geofence_id)
+               FROM changes
+           ) AS changes
+    FROM upsert
+    CROSS JOIN membership
+    LEFT JOIN previous ON TRUE
+"""
 
 
 class GeofenceRepository:
-    """Repository for geofence and device state data access."""
+    """Repository for geofence and device state data access.
+    
+    Every query records pool acquire, round trip and model construction
+    times in the process-wide metrics registry.
+    
+    State writes accept the events they cause and insert them into
+    ``event_outbox`` in the same transaction. With ``outbox`` the
+    single-statement check queues its enter and exit events the same way.
+    """
     
-    def __init__(self, db_pool: asyncpg.Pool):
+    def __init__(
+        self,
+        db_pool: asyncpg.Pool,
+        postgis: bool = False,
+        outbox: bool = False,
+        acquire_timeout: Optional[float] = None
+    ):
         self.db_pool = db_pool
+        self.postgis = postgis
+        self.outbox = outbox
+        self.acquire_timeout = acquire_timeout
+        self._request_connection: Optional[RequestConnection] = None
+        self._check_location_sql = _CHECK_LOCATION_SQL.format(
+            envelope_match=_ENVELOPE_MATCH if postgis else "",
+            haversine=_HAVERSINE_KM,
+            outbox=_OUTBOX_CHANGES if outbox else ""
+        )
+    
+    @asynccontextmanager
+    async def _acquire(self) -> AsyncIterator[asyncpg.Connection]:
+        """A pooled connection, or the request's connection inside ``request_scope``."""
+        if self._request_connection is not None:
+            async with self._request_connection.acquire() as conn:
+                yield conn
+            return
+        conn = await _acquire_from(self.db_pool, self.acquire_timeout)
+        try:
+            yield conn
+        finally:
+            await self.db_pool.release(conn)
+    
+    @asynccontextmanager
+    async def request_scope(self) -> AsyncIterator["GeofenceRepository"]:
+        """Serve every call made inside from one connection, acquired on first use."""
+        self._request_connection = RequestConnection(self.db_pool, self.acquire_timeout)
+        try:
+            yield self
+        finally:
+            request_connection, self._request_connection = self._request_connection, None
+            await request_connection.close()
     
-    async def get_all_geofences(self) -> List[GeofenceModel]:
-        """Retrieve all geofences from database."""
-        async with self.db_pool.acquire() as conn:
+    async def get_all_geofences(self) -> List[GeofenceRecord]:
+        """Retrieve all geofences in id order, as slotted records for the fence index.
+
+        The order makes the first containing fence, which the service reports,
+        the lowest id, as in the single-query check.
+        """
+        async with self._acquire() as conn:
+            acquired = perf_counter_ns()
+            rows = await conn.fetch(f"SELECT {_GEOFENCE_COLUMNS} FROM geofences ORDER BY id")
+            fetched = perf_counter_ns()
+            _QUERY["get_all_geofences"].observe_ns(fetched - acquired)
+        
+        geofences = [_fence_record_from_row(row) for row in rows]
+        _MODELS["geofences"].observe_ns(perf_counter_ns() - fetched)
+        return geofences
+    
+    async def get_geofence(self, geofence_id: int) -> Optional[GeofenceModel]:
+        """Get one geofence by id."""
+        async with self._acquire() as conn:
+            acquired = perf_counter_ns()
+            row = await conn.fetchrow(
+                f"SELECT {_GEOFENCE_COLUMNS} FROM geofences WHERE id = $1", geofence_id
+            )
+            _QUERY["get_geofence"].observe_ns(perf_counter_ns() - acquired)
+        return _geofence_from_row(row) if row else None
+    
+    async def list_geofences(self, after_id: int = 0, limit: int = 1000) -> List[GeofenceModel]:
+        """Geofences with ids above ``after_id``, in id order (keyset pagination)."""
+        async with self._acquire() as conn:
+            acquired = perf_counter_ns()
             rows = await conn.fetch(
-                "SELECT id, name, center_lat, center_lon, radius_km FROM geofences"
+                f"SELECT {_GEOFENCE_COLUMNS} FROM geofences WHERE id > $1 ORDER BY id LIMIT $2",
+                after_id, limit
             )
-            return [GeofenceModel(**dict(row)) for row in rows]
+            _QUERY["list_geofences"].observe_ns(perf_counter_ns() - acquired)
+        return [_geofence_from_row(row) for row in rows]
     
-    async def get_device_state(self, device_id: str) -> Optional[DeviceStateModel]:
-        """Get the last known state of a device."""
-        async with self.db_pool.acquire() as conn:
+    async def create_geofence(self, fence: GeofenceInputModel) -> GeofenceModel:
+        """Insert a geofence and return it with its id."""
+        async with self._acquire() as conn:
+            acquired = perf_counter_ns()
             row = await conn.fetchrow(
-                """
-                SELECT device_id, last_lat, last_lon, is_inside_fence, 
-                       last_geofence_id, last_updated
-                FROM device_states 
-                WHERE device_id = $1
+                f"""
+                INSERT INTO geofences (name, center_lat, center_lon, radius_km, polygon)
+                VALUES ($1, $2, $3, $4, $5)
+                RETURNING {_GEOFENCE_COLUMNS}
+                """,
+                *_geofence_values(fence)
+            )
+            _QUERY["write_geofence"].observe_ns(perf_counter_ns() - acquired)
+        return _geofence_from_row(row)
+    
+    async def update_geofence(self, geofence_id: int, fence: GeofenceInputModel) -> Optional[GeofenceModel]:
+        """Replace a geofence's name and shape; None if it does not exist."""
+        async with self._acquire() as conn:
+            acquired = perf_counter_ns()
+            row = await conn.fetchrow(
+                f"""
+                UPDATE geofences SET
+                    name = $2, center_lat = $3, center_lon = $4, radius_km = $5, polygon = $6
+                WHERE id = $1
+                RETURNING {_GEOFENCE_COLUMNS}
                 """,
-                device_id
+                geofence_id, *_geofence_values(fence)
             )
-            
-            if row:
-                return DeviceStateModel(**dict(row))
-            return None
+            _QUERY["write_geofence"].observe_ns(perf_counter_ns() - acquired)
+        return _geofence_from_row(row) if row else None
+    
+    async def delete_geofence(self, geofence_id: int) -> bool:
+        """Delete a geofence and drop it from device states; False if it did not exist."""
+        async with self._acquire() as conn:
+            acquired = perf_counter_ns()
+            async with conn.transaction():
+                await conn.execute(_RELEASE_GEOFENCES_SQL, [geofence_id])
+                status = await conn.execute("DELETE FROM geofences WHERE id = $1", geofence_id)
+            _QUERY["write_geofence"].observe_ns(perf_counter_ns() - acquired)
+        return _row_count(status) > 0
+    
+    @staticmethod
+    async def create_geofence_staging(conn: asyncpg.Connection) -> None:
+        """Create the ``geofence_import`` staging table, dropped at commit."""
+        await conn.execute("""
+            CREATE TEMP TABLE geofence_import (
+                name VARCHAR(255) NOT NULL,
+                center_lat DOUBLE PRECISION NOT NULL,
+                center_lon DOUBLE PRECISION NOT NULL,
+                radius_km DOUBLE PRECISION NOT NULL,
+                polygon JSONB
+            ) ON COMMIT DROP
+        """)
+    
+    @staticmethod
+    async def copy_geofence_staging(conn: asyncpg.Connection, fences: Sequence[GeofenceInputModel]) -> None:
+        """COPY validated fences into the staging table, inside the caller's transaction."""
+        start = perf_counter_ns()
+        await conn.copy_records_to_table(
+            "geofence_import",
+            records=[_geofence_values(fence) for fence in fences],
+            columns=["name", "center_lat", "center_lon", "radius_km", "polygon"]
+        )
+        _QUERY["copy_geofence_import"].observe_ns(perf_counter_ns() - start)
+    
+    @staticmethod
+    async def merge_geofence_staging(conn: asyncpg.Connection, replace: bool = False) -> Dict[str, int]:
+        """Merge the staging table into ``geofences`` by name.
+        
+        Fences keep their ids when their name is imported again. With
+        ``replace`` fences whose name is not in the import are deleted too.
+        Must run in the transaction that filled the staging table; the table
+        lock serializes concurrent imports against each other and CRUD writes.
+        """
+        start = perf_counter_ns()
+        await conn.execute("LOCK TABLE geofences IN SHARE ROW EXCLUSIVE MODE")
+        deleted = 0
+        if replace:
+            removed = await conn.fetchval("""
+                SELECT COALESCE(array_agg(id), '{}'::int[]) FROM geofences g
+                WHERE NOT EXISTS (SELECT 1 FROM geofence_import i WHERE i.name = g.name)
+            """)
+            if removed:
+                await conn.execute(_RELEASE_GEOFENCES_SQL, removed)
+                deleted = _row_count(await conn.execute(
+                    "DELETE FROM geofences WHERE id = ANY($1::int[])", removed
+                ))
+        updated = _row_count(await conn.execute(_MERGE_IMPORT_UPDATE_SQL))
+        inserted = _row_count(await conn.execute(_MERGE_IMPORT_INSERT_SQL))
+        _QUERY["merge_geofence_import"].observe_ns(perf_counter_ns() - start)
+        return {"inserted": inserted, "updated": updated, "deleted": deleted}
+    
+    async def get_device_state(self, device_id: str) -> Optional[DeviceStateRecord]:
+        """Get the last known state of a device."""
+        async with self._acquire() as conn:
+            acquired = perf_counter_ns()
+            row = await conn.fetchrow(_GET_DEVICE_STATE_SQL, device_id)
+            fetched = perf_counter_ns()
+            _QUERY["get_device_state"].observe_ns(fetched - acquired)
+        
+        if row:
+            state = _state_from_row(row)
+            _MODELS["device_states"].observe_ns(perf_counter_ns() - fetched)
+            return state
+        return None
+    
+    async def get_device_states(self, device_ids: Sequence[str]) -> Dict[str, DeviceStateRecord]:
+        """Get the last known states of several devices in one query."""
+        async with self._acquire() as conn:
+            acquired = perf_counter_ns()
+            rows = await conn.fetch(_GET_DEVICE_STATES_SQL, list(device_ids))
+            fetched = perf_counter_ns()
+            _QUERY["get_device_states"].observe_ns(fetched - acquired)
+        
+        states = {row["device_id"]: _state_from_row(row) for row in rows}
+        _MODELS["device_states"].observe_ns(perf_counter_ns() - fetched)
+        return states
+    
+    async def get_device_states_since(self, since: datetime, limit: int = 100000) -> List[DeviceStateRecord]:
+        """States written at or after ``since``, newest first.
+        
+        ``last_updated`` is deliberately unindexed (an index would stop the
+        state upserts from being HOT updates), so this scans the table; it
+        is meant for the one catch-up read after a snapshot load.
+        """
+        async with self._acquire() as conn:
+            acquired = perf_counter_ns()
+            rows = await conn.fetch(
+                f"""
+                SELECT {_STATE_COLUMNS}
+                FROM device_states
+                WHERE last_updated >= $1
+                ORDER BY last_updated DESC
+                LIMIT $2
+                """,
+                since, limit
+            )
+            fetched = perf_counter_ns()
+            _QUERY["get_device_states_since"].observe_ns(fetched - acquired)
+        
+        states = [_state_from_row(row) for row in rows]
+        _MODELS["device_states"].observe_ns(perf_counter_ns() - fetched)
+        return states
+    
+    async def get_fence_memberships(self) -> List[Tuple[str, Tuple[int, ...]]]:
+        """(device id, fence ids) of every device inside at least one fence.
+        
+        A full scan of ``device_states``, read once to seed the in-memory
+        fence membership index.
+        """
+        async with self._acquire() as conn:
+            acquired = perf_counter_ns()
+            rows = await conn.fetch(
+                """
+                SELECT device_id, last_geofence_id, geofence_ids
+                FROM device_states
+                WHERE is_inside_fence
+                """
+            )
+            _QUERY["get_fence_memberships"].observe_ns(perf_counter_ns() - acquired)
+        
+        return [
+            (row["device_id"], membership(row["last_geofence_id"], row["geofence_ids"]))
+            for row in rows
+        ]
+    
+    async def read_snapshot(
+        self, max_states: int = 0
+    ) -> Tuple[int, datetime, List[GeofenceRecord], List[DeviceStateRecord]]:
+        """Fence version, database time, fences and the most recent states, read consistently.
+        
+        Everything is read in one repeatable-read transaction, so the fences
+        are exactly those of the returned version. The time is the
+        transaction start, comparable with ``last_updated``.
+        """
+        async with self._acquire() as conn:
+            acquired = perf_counter_ns()
+            async with conn.transaction(isolation="repeatable_read", readonly=True):
+                version = await conn.fetchval("SELECT version FROM geofence_version WHERE id")
+                as_of = await conn.fetchval("SELECT LOCALTIMESTAMP")
+                fence_rows = await conn.fetch(f"SELECT {_GEOFENCE_COLUMNS} FROM geofences")
+                state_rows = []
+                if max_states > 0:
+                    state_rows = await conn.fetch(
+                        f"SELECT {_STATE_COLUMNS} FROM device_states ORDER BY last_updated DESC LIMIT $1",
+                        max_states
+                    )
+            _QUERY["read_snapshot"].observe_ns(perf_counter_ns() - acquired)
+        
+        return (
+            version or 0,
+            as_of,
+            [_fence_record_from_row(row) for row in fence_rows],
+            [_state_from_row(row) for row in state_rows]
+        )
     
     async def update_device_state(
         self, 
@@ -40,21 +665,178 @@ class GeofenceRepository:
         lat: float, 
         lon: float, 
         is_inside_fence: bool,
-        geofence_id: Optional[int] = None
+        geofence_id: Optional[int] = None,
+        geofence_ids: Optional[Sequence[int]] = None,
+        events: Optional[Sequence[Dict[str, Any]]] = None
     ) -> None:
-        """Update or insert device state."""
-        async with self.db_pool.acquire() as conn:
-            await conn.execute(
-                """
-                INSERT INTO device_states 
-                (device_id, last_lat, last_lon, is_inside_fence, last_geofence_id, last_updated)
-                VALUES ($1, $2, $3, $4, $5, NOW())
-                ON CONFLICT (device_id) DO UPDATE SET
-                    last_lat = EXCLUDED.last_lat,
-                    last_lon = EXCLUDED.last_lon,
-                    is_inside_fence = EXCLUDED.is_inside_fence,
-                    last_geofence_id = EXCLUDED.last_geofence_id,
-                    last_updated = EXCLUDED.last_updated
-                """,
-                device_id, lat, lon, is_inside_fence, geofence_id
-            )
\ No newline at end of file
+        """Update or insert device state, queueing ``events`` atomically with it.
+        
+        ``geofence_ids`` defaults to ``geofence_id`` alone.
+        """
+        async with self._acquire() as conn:
+            acquired = perf_counter_ns()
+            # Only writes that carry events pay for an explicit transaction.
+            async with conn.transaction() if events else nullcontext():
+                await conn.execute(
+                    _UPSERT_DEVICE_STATE_SQL, device_id, lat, lon, is_inside_fence, geofence_id,
+                    list(membership(geofence_id, geofence_ids))
+                )
+                _QUERY["update_device_state"].observe_ns(perf_counter_ns() - acquired)
+                if events:
+                    await self._insert_outbox_events(conn, events)
+    
+    async def update_device_states(
+        self, 
+        states: Sequence[Tuple[str, float, float, bool, Optional[int], Sequence[int]]],
+        events: Optional[Sequence[Dict[str, Any]]] = None
+    ) -> None:
+        """Upsert several device states in one statement.
+        
+        Each entry is (device_id, lat, lon, is_inside_fence, geofence_id,
+        geofence_ids); device ids must be unique within the call. ``events``
+        are queued in the same transaction.
+        """
+        if not states:
+            return
+        
+        device_ids, lats, lons, inside, geofence_ids, memberships = zip(*states)
+        # unnest cannot take ragged arrays, so each set travels as an array literal.
+        membership_literals = ["{" + ",".join(map(str, ids)) + "}" for ids in memberships]
+        async with self._acquire() as conn:
+            acquired = perf_counter_ns()
+            # Only writes that carry events pay for an explicit transaction.
+            async with conn.transaction() if events else nullcontext():
+                await conn.execute(
+                    _UPSERT_DEVICE_STATES_SQL, list(device_ids), list(lats), list(lons), list(inside), list(geofence_ids),
+                    membership_literals
+                )
+                _QUERY["update_device_states"].observe_ns(perf_counter_ns() - acquired)
+                if events:
+                    await self._insert_outbox_events(conn, events)
+    
+    async def _insert_outbox_events(
+        self,
+        conn: asyncpg.Connection,
+        events: Sequence[Dict[str, Any]]
+    ) -> None:
+        """Queue events in the outbox, inside the caller's transaction."""
+        start = perf_counter_ns()
+        await conn.execute(
+            _INSERT_OUTBOX_SQL,
+            [event["event_type"] for event in events],
+            [event["device_id"] for event in events],
+            [orjson.dumps(event).decode() for event in events]
+        )
+        _QUERY["insert_outbox_events"].observe_ns(perf_counter_ns() - start)
+    
+    async def get_geofence_version(self) -> int:
+        """Get the change counter bumped on every write to the geofences table."""
+        async with self._acquire() as conn:
+            acquired = perf_counter_ns()
+            version = await conn.fetchval(_GEOFENCE_VERSION_SQL)
+            _QUERY["get_geofence_version"].observe_ns(perf_counter_ns() - acquired)
+        return version or 0
+    
+    async def check_device_location(self, device_id: str, lat: float, lon: float) -> Dict[str, Any]:
+        """Evaluate containment and upsert the device state in one statement.
+        
+        Returns the previous and new fence sets (``previous_geofence_ids`` is
+        None for a new device), the new state, the names of the containing
+        fences and the enter/exit ``changes`` as a JSON array. The statement is
+        kept in each connection's statement cache, so later calls cost one
+        round trip.
+        """
+        async with self._acquire() as conn:
+            acquired = perf_counter_ns()
+            row = await conn.fetchrow(self._check_location_sql, device_id, lat, lon)
+            _QUERY["check_device_location"].observe_ns(perf_counter_ns() - acquired)
+        return dict(row)
+
+    
+    async def dispatch_outbox(
+        self,
+        limit: int,
+        publish: Callable[[List[Dict[str, Any]], List[float]], Awaitable[None]]
+    ) -> int:
+        """Hand up to ``limit`` queued events to ``publish`` and delete them.
+        
+        Events are claimed with ``FOR UPDATE SKIP LOCKED``, so concurrent
+        dispatchers take disjoint batches, and deleted only if ``publish``
+        returns: if it raises, the transaction rolls back and the events are
+        dispatched again later (at-least-once). ``publish`` gets the events
+        in insertion order and how long each waited, by the database clock.
+        """
+        async with self._acquire() as conn:
+            acquired = perf_counter_ns()
+            async with conn.transaction():
+                rows = sorted(await conn.fetch(_DISPATCH_OUTBOX_SQL, limit), key=lambda row: row["id"])
+                _QUERY["dispatch_outbox"].observe_ns(perf_counter_ns() - acquired)
+                if rows:
+                    await publish(
+                        [orjson.loads(row["payload"]) for row in rows],
+                        [row["lag_seconds"] for row in rows]
+                    )
+        return len(rows)
+
+    
+    async def copy_location_history(
+        self,
+        rows: Sequence[Tuple[str, datetime, float, float, bool, Optional[int]]]
+    ) -> None:
+        """Append fixes to ``location_history`` with COPY; rows follow ``HISTORY_COLUMNS``."""
+        async with self._acquire() as conn:
+            acquired = perf_counter_ns()
+            await conn.copy_records_to_table("location_history", records=rows, columns=HISTORY_COLUMNS)
+            _QUERY["copy_location_history"].observe_ns(perf_counter_ns() - acquired)
+    
+    async def create_history_partitions(self, days: Sequence[date]) -> None:
+        """Create the daily ``location_history`` partitions that do not exist yet.
+        
+        An advisory lock serializes processes creating the same partition.
+        """
+        async with self._acquire() as conn:
+            async with conn.transaction():
+                await conn.execute("SELECT pg_advisory_xact_lock(hashtext('location_history_partitions'))")
+                for day in days:
+                    await conn.execute(
+                        f"CREATE TABLE IF NOT EXISTS location_history_p{day:%Y%m%d} "
+                        f"PARTITION OF location_history FOR VALUES "
+                        f"FROM ('{day.isoformat()} 00:00:00+00') TO ('{(day + timedelta(days=1)).isoformat()} 00:00:00+00')"
+                    )
+    
+    async def drop_history_partitions(self, before: date) -> List[str]:
+        """Drop daily partitions holding only fixes older than ``before``."""
+        async with self._acquire() as conn:
+            async with conn.transaction():
+                await conn.execute("SELECT pg_advisory_xact_lock(hashtext('location_history_partitions'))")
+                names = await conn.fetch(
+                    """
+                    SELECT c.relname FROM pg_inherits i
+                    JOIN pg_class c ON c.oid = i.inhrelid
+                    WHERE i.inhparent = 'location_history'::regclass
+                    """
+                )
+                dropped = []
+                for row in names:
+                    match = _HISTORY_PARTITION.match(row["relname"])
+                    if match and datetime.strptime(match.group(1), "%Y%m%d").date() < before:
+                        await conn.execute(f"DROP TABLE IF EXISTS {row['relname']}")
+                        dropped.append(row["relname"])
+        return sorted(dropped)
+    
+    async def get_location_track(
+        self,
+        device_id: str,
+        start: datetime,
+        end: datetime,
+        bucket_seconds: float
+    ) -> Tuple[List[asyncpg.Record], int]:
+        """A device's fixes in [start, end), at most one per time bucket plus transitions.
+        
+        Returns the kept rows in time order and how many fixes the range held.
+        """
+        async with self._acquire() as conn:
+            acquired = perf_counter_ns()
+            rows = await conn.fetch(_TRACK_SQL, device_id, start, end, bucket_seconds)
+            _QUERY["get_location_track"].observe_ns(perf_counter_ns() - acquired)
+        return rows, rows[0]["total"] if rows else 0
@@ -0,0 +1,175 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict
+
+from services.metrics import registry
+
+
+# Seconds a deferred check waited for a slot; bounded by the queue timeout.
+QUEUE_WAIT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+_QUEUE_WAIT = registry.histogram(
+    "geofence_admission_queue_wait_seconds",
+    "Time a transition check was deferred before admission.",
+    buckets=QUEUE_WAIT_BUCKETS
+)
+_REJECTED = {
+    kind: registry.counter(
+        "geofence_admission_rejected_total", "Checks rejected with 429, by priority.", {"priority": kind}
+    )
+    for kind in ("transition", "routine")
+}
+
+
+class AdmissionRejected(Exception):
+    """Raised when a check is shed; ``retry_after`` is in whole seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"over the admission limit, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Adaptive concurrency limit for location checks (AIMD).
+
+    Every admitted check holds a slot until it completes. A check that
+    finishes within ``latency_target_seconds``, while the connection pool
+    wait (an EWMA of ``observe_pool_wait``) is within
+    ``pool_wait_target_seconds``, raises the limit by ``1 / limit``: about
+    one slot per limit's worth of completions. A slower check multiplies the
+    limit by ``backoff``, at most once per target interval so one burst of
+    slow completions is a single decrease.
+
+    Checks that may change a device's fence membership (``priority``) may
+    use the whole limit and, when it is reached, wait up to
+    ``queue_timeout_seconds`` for a slot in arrival order. Routine checks
+    (a device repeating its cached state) only use the limit minus
+    ``priority_reserve`` of it, never wait and never overtake a waiting
+    transition. Shed checks raise ``AdmissionRejected``.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 32,
+        min_limit: int = 2,
+        max_limit: int = 512,
+        latency_target_seconds: float = 0.05,
+        pool_wait_target_seconds: float = 0.01,
+        backoff: float = 0.9,
+        priority_reserve: float = 0.2,
+        queue_timeout_seconds: float = 0.1,
+        retry_after_seconds: int = 1,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        if not 1 <= min_limit <= initial_limit <= max_limit:
+            raise ValueError("limits must satisfy 1 <= min_limit <= initial_limit <= max_limit")
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target_seconds = latency_target_seconds
+        self.pool_wait_target_seconds = pool_wait_target_seconds
+        self.backoff = backoff
+        self.priority_reserve = priority_reserve
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.retry_after_seconds = retry_after_seconds
+        self._clock = clock
+
+        self.in_flight = 0
+        self.pool_wait_seconds = 0.0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._next_decrease = 0.0
+
+        self.admitted = 0
+        self.deferred = 0
+        self.rejected_transition = 0
+        self.rejected_routine = 0
+        self.decreases = 0
+
+    def _capacity(self, priority: bool) -> int:
+        limit = self.limit if priority else self.limit * (1 - self.priority_reserve)
+        return max(1, int(limit))
+
+    def observe_pool_wait(self, elapsed_ns: int) -> None:
+        """Fold one connection pool acquire wait into the congestion signal."""
+        self.pool_wait_seconds += 0.1 * (elapsed_ns / 1e9 - self.pool_wait_seconds)
+
+    def _reject(self, priority: bool) -> AdmissionRejected:
+        if priority:
+            self.rejected_transition += 1
+            _REJECTED["transition"].inc()
+        else:
+            self.rejected_routine += 1
+            _REJECTED["routine"].inc()
+        return AdmissionRejected(self.retry_after_seconds)
+
+    async def acquire(self, priority: bool) -> float:
+        """Take a slot, waiting for one if ``priority``; returns the start time for ``release``."""
+        if self.in_flight < self._capacity(priority) and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return self._clock()
+        if not priority or self.queue_timeout_seconds <= 0 or len(self._waiters) >= self._capacity(True):
+            raise self._reject(priority)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.deferred += 1
+        start = time.perf_counter_ns()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout_seconds)
+        except asyncio.TimeoutError:
+            if not waiter.done():
+                self._waiters.remove(waiter)
+                waiter.cancel()
+                raise self._reject(priority)
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the caller went away.
+                self.in_flight -= 1
+                self._wake_waiters()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            raise
+        _QUEUE_WAIT.observe_ns(time.perf_counter_ns() - start)
+        self.admitted += 1
+        return self._clock()
+
+    def release(self, started: float) -> None:
+        """Free a slot and adapt the limit to how long its check took."""
+        self.in_flight -= 1
+        now = self._clock()
+        congested = (
+            now - started > self.latency_target_seconds
+            or self.pool_wait_seconds > self.pool_wait_target_seconds
+        )
+        if congested:
+            if now >= self._next_decrease:
+                self.limit = max(float(self.min_limit), self.limit * self.backoff)
+                self._next_decrease = now + self.latency_target_seconds
+                self.decreases += 1
+        elif self.in_flight + 1 >= self.limit / 2:
+            # Only grow while the limit is actually being used.
+            self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+        self._wake_waiters()
+
+    def _wake_waiters(self) -> None:
+        while self._waiters and self.in_flight < self._capacity(True):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Current limit and admission counters."""
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "pool_wait_seconds": self.pool_wait_seconds,
+            "admitted": self.admitted,
+            "deferred": self.deferred,
+            "rejected_transition": self.rejected_transition,
+            "rejected_routine": self.rejected_routine,
+            "decreases": self.decreases,
+        }
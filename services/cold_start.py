@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from domain.snapshot import load_snapshot
+from repositories.geofence_repository import GeofenceRepository
+from services.device_state_cache import DeviceStateCache
+from services.fence_membership import FenceMembershipIndex
+from services.geofence_cache import GeofenceCache
+
+
+class ColdStart:
+    """Start a process from a snapshot file, then catch up with Postgres.
+
+    ``load`` maps the snapshot, installs its fence index in the fence cache
+    and seeds the device state cache with its states. ``start`` catches up in
+    the background: the fence index is rebuilt if the fence set version moved
+    since the snapshot, and states written since the snapshot (less
+    ``state_overlap_seconds``, covering transactions still open when it was
+    taken) replace the seeded ones, except for devices this process has
+    written since the load; ``memberships`` is seeded from Postgres.
+    ``ready`` is False from a successful load until the catch-up has
+    finished; failed catch-ups are retried with exponential backoff and
+    jitter.
+    """
+
+    def __init__(
+        self,
+        repository: GeofenceRepository,
+        geofence_cache: GeofenceCache,
+        state_cache: Optional[DeviceStateCache] = None,
+        state_overlap_seconds: float = 60.0,
+        max_states: int = 100000,
+        memberships: Optional[FenceMembershipIndex] = None,
+        retry_base_delay: float = 0.1,
+        max_retry_delay: float = 10.0
+    ):
+        self.repository = repository
+        self.geofence_cache = geofence_cache
+        self.state_cache = state_cache
+        self.state_overlap_seconds = state_overlap_seconds
+        self.max_states = max_states
+        self.memberships = memberships
+        self.retry_base_delay = retry_base_delay
+        self.max_retry_delay = max_retry_delay
+        self.logger = logging.getLogger(__name__)
+
+        self._states_as_of: Optional[datetime] = None
+        self._loaded = False
+        self._caught_up = False
+        self._task: Optional[asyncio.Task] = None
+
+        self.snapshot_version: Optional[int] = None
+        self.load_seconds = 0.0
+        self.catch_up_seconds = 0.0
+        self.states_loaded = 0
+        self.states_caught_up = 0
+        self.failures = 0
+
+    @property
+    def ready(self) -> bool:
+        """False while state loaded from a snapshot has not been caught up yet."""
+        return not self._loaded or self._caught_up
+
+    def load(self, path: str) -> bool:
+        """Install the snapshot at ``path``; False if it is missing, unreadable or unusable."""
+        start = time.perf_counter()
+        try:
+            snapshot = load_snapshot(path)
+        except (OSError, ValueError, KeyError) as e:
+            self.logger.warning(f"Snapshot {path} not loaded, starting from Postgres: {e}")
+            return False
+        # A snapshot indexed with another cell size would look up differently.
+        if snapshot.index.cell_size_deg != self.geofence_cache.calculator.cell_size_deg:
+            self.logger.warning(f"Snapshot {path} uses another index cell size, starting from Postgres")
+            return False
+
+        self.geofence_cache.install(snapshot.index, snapshot.fence_version)
+        if self.state_cache is not None and snapshot.states_as_of is not None:
+            # Oldest first, so the most recent states are the last evicted.
+            for state in reversed(list(snapshot.states())):
+                self.state_cache.put_state(state)
+            self.states_loaded = len(snapshot)
+            self._states_as_of = snapshot.states_as_of
+            self.state_cache.track_writes()
+
+        self.snapshot_version = snapshot.fence_version
+        self._loaded = True
+        self.load_seconds = time.perf_counter() - start
+        self.logger.info(
+            f"Snapshot {path} loaded in {self.load_seconds * 1000:.1f} ms: "
+            f"{len(snapshot.index)} fences at version {snapshot.fence_version}, {self.states_loaded} states"
+        )
+        return True
+
+    async def catch_up(self) -> None:
+        """Apply fence and state changes made since the snapshot."""
+        start = time.perf_counter()
+        version = await self.repository.get_geofence_version()
+        if version != self.geofence_cache.version:
+            self.geofence_cache.invalidate()
+            await self.geofence_cache.get_index()
+
+        if self._states_as_of is not None:
+            since = self._states_as_of - timedelta(seconds=self.state_overlap_seconds)
+            states = await self.repository.get_device_states_since(since, self.max_states)
+            # Oldest first; devices checked since the load keep their newer state.
+            self.states_caught_up = self.state_cache.put_unwritten_states(reversed(states))
+            # Tracking has ended, so a retry must not apply them again.
+            self._states_as_of = None
+
+        if self.memberships is not None:
+            self.memberships.load(await self.repository.get_fence_memberships())
+
+        self._caught_up = True
+        self.catch_up_seconds = time.perf_counter() - start
+        self.logger.info(
+            f"Caught up from snapshot version {self.snapshot_version} to {self.geofence_cache.version} "
+            f"and {self.states_caught_up} states in {self.catch_up_seconds * 1000:.1f} ms"
+        )
+
+    async def _run(self) -> None:
+        attempt = 0
+        while True:
+            try:
+                await self.catch_up()
+                return
+            except Exception as e:
+                self.failures += 1
+                delay = min(self.max_retry_delay, self.retry_base_delay * 2 ** attempt)
+                delay *= random.uniform(0.5, 1.5)
+                attempt += 1
+                self.logger.warning(f"Snapshot catch-up failed ({e}), retrying in {delay:.3f}s")
+                await asyncio.sleep(delay)
+
+    def start(self) -> None:
+        """Start catching up in the background."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Stop a catch-up that is still running."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot load and catch-up counters."""
+        return {
+            "ready": self.ready,
+            "snapshot_version": self.snapshot_version,
+            "load_seconds": round(self.load_seconds, 6),
+            "catch_up_seconds": round(self.catch_up_seconds, 6),
+            "states_loaded": self.states_loaded,
+            "states_caught_up": self.states_caught_up,
+            "failures": self.failures,
+        }
@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import zlib
+from time import perf_counter_ns
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, TypeVar
+
+from services.metrics import registry
+
+
+T = TypeVar("T")
+
+_QUEUE_WAIT = registry.histogram(
+    "geofence_sequencer_queue_wait_seconds", "Time a device check waits for its shard worker."
+)
+
+
+class DeviceSequencer:
+    """Runs work for each device on one of N shard workers, in submission order.
+
+    Device ids are hashed (crc32) onto shards. Each shard is an asyncio queue
+    drained by a single task, so at most one check per device is in flight
+    and a device's fixes are applied in the order they were submitted, with
+    no database locks. Shards run concurrently, and callers can submit a
+    device's next fix before the previous one finished; it simply queues.
+
+    Work spanning many devices (a batch) uses ``run_for_devices``: a gate is
+    queued on every shard involved, all in one step, and the work runs once
+    each of those shards has reached its gate. Because gates are enqueued
+    together, every queue sees them in the same order and gates cannot
+    deadlock. Work must not submit to the sequencer itself.
+    """
+
+    def __init__(self, shards: int = 16, queue_size: int = 1000):
+        if shards < 1:
+            raise ValueError("shards must be at least 1")
+        self.shards = shards
+        self.queue_size = queue_size
+        self.logger = logging.getLogger(__name__)
+
+        self._queues: List[asyncio.Queue] = []
+        self._slots: List[asyncio.Semaphore] = []
+        self._workers: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.gates = 0
+
+    def shard_of(self, device_id: str) -> int:
+        """Shard owning a device; stable across processes and restarts."""
+        return zlib.crc32(device_id.encode()) % self.shards
+
+    def start(self) -> None:
+        """Start the shard workers on the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._workers:
+            return
+        self._loop = loop
+        # Queues are unbounded so that gates can always be enqueued at once;
+        # single submissions are bounded by a per-shard semaphore instead.
+        self._queues = [asyncio.Queue() for _ in range(self.shards)]
+        self._slots = [asyncio.Semaphore(self.queue_size) for _ in range(self.shards)]
+        self._workers = [
+            asyncio.create_task(self._drain(queue, slots), name=f"device-shard-{shard}")
+            for shard, (queue, slots) in enumerate(zip(self._queues, self._slots))
+        ]
+
+    async def close(self) -> None:
+        """Finish queued work, then stop the workers."""
+        if not self._workers:
+            return
+        await asyncio.gather(*(queue.join() for queue in self._queues))
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queues = []
+        self._slots = []
+        self.logger.info(f"Device sequencer stopped: {self.stats()}")
+
+    def _ensure_started(self) -> None:
+        if self._loop is not asyncio.get_running_loop() or not self._workers:
+            self.start()
+
+    async def run(self, device_id: str, work: Callable[[], Awaitable[T]]) -> T:
+        """Run ``work`` on the device's shard after earlier work for that shard."""
+        self._ensure_started()
+        shard = self.shard_of(device_id)
+        # Uncontended acquire does not yield, so submission order is kept.
+        await self._slots[shard].acquire()
+        future = self._loop.create_future()
+        self._queues[shard].put_nowait((work, future, perf_counter_ns()))
+        self.submitted += 1
+        return await future
+
+    async def run_for_devices(self, device_ids: Iterable[str], work: Callable[[], Awaitable[T]]) -> T:
+        """Run ``work`` once every shard owning one of the devices is idle at its gate."""
+        self._ensure_started()
+        shards = sorted({self.shard_of(device_id) for device_id in device_ids})
+        arrivals = [self._loop.create_future() for _ in shards]
+        release = self._loop.create_future()
+        enqueued = perf_counter_ns()
+        for shard, arrived in zip(shards, arrivals):
+            self._queues[shard].put_nowait((None, (arrived, release), enqueued))
+        self.gates += 1
+        try:
+            await asyncio.gather(*arrivals)
+            return await work()
+        finally:
+            release.set_result(None)
+
+    async def _drain(self, queue: asyncio.Queue, slots: asyncio.Semaphore) -> None:
+        while True:
+            work, future, enqueued = await queue.get()
+            _QUEUE_WAIT.observe_ns(perf_counter_ns() - enqueued)
+            if work is None:
+                arrived, release = future
+                if not arrived.done():
+                    arrived.set_result(None)
+                await release
+                queue.task_done()
+                continue
+
+            try:
+                # A caller that gave up before its turn does not get its fix applied.
+                if not future.cancelled():
+                    result = await work()
+                    if not future.done():
+                        future.set_result(result)
+                self.completed += 1
+            except Exception as e:
+                self.failed += 1
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                slots.release()
+                queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        """Sequencer counters and current queue depths."""
+        depths = [queue.qsize() for queue in self._queues]
+        return {
+            "shards": self.shards,
+            "queued": sum(depths),
+            "max_shard_depth": max(depths, default=0),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "gates": self.gates,
+        }
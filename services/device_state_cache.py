@@ -0,0 +1,196 @@
+import sys
+import time
+from collections import OrderedDict
+from itertools import islice
+from typing import AbstractSet, Any, Callable, Dict, Iterable, Optional, Sequence, Set
+
+from models.records import DeviceState, DeviceStateRecord, membership, without_geofences
+
+
+class DeviceStateCache:
+    """Bounded LRU cache of device states with write-through semantics.
+
+    The service reads it before the repository and updates it after every
+    write, so a replica that is the only writer for a device never needs to
+    read that device back from Postgres. Entries are ``__slots__`` records
+    updated in place. ``ttl_seconds`` bounds how stale an entry may get when
+    another replica also writes the device (0 disables expiry).
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 100_000,
+        ttl_seconds: float = 0.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[str, DeviceStateRecord]" = OrderedDict()
+        # Devices put since track_writes(), while tracking.
+        self._written: Optional[Set[str]] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.fast_path_hits = 0
+        self.full_evaluations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, device_id: str) -> Optional[DeviceStateRecord]:
+        """Return the cached state and mark it recently used."""
+        record = self._entries.get(device_id)
+        if record is None:
+            self.misses += 1
+            return None
+
+        if self.ttl_seconds and self._clock() - record.cached_at > self.ttl_seconds:
+            del self._entries[device_id]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(device_id)
+        self.hits += 1
+        return record
+
+    def put(
+        self,
+        device_id: str,
+        lat: Optional[float],
+        lon: Optional[float],
+        is_inside_fence: bool,
+        geofence_id: Optional[int],
+        geofence_ids: Optional[Sequence[int]] = None
+    ) -> None:
+        """Insert or update a device's state, evicting the least recently used."""
+        if self._written is not None:
+            self._written.add(device_id)
+        now = self._clock() if self.ttl_seconds else 0.0
+        record = self._entries.get(device_id)
+        if record is not None:
+            record.last_lat = lat
+            record.last_lon = lon
+            record.is_inside_fence = is_inside_fence
+            record.last_geofence_id = geofence_id
+            record.geofence_ids = membership(geofence_id, geofence_ids)
+            record.cached_at = now
+            record.safe_radius_km = 0.0
+            self._entries.move_to_end(device_id)
+            return
+
+        self._entries[device_id] = DeviceStateRecord(
+            device_id, lat, lon, is_inside_fence, geofence_id, geofence_ids, cached_at=now
+        )
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def peek(self, device_id: str) -> Optional[DeviceStateRecord]:
+        """Return the cached state without counting a lookup or refreshing recency."""
+        return self._entries.get(device_id)
+
+    def put_state(self, state: DeviceState) -> None:
+        """Cache a state read from the repository."""
+        self.put(
+            state.device_id,
+            state.last_lat,
+            state.last_lon,
+            state.is_inside_fence,
+            state.last_geofence_id,
+            state.geofence_ids
+        )
+
+    def track_writes(self) -> None:
+        """Start recording which devices are put, for ``put_unwritten_states``."""
+        self._written = set()
+
+    def put_unwritten_states(self, states: Iterable[DeviceState]) -> int:
+        """Cache states read earlier, skipping devices put since ``track_writes``.
+
+        A state written in-process meanwhile is newer than any row read
+        before it. Ends tracking; returns how many states were cached.
+        """
+        written, self._written = self._written or set(), None
+        cached = 0
+        for state in states:
+            if state.device_id not in written:
+                self.put_state(state)
+                cached += 1
+        return cached
+
+    def set_safe_zone(self, device_id: str, radius_km: float, fence_generation: int) -> None:
+        """Attach a safe radius around the cached position of a device."""
+        record = self._entries.get(device_id)
+        if record is not None:
+            record.safe_radius_km = radius_km
+            record.fence_generation = fence_generation
+
+    def count_evaluation(self, fast_path: bool) -> None:
+        """Count a fix answered from the safe zone or by a full evaluation."""
+        if fast_path:
+            self.fast_path_hits += 1
+        else:
+            self.full_evaluations += 1
+
+    def release_geofences(self, geofence_ids: AbstractSet[int]) -> int:
+        """Drop deleted fences from the cached states; returns how many changed."""
+        changed = 0
+        for record in self._entries.values():
+            if not geofence_ids.isdisjoint(record.geofence_ids):
+                kept = without_geofences(record.geofence_ids, geofence_ids)
+                record.geofence_ids = kept
+                record.last_geofence_id = kept[0] if kept else None
+                record.is_inside_fence = bool(kept)
+                changed += 1
+        return changed
+
+    def invalidate(self, device_id: str) -> None:
+        """Drop a device from the cache."""
+        self._entries.pop(device_id, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def bytes_per_entry(self, sample_size: int = 256) -> float:
+        """Estimated memory per cached device: record, key, floats and dict slot."""
+        if not self._entries:
+            return 0.0
+
+        sampled = 0
+        total = 0
+        for device_id, record in islice(self._entries.items(), sample_size):
+            total += sys.getsizeof(record) + sys.getsizeof(device_id)
+            if record.last_lat is not None:
+                total += sys.getsizeof(record.last_lat) + sys.getsizeof(record.last_lon)
+            sampled += 1
+
+        # OrderedDict keeps a hash table slot plus a linked-list node per key.
+        table_overhead = sys.getsizeof(self._entries) / len(self._entries)
+        return total / sampled + table_overhead
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache counters, hit ratio and estimated memory per device."""
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hit_ratio, 4),
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "bytes_per_entry": round(self.bytes_per_entry(), 1),
+            "fast_path_hits": self.fast_path_hits,
+            "full_evaluations": self.full_evaluations,
+        }
@@ -1,9 +1,14 @@
+import asyncio
 import json
 import logging
+import random
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from abc import ABC, abstractmethod
 
+import orjson
+import redis.asyncio as aioredis
+
 
 class EventPublisher(ABC):
     """Abstract base class for event publishing."""
@@ -12,6 +17,11 @@ class EventPublisher(ABC):
     async def publish_geo_event(self, event_data: Dict[str, Any]) -> None:
         """Publish geo-fence event."""
         pass
+    
+    async def publish_geo_events(self, events: List[Dict[str, Any]]) -> None:
+        """Publish events in order; returns once all are delivered or raises."""
+        for event_data in events:
+            await self.publish_geo_event(event_data)
 
 
 class GeoEventData:
@@ -22,13 +32,40 @@ class GeoEventData:
         device_id: str, 
         lat: float, 
         lon: float, 
-        geofence_name: str = None
+        geofence_name: str = None,
+        geofence_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        return GeoEventData._create_fence_event(
+            "fence_exit", device_id, lat, lon, geofence_name, geofence_id
+        )
+    
+    @staticmethod
+    def create_fence_enter_event(
+        device_id: str,
+        lat: float,
+        lon: float,
+        geofence_name: str = None,
+        geofence_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        return GeoEventData._create_fence_event(
+            "fence_enter", device_id, lat, lon, geofence_name, geofence_id
+        )
+    
+    @staticmethod
+    def _create_fence_event(
+        event_type: str,
+        device_id: str,
+        lat: float,
+        lon: float,
+        geofence_name: Optional[str],
+        geofence_id: Optional[int]
     ) -> Dict[str, Any]:
         return {
-            "event_type": "fence_exit",
+            "event_type": event_type,
             "device_id": device_id,
             "latitude": lat,
             "longitude": lon,
+            "geofence_id": geofence_id,
             "geofence_name": geofence_name,
             "timestamp": datetime.utcnow().isoformat() + "Z"
         }
@@ -45,12 +82,140 @@ class MockEventPublisher(EventPublisher):
 
 
 class RedisEventPublisher(EventPublisher):
-    """Redis-based event publisher implementation."""
+    """Redis Streams event publisher.
+    
+    ``publish_geo_event`` serializes the event with orjson and puts it on a
+    bounded in-memory queue; when the queue is full callers wait, which
+    pushes back on the request path instead of growing memory. A background
+    sender drains up to ``batch_size`` events at a time and XADDs them in one
+    pipelined round trip over the pooled connection, retrying failed batches
+    with exponential backoff and jitter.
+    """
     
-    def __init__(self, redis_url: str, queue_name: str = "geo-events"):
+    def __init__(
+        self,
+        redis_url: str,
+        queue_name: str = "geo-events",
+        max_queue_size: int = 10000,
+        batch_size: int = 256,
+        max_retries: int = 5,
+        retry_base_delay: float = 0.05,
+        max_stream_length: Optional[int] = 1_000_000,
+        client: Optional[aioredis.Redis] = None
+    ):
         self.redis_url = redis_url
         self.queue_name = queue_name
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.max_stream_length = max_stream_length
         self.logger = logging.getLogger(__name__)
+        
+        self.redis = client or aioredis.from_url(redis_url)
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self._sender_task: Optional[asyncio.Task] = None
+        
+        self.published = 0
+        self.batches = 0
+        self.retries = 0
+        self.dropped = 0
+        self.backpressure_waits = 0
     
     async def publish_geo_event(self, event_data: Dict[str, Any]) -> None:
-        self.logger.info(f"Publishing to Redis queue {self.queue_name}: {json.dumps(event_data)}")
\ No newline at end of file
+        entry = self._entry(event_data)
+        if self._queue.full():
+            self.backpressure_waits += 1
+        await self._queue.put(entry)
+    
+    @staticmethod
+    def _entry(event_data: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "event_type": event_data.get("event_type", ""),
+            "data": orjson.dumps(event_data),
+        }
+    
+    async def publish_geo_events(self, events: List[Dict[str, Any]]) -> None:
+        """XADD events in one pipelined round trip, bypassing the queue.
+        
+        Raises if Redis fails, so the caller (the outbox dispatcher) keeps
+        the events and retries; no events are dropped here.
+        """
+        if events:
+            await self._xadd([self._entry(event_data) for event_data in events])
+    
+    async def _xadd(self, batch: List[Dict[str, Any]]) -> None:
+        pipe = self.redis.pipeline(transaction=False)
+        for entry in batch:
+            pipe.xadd(
+                self.queue_name,
+                entry,
+                maxlen=self.max_stream_length,
+                approximate=True
+            )
+        await pipe.execute()
+        self.published += len(batch)
+        self.batches += 1
+    
+    async def _send_batch(self, batch: List[Dict[str, Any]]) -> None:
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self._xadd(batch)
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self.dropped += len(batch)
+                    self.logger.error(
+                        f"Dropping {len(batch)} geo-events after {attempt + 1} attempts: {e}"
+                    )
+                    return
+                
+                self.retries += 1
+                delay = self.retry_base_delay * (2 ** attempt) * random.uniform(0.5, 1.5)
+                self.logger.warning(f"Redis XADD failed ({e}), retrying in {delay:.3f}s")
+                await asyncio.sleep(delay)
+    
+    async def _run_sender(self) -> None:
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < self.batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            
+            try:
+                await self._send_batch(batch)
+            finally:
+                for _ in batch:
+                    queue.task_done()
+    
+    def start(self) -> None:
+        """Start the background sender."""
+        if self._sender_task is None:
+            self._sender_task = asyncio.create_task(self._run_sender())
+    
+    async def flush(self) -> None:
+        """Wait until every queued event has been sent or dropped."""
+        await self._queue.join()
+    
+    async def close(self) -> None:
+        """Drain the queue, stop the sender and release the connection pool."""
+        if self._sender_task is not None:
+            await self.flush()
+            self._sender_task.cancel()
+            try:
+                await self._sender_task
+            except asyncio.CancelledError:
+                pass
+            self._sender_task = None
+        
+        await self.redis.aclose()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Publisher counters."""
+        return {
+            "queued": self._queue.qsize(),
+            "published": self.published,
+            "batches": self.batches,
+            "retries": self.retries,
+            "dropped": self.dropped,
+            "backpressure_waits": self.backpressure_waits,
+        }
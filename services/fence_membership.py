@@ -0,0 +1,100 @@
+import heapq
+from typing import AbstractSet, Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from models.records import without_geofences
+
+
+class FenceMembershipIndex:
+    """Inverted index from fence id to the devices currently inside it.
+
+    The service calls ``update`` with a device's fence set whenever it writes
+    the device's state, so the index follows every check this process makes.
+    It is seeded once from ``device_states`` with ``load``; devices updated
+    before the seed arrives keep their newer membership.
+    """
+
+    def __init__(self):
+        self._devices: Dict[int, Set[str]] = {}
+        self._fences: Dict[str, Tuple[int, ...]] = {}
+        # Devices updated while the seed was being read; None once seeded.
+        self._updated_before_load: Optional[Set[str]] = set()
+
+        self.updates = 0
+        self.changes = 0
+
+    def __len__(self) -> int:
+        """Number of devices inside at least one fence."""
+        return len(self._fences)
+
+    def update(self, device_id: str, geofence_ids: Sequence[int]) -> None:
+        """Record the fences a device is now inside."""
+        self.updates += 1
+        if self._updated_before_load is not None:
+            self._updated_before_load.add(device_id)
+        current = tuple(geofence_ids)
+        previous = self._fences.get(device_id, ())
+        if current == previous:
+            return
+
+        self.changes += 1
+        for geofence_id in previous:
+            if geofence_id not in current:
+                devices = self._devices[geofence_id]
+                devices.discard(device_id)
+                if not devices:
+                    del self._devices[geofence_id]
+        for geofence_id in current:
+            if geofence_id not in previous:
+                self._devices.setdefault(geofence_id, set()).add(device_id)
+        if current:
+            self._fences[device_id] = current
+        else:
+            del self._fences[device_id]
+
+    def load(self, memberships: Iterable[Tuple[str, Sequence[int]]]) -> int:
+        """Seed from (device id, fence ids) pairs; returns how many were applied."""
+        updated = self._updated_before_load or set()
+        self._updated_before_load = None
+        loaded = 0
+        for device_id, geofence_ids in memberships:
+            if device_id not in updated:
+                self.update(device_id, geofence_ids)
+                loaded += 1
+        return loaded
+
+    def release_geofences(self, geofence_ids: AbstractSet[int]) -> None:
+        """Forget deleted fences."""
+        devices: Set[str] = set()
+        for geofence_id in geofence_ids:
+            devices.update(self._devices.pop(geofence_id, ()))
+        for device_id in devices:
+            kept = without_geofences(self._fences[device_id], geofence_ids)
+            if kept:
+                self._fences[device_id] = kept
+            else:
+                del self._fences[device_id]
+
+    def fences_of(self, device_id: str) -> Tuple[int, ...]:
+        """Fences the device is inside."""
+        return self._fences.get(device_id, ())
+
+    def count(self, geofence_id: int) -> int:
+        """Number of devices inside the fence."""
+        return len(self._devices.get(geofence_id, ()))
+
+    def devices_in(self, geofence_id: int, limit: Optional[int] = None) -> List[str]:
+        """Sorted ids of the devices inside the fence, the first ``limit`` of them if given."""
+        devices = self._devices.get(geofence_id, ())
+        if limit is not None and limit < len(devices):
+            return heapq.nsmallest(limit, devices)
+        return sorted(devices)
+
+    def stats(self) -> Dict[str, Any]:
+        """Index size and update counters."""
+        return {
+            "devices": len(self._fences),
+            "fences": len(self._devices),
+            "seeded": self._updated_before_load is None,
+            "updates": self.updates,
+            "changes": self.changes,
+        }
@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import os
+import time
+from typing import AbstractSet, Any, Callable, Dict, List, Optional
+
+import asyncpg
+
+from database.db_setup import GEOFENCE_CHANGES_CHANNEL
+from domain.geofence_calculator import GeofenceCalculator
+from domain.shared_index import (
+    index_path, load_index_file, remove_stale_index_files, write_index_file
+)
+from domain.spatial_index import GeofenceGridIndex
+from repositories.geofence_repository import GeofenceRepository
+
+
+class GeofenceCache:
+    """Process-wide cache of the geofence set and its spatial index.
+
+    The index is rebuilt only when the fence set changes. Changes are picked
+    up from Postgres NOTIFY on ``geofences_changed``; as a fallback the entry
+    expires after ``ttl_seconds``, at which point the cheap version counter is
+    compared and the table is re-read only if the version moved.
+
+    With ``index_dir`` set, processes share built indexes through files in
+    that directory: a process that finds the file for the current version
+    maps it instead of reading the table, and one that builds an index
+    writes it there for the others.
+
+    When a reload drops fences, ``removal_listeners`` are called with their
+    ids before the new index is served, so in-process device states can
+    forget them as the delete did in Postgres.
+    """
+
+    def __init__(
+        self,
+        repository: GeofenceRepository,
+        calculator: GeofenceCalculator,
+        ttl_seconds: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+        index_dir: Optional[str] = None
+    ):
+        self.repository = repository
+        self.calculator = calculator
+        self.ttl_seconds = ttl_seconds
+        self.index_dir = index_dir
+        self._clock = clock
+        self.logger = logging.getLogger(__name__)
+
+        self._index: Optional[GeofenceGridIndex] = None
+        self._version: Optional[int] = None
+        self._expires_at = 0.0
+        self._stale = True
+        self._lock = asyncio.Lock()
+        self._listener_conn: Optional[asyncpg.Connection] = None
+        self.removal_listeners: List[Callable[[AbstractSet[int]], None]] = []
+
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+        self.version_checks = 0
+        self.invalidations = 0
+        self.file_loads = 0
+
+    @property
+    def version(self) -> Optional[int]:
+        """Version of the currently cached fence set."""
+        return self._version
+
+    @property
+    def generation(self) -> int:
+        """Increments whenever a new index is built; tags data derived from it."""
+        return self.rebuilds
+
+    @property
+    def current_index(self) -> Optional[GeofenceGridIndex]:
+        """Last loaded index, without a freshness check (None before the first load)."""
+        return self._index
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._index is not None
+            and not self._stale
+            and self._clock() < self._expires_at
+        )
+
+    async def get_index(self) -> GeofenceGridIndex:
+        """Return the cached fence index, reloading it if it is stale."""
+        if self._is_fresh():
+            self.hits += 1
+            return self._index
+
+        self.misses += 1
+        async with self._lock:
+            if not self._is_fresh():
+                await self._refresh()
+            return self._index
+
+    async def _refresh(self) -> None:
+        # Clear the flag before reading so a NOTIFY that races with the load
+        # marks the fresh entry stale again instead of being lost.
+        was_stale = self._stale
+        self._stale = False
+
+        version = await self.repository.get_geofence_version()
+        self.version_checks += 1
+
+        if self._index is not None and not was_stale and version == self._version:
+            self._expires_at = self._clock() + self.ttl_seconds
+            return
+
+        index = self._load_shared(version)
+        if index is None:
+            geofences = await self.repository.get_all_geofences()
+            index = self.calculator.build_index(geofences)
+            self._publish_shared(index, version)
+            self.logger.info(
+                f"Geofence index rebuilt: {len(geofences)} fences, version {version}"
+            )
+
+        previous, self._index = self._index, index
+        self._version = version
+        self._expires_at = self._clock() + self.ttl_seconds
+        self.rebuilds += 1
+        if previous is not None and self.removal_listeners:
+            removed = {fence.id for fence in previous} - {fence.id for fence in index}
+            if removed:
+                for listener in self.removal_listeners:
+                    listener(removed)
+
+    def _load_shared(self, version: int) -> Optional[GeofenceGridIndex]:
+        if not self.index_dir:
+            return None
+        path = index_path(self.index_dir, version)
+        if not os.path.exists(path):
+            return None
+        try:
+            index = load_index_file(path)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Could not load shared geofence index {path}: {e}")
+            return None
+        # Loaded indexes must look up like ones this calculator would build.
+        if index.cell_size_deg != self.calculator.cell_size_deg:
+            return None
+        self.file_loads += 1
+        self.logger.info(f"Geofence index loaded from {path}: {len(index)} fences")
+        return index
+
+    def _publish_shared(self, index: GeofenceGridIndex, version: int) -> None:
+        if not self.index_dir:
+            return
+        try:
+            write_index_file(index, self.index_dir, version)
+            # Keep the previous version for processes that are still loading it.
+            remove_stale_index_files(self.index_dir, (version, version - 1))
+        except OSError as e:
+            self.logger.warning(f"Could not publish shared geofence index: {e}")
+
+    def install(self, index: GeofenceGridIndex, version: int) -> None:
+        """Use an index loaded elsewhere (a snapshot) as the fence set of ``version``."""
+        self._index = index
+        self._version = version
+        self._stale = False
+        self._expires_at = self._clock() + self.ttl_seconds
+        self.rebuilds += 1
+        self.file_loads += 1
+
+    def invalidate(self) -> None:
+        """Mark the cached fence set stale; the next read reloads it."""
+        self._stale = True
+        self.invalidations += 1
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        self.logger.debug(f"Geofence change notification, version {payload}")
+        # A change this process already loaded (e.g. its own import) needs no rebuild.
+        if payload.isdigit() and self._version is not None and int(payload) <= self._version:
+            return
+        self.invalidate()
+
+    async def start_listening(self, connection: asyncpg.Connection) -> None:
+        """Subscribe to fence change notifications on a dedicated connection."""
+        self._listener_conn = connection
+        await connection.add_listener(GEOFENCE_CHANGES_CHANNEL, self._on_notify)
+
+    async def stop_listening(self) -> None:
+        """Unsubscribe and close the notification connection."""
+        if self._listener_conn:
+            await self._listener_conn.remove_listener(
+                GEOFENCE_CHANGES_CHANNEL, self._on_notify
+            )
+            await self._listener_conn.close()
+            self._listener_conn = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache counters, for confirming the table is off the hot path."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "rebuilds": self.rebuilds,
+            "version_checks": self.version_checks,
+            "invalidations": self.invalidations,
+            "file_loads": self.file_loads,
+            "version": self._version,
+            "fences": len(self._index) if self._index is not None else 0,
+        }
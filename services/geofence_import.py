@@ -0,0 +1,308 @@
+import codecs
+import csv
+import json
+import logging
+import re
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+import orjson
+from pydantic import ValidationError
+
+from models.geofence import GeofenceInputModel
+from repositories.geofence_repository import GeofenceRepository
+from services.geofence_cache import GeofenceCache
+from services.metrics import registry
+
+
+IMPORT_FORMATS = ("csv", "geojson", "geojsonseq")
+CSV_COLUMNS = ("name", "center_lat", "center_lon", "radius_km", "polygon")
+
+# One GeoJSON feature or CSV line may not exceed this.
+MAX_RECORD_CHARS = 16 * 1024 * 1024
+
+_IMPORTED_ROWS = registry.counter("geofence_import_rows_total", "Geofence rows loaded by bulk imports.")
+_FEATURES_ARRAY = re.compile(r'"features"\s*:\s*\[')
+_JSON_DECODER = json.JSONDecoder()
+
+
+class GeofenceImportError(ValueError):
+    """Raised when an import cannot be parsed or, when strict, has invalid rows."""
+
+
+class CsvFenceParser:
+    """Incremental CSV reader; the first line is the header.
+
+    Columns are matched by name (``CSV_COLUMNS``; ``polygon`` is a JSON
+    ``[[lat, lon], ...]`` string and may be empty). Every record is on one
+    line.
+    """
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self._partial = ""
+        self._header: Optional[List[str]] = None
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        text = self._partial + self._decoder.decode(chunk)
+        *lines, self._partial = text.split("\n")
+        if len(self._partial) > MAX_RECORD_CHARS:
+            raise GeofenceImportError(f"CSV line exceeds {MAX_RECORD_CHARS} characters")
+        return self._rows(lines)
+
+    def finish(self) -> List[Any]:
+        lines = [self._partial + self._decoder.decode(b"", final=True)]
+        self._partial = ""
+        return self._rows(lines)
+
+    def _rows(self, lines: List[str]) -> List[Any]:
+        lines = [line for line in lines if line.strip()]
+        if not lines:
+            return []
+        rows = list(csv.reader(lines))
+        if self._header is None:
+            self._header = [column.strip() for column in rows.pop(0)]
+            missing = {"name"} - set(self._header)
+            if missing:
+                raise GeofenceImportError(f"CSV header lacks columns: {sorted(missing)}")
+        return [
+            {column: value for column, value in zip(self._header, row) if value != ""}
+            for row in rows
+        ]
+
+
+class GeoJsonFenceParser:
+    """Incremental reader of the features of a GeoJSON FeatureCollection.
+
+    Only the ``features`` array is parsed, one feature at a time, so memory
+    is bounded by the largest feature rather than the file.
+    """
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self._buffer = ""
+        self._in_features = False
+        self._done = False
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        self._buffer += self._decoder.decode(chunk)
+        return self._features(final=False)
+
+    def finish(self) -> List[Any]:
+        self._buffer += self._decoder.decode(b"", final=True)
+        features = self._features(final=True)
+        if not self._done:
+            raise GeofenceImportError("GeoJSON ended before the end of its features array")
+        return features
+
+    def _features(self, final: bool) -> List[Any]:
+        features = []
+        if not self._in_features:
+            match = _FEATURES_ARRAY.search(self._buffer)
+            if match is None:
+                if len(self._buffer) > MAX_RECORD_CHARS or final:
+                    raise GeofenceImportError("GeoJSON has no FeatureCollection features array")
+                return features
+            self._buffer = self._buffer[match.end():]
+            self._in_features = True
+
+        buffer = self._buffer
+        position = 0
+        while not self._done:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position == len(buffer):
+                break
+            if buffer[position] == "]":
+                self._done = True
+                position += 1
+                break
+            try:
+                feature, position = _JSON_DECODER.raw_decode(buffer, position)
+            except ValueError as e:
+                # Usually a feature cut off by the chunk boundary.
+                if final or len(buffer) - position > MAX_RECORD_CHARS:
+                    raise GeofenceImportError(f"invalid GeoJSON feature: {e}") from None
+                break
+            features.append(feature)
+        self._buffer = buffer[position:] if not self._done else ""
+        return features
+
+
+class GeoJsonSeqFenceParser:
+    """Incremental reader of newline-delimited GeoJSON features (RFC 8142)."""
+
+    def __init__(self):
+        self._partial = b""
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        *lines, self._partial = (self._partial + chunk).split(b"\n")
+        if len(self._partial) > MAX_RECORD_CHARS:
+            raise GeofenceImportError(f"GeoJSON line exceeds {MAX_RECORD_CHARS} bytes")
+        return self._features(lines)
+
+    def finish(self) -> List[Any]:
+        lines, self._partial = [self._partial], b""
+        return self._features(lines)
+
+    @staticmethod
+    def _features(lines: List[bytes]) -> List[Any]:
+        features = []
+        for line in lines:
+            line = line.strip(b" \t\r\n\x1e")
+            if line:
+                try:
+                    features.append(orjson.loads(line))
+                except orjson.JSONDecodeError:
+                    features.append(None)
+        return features
+
+
+def fence_from_feature(feature: Any) -> Dict[str, Any]:
+    """Map a GeoJSON feature onto ``GeofenceInputModel`` fields.
+
+    Polygons use their exterior ring; points are circles with a
+    ``radius_km`` property. GeoJSON positions are [lon, lat].
+    """
+    if not isinstance(feature, dict):
+        raise ValueError("not a GeoJSON feature")
+    properties = feature.get("properties") or {}
+    geometry = feature.get("geometry") or {}
+    fence = {"name": properties.get("name")}
+    kind = geometry.get("type")
+    coordinates = geometry.get("coordinates")
+    if kind == "Polygon" and coordinates:
+        ring = [(position[1], position[0]) for position in coordinates[0]]
+        if len(ring) > 1 and ring[0] == ring[-1]:
+            ring.pop()
+        fence["polygon"] = ring
+    elif kind == "Point" and coordinates:
+        fence["center_lon"], fence["center_lat"] = coordinates[0], coordinates[1]
+        fence["radius_km"] = properties.get("radius_km")
+    else:
+        raise ValueError(f"unsupported geometry type {kind!r}; use Polygon or Point")
+    return fence
+
+
+def fence_from_csv(row: Dict[str, str]) -> Dict[str, Any]:
+    """Map a CSV row onto ``GeofenceInputModel`` fields."""
+    if "polygon" in row:
+        row = {**row, "polygon": orjson.loads(row["polygon"])}
+    return row
+
+
+def _error_message(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        first = error.errors()[0]
+        location = ".".join(str(part) for part in first["loc"])
+        return f"{location}: {first['msg']}" if location else first["msg"]
+    return str(error)
+
+
+def _parser(fmt: str):
+    if fmt == "csv":
+        return CsvFenceParser()
+    if fmt == "geojson":
+        return GeoJsonFenceParser()
+    if fmt == "geojsonseq":
+        return GeoJsonSeqFenceParser()
+    raise GeofenceImportError(f"unknown import format {fmt!r}; use one of {IMPORT_FORMATS}")
+
+
+class GeofenceImporter:
+    """Streams fences from a CSV or GeoJSON body into the geofences table.
+
+    Records are parsed incrementally, validated ``chunk_size`` at a time and
+    COPYed into a staging table; one merge then updates fences by name,
+    inserts new ones and, with ``replace``, deletes the rest. All of it is a
+    single transaction, so checks see either the old fence set or the new
+    one, and the fence change triggers fire per statement, not per row.
+    Afterwards the local fence index is rebuilt once; other processes
+    rebuild once on the change notification.
+
+    Invalid records are skipped and reported (the first ``max_errors`` with
+    their record number); with ``strict`` any invalid record aborts the
+    import. Duplicate names within one import are invalid.
+    """
+
+    def __init__(
+        self,
+        repository: GeofenceRepository,
+        geofence_cache: Optional[GeofenceCache] = None,
+        chunk_size: int = 5000,
+        max_errors: int = 100
+    ):
+        self.repository = repository
+        self.geofence_cache = geofence_cache
+        self.chunk_size = chunk_size
+        self.max_errors = max_errors
+        self.logger = logging.getLogger(__name__)
+
+    async def run(
+        self,
+        chunks: AsyncIterator[bytes],
+        fmt: str,
+        replace: bool = False,
+        strict: bool = False
+    ) -> Dict[str, Any]:
+        """Import a byte stream; returns counts, errors and throughput."""
+        parser = _parser(fmt)
+        to_fence = fence_from_csv if fmt == "csv" else fence_from_feature
+        start = time.perf_counter()
+        report: Dict[str, Any] = {"rows": 0, "loaded": 0, "rejected": 0, "errors": []}
+        names: Set[str] = set()
+        pending: List[GeofenceInputModel] = []
+
+        def validate(records: List[Any]) -> None:
+            for record in records:
+                report["rows"] += 1
+                try:
+                    fence = GeofenceInputModel(**to_fence(record))
+                    if fence.name in names:
+                        raise ValueError(f"duplicate name {fence.name!r}")
+                except (ValueError, TypeError, IndexError, KeyError) as e:
+                    report["rejected"] += 1
+                    if len(report["errors"]) < self.max_errors:
+                        message = _error_message(e)
+                        report["errors"].append({"row": report["rows"], "error": message})
+                    continue
+                names.add(fence.name)
+                pending.append(fence)
+
+        async with self.repository.db_pool.acquire() as conn:
+            async with conn.transaction():
+                await self.repository.create_geofence_staging(conn)
+                async for chunk in chunks:
+                    validate(parser.feed(chunk))
+                    if len(pending) >= self.chunk_size:
+                        await self.repository.copy_geofence_staging(conn, pending)
+                        report["loaded"] += len(pending)
+                        pending.clear()
+                validate(parser.finish())
+                if pending:
+                    await self.repository.copy_geofence_staging(conn, pending)
+                    report["loaded"] += len(pending)
+                    pending.clear()
+
+                if strict and report["rejected"]:
+                    raise GeofenceImportError(
+                        f"{report['rejected']} invalid rows, first: {report['errors'][0]}"
+                    )
+                loaded = time.perf_counter()
+                report.update(await self.repository.merge_geofence_staging(conn, replace))
+
+        merged = time.perf_counter()
+        report["load_seconds"] = round(loaded - start, 3)
+        report["merge_seconds"] = round(merged - loaded, 3)
+        if self.geofence_cache is not None:
+            self.geofence_cache.invalidate()
+            await self.geofence_cache.get_index()
+        report["rebuild_seconds"] = round(time.perf_counter() - merged, 3)
+        report["rows_per_second"] = round(report["rows"] / (merged - start), 1) if merged > start else 0.0
+        _IMPORTED_ROWS.inc(report["loaded"])
+        self.logger.info(
+            f"Geofence import: {report['loaded']} loaded, {report['rejected']} rejected, "
+            f"{report['inserted']} inserted, {report['updated']} updated, {report['deleted']} deleted "
+            f"at {report['rows_per_second']} rows/s"
+        )
+        return report
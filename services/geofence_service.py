@@ -1,76 +1,649 @@
-from typing import Dict, Any
+from datetime import datetime
+from time import perf_counter_ns
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+import orjson
+
 from models.geofence import DeviceLocationModel
 from domain.geofence_calculator import GeofenceCalculator
+from domain.spatial_index import GeofenceGridIndex
+from domain.track import simplify_track
 from repositories.geofence_repository import GeofenceRepository
+from models.records import DeviceState, DeviceStateRecord, Geofence
+from services.device_sequencer import DeviceSequencer
+from services.device_state_cache import DeviceStateCache
 from services.event_publisher import EventPublisher, GeoEventData
+from services.fence_membership import FenceMembershipIndex
+from services.geofence_cache import GeofenceCache
+from services.location_history import LocationHistoryWriter
+from services.metrics import registry
+from services.outbox_dispatcher import OutboxDispatcher
+from services.state_write_buffer import DeviceStateWriteBuffer
+
+
+_STAGES = registry.histograms(
+    "geofence_check_stage_seconds", "Time per stage of a single location check.", "stage",
+    (
+        "fence_fetch", "state_read", "containment", "state_write", "safe_radius",
+        "single_query", "publish", "total"
+    )
+)
+_BATCH_SECONDS = registry.histogram(
+    "geofence_batch_check_seconds", "Time per batch location check."
+)
+_CHECKS = {
+    path: registry.counter(
+        "geofence_checks_total", "Location fixes checked, by evaluation path.", {"path": path}
+    )
+    for path in ("fast", "full", "single_query", "batch")
+}
+_FENCE_EVENTS = {
+    "fence_exit": registry.counter("geofence_exit_events_total", "Fence exit events published."),
+    "fence_enter": registry.counter("geofence_enter_events_total", "Fence enter events published."),
+}
 
 
 class GeofenceService:
-    """Main business logic for geofence operations."""
+    """Main business logic for geofence operations.
+    
+    With both caches configured and ``fast_path`` on, each full evaluation
+    stores a safe radius around the device's position; later fixes inside it
+    are answered from the cached state without a containment search or a
+    database write.
+    
+    With ``single_query`` a single check is done entirely in the database:
+    one statement reads the previous state, evaluates containment and upserts
+    the new state. The caches and write buffer are then bypassed for single
+    checks, so callers should not configure them for device states.
+    
+    With a ``sequencer``, checks for one device run one at a time in
+    submission order on the device's shard, so concurrent fixes cannot both
+    act on the same previous state; a batch runs once all its devices' shards
+    have caught up to it.
+    
+    A device may be inside several overlapping fences at once; its state
+    keeps the sorted ids of all of them. A fix that changes that set emits a
+    ``fence_exit`` for every fence left and then a ``fence_enter`` for every
+    fence entered, so moving straight from one fence to another is an exit
+    and an enter in the same check. A device's first fix emits nothing.
+    Deleting a fence emits no events: fences no longer in the fence set are
+    dropped from memberships without an exit.
+    
+    With an ``outbox`` dispatcher, fence events are not published inline:
+    they are inserted into ``event_outbox`` in the transaction that writes
+    the device state, and the dispatcher publishes them in the background.
+    
+    With a ``history`` writer, every checked fix is also queued for the
+    ``location_history`` table; the writer appends them in bulk off the
+    check path.
+    
+    With ``memberships``, every written device state also updates an
+    in-memory fence -> devices index behind ``devices_in_geofence``.
+    """
     
     def __init__(
         self, 
         repository: GeofenceRepository,
         calculator: GeofenceCalculator,
-        event_publisher: EventPublisher
+        event_publisher: EventPublisher,
+        geofence_cache: Optional[GeofenceCache] = None,
+        state_buffer: Optional[DeviceStateWriteBuffer] = None,
+        state_cache: Optional[DeviceStateCache] = None,
+        fast_path: bool = True,
+        single_query: bool = False,
+        sequencer: Optional[DeviceSequencer] = None,
+        outbox: Optional[OutboxDispatcher] = None,
+        history: Optional[LocationHistoryWriter] = None,
+        memberships: Optional[FenceMembershipIndex] = None
     ):
         self.repository = repository
         self.calculator = calculator
         self.event_publisher = event_publisher
+        self.geofence_cache = geofence_cache
+        self.state_buffer = state_buffer
+        self.state_cache = state_cache
+        self.fast_path = fast_path and geofence_cache is not None and state_cache is not None
+        self.single_query = single_query
+        self.sequencer = sequencer
+        self.outbox = outbox
+        self.history = history
+        self.memberships = memberships
+    
+    async def _get_geofences(self) -> List[Geofence] | GeofenceGridIndex:
+        """Fence set for containment checks, from the cache when configured."""
+        if self.geofence_cache is not None:
+            return await self.geofence_cache.get_index()
+        return await self.repository.get_all_geofences()
+    
+    async def _get_device_state(self, device_id: str) -> Optional[DeviceState]:
+        """Last known device state: state cache, then write buffer, then database."""
+        if self.state_cache is not None:
+            cached = self.state_cache.get(device_id)
+            if cached is not None:
+                return cached
+        
+        if self.state_buffer is not None:
+            pending = self.state_buffer.get_pending(device_id)
+            if pending is not None:
+                return pending
+        
+        state = await self.repository.get_device_state(device_id)
+        if state is not None and self.state_cache is not None:
+            self.state_cache.put_state(state)
+        return state
+    
+    async def _get_device_states(self, device_ids: List[str]) -> Dict[str, DeviceState]:
+        """Batch variant of ``_get_device_state``."""
+        states: Dict[str, DeviceState] = {}
+        missing = []
+        for device_id in device_ids:
+            state = self.state_cache.get(device_id) if self.state_cache is not None else None
+            if state is None and self.state_buffer is not None:
+                state = self.state_buffer.get_pending(device_id)
+            if state is None:
+                missing.append(device_id)
+            else:
+                states[device_id] = state
+        
+        if missing:
+            loaded = await self.repository.get_device_states(missing)
+            if self.state_cache is not None:
+                for state in loaded.values():
+                    self.state_cache.put_state(state)
+            states.update(loaded)
+        return states
+    
+    async def _save_device_state(
+        self,
+        device_id: str,
+        lat: float,
+        lon: float,
+        is_inside: bool,
+        geofence_id: Optional[int],
+        geofence_ids: Tuple[int, ...],
+        transition: bool,
+        events: Optional[List[Dict[str, Any]]] = None
+    ) -> None:
+        """Persist a device state, through the write buffer when configured.
+        
+        ``events`` go to the outbox in the same transaction.
+        """
+        if events:
+            if self.state_buffer is not None:
+                await self.state_buffer.update_device_state(
+                    device_id, lat, lon, is_inside, geofence_id, geofence_ids,
+                    flush_now=True, events=events
+                )
+            else:
+                await self.repository.update_device_state(
+                    device_id, lat, lon, is_inside, geofence_id, geofence_ids, events=events
+                )
+            self.outbox.notify()
+        elif self.state_buffer is not None:
+            await self.state_buffer.update_device_state(
+                device_id, lat, lon, is_inside, geofence_id, geofence_ids, flush_now=transition
+            )
+        else:
+            await self.repository.update_device_state(
+                device_id, lat, lon, is_inside, geofence_id, geofence_ids
+            )
+        
+        if self.state_cache is not None:
+            self.state_cache.put(device_id, lat, lon, is_inside, geofence_id, geofence_ids)
+        if self.memberships is not None:
+            self.memberships.update(device_id, geofence_ids)
+    
+    def is_routine_fix(self, device_id: str, lat: float, lon: float) -> bool:
+        """Whether a fix most likely repeats the device's cached fence membership.
+        
+        True when the device has not moved from its cached fix, or is still
+        inside its safe radius. Answered from the cached state alone, with no
+        containment test, so admission control can rank fixes cheaply before
+        checking them; without the caches every fix may be a transition.
+        """
+        if self.state_cache is None or self.geofence_cache is None:
+            return False
+        state = self.state_cache.peek(device_id)
+        if state is None or state.last_lat is None:
+            return False
+        
+        if state.last_lat == lat and state.last_lon == lon:
+            return True
+        return (
+            state.safe_radius_km > 0
+            and state.fence_generation == self.geofence_cache.generation
+            and self.calculator.calculate_distance_km(
+                state.last_lat, state.last_lon, lat, lon
+            ) < state.safe_radius_km
+        )
     
     async def check_device_location(self, location: DeviceLocationModel) -> Dict[str, Any]:
         """Check if device location is within geofences and handle state changes."""
+        if self.sequencer is not None:
+            return await self.sequencer.run(
+                location.device_id, lambda: self._check_device_location(location)
+            )
+        return await self._check_device_location(location)
+    
+    async def _check_device_location(self, location: DeviceLocationModel) -> Dict[str, Any]:
+        """Single check, run directly or on the device's sequencer shard."""
+        if self.single_query:
+            return await self._check_in_database(location)
         
-        geofences = await self.repository.get_all_geofences()
-        device_state = await self.repository.get_device_state(location.device_id)
+        start = perf_counter_ns()
+        geofences = await self._get_geofences()
+        fetched = perf_counter_ns()
+        _STAGES["fence_fetch"].observe_ns(fetched - start)
         
-        containing_geofence = self.calculator.find_containing_geofence(location, geofences)
-        is_inside = containing_geofence is not None
+        device_state = await self._get_device_state(location.device_id)
+        read = perf_counter_ns()
+        _STAGES["state_read"].observe_ns(read - fetched)
         
-        state_changed = (
-            device_state is None or 
-            device_state.is_inside_fence != is_inside
-        )
+        if self.fast_path:
+            result = self._check_safe_zone(location, device_state, geofences)
+            if result is not None:
+                self.state_cache.count_evaluation(fast_path=True)
+                if self.history is not None:
+                    self.history.record(
+                        location.device_id, location.lat, location.lon,
+                        device_state.is_inside_fence, device_state.last_geofence_id
+                    )
+                _CHECKS["fast"].inc()
+                _STAGES["total"].observe_ns(perf_counter_ns() - start)
+                return result
         
-        if state_changed and device_state and device_state.is_inside_fence and not is_inside:
-            await self._publish_fence_exit_event(location, device_state)
+        containing = self.calculator.find_containing_geofences(location, geofences)
+        _STAGES["containment"].observe_ns(perf_counter_ns() - read)
+        events = [] if self.outbox is not None else None
+        result = await self._apply_transition(
+            location.device_id, location.lat, location.lon,
+            device_state, containing, geofences, events
+        )
         
-        geofence_id = containing_geofence.id if containing_geofence else None
-        await self.repository.update_device_state(
+        geofence_id = containing[0].id if containing else None
+        geofence_ids = _membership_of(containing)
+        write_start = perf_counter_ns()
+        await self._save_device_state(
             location.device_id, 
             location.lat, 
             location.lon, 
-            is_inside,
-            geofence_id
+            result["inside_geofence"],
+            geofence_id,
+            geofence_ids,
+            self._is_transition(device_state, geofence_ids),
+            events
+        )
+        written = perf_counter_ns()
+        _STAGES["state_write"].observe_ns(written - write_start)
+        
+        if self.fast_path:
+            self.state_cache.count_evaluation(fast_path=False)
+            self.state_cache.set_safe_zone(
+                location.device_id,
+                self.calculator.safe_radius_km(location.lat, location.lon, geofences),
+                self.geofence_cache.generation
+            )
+            _STAGES["safe_radius"].observe_ns(perf_counter_ns() - written)
+        
+        if self.history is not None:
+            self.history.record(
+                location.device_id, location.lat, location.lon, result["inside_geofence"], geofence_id
+            )
+        _CHECKS["full"].inc()
+        _STAGES["total"].observe_ns(perf_counter_ns() - start)
+        return result
+    
+    async def _check_in_database(self, location: DeviceLocationModel) -> Dict[str, Any]:
+        """Single check as one round trip through ``repository.check_device_location``."""
+        start = perf_counter_ns()
+        row = await self.repository.check_device_location(
+            location.device_id, location.lat, location.lon
         )
+        _STAGES["single_query"].observe_ns(perf_counter_ns() - start)
+        
+        previous_ids = row["previous_geofence_ids"]
+        is_inside = row["is_inside_fence"]
+        state_changed = previous_ids is None or previous_ids != row["geofence_ids"]
+        changes = orjson.loads(row["changes"]) if row["changes"] else []
+        if changes and self.outbox is not None:
+            # The statement queued the events in the outbox.
+            for change in changes:
+                _FENCE_EVENTS[change["event_type"]].inc()
+            self.outbox.notify()
+        else:
+            for change in changes:
+                await self._publish_fence_event(
+                    change["event_type"], location.device_id, location.lat, location.lon,
+                    change["geofence_name"], change["geofence_id"]
+                )
         
+        if self.memberships is not None:
+            self.memberships.update(location.device_id, row["geofence_ids"])
+        if self.history is not None:
+            self.history.record(
+                location.device_id, location.lat, location.lon, is_inside, row["geofence_id"]
+            )
+        _CHECKS["single_query"].inc()
+        _STAGES["total"].observe_ns(perf_counter_ns() - start)
         return {
             "device_id": location.device_id,
             "inside_geofence": is_inside,
-            "geofence_name": containing_geofence.name if containing_geofence else None,
+            "geofence_name": row["geofence_name"],
+            "geofence_names": row["geofence_names"],
             "state_changed": state_changed
         }
     
-    async def _publish_fence_exit_event(
+    def _check_safe_zone(
+        self,
+        location: DeviceLocationModel,
+        device_state: Optional[DeviceState],
+        geofences: GeofenceGridIndex
+    ) -> Optional[Dict[str, Any]]:
+        """Answer a fix from the cached state if it is inside the safe radius."""
+        if not isinstance(device_state, DeviceStateRecord):
+            return None
+        if (device_state.safe_radius_km <= 0
+                or device_state.fence_generation != self.geofence_cache.generation):
+            return None
+        
+        distance = self.calculator.calculate_distance_km(
+            device_state.last_lat, device_state.last_lon, location.lat, location.lon
+        )
+        if distance >= device_state.safe_radius_km:
+            return None
+        
+        names = []
+        for geofence_id in device_state.geofence_ids:
+            geofence = geofences.get(geofence_id)
+            if geofence is None:
+                return None
+            names.append(geofence.name)
+        primary = geofences.get(device_state.last_geofence_id)
+        
+        return {
+            "device_id": location.device_id,
+            "inside_geofence": device_state.is_inside_fence,
+            "geofence_name": primary.name if primary is not None else None,
+            "geofence_names": names,
+            "state_changed": False
+        }
+    
+    async def check_device_locations(
         self, 
-        location: DeviceLocationModel, 
-        previous_state
-    ) -> None:
-        """Publish fence exit event."""
-        geofences = await self.repository.get_all_geofences()
-        geofence_name = None
-        
-        if previous_state.last_geofence_id:
-            for gf in geofences:
-                if gf.id == previous_state.last_geofence_id:
-                    geofence_name = gf.name
-                    break
-        
-        event_data = GeoEventData.create_fence_exit_event(
-            location.device_id,
-            location.lat,
-            location.lon,
-            geofence_name
+        locations: List[DeviceLocationModel]
+    ) -> List[Dict[str, Any]]:
+        """Check a batch of device locations, exclusive of other work on its devices."""
+        return await self.check_device_arrays(
+            [location.device_id for location in locations],
+            [location.lat for location in locations],
+            [location.lon for location in locations]
+        )
+    
+    async def check_device_arrays(
+        self,
+        device_ids: Sequence[str],
+        lats: Sequence[float] | np.ndarray,
+        lons: Sequence[float] | np.ndarray
+    ) -> List[Dict[str, Any]]:
+        """Batch check over parallel sequences of already validated fixes.
+        
+        Same as ``check_device_locations`` without per-fix model objects, for
+        decoders that produce coordinate arrays.
+        """
+        if self.sequencer is None or not len(device_ids):
+            return await self._check_device_arrays(device_ids, lats, lons)
+        return await self.sequencer.run_for_devices(
+            device_ids, lambda: self._check_device_arrays(device_ids, lats, lons)
+        )
+    
+    async def _check_device_arrays(
+        self,
+        fix_device_ids: Sequence[str],
+        lats: Sequence[float] | np.ndarray,
+        lons: Sequence[float] | np.ndarray
+    ) -> List[Dict[str, Any]]:
+        """Check a batch of device locations.
+        
+        Containment is computed for the whole batch in one vectorized pass,
+        device states are read and written back with one query each, and fixes
+        for the same device are applied in input order. Results are returned
+        in input order.
+        """
+        if not len(fix_device_ids):
+            return []
+        
+        start = perf_counter_ns()
+        geofences = await self._get_geofences()
+        device_ids = list(dict.fromkeys(fix_device_ids))
+        states = await self._get_device_states(device_ids)
+        
+        matches = self.calculator.find_all_containing_geofences_batch(lats, lons, geofences)
+        if isinstance(lats, np.ndarray):
+            lats, lons = lats.tolist(), lons.tolist()
+        
+        results = []
+        checked = [] if self.history is not None else None
+        any_transition = False
+        events = [] if self.outbox is not None else None
+        for device_id, lat, lon, containing in zip(fix_device_ids, lats, lons, matches):
+            device_state = states.get(device_id)
+            result = await self._apply_transition(
+                device_id, lat, lon, device_state, containing, geofences, events
+            )
+            geofence_id = containing[0].id if containing else None
+            geofence_ids = _membership_of(containing)
+            any_transition = any_transition or self._is_transition(device_state, geofence_ids)
+            states[device_id] = DeviceStateRecord(
+                device_id, lat, lon, result["inside_geofence"], geofence_id, geofence_ids
+            )
+            if checked is not None:
+                checked.append((device_id, lat, lon, result["inside_geofence"], geofence_id))
+            results.append(result)
+        
+        rows = [
+            (
+                device_id,
+                states[device_id].last_lat,
+                states[device_id].last_lon,
+                states[device_id].is_inside_fence,
+                states[device_id].last_geofence_id,
+                states[device_id].geofence_ids
+            )
+            for device_id in device_ids
+        ]
+        if events:
+            if self.state_buffer is not None:
+                await self.state_buffer.update_device_states(rows, flush_now=True, events=events)
+            else:
+                await self.repository.update_device_states(rows, events=events)
+            self.outbox.notify()
+        elif self.state_buffer is not None:
+            await self.state_buffer.update_device_states(rows, flush_now=any_transition)
+        else:
+            await self.repository.update_device_states(rows)
+        
+        if self.state_cache is not None:
+            for row in rows:
+                self.state_cache.put(*row)
+        if self.memberships is not None:
+            for row in rows:
+                self.memberships.update(row[0], row[5])
+        if checked is not None:
+            self.history.record_many(checked)
+        
+        _CHECKS["batch"].inc(len(results))
+        _BATCH_SECONDS.observe_ns(perf_counter_ns() - start)
+        return results
+    
+    async def get_device_track(
+        self,
+        device_id: str,
+        start: datetime,
+        end: datetime,
+        max_points: int = 1000,
+        tolerance_m: float = 0.0
+    ) -> Dict[str, Any]:
+        """A device's recorded track between ``start`` and ``end``, downsampled.
+        
+        The database keeps the last fix of each of ``max_points`` equal time
+        buckets plus every fence transition; with ``tolerance_m`` the result is
+        further simplified with Douglas-Peucker, never dropping a transition.
+        """
+        bucket_seconds = max((end - start).total_seconds() / max_points, 0.001)
+        rows, total = await self.repository.get_location_track(device_id, start, end, bucket_seconds)
+        
+        kept = simplify_track(
+            [row["lat"] for row in rows],
+            [row["lon"] for row in rows],
+            tolerance_m,
+            keep=[row["transition"] for row in rows]
         )
+        return {
+            "device_id": device_id,
+            "bucket_seconds": bucket_seconds,
+            "source_fixes": total,
+            "points": [
+                {
+                    "timestamp": rows[i]["recorded_at"],
+                    "lat": rows[i]["lat"],
+                    "lon": rows[i]["lon"],
+                    "inside_geofence": rows[i]["is_inside_fence"],
+                    "geofence_id": rows[i]["geofence_id"],
+                    "transition": rows[i]["transition"],
+                }
+                for i in kept
+            ],
+        }
+    
+    async def _get_index(self) -> GeofenceGridIndex:
+        geofences = await self._get_geofences()
+        if isinstance(geofences, GeofenceGridIndex):
+            return geofences
+        return self.calculator.build_index(geofences)
+    
+    async def nearest_geofences(self, lat: float, lon: float, k: int = 5) -> Dict[str, Any]:
+        """The ``k`` fences whose boundaries are nearest a point, nearest first.
         
-        await self.event_publisher.publish_geo_event(event_data)
\ No newline at end of file
+        Distances are signed: negative when the point is inside the fence.
+        """
+        index = await self._get_index()
+        return {
+            "lat": lat,
+            "lon": lon,
+            "geofences": [
+                {
+                    "id": geofence.id,
+                    "name": geofence.name,
+                    "distance_km": distance,
+                    "inside": distance <= 0,
+                }
+                for geofence, distance in self.calculator.nearest_geofences(lat, lon, index, k)
+            ],
+        }
+    
+    async def devices_in_geofence(
+        self,
+        geofence_id: int,
+        limit: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Devices this process last saw inside a fence, None for an unknown fence.
+        
+        Needs ``memberships``.
+        """
+        index = await self._get_index()
+        if index.get(geofence_id) is None:
+            return None
+        return {
+            "geofence_id": geofence_id,
+            "count": self.memberships.count(geofence_id),
+            "device_ids": self.memberships.devices_in(geofence_id, limit),
+        }
+    
+    @staticmethod
+    def _is_transition(device_state: Optional[DeviceState], geofence_ids: Tuple[int, ...]) -> bool:
+        """Whether a fix changes the persisted fence membership of a device."""
+        return device_state is None or device_state.geofence_ids != geofence_ids
+    
+    async def _apply_transition(
+        self,
+        device_id: str,
+        lat: float,
+        lon: float,
+        device_state,
+        containing: List[Geofence],
+        geofences: List[Geofence] | GeofenceGridIndex,
+        events: Optional[List[Dict[str, Any]]] = None
+    ) -> Dict[str, Any]:
+        """Compare a fix against the previous state and publish its fence events.
+        
+        Events are appended to ``events`` instead when it is given.
+        """
+        geofence_ids = _membership_of(containing)
+        state_changed = device_state is None or device_state.geofence_ids != geofence_ids
+        
+        if state_changed and device_state is not None:
+            previous = set(device_state.geofence_ids)
+            current = set(geofence_ids)
+            for geofence_id in sorted(previous - current):
+                geofence = self._find_geofence(geofences, geofence_id)
+                if geofence is not None:
+                    await self._publish_fence_event(
+                        "fence_exit", device_id, lat, lon, geofence.name, geofence_id, events
+                    )
+            for geofence in sorted(containing, key=lambda g: g.id):
+                if geofence.id not in previous:
+                    await self._publish_fence_event(
+                        "fence_enter", device_id, lat, lon, geofence.name, geofence.id, events
+                    )
+        
+        return {
+            "device_id": device_id,
+            "inside_geofence": bool(containing),
+            "geofence_name": containing[0].name if containing else None,
+            "geofence_names": [geofence.name for geofence in containing],
+            "state_changed": state_changed
+        }
+    
+    @staticmethod
+    def _find_geofence(
+        geofences: List[Geofence] | GeofenceGridIndex,
+        geofence_id: int
+    ) -> Optional[Geofence]:
+        """Look up a fence by id in an index or a plain list."""
+        if isinstance(geofences, GeofenceGridIndex):
+            return geofences.get(geofence_id)
+        for geofence in geofences:
+            if geofence.id == geofence_id:
+                return geofence
+        return None
+    
+    async def _publish_fence_event(
+        self,
+        event_type: str,
+        device_id: str,
+        lat: float,
+        lon: float,
+        geofence_name: Optional[str],
+        geofence_id: Optional[int],
+        events: Optional[List[Dict[str, Any]]] = None
+    ) -> None:
+        """Publish a fence enter or exit event, or add it to ``events``."""
+        if event_type == "fence_enter":
+            event_data = GeoEventData.create_fence_enter_event(device_id, lat, lon, geofence_name, geofence_id)
+        else:
+            event_data = GeoEventData.create_fence_exit_event(device_id, lat, lon, geofence_name, geofence_id)
+        if events is not None:
+            events.append(event_data)
+            _FENCE_EVENTS[event_type].inc()
+            return
+        
+        start = perf_counter_ns()
+        await self.event_publisher.publish_geo_event(event_data)
+        _STAGES["publish"].observe_ns(perf_counter_ns() - start)
+        _FENCE_EVENTS[event_type].inc()
+
+
+def _membership_of(containing: List[Geofence]) -> Tuple[int, ...]:
+    """Sorted ids of the fences a fix is in."""
+    return tuple(sorted(geofence.id for geofence in containing))
@@ -0,0 +1,43 @@
+import hashlib
+from bisect import bisect_right
+from typing import Generic, Hashable, List, Sequence, TypeVar
+
+
+Node = TypeVar("Node", bound=Hashable)
+
+
+def _point(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing(Generic[Node]):
+    """Consistent hash ring mapping keys (device ids) to nodes (workers).
+
+    Each node is placed at ``replicas`` pseudo-random points; a key belongs to
+    the first node point at or after its own hash. Adding or removing a node
+    only moves the keys in the arcs it gains or loses, about 1/N of them, so
+    per-worker caches mostly stay valid when the worker count changes.
+    """
+
+    def __init__(self, nodes: Sequence[Node], replicas: int = 512):
+        if not nodes:
+            raise ValueError("a hash ring needs at least one node")
+        self.nodes: List[Node] = list(nodes)
+        self.replicas = replicas
+
+        ring = sorted(
+            (_point(f"{node}#{replica}"), position)
+            for position, node in enumerate(self.nodes)
+            for replica in range(replicas)
+        )
+        self._points = [point for point, _ in ring]
+        self._owners = [position for _, position in ring]
+
+    def node_for(self, key: str) -> Node:
+        """Node owning a key."""
+        return self.nodes[self.position_for(key)]
+
+    def position_for(self, key: str) -> int:
+        """Index into ``nodes`` of the node owning a key."""
+        i = bisect_right(self._points, _point(key))
+        return self._owners[i % len(self._owners)]
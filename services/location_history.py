@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from repositories.geofence_repository import GeofenceRepository
+from services.metrics import registry
+
+
+HistoryRow = Tuple[str, float, float, float, bool, Optional[int]]
+
+_FLUSH_SECONDS = registry.histogram(
+    "geofence_history_flush_seconds", "Time per COPY of buffered location history."
+)
+_DROPPED = registry.counter(
+    "geofence_history_fixes_dropped_total", "Fixes not recorded because the history buffer was full."
+)
+
+
+class LocationHistoryWriter:
+    """Append-only location history fed from the check path.
+
+    ``record`` only appends to an in-memory list, so checks never wait for
+    the history table. A background task COPYs the buffer into
+    ``location_history`` every ``flush_interval_seconds``, or as soon as
+    ``batch_size`` fixes are waiting. When ``max_pending`` fixes are waiting
+    (the database is down or slow) new fixes are dropped and counted rather
+    than growing memory.
+
+    The same task keeps the daily partitions in shape: it creates them
+    ``days_ahead`` days in advance and drops those older than
+    ``retention_days``.
+    """
+
+    def __init__(
+        self,
+        repository: GeofenceRepository,
+        flush_interval_seconds: float = 1.0,
+        batch_size: int = 5000,
+        max_pending: int = 100_000,
+        retention_days: int = 30,
+        days_ahead: int = 2,
+        maintenance_interval_seconds: float = 3600.0,
+        clock: Callable[[], float] = time.time
+    ):
+        self.repository = repository
+        self.flush_interval_seconds = flush_interval_seconds
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.retention_days = retention_days
+        self.days_ahead = days_ahead
+        self.maintenance_interval_seconds = maintenance_interval_seconds
+        self._clock = clock
+        self.logger = logging.getLogger(__name__)
+
+        self._pending: List[HistoryRow] = []
+        self._wake = asyncio.Event()
+        self._write_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._next_maintenance = 0.0
+
+        self.recorded = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.rows_flushed = 0
+        self.flush_errors = 0
+        self.partitions_dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def record(
+        self,
+        device_id: str,
+        lat: float,
+        lon: float,
+        is_inside_fence: bool,
+        geofence_id: Optional[int]
+    ) -> None:
+        """Queue one checked fix, stamped now."""
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            _DROPPED.inc()
+            return
+        self._pending.append((device_id, self._clock(), lat, lon, is_inside_fence, geofence_id))
+        self.recorded += 1
+        if len(self._pending) >= self.batch_size:
+            self._wake.set()
+
+    def record_many(self, rows: Sequence[Tuple[str, float, float, bool, Optional[int]]]) -> None:
+        """Queue a batch of checked (device_id, lat, lon, inside, geofence_id) fixes."""
+        room = self.max_pending - len(self._pending)
+        if room < len(rows):
+            self.dropped += len(rows) - max(room, 0)
+            _DROPPED.inc(len(rows) - max(room, 0))
+            rows = rows[:max(room, 0)]
+        now = self._clock()
+        self._pending.extend(
+            (device_id, now, lat, lon, inside, geofence_id)
+            for device_id, lat, lon, inside, geofence_id in rows
+        )
+        self.recorded += len(rows)
+        if len(self._pending) >= self.batch_size:
+            self._wake.set()
+
+    async def flush(self) -> int:
+        """COPY everything buffered; returns rows written."""
+        async with self._write_lock:
+            if not self._pending:
+                return 0
+
+            batch, self._pending = self._pending, []
+            to_datetime = datetime.fromtimestamp
+            rows = [
+                (device_id, to_datetime(at, timezone.utc), lat, lon, inside, geofence_id)
+                for device_id, at, lat, lon, inside, geofence_id in batch
+            ]
+            start = time.perf_counter_ns()
+            try:
+                await self.repository.copy_location_history(rows)
+            except Exception:
+                # Keep the rows for the next attempt, within the buffer limit.
+                self._pending[:0] = batch[:max(self.max_pending - len(self._pending), 0)]
+                self.flush_errors += 1
+                raise
+            _FLUSH_SECONDS.observe_ns(time.perf_counter_ns() - start)
+
+            self.flushes += 1
+            self.rows_flushed += len(rows)
+            return len(rows)
+
+    async def maintain_partitions(self) -> None:
+        """Create upcoming daily partitions and drop expired ones."""
+        today = datetime.fromtimestamp(self._clock(), timezone.utc).date()
+        # Yesterday too, for fixes buffered across midnight.
+        await self.repository.create_history_partitions(
+            [today + timedelta(days=offset) for offset in range(-1, self.days_ahead + 1)]
+        )
+        dropped = await self.repository.drop_history_partitions(today - timedelta(days=self.retention_days))
+        if dropped:
+            self.partitions_dropped += len(dropped)
+            self.logger.info(f"Dropped expired location history partitions: {', '.join(dropped)}")
+        self._next_maintenance = time.monotonic() + self.maintenance_interval_seconds
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                if time.monotonic() >= self._next_maintenance:
+                    await self.maintain_partitions()
+                await self.flush()
+            except Exception as e:
+                self.logger.error(f"Location history flush failed: {e}")
+
+    async def start(self) -> None:
+        """Ensure today's partitions exist and start the background task."""
+        await self.maintain_partitions()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Stop the background task and write what is buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        try:
+            await self.flush()
+        except Exception as e:
+            self.logger.error(f"Location history not flushed at shutdown, {len(self)} fixes lost: {e}")
+        self.logger.info(f"Location history writer stopped: {self.stats()}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Writer counters."""
+        return {
+            "pending": len(self._pending),
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+            "rows_flushed": self.rows_flushed,
+            "flush_errors": self.flush_errors,
+            "partitions_dropped": self.partitions_dropped,
+        }
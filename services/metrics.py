@@ -0,0 +1,137 @@
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+# Upper bounds in seconds; the hot path spans ~10us (cached) to ~100ms (DB).
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5
+)
+
+# (name suffix, labels, value) rows a metric contributes to its family.
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items()) + "}"
+
+
+class Histogram:
+    """Fixed-bucket latency histogram fed with ``perf_counter_ns`` deltas.
+
+    Buckets are preallocated and ``observe_ns`` only bumps integers, so
+    recording a sample allocates nothing beyond the int it is given.
+    """
+    __slots__ = ("labels", "bounds_ns", "buckets", "counts", "sum_ns", "count")
+
+    def __init__(self, labels: Dict[str, str], buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.bounds_ns = [int(bound * 1e9) for bound in self.buckets]
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum_ns = 0
+        self.count = 0
+
+    def observe_ns(self, elapsed_ns: int) -> None:
+        self.counts[bisect_left(self.bounds_ns, elapsed_ns)] += 1
+        self.sum_ns += elapsed_ns
+        self.count += 1
+
+    def samples(self) -> Iterable[Sample]:
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield "_bucket", {**self.labels, "le": repr(bound)}, cumulative
+        yield "_bucket", {**self.labels, "le": "+Inf"}, self.count
+        yield "_sum", self.labels, self.sum_ns / 1e9
+        yield "_count", self.labels, self.count
+
+
+class Counter:
+    """Monotonic counter; family names end in ``_total``."""
+    __slots__ = ("labels", "value")
+
+    def __init__(self, labels: Dict[str, str]):
+        self.labels = labels
+        self.value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        self.value += amount
+
+    def samples(self) -> Iterable[Sample]:
+        yield "", self.labels, self.value
+
+
+class MetricsRegistry:
+    """Process-wide set of metric families rendered in Prometheus text format.
+
+    Metrics are created once, at import or construction time, and recorded
+    into directly; collectors add values computed at scrape time, such as
+    cache counters that already live on their components.
+    """
+
+    def __init__(self):
+        self._families: Dict[str, Tuple[str, str, List]] = {}
+        self._collectors: List[Tuple[str, str, Callable[[], Iterable[Tuple[Dict[str, str], float]]]]] = []
+
+    def _get(self, name: str, kind: str, help_text: str, factory, labels: Dict[str, str]):
+        family = self._families.setdefault(name, (kind, help_text, []))
+        if family[0] != kind:
+            raise ValueError(f"metric {name} already registered as a {family[0]}")
+        for metric in family[2]:
+            if metric.labels == labels:
+                return metric
+        metric = factory(labels)
+        family[2].append(metric)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labels: Optional[Dict[str, str]] = None,
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._get(name, "histogram", help_text, lambda metric_labels: Histogram(metric_labels, buckets), labels or {})
+
+    def histograms(self, name: str, help_text: str, label: str, values: Sequence[str]) -> Dict[str, Histogram]:
+        """One histogram per label value, e.g. per stage."""
+        return {value: self.histogram(name, help_text, {label: value}) for value in values}
+
+    def counter(self, name: str, help_text: str, labels: Optional[Dict[str, str]] = None) -> Counter:
+        return self._get(name, "counter", help_text, Counter, labels or {})
+
+    def register_collector(
+        self,
+        name: str,
+        help_text: str,
+        collect: Callable[[], Iterable[Tuple[Dict[str, str], float]]]
+    ) -> None:
+        """Add a gauge family whose (labels, value) samples are read at scrape time."""
+        self._collectors.append((name, help_text, collect))
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for name, (kind, help_text, metrics) in self._families.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for metric in metrics:
+                for suffix, labels, value in metric.samples():
+                    lines.append(f"{name}{suffix}{_format_labels(labels)} {value}")
+
+        for name, help_text, collect in self._collectors:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in collect():
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
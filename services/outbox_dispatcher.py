@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import random
+from typing import Any, Dict, List, Optional
+
+from repositories.geofence_repository import GeofenceRepository
+from services.event_publisher import EventPublisher
+from services.metrics import registry
+
+
+# Seconds an event waited in the outbox; dispatch normally takes milliseconds,
+# broker outages minutes.
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+_LAG = registry.histogram(
+    "geofence_outbox_dispatch_lag_seconds",
+    "Time from an event entering the outbox to its dispatch.",
+    buckets=LAG_BUCKETS
+)
+_DISPATCHED = registry.counter(
+    "geofence_outbox_events_dispatched_total", "Outbox events handed to the publisher."
+)
+_FAILURES = registry.counter(
+    "geofence_outbox_dispatch_failures_total", "Outbox batches that failed and were retried."
+)
+
+
+class OutboxDispatcher:
+    """Background task draining ``event_outbox`` into an ``EventPublisher``.
+
+    Batches of up to ``batch_size`` events are claimed with ``FOR UPDATE
+    SKIP LOCKED`` and deleted only once the publisher accepted them, so every
+    process can run a dispatcher and events are delivered at least once. The
+    task polls every ``poll_interval_seconds``; ``notify`` wakes it as soon
+    as this process has committed events. Failed batches are retried with
+    exponential backoff and jitter.
+    """
+
+    def __init__(
+        self,
+        repository: GeofenceRepository,
+        publisher: EventPublisher,
+        batch_size: int = 256,
+        poll_interval_seconds: float = 0.5,
+        retry_base_delay: float = 0.1,
+        max_retry_delay: float = 10.0
+    ):
+        self.repository = repository
+        self.publisher = publisher
+        self.batch_size = batch_size
+        self.poll_interval_seconds = poll_interval_seconds
+        self.retry_base_delay = retry_base_delay
+        self.max_retry_delay = max_retry_delay
+        self.logger = logging.getLogger(__name__)
+
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        self.dispatched = 0
+        self.batches = 0
+        self.failures = 0
+        self.last_lag_seconds = 0.0
+
+    def notify(self) -> None:
+        """Signal that new events were committed to the outbox."""
+        self._wake.set()
+
+    async def _publish(self, events: List[Dict[str, Any]], lags: List[float]) -> None:
+        await self.publisher.publish_geo_events(events)
+        for lag in lags:
+            _LAG.observe_ns(int(lag * 1e9))
+        self.last_lag_seconds = lags[-1]
+
+    async def dispatch_once(self) -> int:
+        """Dispatch one batch; returns the number of events sent."""
+        count = await self.repository.dispatch_outbox(self.batch_size, self._publish)
+        if count:
+            self.dispatched += count
+            self.batches += 1
+            _DISPATCHED.inc(count)
+        return count
+
+    async def _wait(self, timeout: float) -> None:
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self) -> None:
+        attempt = 0
+        while True:
+            self._wake.clear()
+            try:
+                count = await self.dispatch_once()
+            except Exception as e:
+                self.failures += 1
+                _FAILURES.inc()
+                delay = min(self.max_retry_delay, self.retry_base_delay * 2 ** attempt)
+                delay *= random.uniform(0.5, 1.5)
+                attempt += 1
+                self.logger.warning(f"Outbox dispatch failed ({e}), retrying in {delay:.3f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            attempt = 0
+            if count < self.batch_size:
+                await self._wait(self.poll_interval_seconds)
+
+    def start(self) -> None:
+        """Start the dispatch task."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Stop the dispatch task, then try once to drain what is left."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        try:
+            while await self.dispatch_once() == self.batch_size:
+                pass
+        except Exception as e:
+            self.logger.error(f"Outbox not drained at shutdown, events stay queued: {e}")
+        self.logger.info(f"Outbox dispatcher stopped: {self.stats()}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Dispatcher counters."""
+        return {
+            "dispatched": self.dispatched,
+            "batches": self.batches,
+            "failures": self.failures,
+            "last_lag_seconds": self.last_lag_seconds,
+        }
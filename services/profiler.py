@@ -0,0 +1,110 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class ProfilerBusyError(RuntimeError):
+    """Raised when a capture is requested while another one is running."""
+
+
+class SamplingProfiler:
+    """On-demand sampling profiler for the event loop thread.
+
+    Nothing runs until ``capture`` is called. A capture starts a daemon thread
+    that reads the loop thread's stack every ``interval_seconds`` via
+    ``sys._current_frames``, keeping only stacks that pass through a file
+    ending in one of ``focus`` (by default the location-check path). Results
+    come back as folded stacks, the input format of flame graph tools, plus
+    the hottest leaf functions.
+
+    The sampler needs the GIL to read a stack, and the loop thread otherwise
+    only hands it over at I/O waits, which would bias every sample towards
+    ``select``. The interpreter switch interval is therefore lowered for the
+    duration of a capture and restored afterwards.
+    """
+
+    def __init__(
+        self,
+        interval_seconds: float = 0.005,
+        focus: Tuple[str, ...] = ("services/geofence_service.py",),
+        max_seconds: float = 60.0
+    ):
+        self.interval_seconds = interval_seconds
+        self.focus = tuple(path.replace("/", os.sep) for path in focus)
+        self.max_seconds = max_seconds
+        self._running = False
+        self.captures = 0
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def _frame_stack(self, frame) -> Optional[Tuple[str, ...]]:
+        stack: List[str] = []
+        matched = not self.focus
+        while frame is not None:
+            code = frame.f_code
+            if not matched and code.co_filename.endswith(self.focus):
+                matched = True
+            stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        if not matched:
+            return None
+        stack.reverse()
+        return tuple(stack)
+
+    def _sample(self, thread_id: int, stop: threading.Event, stacks: Counter, totals: List[int]) -> None:
+        while not stop.wait(self.interval_seconds):
+            frame = sys._current_frames().get(thread_id)
+            totals[0] += 1
+            stack = self._frame_stack(frame)
+            if stack is not None:
+                stacks[stack] += 1
+
+    async def capture(self, seconds: float) -> Dict[str, Any]:
+        """Sample the calling event loop's thread for ``seconds``."""
+        if self._running:
+            raise ProfilerBusyError("a profile capture is already running")
+        seconds = min(max(seconds, self.interval_seconds), self.max_seconds)
+
+        self._running = True
+        stacks: Counter = Counter()
+        totals = [0]
+        stop = threading.Event()
+        sampler = threading.Thread(
+            target=self._sample,
+            args=(threading.get_ident(), stop, stacks, totals),
+            name="sampling-profiler",
+            daemon=True
+        )
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(switch_interval, self.interval_seconds / 5))
+        started = time.monotonic()
+        sampler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            stop.set()
+            sys.setswitchinterval(switch_interval)
+            await asyncio.get_running_loop().run_in_executor(None, sampler.join)
+            self._running = False
+            self.captures += 1
+
+        leaves: Counter = Counter()
+        for stack, count in stacks.items():
+            leaves[stack[-1]] += count
+
+        return {
+            "duration_seconds": round(time.monotonic() - started, 3),
+            "interval_seconds": self.interval_seconds,
+            "samples": totals[0],
+            "matched_samples": sum(stacks.values()),
+            "top": [{"function": name, "samples": count} for name, count in leaves.most_common(20)],
+            "folded": "".join(
+                f"{';'.join(stack)} {count}\n" for stack, count in stacks.most_common()
+            ),
+        }
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+from typing import AbstractSet, Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from models.records import DeviceStateRecord, membership, without_geofences
+from repositories.geofence_repository import GeofenceRepository
+
+
+# (device_id, lat, lon, is_inside_fence, geofence_id, geofence_ids)
+StateRow = Tuple[str, float, float, bool, Optional[int], Tuple[int, ...]]
+
+
+class DeviceStateWriteBuffer:
+    """Write-behind buffer for device_states upserts.
+
+    Updates are kept in memory, latest per device, and written with one bulk
+    upsert when ``max_pending`` devices are dirty or every
+    ``flush_interval_seconds``. Callers pass ``flush_now=True`` for fence
+    transitions so that persisted state never lags behind published events.
+    All database writes go through one lock, so a device's rows reach the
+    table in the order they were submitted.
+
+    Outbox events passed with an update are written in the same transaction
+    as the next write that includes the update, and kept with the rows if
+    that write fails.
+
+    ``release_geofences`` drops deleted fences from pending rows (and from
+    rows put back after a failed write), which would otherwise fail the
+    foreign key on every flush.
+    """
+
+    def __init__(
+        self,
+        repository: GeofenceRepository,
+        max_pending: int = 1000,
+        flush_interval_seconds: float = 0.5
+    ):
+        self.repository = repository
+        self.max_pending = max_pending
+        self.flush_interval_seconds = flush_interval_seconds
+        self.logger = logging.getLogger(__name__)
+
+        self._pending: Dict[str, StateRow] = {}
+        self._events: List[Dict[str, Any]] = []
+        self._released: Set[int] = set()
+        self._write_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+
+        self.submitted = 0
+        self.coalesced = 0
+        self.immediate_writes = 0
+        self.flushes = 0
+        self.rows_flushed = 0
+        self.flush_errors = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def get_pending(self, device_id: str) -> Optional[DeviceStateRecord]:
+        """Return the buffered state of a device not yet written, if any."""
+        row = self._pending.get(device_id)
+        if row is None:
+            return None
+        return DeviceStateRecord(*row)
+
+    def _put(self, row: StateRow) -> None:
+        self.submitted += 1
+        if row[0] in self._pending:
+            self.coalesced += 1
+        self._pending[row[0]] = row
+
+    def _without_released(self, row: StateRow) -> StateRow:
+        if self._released.isdisjoint(row[5]):
+            return row
+        kept = without_geofences(row[5], self._released)
+        return (row[0], row[1], row[2], bool(kept), kept[0] if kept else None, kept)
+
+    def _restore(self, device_id: str, row: StateRow) -> None:
+        # Unless a newer update arrived meanwhile.
+        self._pending.setdefault(device_id, self._without_released(row))
+
+    def release_geofences(self, geofence_ids: AbstractSet[int]) -> None:
+        """Drop deleted fences from the pending rows."""
+        self._released.update(geofence_ids)
+        for device_id, row in list(self._pending.items()):
+            self._pending[device_id] = self._without_released(row)
+
+    async def update_device_state(
+        self,
+        device_id: str,
+        lat: float,
+        lon: float,
+        is_inside_fence: bool,
+        geofence_id: Optional[int] = None,
+        geofence_ids: Optional[Sequence[int]] = None,
+        flush_now: bool = False,
+        events: Optional[List[Dict[str, Any]]] = None
+    ) -> None:
+        """Buffer a device state update; write it immediately if flush_now."""
+        self._put((
+            device_id, lat, lon, is_inside_fence, geofence_id, membership(geofence_id, geofence_ids)
+        ))
+
+        if events:
+            self._events.extend(events)
+            await self.flush()
+            self.immediate_writes += 1
+        elif flush_now:
+            row = self._pending.pop(device_id)
+            async with self._write_lock:
+                try:
+                    await self.repository.update_device_state(*row)
+                except Exception:
+                    self._restore(device_id, row)
+                    self.flush_errors += 1
+                    raise
+            self.immediate_writes += 1
+        elif len(self._pending) >= self.max_pending:
+            await self.flush()
+
+    async def update_device_states(
+        self,
+        rows: Sequence[StateRow],
+        flush_now: bool = False,
+        events: Optional[List[Dict[str, Any]]] = None
+    ) -> None:
+        """Buffer several updates; flush everything pending if flush_now or events."""
+        for row in rows:
+            self._put(row)
+
+        if events:
+            self._events.extend(events)
+        if flush_now or events or len(self._pending) >= self.max_pending:
+            await self.flush()
+
+    async def flush(self) -> int:
+        """Write all pending updates in one bulk upsert; returns rows written."""
+        async with self._write_lock:
+            if not self._pending:
+                return 0
+
+            batch, self._pending = self._pending, {}
+            events, self._events = self._events, []
+            try:
+                if events:
+                    await self.repository.update_device_states(list(batch.values()), events=events)
+                else:
+                    await self.repository.update_device_states(list(batch.values()))
+            except Exception:
+                for device_id, row in batch.items():
+                    self._restore(device_id, row)
+                self._events[:0] = events
+                self.flush_errors += 1
+                raise
+
+            self.flushes += 1
+            self.rows_flushed += len(batch)
+            return len(batch)
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval_seconds)
+            try:
+                await self.flush()
+            except Exception as e:
+                self.logger.error(f"Device state flush failed: {e}")
+
+    def start(self) -> None:
+        """Start the periodic flush task."""
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_periodically())
+
+    async def close(self) -> None:
+        """Stop the periodic flush task and drain all dirty entries."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+
+        await self.flush()
+        self.logger.info(f"Device state buffer drained: {self.stats()}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Buffer counters."""
+        return {
+            "pending": len(self._pending),
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "immediate_writes": self.immediate_writes,
+            "flushes": self.flushes,
+            "rows_flushed": self.rows_flushed,
+            "flush_errors": self.flush_errors,
+        }
@@ -0,0 +1,70 @@
+"""Write a fence/state snapshot for fast process start.
+
+The fence set, its prebuilt spatial index (including compiled polygons) and
+optionally the most recently updated device states are read from Postgres in
+one consistent transaction and written to a memory-mapped file. Processes
+started with ``SNAPSHOT_PATH`` pointing at it map the file instead of reading
+and indexing the fence table, then catch up on changes made since; see
+``services.cold_start``. Run from the repository root, e.g. from a cron job
+or before rolling out new replicas:
+
+    python snapshot.py --output /var/lib/geofence/snapshot.bin
+    python snapshot.py --output /var/lib/geofence/snapshot.bin --states 100000
+
+The file is replaced atomically, so running processes are unaffected.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import time
+
+from config.settings import settings
+from database.db_setup import DatabaseManager
+from domain.geofence_calculator import GeofenceCalculator
+from domain.snapshot import write_snapshot
+from repositories.geofence_repository import GeofenceRepository
+
+
+logger = logging.getLogger("snapshot")
+
+
+async def main_async(args: argparse.Namespace) -> int:
+    db_manager = DatabaseManager(args.database_url)
+    await db_manager.create_pool()
+    try:
+        start = time.perf_counter()
+        version, as_of, geofences, states = await GeofenceRepository(db_manager.pool).read_snapshot(args.states)
+    finally:
+        await db_manager.close_pool()
+    read = time.perf_counter()
+
+    index = GeofenceCalculator(cell_size_deg=args.cell_size).build_index(geofences)
+    built = time.perf_counter()
+    write_snapshot(args.output, index, version, states, as_of if args.states else None)
+    written = time.perf_counter()
+
+    print(f"{len(geofences)} fences at version {version}, {len(states)} states as of {as_of}")
+    print(f"read {read - start:.2f}s, index {built - read:.2f}s, write {written - built:.2f}s -> {args.output}")
+    return 0
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default=settings.snapshot_path or None, required=not settings.snapshot_path)
+    parser.add_argument("--states", type=int, default=0, help="most recently updated device states to include")
+    parser.add_argument(
+        "--cell-size", type=float, default=settings.geofence_index_cell_deg,
+        help="index cell size; must match GEOFENCE_INDEX_CELL_DEG of the loading processes"
+    )
+    parser.add_argument("--database-url", default=settings.database_url)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    return asyncio.run(main_async(parse_args(argv)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+import asyncio
+import itertools
+
+import pytest_asyncio
+
+
+class FakeRedisServer:
+    """Minimal in-process RESP2 server supporting the commands the publisher uses.
+
+    Streams are kept as lists of (id, fields) tuples. ``fail_next`` makes the
+    next N commands return an error, to exercise retries.
+    """
+
+    def __init__(self):
+        self.streams = {}
+        self.commands = 0
+        self.fail_next = 0
+        self._ids = itertools.count(1)
+        self._server = None
+        self.port = None
+
+    async def start(self) -> "FakeRedisServer":
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+    @property
+    def url(self) -> str:
+        return f"redis://127.0.0.1:{self.port}"
+
+    async def _read_command(self, reader):
+        header = await reader.readline()
+        if not header:
+            return None
+        count = int(header[1:])
+        args = []
+        for _ in range(count):
+            length = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(length + 2))[:-2])
+        return args
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                args = await self._read_command(reader)
+                if args is None:
+                    break
+                writer.write(self._execute(args))
+                await writer.drain()
+        except (ConnectionResetError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _execute(self, args) -> bytes:
+        self.commands += 1
+        name = args[0].upper()
+        if self.fail_next:
+            self.fail_next -= 1
+            return b"-ERR injected failure\r\n"
+        if name == b"PING":
+            return b"+PONG\r\n"
+        if name == b"XADD":
+            return self._xadd(args[1:])
+        if name == b"XLEN":
+            return b":%d\r\n" % len(self.streams.get(args[1], []))
+        return b"+OK\r\n"
+
+    def _xadd(self, args) -> bytes:
+        key, rest = args[0], list(args[1:])
+        maxlen = None
+        if rest[0].upper() == b"MAXLEN":
+            rest.pop(0)
+            if rest[0] in (b"~", b"="):
+                rest.pop(0)
+            maxlen = int(rest.pop(0))
+        rest.pop(0)  # entry id, always "*"
+        fields = dict(zip(rest[::2], rest[1::2]))
+        entry_id = b"%d-0" % next(self._ids)
+        stream = self.streams.setdefault(key, [])
+        stream.append((entry_id, fields))
+        if maxlen is not None and len(stream) > maxlen:
+            del stream[:len(stream) - maxlen]
+        return b"$%d\r\n%s\r\n" % (len(entry_id), entry_id)
+
+
+@pytest_asyncio.fixture
+async def fake_redis():
+    server = await FakeRedisServer().start()
+    yield server
+    await server.stop()
@@ -0,0 +1,193 @@
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock, Mock
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.dependecies import provide_admission_controller, provide_geofence_service
+from api.routers import location
+from domain.geofence_calculator import GeofenceCalculator
+from models.geofence import DeviceLocationModel, GeofenceModel
+from services.admission import AdmissionController, AdmissionRejected
+from services.device_state_cache import DeviceStateCache
+from services.geofence_cache import GeofenceCache
+from services.geofence_service import GeofenceService
+
+
+class FakeClock:
+    """Manually advanced monotonic clock."""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestAdmissionController:
+    """Test cases for AdmissionController."""
+
+    def setup_method(self):
+        self.clock = FakeClock()
+        self.controller = AdmissionController(
+            initial_limit=10, min_limit=2, max_limit=20, latency_target_seconds=0.05,
+            pool_wait_target_seconds=0.01, priority_reserve=0.2, queue_timeout_seconds=0.05,
+            retry_after_seconds=2, clock=self.clock
+        )
+
+    @pytest.mark.asyncio
+    async def test_routine_checks_leave_reserve_for_transitions(self):
+        """Test routine checks are shed at the reserve while transitions still get in."""
+        for _ in range(8):
+            await self.controller.acquire(priority=False)
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            await self.controller.acquire(priority=False)
+        assert rejected.value.retry_after == 2
+
+        await self.controller.acquire(priority=True)
+        await self.controller.acquire(priority=True)
+        assert self.controller.in_flight == 10
+        assert self.controller.stats()["rejected_routine"] == 1
+
+    @pytest.mark.asyncio
+    async def test_transition_deferred_until_slot_frees(self):
+        """Test a transition over the limit waits for a slot instead of failing."""
+        started = [await self.controller.acquire(priority=True) for _ in range(10)]
+
+        waiting = asyncio.create_task(self.controller.acquire(priority=True))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected):
+            await self.controller.acquire(priority=False)
+
+        self.controller.release(started[0])
+        await waiting
+        assert self.controller.in_flight == 10
+        assert self.controller.deferred == 1
+
+        with pytest.raises(AdmissionRejected):
+            await self.controller.acquire(priority=True)
+        assert self.controller.rejected_transition == 1
+        assert not self.controller.stats()["waiting"]
+
+    @pytest.mark.asyncio
+    async def test_limit_grows_when_fast_and_busy(self):
+        """Test fast completions under load raise the limit additively."""
+        started = [await self.controller.acquire(priority=True) for _ in range(10)]
+        for start in started:
+            self.controller.release(start)
+
+        assert 10.4 < self.controller.limit < 10.6
+
+        idle = await self.controller.acquire(priority=True)
+        limit = self.controller.limit
+        self.controller.release(idle)
+        assert self.controller.limit == limit
+
+    @pytest.mark.asyncio
+    async def test_limit_backs_off_once_per_interval(self):
+        """Test slow completions cut the limit once per target interval, down to the minimum."""
+        started = [await self.controller.acquire(priority=True) for _ in range(3)]
+        self.clock.now += 0.2
+        for start in started:
+            self.controller.release(start)
+        assert self.controller.limit == pytest.approx(9.0)
+
+        for _ in range(40):
+            start = await self.controller.acquire(priority=True)
+            self.clock.now += 0.2
+            self.controller.release(start)
+        assert self.controller.limit == 2.0
+
+    @pytest.mark.asyncio
+    async def test_pool_wait_counts_as_congestion(self):
+        """Test a slow connection pool lowers the limit even when checks are quick."""
+        for _ in range(30):
+            self.controller.observe_pool_wait(50_000_000)
+
+        start = await self.controller.acquire(priority=True)
+        self.controller.release(start)
+        assert self.controller.limit == pytest.approx(9.0)
+
+
+class TestRoutineFix:
+    """Test cases for GeofenceService.is_routine_fix."""
+
+    def setup_method(self):
+        self.repository = AsyncMock()
+        self.repository.get_all_geofences.return_value = [
+            GeofenceModel(id=1, name="North Field", center_lat=40.05, center_lon=-95.05, radius_km=1.0)
+        ]
+        self.repository.get_geofence_version.return_value = 1
+        self.repository.get_device_state.return_value = None
+
+    def service(self, fast_path: bool) -> GeofenceService:
+        calculator = GeofenceCalculator()
+        return GeofenceService(
+            self.repository, calculator, AsyncMock(),
+            geofence_cache=GeofenceCache(self.repository, calculator),
+            state_cache=DeviceStateCache(),
+            fast_path=fast_path
+        )
+
+    @pytest.mark.asyncio
+    async def test_routine_within_cached_safe_radius(self):
+        """Test fixes within the cached safe radius are routine, others are not."""
+        service = self.service(fast_path=True)
+
+        assert not service.is_routine_fix("tractor", 40.05, -95.05)
+        await service.check_device_location(DeviceLocationModel(device_id="tractor", lat=40.05, lon=-95.05))
+
+        assert service.is_routine_fix("tractor", 40.0505, -95.05)
+        assert service.is_routine_fix("tractor", 40.058, -95.05)
+        assert not service.is_routine_fix("tractor", 40.07, -95.05)
+        assert not service.is_routine_fix("plough", 40.05, -95.05)
+
+    @pytest.mark.asyncio
+    async def test_routine_without_safe_radius_only_when_unmoved(self):
+        """Test without a safe radius only a repeat of the cached position is routine."""
+        service = self.service(fast_path=False)
+        await service.check_device_location(DeviceLocationModel(device_id="tractor", lat=40.05, lon=-95.05))
+
+        assert service.is_routine_fix("tractor", 40.05, -95.05)
+        assert not service.is_routine_fix("tractor", 40.0505, -95.05)
+
+
+class TestAdmissionApi:
+    """Test cases for admission control on the location routes."""
+
+    def setup_method(self):
+        self.service = AsyncMock()
+        self.service.is_routine_fix = Mock(return_value=True)
+        self.controller = AdmissionController(initial_limit=2, min_limit=1, queue_timeout_seconds=0)
+
+        app = FastAPI()
+        app.include_router(location.router)
+        app.dependency_overrides[provide_geofence_service] = lambda: self.service
+        app.dependency_overrides[provide_admission_controller] = lambda: self.controller
+        self.client = TestClient(app)
+
+    def test_check_releases_slot(self):
+        """Test an admitted check frees its slot when it completes, even on error."""
+        fix = {"device_id": "a", "lat": 1.0, "lon": 1.0}
+        self.service.check_device_location.return_value = {"device_id": "a"}
+        assert self.client.post("/api/v1/location-check", json=fix).status_code == 200
+
+        self.service.check_device_location.side_effect = RuntimeError("db down")
+        assert self.client.post("/api/v1/location-check", json=fix).status_code == 500
+        assert self.controller.in_flight == 0
+        assert self.controller.admitted == 2
+
+    def test_saturated_returns_429(self):
+        """Test a shed check gets 429 with Retry-After and never reaches the service."""
+        self.controller.in_flight = 2
+
+        response = self.client.post(
+            "/api/v1/location-check/batch", json=[{"device_id": "a", "lat": 1.0, "lon": 1.0}]
+        )
+
+        assert response.status_code == 429
+        assert response.headers["retry-after"] == "1"
+        self.service.check_device_locations.assert_not_called()
+        assert self.controller.in_flight == 2
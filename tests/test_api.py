@@ -0,0 +1,88 @@
+from unittest.mock import AsyncMock
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.dependecies import provide_geofence_service
+from api.routers import health, location
+
+
+class TestLocationApi:
+    """Test cases for the location API routes."""
+
+    def setup_method(self):
+        self.mock_service = AsyncMock()
+
+        app = FastAPI()
+        app.include_router(health.router)
+        app.include_router(location.router)
+        app.dependency_overrides[provide_geofence_service] = lambda: self.mock_service
+        self.client = TestClient(app)
+
+    def test_location_check(self):
+        """Test the single location check endpoint."""
+        self.mock_service.check_device_location.return_value = {
+            "device_id": "tractor_001",
+            "inside_geofence": True,
+            "geofence_name": "North Field",
+            "state_changed": False
+        }
+
+        response = self.client.post(
+            "/api/v1/location-check",
+            json={"device_id": "tractor_001", "lat": 40.7831, "lon": -73.9712}
+        )
+
+        assert response.status_code == 200
+        assert response.json()["geofence_name"] == "North Field"
+
+    def test_location_check_validation_error(self):
+        """Test out-of-range coordinates are rejected."""
+        response = self.client.post(
+            "/api/v1/location-check",
+            json={"device_id": "tractor_001", "lat": 95.0, "lon": -73.9712}
+        )
+
+        assert response.status_code == 422
+        self.mock_service.check_device_location.assert_not_called()
+
+    def test_batch_location_check(self):
+        """Test the batch endpoint passes fixes through in input order."""
+        self.mock_service.check_device_locations.side_effect = lambda locations: [
+            {
+                "device_id": loc.device_id,
+                "inside_geofence": False,
+                "geofence_name": None,
+                "state_changed": False
+            }
+            for loc in locations
+        ]
+        payload = [
+            {"device_id": f"tractor_{i:03d}", "lat": 40.0 + i * 0.001, "lon": -73.9}
+            for i in range(500)
+        ]
+
+        response = self.client.post("/api/v1/location-check/batch", json=payload)
+
+        assert response.status_code == 200
+        assert [r["device_id"] for r in response.json()] == [p["device_id"] for p in payload]
+        locations = self.mock_service.check_device_locations.call_args[0][0]
+        assert len(locations) == 500
+
+    def test_batch_location_check_too_large(self):
+        """Test batches above the size limit are rejected."""
+        payload = [{"device_id": "d", "lat": 0.0, "lon": 0.0}] * (location.MAX_BATCH_SIZE + 1)
+
+        response = self.client.post("/api/v1/location-check/batch", json=payload)
+
+        assert response.status_code == 422
+
+    def test_batch_location_check_error(self):
+        """Test service failures map to a 500."""
+        self.mock_service.check_device_locations.side_effect = RuntimeError("boom")
+
+        response = self.client.post(
+            "/api/v1/location-check/batch",
+            json=[{"device_id": "d", "lat": 0.0, "lon": 0.0}]
+        )
+
+        assert response.status_code == 500
@@ -0,0 +1,198 @@
+import csv
+import json
+import os
+import random
+import uuid
+from collections import defaultdict
+
+import pytest
+
+import backfill
+from benchmarks.in_memory_repository import InMemoryGeofenceRepository
+from benchmarks.replay import generate_fences, generate_trace
+from database.db_setup import DatabaseManager
+from domain.geofence_calculator import GeofenceCalculator
+from services.event_publisher import EventPublisher
+from services.geofence_cache import GeofenceCache
+from services.geofence_service import GeofenceService
+
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+
+class CollectingEventPublisher(EventPublisher):
+    """Publisher that keeps every event."""
+
+    def __init__(self):
+        self.events = []
+
+    async def publish_geo_event(self, event_data):
+        self.events.append(event_data)
+
+
+def read_csv(paths):
+    rows = []
+    for path in paths:
+        with open(path, newline="") as f:
+            rows.extend(csv.reader(f))
+    return rows
+
+
+class TestReadFixes:
+    """Test cases for streaming fixes from backfill inputs."""
+
+    def test_jsonl_skips_non_fixes(self, tmp_path):
+        """Test request-shaped lines are unwrapped and invalid lines are counted."""
+        path = tmp_path / "fixes.jsonl"
+        path.write_text("\n".join([
+            json.dumps({"device_id": "a", "lat": 40.0, "lon": -95.0, "timestamp": "2026-01-01T00:00:00Z"}),
+            json.dumps({"request_id": "r1", "body": {"device_id": "b", "lat": 41.0, "lon": -96.0}}),
+            json.dumps({"device_id": "c", "lat": 95.0, "lon": 0.0}),
+            json.dumps({"title": "not a fix"}),
+            "not json",
+        ]))
+        skipped = [0]
+
+        fixes = list(backfill.iter_fixes(str(path), skipped))
+
+        assert fixes == [("a", 40.0, -95.0, "2026-01-01T00:00:00Z"), ("b", 41.0, -96.0, None)]
+        assert skipped == [3]
+
+    def test_csv_export(self, tmp_path):
+        """Test a Postgres CSV export with a header is read by column name."""
+        path = tmp_path / "fixes.csv"
+        path.write_text("timestamp,device_id,lat,lon\n2026-01-01 00:00:00,a,40.5,-95.5\n,b,x,1\n")
+        skipped = [0]
+
+        assert list(backfill.iter_fixes(str(path), skipped)) == [("a", 40.5, -95.5, "2026-01-01 00:00:00")]
+        assert skipped == [1]
+
+
+class TestRunBackfill:
+    """Test cases for the partitioned replay."""
+
+    def setup_method(self):
+        rng = random.Random(5)
+        self.fences = generate_fences(rng, 60, 0.3)
+        self.trace = generate_trace(rng, self.fences, 40, 3000, 400.0)
+        self.fixes = [
+            (fix["device_id"], fix["lat"], fix["lon"], f"2026-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}Z")
+            for i, fix in enumerate(self.trace)
+        ]
+
+    async def sequential(self):
+        """Events and final states of one service checking the whole trace in order."""
+        repository = InMemoryGeofenceRepository(self.fences)
+        calculator = GeofenceCalculator()
+        publisher = CollectingEventPublisher()
+        service = GeofenceService(
+            repository, calculator, publisher, geofence_cache=GeofenceCache(repository, calculator)
+        )
+        for fix in self.trace:
+            await service.check_device_arrays([fix["device_id"]], [fix["lat"]], [fix["lon"]])
+        return publisher.events, repository.states
+
+    @pytest.mark.asyncio
+    async def test_matches_sequential_replay(self, tmp_path):
+        """Test worker processes produce the events and states of an in-order replay."""
+        expected_events, expected_states = await self.sequential()
+
+        summary = backfill.run_backfill(
+            iter(self.fixes), self.fences, 1, str(tmp_path), workers=3, chunk_size=64, queue_chunks=2
+        )
+
+        assert summary["fixes"] == len(self.trace)
+        assert summary["events"] == len(expected_events) > 0
+        assert sum(report["devices"] for report in summary["workers"]) == len(expected_states)
+
+        events = read_csv(report["events_path"] for report in summary["workers"])
+        by_device = defaultdict(list)
+        for event_type, device_id, lat, lon, geofence_name, _, run_id in events:
+            assert event_type in ("fence_enter", "fence_exit") and run_id == "backfill"
+            by_device[device_id].append((event_type, float(lat), float(lon), geofence_name))
+        expected_by_device = defaultdict(list)
+        for event in expected_events:
+            expected_by_device[event["device_id"]].append(
+                (event["event_type"], event["latitude"], event["longitude"], event["geofence_name"])
+            )
+        assert by_device == expected_by_device
+
+        states = read_csv(report["states_path"] for report in summary["workers"])
+        assert {
+            device_id: (
+                float(lat), float(lon), inside == "True", int(fence) if fence else None,
+                tuple(int(i) for i in fences.strip("{}").split(",") if i)
+            )
+            for device_id, lat, lon, inside, fence, fences, _ in states
+        } == {device_id: row[:5] for device_id, row in expected_states.items()}
+
+    def test_stamps_fix_times(self, tmp_path):
+        """Test events carry the causing fix's time and states the device's last fix time."""
+        fixes = [
+            ("tractor", self.fences[0].center_lat, self.fences[0].center_lon, "2026-01-01T08:00:00Z"),
+            ("tractor", 10.0, 10.0, "2026-01-01T08:05:00Z"),
+            ("tractor", 10.0, 10.001, "2026-01-01T08:06:00Z"),
+        ]
+
+        summary = backfill.run_backfill(iter(fixes), self.fences, 1, str(tmp_path), run_id="run-1")
+
+        (report,) = summary["workers"]
+        (event,) = read_csv([report["events_path"]])
+        assert event[1] == "tractor"
+        assert event[4] == self.fences[0].name
+        assert event[5:] == ["2026-01-01T08:05:00Z", "run-1"]
+        (state,) = read_csv([report["states_path"]])
+        assert state == ["tractor", "10.0", "10.001", "False", "", "{}", "2026-01-01T08:06:00Z"]
+
+
+@pytest.mark.asyncio
+async def test_load_results(tmp_path):
+    """Test spooled results are copied into fence_events and upserted into device_states."""
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    import asyncpg
+
+    schema = f"test_backfill_{uuid.uuid4().hex[:8]}"
+    admin = await asyncpg.connect(TEST_DATABASE_URL)
+    await admin.execute(f"CREATE SCHEMA {schema}")
+    manager = DatabaseManager(TEST_DATABASE_URL)
+    manager.pool = await asyncpg.create_pool(
+        TEST_DATABASE_URL, min_size=1, max_size=2,
+        server_settings={"search_path": f"{schema},public"}
+    )
+    try:
+        await manager.create_tables()
+        async with manager.pool.acquire() as conn:
+            fence_id = await conn.fetchval(
+                "INSERT INTO geofences (name, center_lat, center_lon, radius_km) "
+                "VALUES ('North Field', 40.0, -95.0, 1.0) RETURNING id"
+            )
+            await conn.execute(
+                "INSERT INTO device_states (device_id, last_lat, last_lon, is_inside_fence, last_updated) "
+                "VALUES ('live', 1, 1, FALSE, '2030-01-01')"
+            )
+            fences = await backfill.GeofenceRepository(manager.pool).get_all_geofences()
+
+            fixes = [
+                ("tractor", 40.0, -95.0, "2026-01-01T08:00:00Z"),
+                ("tractor", 41.0, -95.0, "2026-01-01T08:05:00Z"),
+                ("live", 40.0, -95.0, "2026-01-01T08:00:00Z"),
+                ("combine", 40.0, -95.0, None),
+            ]
+            summary = backfill.run_backfill(iter(fixes), fences, 1, str(tmp_path), workers=2, run_id="run-1")
+            await backfill.load_results(conn, summary["workers"])
+
+            events = await conn.fetch("SELECT device_id, geofence_name, run_id FROM fence_events")
+            states = {
+                row["device_id"]: row
+                for row in await conn.fetch("SELECT * FROM device_states")
+            }
+        assert [tuple(row) for row in events] == [("tractor", "North Field", "run-1")]
+        assert states["tractor"]["is_inside_fence"] is False
+        assert states["combine"]["last_geofence_id"] == fence_id
+        assert states["combine"]["geofence_ids"] == [fence_id]
+        assert float(states["live"]["last_lat"]) == 1.0
+    finally:
+        await manager.close_pool()
+        await admin.execute(f"DROP SCHEMA {schema} CASCADE")
+        await admin.close()
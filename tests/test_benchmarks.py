@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from benchmarks import bench_codec, bench_ingest, replay
+from benchmarks.harness import compare_results, latency_summary
+
+
+class TestBenchmarkHarness:
+    """Smoke tests keeping the benchmark suite runnable."""
+
+    def test_latency_summary(self):
+        """Test percentiles are reported in milliseconds."""
+        summary = latency_summary([i * 1_000_000 for i in range(1, 101)])
+        assert summary["p50_ms"] == pytest.approx(50.5)
+        assert summary["p99_ms"] == pytest.approx(99.01)
+        assert summary["max_ms"] == 100.0
+
+    def test_load_trace_skips_non_fixes(self, tmp_path):
+        """Test trace loading keeps fixes and skips other JSONL records."""
+        trace = tmp_path / "trace.jsonl"
+        trace.write_text(
+            '{"device_id": "a", "lat": 1.0, "lon": 2.0}\n'
+            '{"request_id": "x", "title": "not a fix", "body": "text"}\n'
+            '{"body": {"device_id": "b", "lat": 3.0, "lon": 4.0, "extra": 1}}\n'
+            'not json\n'
+        )
+        assert replay.load_trace(str(trace)) == [
+            {"device_id": "a", "lat": 1.0, "lon": 2.0},
+            {"device_id": "b", "lat": 3.0, "lon": 4.0},
+        ]
+
+    def test_replay_writes_comparable_results(self, tmp_path, capsys):
+        """Test a tiny replay through all modes saves and compares JSON results."""
+        output = tmp_path / "results.json"
+        args = [
+            "--fences", "20", "--devices", "10", "--fixes", "200",
+            "--batch-size", "50", "--alloc-sample", "5", "--output", str(output)
+        ]
+        replay.main(args)
+        replay.main(args[:-2] + ["--modes", "service", "--baseline", str(output)])
+
+        results = json.loads(output.read_text())["results"]
+        assert set(results) == set(replay.MODES)
+        for summary in results.values():
+            assert summary["p50_ms"] <= summary["p95_ms"] <= summary["p99_ms"]
+            assert summary["throughput_per_s"] > 0
+            assert summary["alloc_peak_bytes_per_request"] > 0
+        assert "service          p50_ms" in capsys.readouterr().out
+        assert compare_results(str(output), {"asgi": results["asgi"]})
+
+    def test_ingest_benchmark_runs(self, tmp_path):
+        """Test a tiny ingest benchmark covers every parser and both endpoints."""
+        output = tmp_path / "ingest.json"
+        bench_ingest.main([
+            "--fences", "20", "--devices", "10", "--fixes", "200",
+            "--batch-size", "50", "--repeat", "1", "--output", str(output)
+        ])
+
+        results = json.loads(output.read_text())["results"]
+        assert set(results) == set(bench_ingest.PARSERS) | {"asgi-json", "asgi-binary"}
+        assert results["binary"]["bytes_per_fix"] < results["json-batch"]["bytes_per_fix"]
+
+    def test_codec_benchmark_runs(self, tmp_path):
+        """Test a tiny codec benchmark compares every stage and both apps."""
+        output = tmp_path / "codec.json"
+        bench_codec.main([
+            "--fences", "20", "--devices", "10", "--fixes", "100",
+            "--repeat", "1", "--alloc-sample", "10", "--output", str(output)
+        ])
+
+        results = json.loads(output.read_text())["results"]
+        assert set(results) == set(bench_codec.STAGES) | {"asgi-models", "asgi-records"}
+        assert results["state-row"]["records_bytes_per_op"] < results["state-row"]["models_bytes_per_op"]
+        assert results["asgi-records"]["throughput_per_s"] > 0
@@ -0,0 +1,231 @@
+import random
+import struct
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock
+
+from api.binary_batch import (
+    DELTAS, MEDIA_TYPE, BinaryBatch, BinaryBatchError, decode_batch, encode_batch
+)
+from api.dependecies import provide_geofence_service
+from api.routers import location
+from benchmarks.in_memory_repository import InMemoryGeofenceRepository
+from benchmarks.replay import CountingEventPublisher, generate_fences, generate_trace
+from domain.geofence_calculator import GeofenceCalculator
+from models.geofence import DeviceLocationModel
+from services.geofence_cache import GeofenceCache
+from services.geofence_service import GeofenceService
+
+
+def random_batch(rng, size, spread):
+    device_ids = [rng.choice(["tractor_1", "tractor_2", "combine_ü", "x" * 255]) for _ in range(size)]
+    lats = [max(-90.0, min(90.0, 40 + rng.uniform(-spread, spread))) for _ in range(size)]
+    lons = [max(-180.0, min(180.0, -95 + rng.uniform(-spread, spread))) for _ in range(size)]
+    return device_ids, lats, lons
+
+
+class TestBinaryBatchFormat:
+    """Test cases for encoding and decoding binary batches."""
+
+    @pytest.mark.parametrize("spread", [0.0001, 0.01, 200.0])
+    def test_round_trip(self, spread):
+        """Test decoded fixes equal the input rounded to 1e-7 degrees."""
+        rng = random.Random(int(spread * 1000))
+        for size in (0, 1, 2, 50, 1000):
+            device_ids, lats, lons = random_batch(rng, size, spread)
+            batch = decode_batch(encode_batch(device_ids, lats, lons))
+
+            assert batch.device_ids == device_ids
+            assert len(batch.device_table) == len(set(device_ids))
+            np.testing.assert_allclose(batch.lats, lats, rtol=0, atol=0.6e-7)
+            np.testing.assert_allclose(batch.lons, lons, rtol=0, atol=0.6e-7)
+
+    def test_extremes(self):
+        """Test poles and the antimeridian survive."""
+        batch = decode_batch(encode_batch(["a", "b", "a"], [90.0, -90.0, 0.0], [180.0, -180.0, 0.0]))
+        assert batch.lats.tolist() == [90.0, -90.0, 0.0]
+        assert batch.lons.tolist() == [180.0, -180.0, 0.0]
+
+    def test_tracker_walk_uses_deltas(self):
+        """Test a device's nearby fixes take 6 bytes each plus its id and base."""
+        rng = random.Random(1)
+        lats = 40 + np.cumsum(rng.choices((-1e-4, 0.0, 1e-4), k=500))
+        lons = -95 + np.cumsum(rng.choices((-1e-4, 0.0, 1e-4), k=500))
+        data = encode_batch(["tractor_001"] * 500, lats, lons)
+        assert data[5] & DELTAS
+        assert len(data) == 12 + 8 + 1 + len("tractor_001") + 6 * 500
+
+    def test_interleaved_devices_use_per_device_deltas(self):
+        """Test a gateway batch mixing far-apart trackers still fits i16 deltas."""
+        rng = random.Random(4)
+        positions = {f"tractor_{i}": (rng.uniform(-60, 60), rng.uniform(-170, 170)) for i in range(40)}
+        device_ids, lats, lons = [], [], []
+        for _ in range(2000):
+            device_id = rng.choice(list(positions))
+            lat, lon = positions[device_id]
+            lat, lon = lat + rng.gauss(0, 1e-4), lon + rng.gauss(0, 1e-4)
+            positions[device_id] = (lat, lon)
+            device_ids.append(device_id)
+            lats.append(lat)
+            lons.append(lon)
+
+        data = encode_batch(device_ids, lats, lons)
+        batch = decode_batch(data)
+
+        assert data[5] & DELTAS
+        assert len(data) < 6.5 * len(device_ids)
+        assert batch.device_ids == device_ids
+        np.testing.assert_allclose(batch.lats, lats, rtol=0, atol=0.6e-7)
+        np.testing.assert_allclose(batch.lons, lons, rtol=0, atol=0.6e-7)
+
+    def test_jump_adds_table_entry(self):
+        """Test a device moving beyond one delta gets a second entry instead of absolute records."""
+        lats = [40.0 + i * 1e-4 for i in range(50)] + [41.0 + i * 1e-4 for i in range(50)]
+        data = encode_batch(["tractor_001"] * 100, lats, [-95.0] * 100)
+        batch = decode_batch(data)
+
+        assert data[5] & DELTAS
+        assert batch.device_table == ["tractor_001", "tractor_001"]
+        assert batch.device_ids == ["tractor_001"] * 100
+        np.testing.assert_allclose(batch.lats, lats, rtol=0, atol=0.6e-7)
+
+    def test_records_are_not_copied(self):
+        """Test the device index is a read-only view of the request body."""
+        data = encode_batch(["a", "b"], [1.0, 2.0], [3.0, 4.0])
+        batch = decode_batch(data)
+        assert not batch.device_index.flags.writeable
+        assert batch.device_index.base is not None
+
+    def test_encoder_rejects_invalid_fixes(self):
+        """Test out-of-range coordinates, bad ids and ragged input are refused."""
+        with pytest.raises(BinaryBatchError):
+            encode_batch(["a"], [91.0], [0.0])
+        with pytest.raises(BinaryBatchError):
+            encode_batch(["a"], [0.0], [-180.1])
+        with pytest.raises(BinaryBatchError):
+            encode_batch([""], [0.0], [0.0])
+        with pytest.raises(BinaryBatchError):
+            encode_batch(["x" * 256], [0.0], [0.0])
+        with pytest.raises(BinaryBatchError):
+            encode_batch(["a", "b"], [0.0], [0.0])
+
+    @pytest.mark.parametrize("mutate, message", [
+        (lambda d: d[:10], "shorter than its header"),
+        (lambda d: b"JSON" + d[4:], "not a binary"),
+        (lambda d: d[:4] + b"\x02" + d[5:], "version"),
+        (lambda d: d[:5] + b"\x80" + d[6:], "flags"),
+        (lambda d: d + b"\x00", "does not match"),
+        (lambda d: d[:-1], "does not match"),
+        (lambda d: d[:28] + b"\x00" + d[29:], "empty device id"),
+        (lambda d: d[:29] + b"\xff" + d[30:], "UTF-8"),
+        (lambda d: d[:-6] + struct.pack("<Hhh", 9, 0, 0), "missing from the table"),
+        (lambda d: d[:12] + struct.pack("<i", 900_000_001) + d[16:], "out of range"),
+    ])
+    def test_decoder_rejects_malformed_batches(self, mutate, message):
+        """Test each framing and value error is reported as BinaryBatchError."""
+        data = encode_batch(["a", "b"], [40.0, 40.0001], [-95.0, -95.0001])
+        with pytest.raises(BinaryBatchError, match=message):
+            decode_batch(mutate(data))
+
+    def test_decoder_enforces_fix_limit(self):
+        """Test batches over the size limit are refused before parsing records."""
+        data = encode_batch(["a"] * 11, [0.0] * 11, [0.0] * 11)
+        with pytest.raises(BinaryBatchError, match="limit"):
+            decode_batch(data, max_fixes=10)
+
+    def test_fuzz(self):
+        """Test random corruptions decode to valid fixes or raise BinaryBatchError only."""
+        rng = random.Random(2)
+        decoded = 0
+        for _ in range(3000):
+            device_ids, lats, lons = random_batch(rng, rng.randint(0, 20), rng.choice((0.001, 50.0)))
+            data = bytearray(encode_batch(device_ids, lats, lons))
+            action = rng.random()
+            if action < 0.5:
+                for _ in range(rng.randint(1, 4)):
+                    data[rng.randrange(len(data))] = rng.randrange(256)
+            elif action < 0.7:
+                del data[rng.randrange(len(data)):]
+            elif action < 0.9:
+                data += bytes(rng.randrange(256) for _ in range(rng.randint(1, 12)))
+            else:
+                data = data[:12] + bytes(rng.randrange(256) for _ in range(rng.randint(0, 200)))
+
+            try:
+                batch = decode_batch(bytes(data))
+            except BinaryBatchError:
+                continue
+            decoded += 1
+            assert isinstance(batch, BinaryBatch)
+            assert len(batch.lats) == len(batch.lons) == len(batch.device_ids)
+            assert np.all(np.abs(batch.lats) <= 90) and np.all(np.abs(batch.lons) <= 180)
+            assert all(batch.device_ids)
+        assert decoded > 100
+
+
+class TestBinaryBatchCheck:
+    """Test cases for checking decoded arrays and the binary endpoint."""
+
+    @pytest.mark.asyncio
+    async def test_arrays_match_model_batch(self):
+        """Test checking decoded arrays gives the results of the model batch."""
+        rng = random.Random(3)
+        fences = generate_fences(rng, 50, 0.3)
+        trace = generate_trace(rng, fences, 20, 400, 400.0)
+        batch = decode_batch(encode_batch(
+            [fix["device_id"] for fix in trace],
+            [fix["lat"] for fix in trace],
+            [fix["lon"] for fix in trace]
+        ))
+
+        def service():
+            repository = InMemoryGeofenceRepository(fences)
+            calculator = GeofenceCalculator()
+            return GeofenceService(
+                repository, calculator, CountingEventPublisher(),
+                geofence_cache=GeofenceCache(repository, calculator)
+            )
+
+        expected_service = service()
+        expected = await expected_service.check_device_locations([
+            DeviceLocationModel(device_id=d, lat=lat, lon=lon)
+            for d, lat, lon in zip(batch.device_ids, batch.lats.tolist(), batch.lons.tolist())
+        ])
+        actual_service = service()
+        actual = await actual_service.check_device_arrays(batch.device_ids, batch.lats, batch.lons)
+
+        assert actual == expected
+        assert actual_service.event_publisher.published == expected_service.event_publisher.published > 0
+        def persisted(service):
+            return {d: row[:4] for d, row in service.repository.states.items()}
+
+        assert persisted(actual_service) == persisted(expected_service)
+
+    def test_endpoint(self):
+        """Test the endpoint passes decoded arrays to the service and rejects bad bodies."""
+        service = AsyncMock()
+        service.check_device_arrays.return_value = [
+            {"device_id": "a", "inside_geofence": True, "geofence_name": "North", "state_changed": False}
+        ]
+        app = FastAPI()
+        app.include_router(location.router)
+        app.dependency_overrides[provide_geofence_service] = lambda: service
+        client = TestClient(app)
+
+        response = client.post(
+            "/api/v1/location-check/binary",
+            content=encode_batch(["a"], [40.5], [-95.5]),
+            headers={"content-type": MEDIA_TYPE}
+        )
+        assert response.status_code == 200
+        assert response.json()[0]["geofence_name"] == "North"
+        device_ids, lats, lons = service.check_device_arrays.await_args.args
+        assert device_ids == ["a"]
+        assert lats.tolist() == [40.5] and lons.tolist() == [-95.5]
+
+        response = client.post("/api/v1/location-check/binary", content=b"GFBT\x01")
+        assert response.status_code == 400
+        assert "header" in response.json()["detail"]
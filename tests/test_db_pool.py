@@ -0,0 +1,164 @@
+import asyncio
+import os
+import uuid
+
+import pytest
+
+from database.db_setup import DatabaseManager
+from repositories import geofence_repository
+from repositories.geofence_repository import GeofenceRepository
+
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+
+class FakeConnection:
+    def __init__(self):
+        self.calls = 0
+        self.block = None
+
+    def is_closed(self) -> bool:
+        return False
+
+    async def fetchval(self, sql, *args):
+        self.calls += 1
+        if self.block is not None:
+            await self.block.wait()
+        return 7
+
+
+class FakePool:
+    def __init__(self, timeout: bool = False):
+        self.timeout = timeout
+        self.acquired = []
+        self.released = []
+
+    async def acquire(self, timeout=None):
+        if self.timeout:
+            raise asyncio.TimeoutError()
+        conn = FakeConnection()
+        self.acquired.append(conn)
+        return conn
+
+    async def release(self, conn):
+        self.released.append(conn)
+
+    def get_size(self) -> int:
+        return 4
+
+    def get_idle_size(self) -> int:
+        return 1
+
+
+class TestRequestConnection:
+    """Test cases for sharing one connection between a request's repository calls."""
+
+    def setup_method(self):
+        self.pool = FakePool()
+        self.repository = GeofenceRepository(self.pool)
+
+    @pytest.mark.asyncio
+    async def test_calls_outside_scope_acquire_each_time(self):
+        """Test every call takes and returns its own connection without a request scope."""
+        for _ in range(3):
+            assert await self.repository.get_geofence_version() == 7
+
+        assert len(self.pool.acquired) == 3
+        assert self.pool.released == self.pool.acquired
+
+    @pytest.mark.asyncio
+    async def test_scope_reuses_one_connection(self):
+        """Test calls in a request scope share a connection released at the end."""
+        async with self.repository.request_scope():
+            for _ in range(3):
+                await self.repository.get_geofence_version()
+            assert len(self.pool.acquired) == 1
+            assert self.pool.released == []
+
+        assert self.pool.released == self.pool.acquired
+        assert self.pool.acquired[0].calls == 3
+
+    @pytest.mark.asyncio
+    async def test_unused_scope_takes_no_connection(self):
+        """Test a request answered without the database never acquires."""
+        async with self.repository.request_scope():
+            pass
+
+        assert self.pool.acquired == []
+
+    @pytest.mark.asyncio
+    async def test_call_running_at_scope_end_releases_after(self):
+        """Test a call outliving its request keeps the connection until it finishes."""
+        block = asyncio.Event()
+        async with self.repository.request_scope():
+            await self.repository.get_geofence_version()
+            conn = self.pool.acquired[0]
+            conn.block = block
+            running = asyncio.create_task(self.repository.get_geofence_version())
+            await asyncio.sleep(0)
+
+        assert self.pool.released == []
+        block.set()
+        assert await running == 7
+        assert self.pool.released == [conn]
+
+    @pytest.mark.asyncio
+    async def test_acquire_timeout_counted(self):
+        """Test acquire timeouts are counted and raised."""
+        repository = GeofenceRepository(FakePool(timeout=True), acquire_timeout=0.1)
+        before = geofence_repository._POOL_TIMEOUTS.value
+
+        with pytest.raises(asyncio.TimeoutError):
+            await repository.get_geofence_version()
+
+        assert geofence_repository._POOL_TIMEOUTS.value == before + 1
+
+
+class TestPoolStats:
+    """Test cases for pool occupancy reporting."""
+
+    def test_pool_stats(self):
+        """Test pool occupancy and utilization against the configured maximum."""
+        manager = DatabaseManager("postgresql://unused", min_size=2, max_size=8)
+        assert manager.stats() == {}
+
+        manager.pool = FakePool()
+        assert manager.stats() == {
+            "size": 4, "in_use": 3, "min_size": 2, "max_size": 8, "utilization": 0.375,
+        }
+
+
+class TestManagedPool:
+    """Test cases for the repository on a pool created by DatabaseManager."""
+
+    @pytest.mark.asyncio
+    async def test_calls_across_checkouts(self):
+        """Test repository calls through a real DatabaseManager pool across checkouts."""
+        if not TEST_DATABASE_URL:
+            pytest.skip("TEST_DATABASE_URL is not set")
+        import asyncpg
+
+        schema = f"test_db_pool_{uuid.uuid4().hex[:8]}"
+        admin = await asyncpg.connect(TEST_DATABASE_URL)
+        await admin.execute(f"CREATE SCHEMA {schema}")
+        # asyncpg passes unknown DSN parameters on as server settings.
+        separator = "&" if "?" in TEST_DATABASE_URL else "?"
+        manager = DatabaseManager(
+            f"{TEST_DATABASE_URL}{separator}search_path={schema}", min_size=1, max_size=2
+        )
+        try:
+            await manager.create_pool()
+            await manager.create_tables()
+            repository = GeofenceRepository(manager.pool)
+
+            version = await repository.get_geofence_version()
+            assert await repository.get_geofence_version() == version
+            await repository.update_device_state("tractor", 40.0, -95.0, False)
+            assert (await repository.get_device_state("tractor")).last_lat == 40.0
+            async with repository.request_scope():
+                assert await repository.get_geofence_version() == version
+                assert await repository.get_device_states(["tractor"])
+        finally:
+            await manager.close_pool()
+            await admin.execute(f"DROP SCHEMA {schema} CASCADE")
+            await admin.close()
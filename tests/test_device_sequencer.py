@@ -0,0 +1,234 @@
+import asyncio
+import random
+from collections import defaultdict
+from datetime import datetime
+
+import pytest
+
+from domain.geofence_calculator import GeofenceCalculator
+from models.geofence import DeviceLocationModel, DeviceStateModel, GeofenceModel
+from services.device_sequencer import DeviceSequencer
+from services.device_state_cache import DeviceStateCache
+from services.geofence_cache import GeofenceCache
+from services.geofence_service import GeofenceService
+
+
+FENCE = GeofenceModel(id=1, name="Field", center_lat=40.0, center_lon=-95.0, radius_km=1.0)
+INSIDE = (40.0, -95.0)
+OUTSIDE = (40.1, -95.0)
+
+
+class SlowRepository:
+    """In-memory repository that yields to the loop around every query.
+
+    Each write is logged, so the sequence of persisted states per device
+    tells how many exits a correct service must have published.
+    """
+
+    def __init__(self):
+        self.states = {}
+        self.writes = defaultdict(list)
+
+    async def get_all_geofences(self):
+        return [FENCE]
+
+    async def get_geofence_version(self):
+        return 1
+
+    async def get_device_state(self, device_id):
+        await asyncio.sleep(0)
+        state = self.states.get(device_id)
+        await asyncio.sleep(0)
+        return state
+
+    async def get_device_states(self, device_ids):
+        await asyncio.sleep(0)
+        return {d: self.states[d] for d in device_ids if d in self.states}
+
+    async def update_device_state(self, device_id, lat, lon, is_inside, geofence_id=None, geofence_ids=None):
+        await asyncio.sleep(0)
+        self._write(device_id, lat, lon, is_inside, geofence_id, geofence_ids)
+
+    async def update_device_states(self, rows):
+        await asyncio.sleep(0)
+        for row in rows:
+            self._write(*row)
+
+    def _write(self, device_id, lat, lon, is_inside, geofence_id, geofence_ids=None):
+        self.states[device_id] = DeviceStateModel(
+            device_id=device_id, last_lat=lat, last_lon=lon,
+            is_inside_fence=is_inside, last_geofence_id=geofence_id,
+            geofence_ids=geofence_ids, last_updated=datetime.now()
+        )
+        self.writes[device_id].append(is_inside)
+
+    def expected_exits(self):
+        return {
+            device_id: sum(1 for before, after in zip(log, log[1:]) if before and not after)
+            for device_id, log in self.writes.items()
+        }
+
+
+class RecordingPublisher:
+    def __init__(self):
+        self.exits = defaultdict(int)
+
+    async def publish_geo_event(self, event_data):
+        await asyncio.sleep(0)
+        if event_data["event_type"] == "fence_exit":
+            self.exits[event_data["device_id"]] += 1
+
+
+def build_service(repository, publisher, sequencer, caches):
+    calculator = GeofenceCalculator()
+    return GeofenceService(
+        repository,
+        calculator,
+        publisher,
+        geofence_cache=GeofenceCache(repository, calculator) if caches else None,
+        state_cache=DeviceStateCache() if caches else None,
+        sequencer=sequencer
+    )
+
+
+def random_fixes(rng, devices, fixes_per_device):
+    fixes = [
+        DeviceLocationModel(device_id=f"device_{d}", lat=lat, lon=lon)
+        for d in range(devices)
+        for lat, lon in (rng.choice((INSIDE, OUTSIDE)) for _ in range(fixes_per_device))
+    ]
+    rng.shuffle(fixes)
+    return fixes
+
+
+class TestDeviceSequencer:
+    """Test cases for DeviceSequencer."""
+
+    @pytest.mark.asyncio
+    async def test_same_shard_runs_in_order(self):
+        """Test work on one shard runs one at a time in submission order."""
+        sequencer = DeviceSequencer(shards=4)
+        running = []
+        order = []
+
+        async def work(i):
+            running.append(i)
+            assert len(running) == 1
+            await asyncio.sleep(0.001)
+            order.append(i)
+            running.remove(i)
+            return i
+
+        results = await asyncio.gather(*(sequencer.run("tractor", lambda i=i: work(i)) for i in range(20)))
+        await sequencer.close()
+
+        assert results == list(range(20))
+        assert order == list(range(20))
+
+    @pytest.mark.asyncio
+    async def test_shards_run_concurrently(self):
+        """Test devices on different shards do not wait for each other."""
+        sequencer = DeviceSequencer(shards=2)
+        release = asyncio.Event()
+        devices = ["a", "b", "c", "d", "e"]
+        first = next(d for d in devices if sequencer.shard_of(d) == 0)
+        second = next(d for d in devices if sequencer.shard_of(d) == 1)
+
+        blocked = asyncio.create_task(sequencer.run(first, release.wait))
+        assert await sequencer.run(second, lambda: asyncio.sleep(0, "done")) == "done"
+        release.set()
+        await blocked
+        await sequencer.close()
+
+    @pytest.mark.asyncio
+    async def test_errors_reach_caller_and_worker_survives(self):
+        """Test a failing check raises in its caller without stopping the shard."""
+        sequencer = DeviceSequencer(shards=1)
+
+        async def fail():
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            await sequencer.run("tractor", fail)
+        assert await sequencer.run("tractor", lambda: asyncio.sleep(0, 7)) == 7
+        assert sequencer.stats()["failed"] == 1
+        await sequencer.close()
+
+    @pytest.mark.asyncio
+    async def test_queue_backpressure(self):
+        """Test submissions beyond the queue size wait instead of failing."""
+        sequencer = DeviceSequencer(shards=1, queue_size=2)
+        results = await asyncio.gather(
+            *(sequencer.run("tractor", lambda i=i: asyncio.sleep(0, i)) for i in range(10))
+        )
+        assert results == list(range(10))
+        await sequencer.close()
+
+
+class TestSequencedService:
+    """Stress tests: concurrent fixes publish exactly one exit per transition."""
+
+    @pytest.mark.asyncio
+    async def test_race_without_sequencer(self):
+        """Test the stress setup does expose lost and duplicate exits unsequenced."""
+        repository = SlowRepository()
+        publisher = RecordingPublisher()
+        service = build_service(repository, publisher, None, caches=False)
+
+        await asyncio.gather(*(
+            service.check_device_location(fix) for fix in random_fixes(random.Random(1), 5, 40)
+        ))
+
+        assert dict(publisher.exits) != repository.expected_exits()
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("caches", [False, True])
+    async def test_one_exit_per_transition(self, caches):
+        """Test concurrent single checks publish exactly one exit per transition."""
+        repository = SlowRepository()
+        publisher = RecordingPublisher()
+        sequencer = DeviceSequencer(shards=4)
+        service = build_service(repository, publisher, sequencer, caches)
+        fixes = random_fixes(random.Random(2), 30, 40)
+
+        results = await asyncio.gather(*(service.check_device_location(fix) for fix in fixes))
+        await sequencer.close()
+
+        expected = {d: n for d, n in repository.expected_exits().items() if n}
+        assert dict(publisher.exits) == expected
+        assert sum(expected.values()) > 100
+        for fix, result in zip(fixes, results):
+            assert result["inside_geofence"] is ((fix.lat, fix.lon) == INSIDE)
+
+    @pytest.mark.asyncio
+    async def test_batches_and_singles_interleaved(self):
+        """Test batches split per shard stay consistent with concurrent single checks."""
+        repository = SlowRepository()
+        publisher = RecordingPublisher()
+        sequencer = DeviceSequencer(shards=4)
+        service = build_service(repository, publisher, sequencer, caches=True)
+        rng = random.Random(3)
+        fixes = random_fixes(rng, 20, 60)
+
+        # Batches hold each device at most once, so every fix is one logged write.
+        calls = []
+        position = 0
+        while position < len(fixes):
+            size = rng.choice((1, 1, 8, 25))
+            chunk = []
+            while position < len(fixes) and len(chunk) < size and fixes[position].device_id not in {
+                fix.device_id for fix in chunk
+            }:
+                chunk.append(fixes[position])
+                position += 1
+            if len(chunk) == 1:
+                calls.append(service.check_device_location(chunk[0]))
+            else:
+                calls.append(service.check_device_locations(chunk))
+        results = await asyncio.gather(*calls)
+        await sequencer.close()
+
+        expected = {d: n for d, n in repository.expected_exits().items() if n}
+        assert dict(publisher.exits) == expected
+        flat = [r for result in results for r in (result if isinstance(result, list) else [result])]
+        assert [r["device_id"] for r in flat] == [fix.device_id for fix in fixes]
@@ -0,0 +1,137 @@
+import pytest
+from unittest.mock import AsyncMock
+from domain.geofence_calculator import GeofenceCalculator
+from models.geofence import DeviceLocationModel, DeviceStateModel, GeofenceModel
+from services.device_state_cache import DeviceStateCache
+from services.geofence_service import GeofenceService
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestDeviceStateCache:
+    """Test cases for DeviceStateCache."""
+
+    def setup_method(self):
+        self.clock = FakeClock()
+        self.cache = DeviceStateCache(max_entries=3, clock=self.clock)
+
+    def test_get_and_put(self):
+        """Test write-through updates and hit/miss accounting."""
+        assert self.cache.get("a") is None
+
+        self.cache.put("a", 1.0, 2.0, True, 7)
+        record = self.cache.get("a")
+        assert record.is_inside_fence is True
+        assert record.last_geofence_id == 7
+        assert record.geofence_ids == (7,)
+
+        self.cache.put("a", 3.0, 4.0, True, 7, (2, 7))
+        assert record.geofence_ids == (2, 7)
+
+        self.cache.put("a", 3.0, 4.0, False, None)
+        assert self.cache.get("a") is record
+        assert record.last_lat == 3.0
+        assert record.is_inside_fence is False
+        assert record.geofence_ids == ()
+
+        assert self.cache.hits == 2
+        assert self.cache.misses == 1
+        assert self.cache.hit_ratio == pytest.approx(2 / 3)
+
+    def test_lru_eviction(self):
+        """Test the least recently used device is evicted first."""
+        for device_id in ["a", "b", "c"]:
+            self.cache.put(device_id, 0.0, 0.0, False, None)
+        self.cache.get("a")
+        self.cache.put("d", 0.0, 0.0, False, None)
+
+        assert len(self.cache) == 3
+        assert self.cache.get("b") is None
+        assert self.cache.get("a") is not None
+        assert self.cache.evictions == 1
+
+    def test_ttl_expiry(self):
+        """Test entries older than the TTL are treated as misses."""
+        cache = DeviceStateCache(max_entries=10, ttl_seconds=5, clock=self.clock)
+        cache.put("a", 0.0, 0.0, True, 1)
+
+        self.clock.now = 4
+        assert cache.get("a") is not None
+        self.clock.now = 6
+        assert cache.get("a") is None
+        assert cache.expirations == 1
+
+    def test_stats_report_memory_and_hit_ratio(self):
+        """Test stats include memory per device and the hit ratio."""
+        self.cache.put("tractor_001", 40.78, -73.97, True, 1)
+        self.cache.get("tractor_001")
+
+        stats = self.cache.stats()
+        assert stats["size"] == 1
+        assert stats["hit_ratio"] == 1.0
+        assert 0 < stats["bytes_per_entry"] < 1024
+
+    def test_invalid_size(self):
+        """Test a non-positive size is rejected."""
+        with pytest.raises(ValueError):
+            DeviceStateCache(max_entries=0)
+
+    @pytest.mark.asyncio
+    async def test_service_skips_repository_read_when_cached(self):
+        """Test the service reads Postgres once per device and writes through."""
+        geofence = GeofenceModel(
+            id=1, name="Test Field",
+            center_lat=40.7831, center_lon=-73.9712,
+            radius_km=2.0
+        )
+        repository = AsyncMock()
+        repository.get_all_geofences.return_value = [geofence]
+        repository.get_device_state.return_value = DeviceStateModel(
+            device_id="tractor", last_lat=40.7831, last_lon=-73.9712,
+            is_inside_fence=True, last_geofence_id=1, last_updated=None
+        )
+        publisher = AsyncMock()
+        cache = DeviceStateCache(max_entries=10)
+        service = GeofenceService(
+            repository, GeofenceCalculator(), publisher, state_cache=cache
+        )
+
+        await service.check_device_location(
+            DeviceLocationModel(device_id="tractor", lat=40.7831, lon=-73.9712)
+        )
+        result = await service.check_device_location(
+            DeviceLocationModel(device_id="tractor", lat=41.5, lon=-74.0)
+        )
+
+        assert result["state_changed"] is True
+        publisher.publish_geo_event.assert_called_once()
+        repository.get_device_state.assert_called_once()
+        assert repository.update_device_state.call_count == 2
+        assert cache.get("tractor").is_inside_fence is False
+
+    @pytest.mark.asyncio
+    async def test_batch_reads_only_uncached_devices(self):
+        """Test the batch path only queries devices missing from the cache."""
+        repository = AsyncMock()
+        repository.get_all_geofences.return_value = []
+        repository.get_device_states.return_value = {}
+        cache = DeviceStateCache(max_entries=10)
+        cache.put("known", 0.0, 0.0, False, None)
+        service = GeofenceService(
+            repository, GeofenceCalculator(), AsyncMock(), state_cache=cache
+        )
+
+        results = await service.check_device_locations([
+            DeviceLocationModel(device_id="known", lat=1.0, lon=1.0),
+            DeviceLocationModel(device_id="new", lat=1.0, lon=1.0),
+        ])
+
+        assert [r["state_changed"] for r in results] == [False, True]
+        repository.get_device_states.assert_called_once_with(["new"])
+        assert cache.get("new") is not None
@@ -0,0 +1,136 @@
+import asyncio
+import time
+
+import orjson
+import pytest
+from services.event_publisher import GeoEventData, RedisEventPublisher
+
+
+def make_event(i: int):
+    return GeoEventData.create_fence_exit_event(
+        f"tractor_{i:05d}", 40.7831, -73.9712, "North Field"
+    )
+
+
+class TestRedisEventPublisher:
+    """Test cases for RedisEventPublisher against an in-process fake Redis."""
+
+    @pytest.mark.asyncio
+    async def test_publishes_events_to_stream(self, fake_redis):
+        """Test events land in the stream in order with their payload."""
+        publisher = RedisEventPublisher(fake_redis.url, queue_name="geo-events")
+        publisher.start()
+
+        for i in range(10):
+            await publisher.publish_geo_event(make_event(i))
+        await publisher.close()
+
+        stream = fake_redis.streams[b"geo-events"]
+        assert len(stream) == 10
+        payloads = [orjson.loads(fields[b"data"]) for _, fields in stream]
+        assert [p["device_id"] for p in payloads] == [f"tractor_{i:05d}" for i in range(10)]
+        assert stream[0][1][b"event_type"] == b"fence_exit"
+        assert publisher.stats()["published"] == 10
+
+    @pytest.mark.asyncio
+    async def test_batches_share_round_trips(self, fake_redis):
+        """Test queued events are sent as pipelined batches."""
+        publisher = RedisEventPublisher(fake_redis.url, batch_size=50)
+
+        for i in range(200):
+            await publisher.publish_geo_event(make_event(i))
+        publisher.start()
+        await publisher.close()
+
+        assert len(fake_redis.streams[b"geo-events"]) == 200
+        assert publisher.stats()["batches"] == 4
+
+    @pytest.mark.asyncio
+    async def test_retries_failed_batches(self, fake_redis):
+        """Test a failing batch is retried and eventually delivered."""
+        publisher = RedisEventPublisher(fake_redis.url, retry_base_delay=0.001)
+        publisher.start()
+        await publisher.publish_geo_event(make_event(0))
+        await publisher.flush()
+
+        fake_redis.fail_next = 2
+        await publisher.publish_geo_event(make_event(1))
+        await publisher.close()
+
+        assert len(fake_redis.streams[b"geo-events"]) == 2
+        assert publisher.stats()["retries"] >= 1
+        assert publisher.stats()["dropped"] == 0
+
+    @pytest.mark.asyncio
+    async def test_publish_events_is_direct_and_raises(self, fake_redis):
+        """Test batch publishing XADDs without the queue and raises instead of dropping."""
+        publisher = RedisEventPublisher(fake_redis.url)
+
+        await publisher.publish_geo_events([make_event(i) for i in range(5)])
+        assert len(fake_redis.streams[b"geo-events"]) == 5
+
+        fake_redis.fail_next = 10 ** 6
+        with pytest.raises(Exception):
+            await publisher.publish_geo_events([make_event(5)])
+        fake_redis.fail_next = 0
+        assert publisher.stats()["dropped"] == 0
+        await publisher.close()
+
+    @pytest.mark.asyncio
+    async def test_drops_after_max_retries(self, fake_redis):
+        """Test a batch is dropped once retries are exhausted."""
+        publisher = RedisEventPublisher(
+            fake_redis.url, max_retries=1, retry_base_delay=0.001
+        )
+        fake_redis.fail_next = 10 ** 6
+        publisher.start()
+        await publisher.publish_geo_event(make_event(0))
+        await publisher.flush()
+        fake_redis.fail_next = 0
+        await publisher.close()
+
+        assert publisher.stats()["dropped"] == 1
+
+    @pytest.mark.asyncio
+    async def test_bounded_queue_applies_backpressure(self, fake_redis):
+        """Test publishers wait when the queue is full."""
+        publisher = RedisEventPublisher(fake_redis.url, max_queue_size=2)
+        await publisher.publish_geo_event(make_event(0))
+        await publisher.publish_geo_event(make_event(1))
+
+        blocked = asyncio.create_task(publisher.publish_geo_event(make_event(2)))
+        await asyncio.sleep(0.01)
+        assert not blocked.done()
+
+        publisher.start()
+        await asyncio.wait_for(blocked, timeout=1)
+        await publisher.close()
+
+        assert len(fake_redis.streams[b"geo-events"]) == 3
+        assert publisher.stats()["backpressure_waits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_throughput_batched_vs_unbatched(self, fake_redis):
+        """Benchmark events/sec with pipelined batches vs one XADD per round trip."""
+        events = 2000
+        rates = {}
+        for label, batch_size in [("unbatched", 1), ("batched", 256)]:
+            publisher = RedisEventPublisher(
+                fake_redis.url, queue_name=label, batch_size=batch_size
+            )
+            publisher.start()
+            start = time.perf_counter()
+            for i in range(events):
+                await publisher.publish_geo_event(make_event(i))
+            await publisher.flush()
+            rates[label] = events / (time.perf_counter() - start)
+            await publisher.close()
+
+            assert len(fake_redis.streams[label.encode()]) == events
+
+        print(
+            f"\ngeo-event publish throughput: unbatched {rates['unbatched']:.0f}/s, "
+            f"batched {rates['batched']:.0f}/s "
+            f"({rates['batched'] / rates['unbatched']:.1f}x)"
+        )
+        assert rates["batched"] > rates["unbatched"]
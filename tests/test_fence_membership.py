@@ -0,0 +1,165 @@
+from unittest.mock import AsyncMock
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.dependecies import provide_geofence_service
+from api.routers import geofences
+from domain.geofence_calculator import GeofenceCalculator
+from models.geofence import DeviceLocationModel, GeofenceModel
+from services.fence_membership import FenceMembershipIndex
+from services.geofence_service import GeofenceService
+
+
+FENCES = [
+    GeofenceModel(id=1, name="North Field", center_lat=40.0, center_lon=-95.0, radius_km=2.0),
+    GeofenceModel(id=2, name="Well", center_lat=40.0, center_lon=-95.0, radius_km=0.5),
+    GeofenceModel(id=3, name="South Field", center_lat=39.9, center_lon=-95.0, radius_km=2.0),
+]
+
+
+class TestFenceMembershipIndex:
+    """Test cases for the fence -> devices index."""
+
+    def setup_method(self):
+        self.memberships = FenceMembershipIndex()
+
+    def test_update_moves_device_between_fences(self):
+        """Test a new fence set removes the device from fences left and adds it to those entered."""
+        self.memberships.update("tractor", (1, 2))
+        self.memberships.update("plough", (1,))
+        assert self.memberships.devices_in(1) == ["plough", "tractor"]
+        assert self.memberships.devices_in(2) == ["tractor"]
+
+        self.memberships.update("tractor", (3,))
+        assert self.memberships.devices_in(1) == ["plough"]
+        assert self.memberships.devices_in(2) == []
+        assert self.memberships.fences_of("tractor") == (3,)
+
+        self.memberships.update("tractor", ())
+        assert self.memberships.devices_in(3) == []
+        assert len(self.memberships) == 1
+        assert self.memberships.stats()["fences"] == 1
+
+    def test_limit_keeps_id_order(self):
+        """Test a limited answer is the first ids in order and the count covers all."""
+        for i in range(50):
+            self.memberships.update(f"device_{i:02d}", (1,))
+
+        assert self.memberships.devices_in(1, limit=3) == ["device_00", "device_01", "device_02"]
+        assert self.memberships.count(1) == 50
+
+    def test_load_keeps_newer_updates(self):
+        """Test seeded rows do not overwrite devices updated while the seed was read."""
+        self.memberships.update("tractor", ())
+        self.memberships.update("plough", (2,))
+
+        loaded = self.memberships.load([("tractor", (1,)), ("plough", (1,)), ("drone", (1, 2))])
+
+        assert loaded == 1
+        assert self.memberships.devices_in(1) == ["drone"]
+        assert self.memberships.devices_in(2) == ["drone", "plough"]
+        assert self.memberships.stats()["seeded"] is True
+
+    def test_release_deleted_fences(self):
+        """Test deleted fences are forgotten and devices left in no fence dropped."""
+        self.memberships.update("tractor", (1, 2))
+        self.memberships.update("plough", (1,))
+
+        self.memberships.release_geofences({1})
+
+        assert self.memberships.devices_in(1) == []
+        assert self.memberships.fences_of("tractor") == (2,)
+        assert len(self.memberships) == 1
+
+
+class TestServiceMemberships:
+    """Test cases for keeping memberships current from checks and answering queries."""
+
+    def setup_method(self):
+        self.repository = AsyncMock()
+        self.repository.get_all_geofences.return_value = FENCES
+        self.repository.get_device_state.return_value = None
+        self.repository.get_device_states.return_value = {}
+        self.memberships = FenceMembershipIndex()
+        self.service = GeofenceService(
+            self.repository, GeofenceCalculator(), AsyncMock(), memberships=self.memberships
+        )
+
+    @pytest.mark.asyncio
+    async def test_single_and_batch_checks_update_memberships(self):
+        """Test both check paths record the fences each device ends up in."""
+        await self.service.check_device_location(DeviceLocationModel(device_id="tractor", lat=40.0, lon=-95.0))
+        assert self.memberships.fences_of("tractor") == (1, 2)
+
+        await self.service.check_device_locations([
+            DeviceLocationModel(device_id="tractor", lat=39.9, lon=-95.0),
+            DeviceLocationModel(device_id="plough", lat=40.01, lon=-95.0),
+        ])
+        assert self.memberships.devices_in(1) == ["plough"]
+        assert self.memberships.devices_in(3) == ["tractor"]
+
+    @pytest.mark.asyncio
+    async def test_single_query_checks_update_memberships(self):
+        """Test database-evaluated checks record the fence set the statement returned."""
+        self.service.single_query = True
+        self.repository.check_device_location.return_value = {
+            "previous_geofence_ids": [], "geofence_ids": [1, 2], "is_inside_fence": True,
+            "geofence_id": 1, "geofence_name": "North Field",
+            "geofence_names": ["North Field", "Well"], "changes": None,
+        }
+
+        await self.service.check_device_location(DeviceLocationModel(device_id="tractor", lat=40.0, lon=-95.0))
+        assert self.memberships.devices_in(2) == ["tractor"]
+
+    @pytest.mark.asyncio
+    async def test_queries(self):
+        """Test nearest fences are signed and unknown fences have no devices answer."""
+        self.memberships.update("tractor", (1,))
+
+        nearest = await self.service.nearest_geofences(40.0, -95.0, k=2)
+        assert [(f["id"], f["inside"]) for f in nearest["geofences"]] == [(1, True), (2, True)]
+        assert nearest["geofences"][0]["distance_km"] == pytest.approx(-2.0)
+
+        assert await self.service.devices_in_geofence(1) == {
+            "geofence_id": 1, "count": 1, "device_ids": ["tractor"],
+        }
+        assert await self.service.devices_in_geofence(99) is None
+
+
+class TestProximityApi:
+    """Test cases for the proximity routes."""
+
+    def setup_method(self):
+        self.service = AsyncMock()
+        self.service.memberships = FenceMembershipIndex()
+
+        app = FastAPI()
+        app.include_router(geofences.router)
+        app.dependency_overrides[provide_geofence_service] = lambda: self.service
+        self.client = TestClient(app)
+
+    def test_nearest(self):
+        """Test the nearest route is not taken for a fence id and validates its query."""
+        self.service.nearest_geofences.return_value = {"lat": 40.0, "lon": -95.0, "geofences": []}
+
+        response = self.client.get("/api/v1/geofences/nearest", params={"lat": 40.0, "lon": -95.0, "k": 3})
+        assert response.status_code == 200
+        self.service.nearest_geofences.assert_awaited_once_with(40.0, -95.0, 3)
+
+        assert self.client.get("/api/v1/geofences/nearest", params={"lat": 91, "lon": 0}).status_code == 422
+        assert self.client.get("/api/v1/geofences/nearest", params={"lat": 0, "lon": 0, "k": 0}).status_code == 422
+
+    def test_devices(self):
+        """Test devices in a fence, unknown fences and a disabled index."""
+        self.service.devices_in_geofence.return_value = {"geofence_id": 1, "count": 0, "device_ids": []}
+        response = self.client.get("/api/v1/geofences/1/devices", params={"limit": 10})
+        assert response.status_code == 200
+        self.service.devices_in_geofence.assert_awaited_once_with(1, 10)
+
+        self.service.devices_in_geofence.return_value = None
+        assert self.client.get("/api/v1/geofences/99/devices").status_code == 404
+
+        self.service.memberships = None
+        assert self.client.get("/api/v1/geofences/1/devices").status_code == 501
@@ -0,0 +1,327 @@
+from collections import Counter
+
+import httpx
+import orjson
+import pytest
+from fastapi import FastAPI, Request, Response
+from fastapi.testclient import TestClient
+
+from api.binary_batch import MEDIA_TYPE, decode_batch, encode_batch
+from api.front import create_front_app
+from models.geofence import DeviceLocationModel
+from services.hash_ring import HashRing
+
+
+class TestHashRing:
+    """Test cases for HashRing."""
+
+    def test_deterministic(self):
+        """Test the same key maps to the same node on every ring instance."""
+        first = HashRing(["a", "b", "c"])
+        second = HashRing(["a", "b", "c"])
+        keys = [f"device_{i}" for i in range(1000)]
+        assert [first.node_for(k) for k in keys] == [second.node_for(k) for k in keys]
+
+    def test_balanced(self):
+        """Test keys spread roughly evenly over the nodes."""
+        ring = HashRing(list(range(4)))
+        counts = Counter(ring.position_for(f"device_{i}") for i in range(20000))
+        assert min(counts.values()) > 20000 / 4 * 0.85
+        assert max(counts.values()) < 20000 / 4 * 1.15
+
+    def test_adding_node_moves_few_keys(self):
+        """Test growing from 4 to 5 nodes moves about a fifth of the keys, all to the new node."""
+        before = HashRing(list(range(4)))
+        after = HashRing(list(range(5)))
+        keys = [f"device_{i}" for i in range(20000)]
+        moved = [k for k in keys if before.node_for(k) != after.node_for(k)]
+
+        assert 0.12 < len(moved) / len(keys) < 0.28
+        assert {after.node_for(k) for k in moved} == {4}
+
+    def test_needs_nodes(self):
+        """Test an empty ring is rejected."""
+        with pytest.raises(ValueError):
+            HashRing([])
+
+
+def worker_app(worker: int, seen: list) -> FastAPI:
+    """Stand-in worker recording which devices it was sent."""
+    app = FastAPI()
+
+    @app.post("/api/v1/location-check")
+    async def check(location: DeviceLocationModel):
+        seen.append(location.device_id)
+        return {"device_id": location.device_id, "worker": worker}
+
+    @app.post("/api/v1/location-check/batch")
+    async def batch(request: Request):
+        body = await request.json()
+        seen.extend(fix["device_id"] for fix in body)
+        return [{"device_id": fix["device_id"], "worker": worker} for fix in body]
+
+    @app.post("/api/v1/location-check/binary")
+    async def binary(request: Request):
+        batch = decode_batch(await request.body())
+        seen.extend(batch.device_ids)
+        return [
+            {"device_id": device_id, "lat": lat, "worker": worker}
+            for device_id, lat in zip(batch.device_ids, batch.lats.tolist())
+        ]
+
+    @app.post("/api/v1/location-stream")
+    async def stream(request: Request):
+        results = []
+        for line_no, line in enumerate((await request.body()).splitlines(), start=1):
+            try:
+                device_id = orjson.loads(line)["device_id"]
+            except (orjson.JSONDecodeError, KeyError):
+                results.append({"line": line_no, "error": "invalid location", "worker": worker})
+                continue
+            seen.append(device_id)
+            results.append({"device_id": device_id, "worker": worker})
+        return Response(b"".join(orjson.dumps(r) + b"\n" for r in results), media_type="application/x-ndjson")
+
+    @app.get("/api/v1/devices/{device_id}/track")
+    async def track(device_id: str, request: Request):
+        seen.append(device_id)
+        return {"device_id": device_id, "query": str(request.url.query), "worker": worker}
+
+    @app.put("/api/v1/geofences/{geofence_id}")
+    async def update_fence(geofence_id: int, request: Request):
+        return {"id": geofence_id, "name": (await request.json())["name"], "worker": worker}
+
+    @app.get("/api/v1/geofences/{geofence_id}/devices")
+    async def devices(geofence_id: int, limit: int = 1000):
+        device_ids = sorted(d for d in {f"device_{i}" for i in range(30)} if len(d) % 3 == worker)
+        return {"geofence_id": geofence_id, "count": len(device_ids), "device_ids": device_ids[:limit]}
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy"}
+
+    return app
+
+
+class TestFront:
+    """Test cases for the device-affinity front."""
+
+    def setup_method(self):
+        self.seen = [[] for _ in range(3)]
+        self.workers = [
+            httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=worker_app(i, seen)), base_url="http://worker"
+            )
+            for i, seen in enumerate(self.seen)
+        ]
+        self.front = create_front_app(self.workers)
+        self.ring = self.front.state.ring
+        self.client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=self.front), base_url="http://front"
+        )
+
+    @pytest.mark.asyncio
+    async def test_single_checks_stick_to_device_worker(self):
+        """Test every fix of a device reaches the worker the ring assigns it."""
+        for i in range(60):
+            device_id = f"device_{i % 20}"
+            response = await self.client.post(
+                "/api/v1/location-check", json={"device_id": device_id, "lat": 1.0, "lon": 2.0}
+            )
+            assert response.json()["worker"] == self.ring.position_for(device_id)
+
+        assert all(self.seen)
+        for worker, devices in enumerate(self.seen):
+            assert {self.ring.position_for(d) for d in devices} == {worker}
+
+    @pytest.mark.asyncio
+    async def test_batch_split_and_reassembled_in_order(self):
+        """Test a mixed batch is split per worker and merged back in input order."""
+        fixes = [{"device_id": f"device_{i % 25}", "lat": 1.0, "lon": 2.0} for i in range(100)]
+        response = await self.client.post("/api/v1/location-check/batch", json=fixes)
+
+        assert response.status_code == 200
+        results = response.json()
+        assert [r["device_id"] for r in results] == [f["device_id"] for f in fixes]
+        assert [r["worker"] for r in results] == [self.ring.position_for(f["device_id"]) for f in fixes]
+        assert sum(len(devices) for devices in self.seen) == 100
+
+    @pytest.mark.asyncio
+    async def test_binary_batch_split_and_reassembled_in_order(self):
+        """Test a binary batch is re-encoded per worker and merged back in input order."""
+        device_ids = [f"device_{i % 25}" for i in range(100)]
+        lats = [40 + i * 1e-4 for i in range(100)]
+        response = await self.client.post(
+            "/api/v1/location-check/binary",
+            content=encode_batch(device_ids, lats, [-95.0] * 100),
+            headers={"content-type": MEDIA_TYPE}
+        )
+
+        assert response.status_code == 200
+        results = response.json()
+        assert [r["device_id"] for r in results] == device_ids
+        assert [r["lat"] for r in results] == pytest.approx(lats, abs=1e-7)
+        assert [r["worker"] for r in results] == [self.ring.position_for(d) for d in device_ids]
+        assert sum(len(devices) for devices in self.seen) == 100
+
+    @pytest.mark.asyncio
+    async def test_batch_worker_failure_reported_per_fix(self):
+        """Test fixes of a failed worker get error entries in place, with 207, so only they are retried."""
+        def refuse(request):
+            raise httpx.ConnectError("refused")
+
+        self.workers[1]._transport = httpx.MockTransport(refuse)
+        device_ids = [f"device_{i}" for i in range(30)]
+        lats = [40.0] * 30
+
+        json_response = await self.client.post(
+            "/api/v1/location-check/batch",
+            json=[{"device_id": d, "lat": 40.0, "lon": -95.0} for d in device_ids]
+        )
+        binary_response = await self.client.post(
+            "/api/v1/location-check/binary",
+            content=encode_batch(device_ids, lats, [-95.0] * 30), headers={"content-type": MEDIA_TYPE}
+        )
+
+        for response in (json_response, binary_response):
+            assert response.status_code == 207
+            for device_id, result in zip(device_ids, response.json()):
+                assert result["device_id"] == device_id
+                if self.ring.position_for(device_id) == 1:
+                    assert result == {
+                        "device_id": device_id, "error": "worker 1 failed with status 502", "status": 502
+                    }
+                else:
+                    assert result["worker"] == self.ring.position_for(device_id)
+
+    @pytest.mark.asyncio
+    async def test_batch_fails_when_every_worker_fails(self):
+        """Test a batch no worker accepted returns the worker failure itself."""
+        def refuse(request):
+            raise httpx.ConnectError("refused")
+
+        for worker in self.workers:
+            worker._transport = httpx.MockTransport(refuse)
+        response = await self.client.post(
+            "/api/v1/location-check/batch",
+            json=[{"device_id": f"device_{i}", "lat": 40.0, "lon": -95.0} for i in range(30)]
+        )
+
+        assert response.status_code == 502
+
+    @pytest.mark.asyncio
+    async def test_stream_routed_per_device(self):
+        """Test streamed fixes reach their devices' workers and results keep stream order and line numbers."""
+        lines = [
+            orjson.dumps({"device_id": f"device_{i % 25}", "lat": 1.0, "lon": 2.0}) if i % 10 else b"not json"
+            for i in range(1, 301)
+        ]
+        response = await self.client.post(
+            "/api/v1/location-stream", content=b"\n".join(lines),
+            headers={"content-type": "application/x-ndjson"}
+        )
+
+        assert response.status_code == 200
+        results = [orjson.loads(line) for line in response.content.splitlines()]
+        assert len(results) == 300
+        for line_no, (line, result) in enumerate(zip(lines, results), start=1):
+            if line == b"not json":
+                assert result == {"line": line_no, "error": "invalid location", "worker": 0}
+            else:
+                device_id = orjson.loads(line)["device_id"]
+                assert result == {"device_id": device_id, "worker": self.ring.position_for(device_id)}
+        for worker, devices in enumerate(self.seen):
+            assert {self.ring.position_for(d) for d in devices} == {worker}
+
+    @pytest.mark.asyncio
+    async def test_stream_worker_failure_reported_per_line(self):
+        """Test lines sent to an unreachable worker get error results in place."""
+        def refuse(request):
+            raise httpx.ConnectError("refused")
+
+        self.workers[1]._transport = httpx.MockTransport(refuse)
+        device_ids = [f"device_{i}" for i in range(20)]
+        response = await self.client.post(
+            "/api/v1/location-stream",
+            content=b"\n".join(orjson.dumps({"device_id": d, "lat": 1.0, "lon": 2.0}) for d in device_ids)
+        )
+
+        results = [orjson.loads(line) for line in response.content.splitlines()]
+        for line_no, (device_id, result) in enumerate(zip(device_ids, results), start=1):
+            if self.ring.position_for(device_id) == 1:
+                assert result == {"line": line_no, "error": "worker 1 failed with status 502"}
+            else:
+                assert result["device_id"] == device_id
+
+    def test_websocket_routed_per_device(self):
+        """Test each websocket frame is answered with its fixes' results from their devices' workers."""
+        device_ids = [f"device_{i}" for i in range(12)]
+        with TestClient(self.front) as client, client.websocket_connect("/api/v1/location-stream/ws") as ws:
+            ws.send_text("\n".join(
+                orjson.dumps({"device_id": d, "lat": 1.0, "lon": 2.0}).decode() for d in device_ids
+            ))
+            results = [orjson.loads(line) for line in ws.receive_text().splitlines()]
+
+        assert [r["device_id"] for r in results] == device_ids
+        assert [r["worker"] for r in results] == [self.ring.position_for(d) for d in device_ids]
+
+    @pytest.mark.asyncio
+    async def test_track_query_goes_to_device_worker(self):
+        """Test a track query is forwarded with its query string to the device's worker."""
+        response = await self.client.get(
+            "/api/v1/devices/device_7/track", params={"start": "2024-01-01T00:00:00Z", "max_points": 50}
+        )
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body["worker"] == self.ring.position_for("device_7")
+        assert "max_points=50" in body["query"]
+
+    @pytest.mark.asyncio
+    async def test_unroutable_payload_goes_to_first_worker(self):
+        """Test a payload without device id is left to a worker to reject."""
+        response = await self.client.post("/api/v1/location-check", content=b"not json")
+        assert response.status_code == 422
+        assert not any(self.seen)
+
+    @pytest.mark.asyncio
+    async def test_fence_management_goes_to_first_worker(self):
+        """Test fence writes are forwarded to worker 0 and imports are refused."""
+        response = await self.client.put("/api/v1/geofences/12", json={"name": "North Field"})
+        assert response.status_code == 200
+        assert response.json() == {"id": 12, "name": "North Field", "worker": 0}
+
+        response = await self.client.post("/api/v1/geofences/import?format=csv", content=b"name\n")
+        assert response.status_code == 501
+
+    @pytest.mark.asyncio
+    async def test_devices_in_fence_merged_from_every_worker(self):
+        """Test each worker's devices are merged in id order, limited and counted."""
+        response = await self.client.get("/api/v1/geofences/4/devices", params={"limit": 5})
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body["geofence_id"] == 4
+        assert body["count"] == 30
+        assert body["device_ids"] == sorted(f"device_{i}" for i in range(30))[:5]
+
+    @pytest.mark.asyncio
+    async def test_health_aggregates_workers(self):
+        """Test health reports every worker and degrades when one is unreachable."""
+        response = await self.client.get("/health")
+        assert response.status_code == 200
+        assert response.json()["workers"] == [200, 200, 200]
+
+        def refuse(request):
+            raise httpx.ConnectError("refused")
+
+        self.workers[1]._transport = httpx.MockTransport(refuse)
+        response = await self.client.get("/health")
+        assert response.status_code == 503
+        assert response.json()["workers"] == [200, 502, 200]
+
+    @pytest.mark.asyncio
+    async def test_worker_passthrough(self):
+        """Test per-worker GETs and unknown workers."""
+        assert (await self.client.get("/workers/2/health")).json() == {"status": "healthy"}
+        assert (await self.client.get("/workers/7/health")).status_code == 404
@@ -0,0 +1,152 @@
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock
+from domain.geofence_calculator import GeofenceCalculator
+from domain.spatial_index import GeofenceGridIndex
+from models.geofence import GeofenceModel, DeviceLocationModel, DeviceStateModel
+from services.device_state_cache import DeviceStateCache
+from services.geofence_cache import GeofenceCache
+from services.geofence_service import GeofenceService
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestGeofenceCache:
+    """Test cases for GeofenceCache."""
+
+    def setup_method(self):
+        self.geofences = [
+            GeofenceModel(
+                id=1, name="Test Field",
+                center_lat=40.7831, center_lon=-73.9712,
+                radius_km=2.0
+            )
+        ]
+        self.mock_repository = AsyncMock()
+        self.mock_repository.get_all_geofences.return_value = self.geofences
+        self.mock_repository.get_geofence_version.return_value = 1
+        self.clock = FakeClock()
+        self.cache = GeofenceCache(
+            self.mock_repository, GeofenceCalculator(), ttl_seconds=30, clock=self.clock
+        )
+
+    @pytest.mark.asyncio
+    async def test_first_read_loads_then_hits(self):
+        """Test the table is read once and later reads are hits."""
+        index = await self.cache.get_index()
+        assert isinstance(index, GeofenceGridIndex)
+        assert list(index) == self.geofences
+
+        for _ in range(5):
+            assert await self.cache.get_index() is index
+
+        assert self.mock_repository.get_all_geofences.await_count == 1
+        assert self.cache.stats()["hits"] == 5
+        assert self.cache.stats()["misses"] == 1
+        assert self.cache.stats()["rebuilds"] == 1
+
+    @pytest.mark.asyncio
+    async def test_ttl_expiry_with_same_version_skips_reload(self):
+        """Test TTL expiry only checks the version when nothing changed."""
+        index = await self.cache.get_index()
+        self.clock.now = 31
+
+        assert await self.cache.get_index() is index
+        assert self.mock_repository.get_geofence_version.await_count == 2
+        assert self.mock_repository.get_all_geofences.await_count == 1
+        assert self.cache.stats()["rebuilds"] == 1
+
+    @pytest.mark.asyncio
+    async def test_ttl_expiry_with_new_version_rebuilds(self):
+        """Test TTL expiry rebuilds the index when the version moved."""
+        index = await self.cache.get_index()
+        self.clock.now = 31
+        self.mock_repository.get_geofence_version.return_value = 2
+
+        assert await self.cache.get_index() is not index
+        assert self.cache.version == 2
+        assert self.cache.stats()["rebuilds"] == 2
+
+    @pytest.mark.asyncio
+    async def test_notification_invalidates(self):
+        """Test a change notification forces a reload before the TTL."""
+        index = await self.cache.get_index()
+        self.cache._on_notify(None, 0, "geofences_changed", "2")
+
+        assert await self.cache.get_index() is not index
+        assert self.mock_repository.get_all_geofences.await_count == 2
+        assert self.cache.stats()["invalidations"] == 1
+
+    @pytest.mark.asyncio
+    async def test_notification_of_loaded_version_ignored(self):
+        """Test notifications for versions already loaded (e.g. a local import) do not rebuild."""
+        self.mock_repository.get_geofence_version.return_value = 3
+        index = await self.cache.get_index()
+        for version in ("2", "3"):
+            self.cache._on_notify(None, 0, "geofences_changed", version)
+
+        assert await self.cache.get_index() is index
+        assert self.cache.stats()["invalidations"] == 0
+
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_rebuild_once(self):
+        """Test concurrent cold reads share a single rebuild."""
+        results = await asyncio.gather(*(self.cache.get_index() for _ in range(10)))
+
+        assert all(result is results[0] for result in results)
+        assert self.mock_repository.get_all_geofences.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_service_uses_cache_on_hot_path(self):
+        """Test the service never scans the table once the cache is warm."""
+        publisher = AsyncMock()
+        service = GeofenceService(
+            self.mock_repository, GeofenceCalculator(), publisher, self.cache
+        )
+        self.mock_repository.get_device_state.return_value = DeviceStateModel(
+            device_id="test_device", last_lat=40.7831, last_lon=-73.9712,
+            is_inside_fence=True, last_geofence_id=1, last_updated=None
+        )
+
+        inside = DeviceLocationModel(device_id="test_device", lat=40.7831, lon=-73.9712)
+        outside = DeviceLocationModel(device_id="test_device", lat=41.5, lon=-74.0)
+        await service.check_device_location(inside)
+        result = await service.check_device_location(outside)
+
+        assert result["state_changed"] is True
+        assert self.mock_repository.get_all_geofences.await_count == 1
+        event = publisher.publish_geo_event.call_args[0][0]
+        assert event["geofence_name"] == "Test Field"
+
+    @pytest.mark.asyncio
+    async def test_deleted_fences_released_without_exit(self):
+        """Test a reload that drops a fence reports it and cached members leave it silently."""
+        state_cache = DeviceStateCache()
+        released = []
+        self.cache.removal_listeners.append(released.append)
+        self.cache.removal_listeners.append(state_cache.release_geofences)
+        publisher = AsyncMock()
+        service = GeofenceService(
+            self.mock_repository, GeofenceCalculator(), publisher, self.cache, state_cache=state_cache
+        )
+        location = DeviceLocationModel(device_id="test_device", lat=40.7831, lon=-73.9712)
+        self.mock_repository.get_device_state.return_value = None
+        await service.check_device_location(location)
+        assert state_cache.peek("test_device").geofence_ids == (1,)
+
+        self.mock_repository.get_all_geofences.return_value = []
+        self.mock_repository.get_geofence_version.return_value = 2
+        self.cache.invalidate()
+        result = await service.check_device_location(location)
+
+        assert released == [{1}]
+        assert result["state_changed"] is False
+        assert state_cache.peek("test_device").is_inside_fence is False
+        publisher.publish_geo_event.assert_not_called()
@@ -1,3 +1,6 @@
+import random
+
+import numpy as np
 import pytest
 from domain.geofence_calculator import GeofenceCalculator
 from models.geofence import GeofenceModel, DeviceLocationModel
@@ -83,4 +86,61 @@ class TestGeofenceCalculator:
         
         result = self.calculator.find_containing_geofence(location, geofences)
         assert result is not None
-        assert result.name == "First Field" 
\ No newline at end of file
+        assert result.name == "First Field" 
+    
+    def test_distance_pairs_match_scalar(self):
+        """Test vectorized distances match the scalar Haversine."""
+        lats = np.array([40.7128, 34.0522, -33.8688])
+        lons = np.array([-74.0060, -118.2437, 151.2093])
+        distances = self.calculator.calculate_distance_km_pairs(lats, lons, lats[::-1], lons[::-1])
+        
+        assert distances.shape == (3,)
+        for i in range(3):
+            expected = self.calculator.calculate_distance_km(lats[i], lons[i], lats[2 - i], lons[2 - i])
+            assert distances[i] == pytest.approx(expected, abs=1e-9)
+    
+    def test_batch_matches_single_point_lookup(self):
+        """Test batch containment matches per-point lookups in input order."""
+        rng = random.Random(3)
+        geofences = [
+            GeofenceModel(
+                id=i, name=f"Field {i}",
+                center_lat=rng.uniform(40.0, 41.0),
+                center_lon=rng.uniform(-74.5, -73.5),
+                radius_km=rng.uniform(0.1, 5.0)
+            )
+            for i in range(1, 301)
+        ]
+        geofences.append(
+            GeofenceModel(id=999, name="Region", center_lat=40.5, center_lon=-74.0, radius_km=400.0)
+        )
+        lats = [rng.uniform(39.5, 41.5) for _ in range(2000)]
+        lons = [rng.uniform(-75.0, -73.0) for _ in range(2000)]
+        
+        results = self.calculator.find_containing_geofences_batch(
+            lats, lons, geofences, max_matrix_size=5000
+        )
+        
+        for lat, lon, result in zip(lats, lons, results):
+            location = DeviceLocationModel(device_id="d", lat=lat, lon=lon)
+            assert result == self.calculator.find_containing_geofence(location, geofences)
+        
+        all_results = self.calculator.find_all_containing_geofences_batch(
+            lats, lons, geofences, max_matrix_size=5000
+        )
+        
+        overlaps = 0
+        for lat, lon, result in zip(lats, lons, all_results):
+            location = DeviceLocationModel(device_id="d", lat=lat, lon=lon)
+            assert result == self.calculator.find_containing_geofences(location, geofences)
+            overlaps += len(result) > 1
+        assert overlaps > 0
+    
+    def test_batch_empty_inputs(self):
+        """Test batch lookups with no points or no fences."""
+        geofences = [
+            GeofenceModel(id=1, name="Test Field", center_lat=0.0, center_lon=0.0, radius_km=1.0)
+        ]
+        assert self.calculator.find_containing_geofences_batch([], [], geofences) == []
+        assert self.calculator.find_containing_geofences_batch([0.0], [0.0], []) == [None]
+        assert self.calculator.find_all_containing_geofences_batch([0.0], [0.0], []) == [[]]
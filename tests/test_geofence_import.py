@@ -0,0 +1,389 @@
+import json
+import os
+import uuid
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import import_geofences
+from api.dependecies import (
+    provide_geofence_cache, provide_geofence_importer, provide_geofence_repository
+)
+from api.routers import geofences
+from database.db_setup import DatabaseManager
+from models.geofence import GeofenceInputModel, GeofenceModel
+from repositories.geofence_repository import GeofenceRepository
+from services.geofence_import import (
+    CsvFenceParser, GeoJsonFenceParser, GeoJsonSeqFenceParser, GeofenceImporter,
+    GeofenceImportError, fence_from_feature
+)
+
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+
+def polygon_feature(name, lat, lon, size=0.01):
+    ring = [[lon, lat], [lon + size, lat], [lon + size, lat + size], [lon, lat + size], [lon, lat]]
+    return {
+        "type": "Feature",
+        "properties": {"name": name},
+        "geometry": {"type": "Polygon", "coordinates": [ring]},
+    }
+
+
+def point_feature(name, lat, lon, radius_km):
+    return {
+        "type": "Feature",
+        "properties": {"name": name, "radius_km": radius_km},
+        "geometry": {"type": "Point", "coordinates": [lon, lat]},
+    }
+
+
+def feature_collection(features):
+    return json.dumps({"type": "FeatureCollection", "name": "fields", "features": features}).encode()
+
+
+def split(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def parse(parser, chunks):
+    records = []
+    for chunk in chunks:
+        records.extend(parser.feed(chunk))
+    records.extend(parser.finish())
+    return records
+
+
+async def stream(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+class TestParsers:
+    """Test cases for the incremental fence parsers."""
+
+    def setup_method(self):
+        self.features = [polygon_feature(f"Field é {i}", 40 + i * 0.01, -95.0) for i in range(20)]
+        self.features.append(point_feature("Silo", 40.5, -95.5, 0.2))
+
+    @pytest.mark.parametrize("size", [1, 7, 64, 100_000])
+    def test_geojson_any_chunk_boundary(self, size):
+        """Test a FeatureCollection parses the same however the bytes are split."""
+        records = parse(GeoJsonFenceParser(), split(feature_collection(self.features), size))
+        assert records == self.features
+
+    @pytest.mark.parametrize("size", [1, 13, 100_000])
+    def test_geojsonseq_any_chunk_boundary(self, size):
+        """Test newline-delimited features parse the same however the bytes are split."""
+        data = b"".join(b"\x1e" + json.dumps(f).encode() + b"\n" for f in self.features)
+        assert parse(GeoJsonSeqFenceParser(), split(data, size)) == self.features
+
+    @pytest.mark.parametrize("size", [1, 5, 100_000])
+    def test_csv_any_chunk_boundary(self, size):
+        """Test CSV rows parse the same however the bytes are split; empty cells are dropped."""
+        data = (
+            "﻿name,center_lat,center_lon,radius_km,polygon\r\n"
+            "North Field,40.1,-95.2,1.5,\r\n"
+            '"Pivot, east",,,,"[[40.0, -95.0], [40.0, -94.9], [40.1, -94.9]]"\r\n'
+        ).encode()
+        assert parse(CsvFenceParser(), split(data, size)) == [
+            {"name": "North Field", "center_lat": "40.1", "center_lon": "-95.2", "radius_km": "1.5"},
+            {"name": "Pivot, east", "polygon": "[[40.0, -95.0], [40.0, -94.9], [40.1, -94.9]]"},
+        ]
+
+    def test_csv_needs_name_column(self):
+        """Test a header without a name column is rejected."""
+        with pytest.raises(GeofenceImportError):
+            CsvFenceParser().feed(b"lat,lon\n1,2\n")
+
+    def test_geojson_without_features(self):
+        """Test a document without a features array is rejected."""
+        with pytest.raises(GeofenceImportError):
+            parse(GeoJsonFenceParser(), [b'{"type": "Feature", "geometry": null}'])
+
+    def test_geojson_truncated(self):
+        """Test a body cut off inside the features array is rejected."""
+        data = feature_collection(self.features)
+        with pytest.raises(GeofenceImportError):
+            parse(GeoJsonFenceParser(), [data[:len(data) // 2]])
+
+
+class TestFenceFromFeature:
+    """Test cases for mapping GeoJSON features onto fences."""
+
+    def test_polygon(self):
+        """Test positions are swapped to (lat, lon) and the closing vertex dropped."""
+        fence = GeofenceInputModel(**fence_from_feature(polygon_feature("North Field", 40.0, -95.0)))
+
+        assert fence.polygon == [(40.0, -95.0), (40.0, -94.99), (40.01, -94.99), (40.01, -95.0)]
+        assert fence.center_lat == pytest.approx(40.005)
+        assert fence.radius_km > 0
+
+    def test_point(self):
+        """Test a point with a radius_km property becomes a circle."""
+        fence = GeofenceInputModel(**fence_from_feature(point_feature("Silo", 40.5, -95.5, 0.2)))
+        assert (fence.center_lat, fence.center_lon, fence.radius_km, fence.polygon) == (40.5, -95.5, 0.2, None)
+
+    def test_unsupported_geometry(self):
+        """Test geometries other than Polygon and Point are rejected."""
+        feature = {"properties": {"name": "Road"}, "geometry": {"type": "LineString", "coordinates": [[0, 0]]}}
+        with pytest.raises(ValueError):
+            fence_from_feature(feature)
+
+
+class FakeImportRepository:
+    """Records what the importer stages and merges, without a database."""
+
+    def __init__(self):
+        self.copies = []
+        self.conn = MagicMock()
+
+        @asynccontextmanager
+        async def transaction():
+            yield
+
+        @asynccontextmanager
+        async def acquire():
+            yield self.conn
+
+        self.conn.transaction = transaction
+        self.db_pool = MagicMock()
+        self.db_pool.acquire = acquire
+        self.create_geofence_staging = AsyncMock()
+        self.merge_geofence_staging = AsyncMock(return_value={"inserted": 3, "updated": 1, "deleted": 0})
+
+    async def copy_geofence_staging(self, conn, fences):
+        self.copies.append([fence.name for fence in fences])
+
+
+class TestGeofenceImporter:
+    """Test cases for GeofenceImporter."""
+
+    def setup_method(self):
+        self.repository = FakeImportRepository()
+        self.cache = MagicMock()
+        self.cache.get_index = AsyncMock()
+        self.importer = GeofenceImporter(self.repository, self.cache, chunk_size=2)
+
+    @pytest.mark.asyncio
+    async def test_chunks_copied_and_merged_once(self):
+        """Test valid rows are COPYed per chunk, merged once and the index rebuilt once."""
+        features = [polygon_feature(f"Field {i}", 40 + i * 0.01, -95.0) for i in range(4)]
+        data = feature_collection(features)
+
+        report = await self.importer.run(stream(split(data, 50)), "geojson", replace=True)
+
+        assert [name for copy in self.repository.copies for name in copy] == [f"Field {i}" for i in range(4)]
+        assert all(len(copy) <= 3 for copy in self.repository.copies)
+        self.repository.merge_geofence_staging.assert_awaited_once_with(self.repository.conn, True)
+        self.cache.invalidate.assert_called_once()
+        self.cache.get_index.assert_awaited_once()
+        assert report["rows"] == report["loaded"] == 4
+        assert (report["inserted"], report["updated"], report["deleted"]) == (3, 1, 0)
+        assert report["rows_per_second"] > 0
+
+    @pytest.mark.asyncio
+    async def test_invalid_rows_reported(self):
+        """Test invalid and duplicate rows are skipped with their record numbers."""
+        data = (
+            b"name,center_lat,center_lon,radius_km\n"
+            b"North Field,40.1,-95.2,1.5\n"
+            b"Too Far North,95.0,-95.2,1.5\n"
+            b"North Field,40.2,-95.2,1.5\n"
+            b"South Field,40.0,-95.2,0.5\n"
+        )
+
+        report = await self.importer.run(stream([data]), "csv")
+
+        assert report["loaded"] == 2
+        assert report["rejected"] == 2
+        assert [error["row"] for error in report["errors"]] == [2, 3]
+        assert "center_lat" in report["errors"][0]["error"]
+        assert "duplicate" in report["errors"][1]["error"]
+
+    @pytest.mark.asyncio
+    async def test_strict_aborts_before_merge(self):
+        """Test a strict import with an invalid row never merges."""
+        data = b"name,center_lat,center_lon,radius_km\nNorth Field,40.1,-95.2,-1\n"
+
+        with pytest.raises(GeofenceImportError):
+            await self.importer.run(stream([data]), "csv", strict=True)
+
+        self.repository.merge_geofence_staging.assert_not_called()
+        self.cache.invalidate.assert_not_called()
+
+
+class TestGeofencesApi:
+    """Test cases for the geofence management routes."""
+
+    def setup_method(self):
+        self.repository = AsyncMock()
+        self.cache = MagicMock()
+        self.importer = MagicMock()
+        self.importer.run = AsyncMock()
+
+        app = FastAPI()
+        app.include_router(geofences.router)
+        app.dependency_overrides[provide_geofence_repository] = lambda: self.repository
+        app.dependency_overrides[provide_geofence_cache] = lambda: self.cache
+        app.dependency_overrides[provide_geofence_importer] = lambda: self.importer
+        self.client = TestClient(app)
+
+    def test_create_invalidates_cache(self):
+        """Test creating a fence returns it with its id and reloads the fence cache."""
+        self.repository.create_geofence.side_effect = lambda fence: GeofenceModel(id=7, **fence.model_dump())
+
+        response = self.client.post(
+            "/api/v1/geofences", json={"name": "North Field", "center_lat": 40.1, "center_lon": -95.2, "radius_km": 1.5}
+        )
+
+        assert response.status_code == 201
+        assert response.json()["id"] == 7
+        self.cache.invalidate.assert_called_once()
+
+    def test_polygon_fills_circle(self):
+        """Test a polygon fence may leave out its enclosing circle."""
+        self.repository.create_geofence.side_effect = lambda fence: GeofenceModel(id=8, **fence.model_dump())
+
+        response = self.client.post(
+            "/api/v1/geofences", json={"name": "Pivot", "polygon": [[40.0, -95.0], [40.0, -94.9], [40.1, -94.9]]}
+        )
+
+        assert response.status_code == 201
+        assert response.json()["radius_km"] > 0
+
+    def test_polygon_circle_rederived_on_update(self):
+        """Test a polygon sent back with a stale circle is stored with its enclosing circle."""
+        polygon = [[40.0, -95.0], [40.0, -94.9], [40.1, -94.9]]
+        self.repository.update_geofence.side_effect = lambda geofence_id, fence: GeofenceModel(
+            id=geofence_id, **fence.model_dump()
+        )
+
+        response = self.client.put(
+            "/api/v1/geofences/8",
+            json={"name": "Pivot", "center_lat": 40.0, "center_lon": -95.0, "radius_km": 0.1, "polygon": polygon}
+        )
+
+        assert response.status_code == 200
+        stored = self.repository.update_geofence.call_args[0][1]
+        assert (stored.center_lat, stored.center_lon) == pytest.approx((40.05, -94.95))
+        assert stored.radius_km > 7
+
+    def test_invalid_fence(self):
+        """Test a fence with neither a complete circle nor a polygon is rejected."""
+        response = self.client.post("/api/v1/geofences", json={"name": "Nowhere", "center_lat": 40.0})
+        assert response.status_code == 422
+        self.repository.create_geofence.assert_not_called()
+
+    def test_missing_fence(self):
+        """Test reads, updates and deletes of unknown fences are 404s."""
+        self.repository.get_geofence.return_value = None
+        self.repository.update_geofence.return_value = None
+        self.repository.delete_geofence.return_value = False
+        fence = {"name": "North Field", "center_lat": 40.1, "center_lon": -95.2, "radius_km": 1.5}
+
+        assert self.client.get("/api/v1/geofences/3").status_code == 404
+        assert self.client.put("/api/v1/geofences/3", json=fence).status_code == 404
+        assert self.client.delete("/api/v1/geofences/3").status_code == 404
+        self.cache.invalidate.assert_not_called()
+
+    def test_list_pages(self):
+        """Test listing passes the keyset cursor through."""
+        self.repository.list_geofences.return_value = []
+
+        response = self.client.get("/api/v1/geofences", params={"after_id": 100, "limit": 50})
+
+        assert response.status_code == 200
+        self.repository.list_geofences.assert_awaited_once_with(100, 50)
+
+    def test_import(self):
+        """Test an import streams the body to the importer with its options."""
+        self.importer.run.return_value = {"rows": 1, "loaded": 1}
+
+        response = self.client.post(
+            "/api/v1/geofences/import", params={"format": "csv", "replace": "true"},
+            content=b"name,center_lat,center_lon,radius_km\nNorth Field,40.1,-95.2,1.5\n"
+        )
+
+        assert response.status_code == 200
+        assert response.json() == {"rows": 1, "loaded": 1}
+        args, kwargs = self.importer.run.call_args
+        assert args[1] == "csv"
+        assert kwargs == {"replace": True, "strict": False}
+
+    def test_import_errors(self):
+        """Test unknown formats are 422s and unparseable bodies 400s."""
+        assert self.client.post("/api/v1/geofences/import", params={"format": "kml"}).status_code == 422
+
+        self.importer.run.side_effect = GeofenceImportError("GeoJSON has no FeatureCollection features array")
+        response = self.client.post("/api/v1/geofences/import", params={"format": "geojson"}, content=b"{}")
+        assert response.status_code == 400
+
+
+class TestImportCli:
+    """Test cases for import_geofences.py argument handling."""
+
+    def test_format_from_extension(self):
+        """Test the format is inferred from the file extension unless given."""
+        assert import_geofences.parse_args(["--input", "fences.geojson"]).format == "geojson"
+        assert import_geofences.parse_args(["--input", "fences.ndjson"]).format == "geojsonseq"
+        assert import_geofences.parse_args(["--input", "fences.txt", "--format", "csv"]).format == "csv"
+        with pytest.raises(SystemExit):
+            import_geofences.parse_args(["--input", "fences.txt"])
+
+
+@pytest_asyncio.fixture
+async def import_repository():
+    """Repository on a throwaway schema of TEST_DATABASE_URL."""
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    import asyncpg
+
+    schema = f"test_geofence_import_{uuid.uuid4().hex[:8]}"
+    admin = await asyncpg.connect(TEST_DATABASE_URL)
+    await admin.execute(f"CREATE SCHEMA {schema}")
+    manager = DatabaseManager(TEST_DATABASE_URL)
+    manager.pool = await asyncpg.create_pool(
+        TEST_DATABASE_URL, min_size=1, max_size=2,
+        server_settings={"search_path": f"{schema},public"}
+    )
+    try:
+        await manager.create_tables()
+        yield GeofenceRepository(manager.pool)
+    finally:
+        await manager.close_pool()
+        await admin.execute(f"DROP SCHEMA {schema} CASCADE")
+        await admin.close()
+
+
+class TestImportSql:
+    """Test cases for the staged import merge against Postgres."""
+
+    @pytest.mark.asyncio
+    async def test_merge_and_replace(self, import_repository):
+        """Test imports keep ids by name, count changes and release replaced fences."""
+        importer = GeofenceImporter(import_repository, chunk_size=2)
+        first = [point_feature(name, 40.0 + i, -95.0, 1.0) for i, name in enumerate(["A", "B", "C"])]
+        report = await importer.run(stream([feature_collection(first)]), "geojson")
+        assert (report["inserted"], report["updated"], report["deleted"]) == (3, 0, 0)
+        ids = {fence.name: fence.id for fence in await import_repository.get_all_geofences()}
+
+        await import_repository.update_device_state("tractor", 40.0, -95.0, True, ids["A"], (ids["A"],))
+        version = await import_repository.get_geofence_version()
+
+        second = [point_feature("B", 41.0, -95.0, 2.0), point_feature("C", 42.0, -95.0, 1.0),
+                  point_feature("D", 43.0, -95.0, 1.0)]
+        report = await importer.run(stream([feature_collection(second)]), "geojson", replace=True)
+
+        assert (report["inserted"], report["updated"], report["deleted"]) == (1, 1, 1)
+        fences = {fence.name: fence for fence in await import_repository.get_all_geofences()}
+        assert set(fences) == {"B", "C", "D"}
+        assert fences["B"].id == ids["B"] and fences["B"].radius_km == 2.0
+        assert await import_repository.get_geofence_version() > version
+        state = await import_repository.get_device_state("tractor")
+        assert (state.is_inside_fence, state.last_geofence_id, state.geofence_ids) == (False, None, ())
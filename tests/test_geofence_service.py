@@ -1,5 +1,6 @@
 import pytest
 from unittest.mock import AsyncMock, Mock
+from domain.geofence_calculator import GeofenceCalculator
 from services.geofence_service import GeofenceService
 from models.geofence import DeviceLocationModel, GeofenceModel, DeviceStateModel
 
@@ -33,7 +34,7 @@ class TestGeofenceService:
         
         self.mock_repository.get_all_geofences.return_value = [geofence]
         self.mock_repository.get_device_state.return_value = None  # First time
-        self.mock_calculator.find_containing_geofence.return_value = geofence
+        self.mock_calculator.find_containing_geofences.return_value = [geofence]
         
         result = await self.service.check_device_location(location)
         
@@ -43,7 +44,7 @@ class TestGeofenceService:
         assert result["state_changed"] is True
         
         self.mock_repository.update_device_state.assert_called_once_with(
-            "test_device", 40.7831, -73.9712, True, 1
+            "test_device", 40.7831, -73.9712, True, 1, (1,)
         )
         
         self.mock_event_publisher.publish_geo_event.assert_not_called()
@@ -72,7 +73,7 @@ class TestGeofenceService:
         
         self.mock_repository.get_all_geofences.return_value = [geofence]
         self.mock_repository.get_device_state.return_value = previous_state
-        self.mock_calculator.find_containing_geofence.return_value = None
+        self.mock_calculator.find_containing_geofences.return_value = []
         
         result = await self.service.check_device_location(location)
         
@@ -84,7 +85,7 @@ class TestGeofenceService:
         self.mock_event_publisher.publish_geo_event.assert_called_once()
         
         self.mock_repository.update_device_state.assert_called_once_with(
-            "test_device", 41.0, -74.0, False, None
+            "test_device", 41.0, -74.0, False, None, ()
         )
     
     @pytest.mark.asyncio
@@ -111,7 +112,7 @@ class TestGeofenceService:
         
         self.mock_repository.get_all_geofences.return_value = [geofence]
         self.mock_repository.get_device_state.return_value = previous_state
-        self.mock_calculator.find_containing_geofence.return_value = geofence
+        self.mock_calculator.find_containing_geofences.return_value = [geofence]
         
         result = await self.service.check_device_location(location)
         
@@ -123,5 +124,100 @@ class TestGeofenceService:
         self.mock_event_publisher.publish_geo_event.assert_not_called()
         
         self.mock_repository.update_device_state.assert_called_once_with(
-            "test_device", 40.7831, -73.9712, True, 1
-        )
\ No newline at end of file
+            "test_device", 40.7831, -73.9712, True, 1, (1,)
+        )
+    
+    @pytest.mark.asyncio
+    async def test_batch_applies_fixes_in_order(self):
+        """Test batch check keeps input order and sequences fixes per device."""
+        geofence = GeofenceModel(
+            id=1, name="Test Field", 
+            center_lat=40.7831, center_lon=-73.9712, 
+            radius_km=2.0
+        )
+        previous_state = DeviceStateModel(
+            device_id="tractor",
+            last_lat=40.7831,
+            last_lon=-73.9712,
+            is_inside_fence=True,
+            last_geofence_id=1,
+            last_updated="2024-01-01T00:00:00Z"
+        )
+        service = GeofenceService(
+            self.mock_repository, GeofenceCalculator(), self.mock_event_publisher
+        )
+        self.mock_repository.get_all_geofences.return_value = [geofence]
+        self.mock_repository.get_device_states.return_value = {"tractor": previous_state}
+        
+        locations = [
+            DeviceLocationModel(device_id="tractor", lat=41.0, lon=-74.0),
+            DeviceLocationModel(device_id="plough", lat=40.7831, lon=-73.9712),
+            DeviceLocationModel(device_id="tractor", lat=40.7831, lon=-73.9712),
+            DeviceLocationModel(device_id="tractor", lat=41.0, lon=-74.0),
+        ]
+        
+        results = await service.check_device_locations(locations)
+        
+        assert [r["device_id"] for r in results] == ["tractor", "plough", "tractor", "tractor"]
+        assert [r["inside_geofence"] for r in results] == [False, True, True, False]
+        assert [r["state_changed"] for r in results] == [True, True, True, True]
+        
+        self.mock_repository.get_device_states.assert_called_once_with(["tractor", "plough"])
+        assert [
+            call.args[0]["event_type"] for call in self.mock_event_publisher.publish_geo_event.call_args_list
+        ] == ["fence_exit", "fence_enter", "fence_exit"]
+        self.mock_repository.update_device_states.assert_called_once_with([
+            ("tractor", 41.0, -74.0, False, None, ()),
+            ("plough", 40.7831, -73.9712, True, 1, (1,)),
+        ])
+        self.mock_repository.update_device_state.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_batch_empty(self):
+        """Test an empty batch does no work."""
+        assert await self.service.check_device_locations([]) == []
+        self.mock_repository.get_device_states.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_overlapping_fences_enter_and_exit_each(self):
+        """Test every fence of an overlap gets its own enter and exit, exits first."""
+        north = GeofenceModel(id=1, name="North Field", center_lat=40.0, center_lon=-95.0, radius_km=1.0)
+        pivot = GeofenceModel(id=2, name="Pivot", center_lat=40.012, center_lon=-95.0, radius_km=1.0)
+        self.mock_repository.get_all_geofences.return_value = [pivot, north]
+        self.mock_repository.get_device_state.return_value = None
+        service = GeofenceService(self.mock_repository, GeofenceCalculator(), self.mock_event_publisher)
+        
+        async def check(lat):
+            result = await service.check_device_location(
+                DeviceLocationModel(device_id="tractor", lat=lat, lon=-95.0)
+            )
+            args = self.mock_repository.update_device_state.call_args.args
+            self.mock_repository.get_device_state.return_value = DeviceStateModel(
+                device_id="tractor", last_lat=args[1], last_lon=args[2], is_inside_fence=args[3],
+                last_geofence_id=args[4], geofence_ids=args[5], last_updated=None
+            )
+            events = [
+                (call.args[0]["event_type"], call.args[0]["geofence_id"])
+                for call in self.mock_event_publisher.publish_geo_event.call_args_list
+            ]
+            self.mock_event_publisher.publish_geo_event.reset_mock()
+            return result, events
+        
+        result, events = await check(39.995)
+        assert result["geofence_names"] == ["North Field"] and events == []
+        
+        result, events = await check(40.006)
+        assert result["geofence_names"] == ["Pivot", "North Field"]
+        assert result["state_changed"] is True
+        assert events == [("fence_enter", 2)]
+        assert self.mock_repository.update_device_state.call_args.args[4:] == (2, (1, 2))
+        
+        result, events = await check(40.0065)
+        assert result["state_changed"] is False and events == []
+        
+        result, events = await check(40.02)
+        assert events == [("fence_exit", 1)]
+        
+        result, events = await check(39.995)
+        assert events == [("fence_exit", 2), ("fence_enter", 1)]
+        assert result["inside_geofence"] is True
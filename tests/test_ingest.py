@@ -0,0 +1,173 @@
+import asyncio
+import json
+
+import pytest
+from unittest.mock import AsyncMock
+from fastapi import FastAPI, WebSocketDisconnect
+from fastapi.testclient import TestClient
+
+from api.dependecies import provide_geofence_service
+from api.routers import ingest
+from api.routers.ingest import LineTooLongError, NdjsonSplitter
+
+
+def echo_results(locations):
+    return [
+        {
+            "device_id": loc.device_id,
+            "inside_geofence": loc.lat > 0,
+            "geofence_name": None,
+            "state_changed": False
+        }
+        for loc in locations
+    ]
+
+
+class TestNdjsonSplitter:
+    """Test cases for the incremental NDJSON splitter."""
+
+    def test_lines_split_across_chunks(self):
+        """Test lines spanning chunk boundaries are reassembled."""
+        splitter = NdjsonSplitter()
+        assert splitter.feed(b'{"a": 1}\n{"b"') == [b'{"a": 1}']
+        assert splitter.feed(b': 2}\n\n  \n{"c": 3}') == [b'{"b": 2}']
+        assert splitter.finish() == [b'{"c": 3}']
+        assert splitter.finish() == []
+
+    def test_line_too_long(self):
+        """Test oversized lines are rejected, terminated or not."""
+        splitter = NdjsonSplitter(max_line_bytes=8)
+        with pytest.raises(LineTooLongError):
+            splitter.feed(b"x" * 9)
+
+        splitter = NdjsonSplitter(max_line_bytes=8)
+        with pytest.raises(LineTooLongError):
+            splitter.feed(b"ok\n" + b"x" * 9 + b"\nok")
+
+
+class TestIngestApi:
+    """Test cases for the streaming ingestion routes."""
+
+    def setup_method(self):
+        self.mock_service = AsyncMock()
+        self.mock_service.check_device_locations.side_effect = echo_results
+
+        app = FastAPI()
+        app.include_router(ingest.router)
+        app.dependency_overrides[provide_geofence_service] = lambda: self.mock_service
+        self.client = TestClient(app)
+
+    def test_ndjson_stream(self):
+        """Test NDJSON fixes stream back results in order, errors in place."""
+        lines = [
+            json.dumps({"device_id": f"tractor_{i}", "lat": 1.0 if i % 2 else -1.0, "lon": 0.0})
+            for i in range(5)
+        ]
+        lines.insert(2, '{"device_id": "bad", "lat": 200, "lon": 0}')
+        body = ("\n".join(lines)).encode()
+
+        def chunks():
+            for start in range(0, len(body), 7):
+                yield body[start:start + 7]
+
+        response = self.client.post(
+            "/api/v1/location-stream",
+            content=chunks(),
+            headers={"Content-Type": "application/x-ndjson"}
+        )
+
+        assert response.status_code == 200
+        results = [json.loads(line) for line in response.text.splitlines()]
+        assert len(results) == 6
+        assert results[2]["line"] == 3
+        assert results[2]["error"] == "invalid location"
+        assert [r["device_id"] for r in results if "device_id" in r] == [
+            f"tractor_{i}" for i in range(5)
+        ]
+
+    def test_ndjson_micro_batches(self):
+        """Test large streams are handed to the service in bounded batches."""
+        body = "".join(
+            json.dumps({"device_id": f"d{i}", "lat": 0.5, "lon": 0.5}) + "\n"
+            for i in range(ingest.MAX_MICRO_BATCH + 10)
+        )
+
+        response = self.client.post("/api/v1/location-stream", content=body)
+
+        assert len(response.text.splitlines()) == ingest.MAX_MICRO_BATCH + 10
+        for call in self.mock_service.check_device_locations.call_args_list:
+            assert len(call[0][0]) <= ingest.MAX_MICRO_BATCH
+
+    def test_websocket_stream(self):
+        """Test frames with one or several fixes are answered in order."""
+        with self.client.websocket_connect("/api/v1/location-stream/ws") as ws:
+            ws.send_text(json.dumps({"device_id": "tractor_1", "lat": 1.0, "lon": 0.0}))
+            first = [json.loads(line) for line in ws.receive_text().splitlines()]
+
+            ws.send_text(
+                json.dumps({"device_id": "tractor_2", "lat": -1.0, "lon": 0.0}) + "\n"
+                + "not json\n"
+                + json.dumps({"device_id": "tractor_3", "lat": 1.0, "lon": 0.0})
+            )
+            received = []
+            while len(received) < 3:
+                received += [json.loads(line) for line in ws.receive_text().splitlines()]
+
+        assert first == [{
+            "device_id": "tractor_1", "inside_geofence": True,
+            "geofence_name": None, "state_changed": False
+        }]
+        assert received[0]["device_id"] == "tractor_2"
+        assert received[1]["line"] == 3
+        assert received[2]["device_id"] == "tractor_3"
+
+    def test_websocket_line_too_long_closes_with_1009(self):
+        """Test an oversized line closes the socket with 1009 after earlier fixes were answered."""
+        with self.client.websocket_connect("/api/v1/location-stream/ws") as ws:
+            ws.send_text(json.dumps({"device_id": "tractor_1", "lat": 1.0, "lon": 0.0}))
+            results = [json.loads(line) for line in ws.receive_text().splitlines()]
+            ws.send_text("x" * (ingest.MAX_LINE_BYTES + 1))
+            with pytest.raises(WebSocketDisconnect) as disconnect:
+                ws.receive_text()
+
+        assert [r["device_id"] for r in results] == ["tractor_1"]
+        assert disconnect.value.code == 1009
+
+    @pytest.mark.asyncio
+    async def test_cancelled_reader_with_full_queue_finishes(self, monkeypatch):
+        """Test the reader task ends when cancelled while the queue is full."""
+        monkeypatch.setattr(ingest, "MAX_PENDING_LINES", 1)
+        tasks = []
+        create_task = asyncio.create_task
+
+        def record_task(coro):
+            task = create_task(coro)
+            tasks.append(task)
+            return task
+
+        monkeypatch.setattr(ingest.asyncio, "create_task", record_task)
+        async def fail(fixes):
+            await asyncio.sleep(0.01)
+            raise RuntimeError("db down")
+
+        self.mock_service.check_device_locations.side_effect = fail
+        frames = asyncio.Queue()
+        for i in range(3):
+            frames.put_nowait(json.dumps({"device_id": f"d{i}", "lat": 1.0, "lon": 0.0}) + "\n" * 2)
+        websocket = AsyncMock()
+        websocket.receive_text.side_effect = frames.get
+
+        await ingest.ingest_websocket(websocket, self.mock_service)
+
+        websocket.close.assert_awaited_once_with(code=1011)
+        await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), timeout=1)
+        assert all(task.done() for task in tasks)
+
+    def test_websocket_read_error_closes_with_1011(self):
+        """Test a frame the reader cannot handle closes the socket as a server error."""
+        with self.client.websocket_connect("/api/v1/location-stream/ws") as ws:
+            ws.send_bytes(b"binary frames are not accepted")
+            with pytest.raises(WebSocketDisconnect) as disconnect:
+                ws.receive_text()
+
+        assert disconnect.value.code == 1011
@@ -0,0 +1,272 @@
+import asyncio
+import os
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+import pytest_asyncio
+from unittest.mock import AsyncMock, Mock
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.dependecies import provide_geofence_service
+from api.routers import history
+from database.db_setup import DatabaseManager
+from domain.geofence_calculator import GeofenceCalculator
+from domain.track import simplify_track
+from models.geofence import DeviceLocationModel, GeofenceModel
+from repositories.geofence_repository import GeofenceRepository
+from services.geofence_service import GeofenceService
+from services.location_history import LocationHistoryWriter
+
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+NORTH_FIELD = GeofenceModel(id=1, name="North Field", center_lat=40.0, center_lon=-95.0, radius_km=1.0)
+
+# 2024-03-10 12:00:00 UTC
+NOON = 1710072000.0
+
+
+class FakeHistoryRepository:
+    """Records COPY batches and partition maintenance calls."""
+
+    def __init__(self):
+        self.batches = []
+        self.created = []
+        self.dropped_before = []
+        self.fail = False
+
+    async def copy_location_history(self, rows):
+        if self.fail:
+            raise ConnectionError("db down")
+        self.batches.append(list(rows))
+
+    async def create_history_partitions(self, days):
+        self.created.extend(days)
+
+    async def drop_history_partitions(self, before):
+        self.dropped_before.append(before)
+        return ["location_history_p20240101"]
+
+
+class TestSimplifyTrack:
+    """Test cases for simplify_track."""
+
+    def test_straight_line_keeps_endpoints(self):
+        """Test collinear points collapse to the first and last."""
+        lats = [40.0 + i * 1e-3 for i in range(50)]
+        assert simplify_track(lats, [-95.0] * 50, tolerance_m=1.0) == [0, 49]
+
+    def test_corner_and_kept_points_survive(self):
+        """Test a corner beyond the tolerance and flagged points are kept."""
+        lats = [40.0, 40.005, 40.01, 40.01, 40.01]
+        lons = [-95.0, -95.0, -95.0, -94.99, -94.98]
+        keep = [False, False, False, True, False]
+
+        assert simplify_track(lats, lons, tolerance_m=5.0, keep=keep) == [0, 2, 3, 4]
+
+    def test_zero_tolerance_keeps_everything(self):
+        """Test simplification is off without a tolerance."""
+        assert simplify_track([1.0, 1.0, 1.0], [1.0, 2.0, 3.0], tolerance_m=0) == [0, 1, 2]
+
+
+class TestLocationHistoryWriter:
+    """Test cases for LocationHistoryWriter."""
+
+    def setup_method(self):
+        self.repository = FakeHistoryRepository()
+        self.writer = LocationHistoryWriter(
+            self.repository, flush_interval_seconds=5.0, batch_size=10, max_pending=20,
+            retention_days=7, clock=lambda: NOON
+        )
+
+    @pytest.mark.asyncio
+    async def test_flush_writes_utc_rows(self):
+        """Test buffered fixes are copied in order with UTC timestamps."""
+        self.writer.record("a", 40.0, -95.0, True, 1)
+        self.writer.record_many([("b", 41.0, -95.0, False, None), ("a", 40.1, -95.0, True, 1)])
+
+        assert await self.writer.flush() == 3
+        (batch,) = self.repository.batches
+        assert [row[0] for row in batch] == ["a", "b", "a"]
+        assert batch[0][1] == datetime(2024, 3, 10, 12, tzinfo=timezone.utc)
+        assert batch[1][2:] == (41.0, -95.0, False, None)
+        assert await self.writer.flush() == 0
+
+    @pytest.mark.asyncio
+    async def test_full_buffer_drops_and_failed_flush_requeues(self):
+        """Test fixes beyond max_pending are dropped and a failed COPY keeps its rows."""
+        self.writer.record_many([("a", 1.0, 1.0, False, None)] * 15)
+        self.writer.record_many([("b", 1.0, 1.0, False, None)] * 10)
+        self.writer.record("c", 1.0, 1.0, False, None)
+        assert len(self.writer) == 20
+        assert self.writer.dropped == 6
+
+        self.repository.fail = True
+        with pytest.raises(ConnectionError):
+            await self.writer.flush()
+        assert len(self.writer) == 20
+        assert self.writer.flush_errors == 1
+
+        self.repository.fail = False
+        assert await self.writer.flush() == 20
+
+    @pytest.mark.asyncio
+    async def test_partition_maintenance(self):
+        """Test partitions are created around today and expired ones dropped."""
+        await self.writer.maintain_partitions()
+
+        assert self.repository.created == [date(2024, 3, d) for d in (9, 10, 11, 12)]
+        assert self.repository.dropped_before == [date(2024, 3, 3)]
+        assert self.writer.partitions_dropped == 1
+
+    @pytest.mark.asyncio
+    async def test_batch_size_wakes_flush_and_close_drains(self):
+        """Test a full batch is written before the interval and close writes the rest."""
+        await self.writer.start()
+        self.writer.record_many([("a", 1.0, 1.0, False, None)] * 10)
+        await asyncio.sleep(0.05)
+        assert len(self.repository.batches) == 1
+
+        self.writer.record("b", 1.0, 1.0, False, None)
+        await self.writer.close()
+        assert [len(batch) for batch in self.repository.batches] == [10, 1]
+
+
+class TestServiceHistory:
+    """Test cases for GeofenceService feeding and reading location history."""
+
+    def setup_method(self):
+        self.repository = AsyncMock()
+        self.repository.get_all_geofences.return_value = [NORTH_FIELD]
+        self.history = Mock()
+        self.service = GeofenceService(
+            self.repository, GeofenceCalculator(), AsyncMock(), history=self.history
+        )
+
+    @pytest.mark.asyncio
+    async def test_checks_are_recorded(self):
+        """Test single and batch checks queue every fix without awaiting the history."""
+        self.repository.get_device_state.return_value = None
+        self.repository.get_device_states.return_value = {}
+
+        await self.service.check_device_location(DeviceLocationModel(device_id="a", lat=40.0, lon=-95.0))
+        await self.service.check_device_arrays(["b", "a"], [41.0, 40.0], [-95.0, -95.0])
+
+        self.history.record.assert_called_once_with("a", 40.0, -95.0, True, 1)
+        self.history.record_many.assert_called_once_with(
+            [("b", 41.0, -95.0, False, None), ("a", 40.0, -95.0, True, 1)]
+        )
+
+    @pytest.mark.asyncio
+    async def test_track_is_bucketed_and_simplified(self):
+        """Test the track query sizes buckets from max_points and keeps transitions."""
+        start = datetime(2024, 3, 10, tzinfo=timezone.utc)
+        rows = [
+            {"recorded_at": start + timedelta(minutes=i), "lat": 40.0 + i * 1e-3, "lon": -95.0,
+             "is_inside_fence": i >= 2, "geofence_id": 1 if i >= 2 else None, "transition": i == 2}
+            for i in range(5)
+        ]
+        self.repository.get_location_track.return_value = (rows, 240)
+
+        track = await self.service.get_device_track("a", start, start + timedelta(hours=1), 60, 1.0)
+
+        self.repository.get_location_track.assert_called_once_with(
+            "a", start, start + timedelta(hours=1), 60.0
+        )
+        assert track["source_fixes"] == 240
+        assert [point["lat"] for point in track["points"]] == [40.0, 40.002, 40.004]
+        assert track["points"][1]["transition"] is True
+
+
+class TestTrackApi:
+    """Test cases for the device track route."""
+
+    def setup_method(self):
+        self.mock_service = AsyncMock()
+        app = FastAPI()
+        app.include_router(history.router)
+        app.dependency_overrides[provide_geofence_service] = lambda: self.mock_service
+        self.client = TestClient(app)
+
+    def test_track(self):
+        """Test query parameters reach the service with naive times as UTC."""
+        self.mock_service.get_device_track.return_value = {"device_id": "a", "points": []}
+
+        response = self.client.get(
+            "/api/v1/devices/a/track",
+            params={"start": "2024-03-10T00:00:00", "end": "2024-03-11T00:00:00Z", "max_points": 10}
+        )
+
+        assert response.status_code == 200
+        args = self.mock_service.get_device_track.call_args.args
+        assert args[1] == datetime(2024, 3, 10, tzinfo=timezone.utc)
+        assert args[3:] == (10, 0.0)
+
+    def test_empty_range_rejected(self):
+        """Test an end before start is a client error."""
+        response = self.client.get(
+            "/api/v1/devices/a/track",
+            params={"start": "2024-03-11T00:00:00Z", "end": "2024-03-10T00:00:00Z"}
+        )
+
+        assert response.status_code == 400
+        self.mock_service.get_device_track.assert_not_called()
+
+
+@pytest_asyncio.fixture
+async def history_repository():
+    """Repository on a throwaway schema of TEST_DATABASE_URL."""
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    import asyncpg
+
+    schema = f"test_history_{uuid.uuid4().hex[:8]}"
+    admin = await asyncpg.connect(TEST_DATABASE_URL)
+    await admin.execute(f"CREATE SCHEMA {schema}")
+    manager = DatabaseManager(TEST_DATABASE_URL)
+    manager.pool = await asyncpg.create_pool(
+        TEST_DATABASE_URL, min_size=1, max_size=4,
+        server_settings={"search_path": f"{schema},public"}
+    )
+    try:
+        await manager.create_tables()
+        yield GeofenceRepository(manager.pool)
+    finally:
+        await manager.close_pool()
+        await admin.execute(f"DROP SCHEMA {schema} CASCADE")
+        await admin.close()
+
+
+class TestHistorySql:
+    """Integration tests for location_history against Postgres."""
+
+    @pytest.mark.asyncio
+    async def test_copy_track_and_retention(self, history_repository):
+        """Test fixes land in daily partitions, tracks keep transitions, old days drop."""
+        await history_repository.create_history_partitions([date(2024, 3, 9), date(2024, 3, 10)])
+        start = datetime(2024, 3, 10, tzinfo=timezone.utc)
+        await history_repository.copy_location_history(
+            [("a", start - timedelta(hours=1), 39.0, -95.0, False, None)]
+            + [
+                ("a", start + timedelta(seconds=i), 40.0, -95.0, 30 <= i < 40, 1 if 30 <= i < 40 else None)
+                for i in range(100)
+            ]
+        )
+
+        rows, total = await history_repository.get_location_track(
+            "a", start, start + timedelta(seconds=100), 50.0
+        )
+        assert total == 100
+        assert [row["recorded_at"] - start for row in rows] == [
+            timedelta(seconds=s) for s in (0, 30, 40, 49, 99)
+        ]
+
+        assert await history_repository.drop_history_partitions(date(2024, 3, 10)) == [
+            "location_history_p20240309"
+        ]
+        rows, total = await history_repository.get_location_track(
+            "a", start - timedelta(days=1), start, 3600.0
+        )
+        assert total == 0
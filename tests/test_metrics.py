@@ -0,0 +1,163 @@
+import asyncio
+import sys
+import time
+
+import pytest
+from unittest.mock import AsyncMock
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api import dependecies
+from api.routers import metrics
+from domain.geofence_calculator import GeofenceCalculator
+from models.geofence import DeviceLocationModel, GeofenceModel
+from services.geofence_service import GeofenceService
+from services.metrics import MetricsRegistry, registry
+from services.profiler import ProfilerBusyError, SamplingProfiler
+
+
+def burn_cpu(seconds: float) -> None:
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class TestMetricsRegistry:
+    """Test cases for the metrics registry and its text rendering."""
+
+    def setup_method(self):
+        self.registry = MetricsRegistry()
+
+    def test_histogram_rendering(self):
+        """Test buckets are cumulative and sums are reported in seconds."""
+        histogram = self.registry.histogram(
+            "stage_seconds", "Stage time.", {"stage": "a"}, buckets=(0.001, 0.01)
+        )
+        for elapsed_ns in (500_000, 2_000_000, 50_000_000):
+            histogram.observe_ns(elapsed_ns)
+
+        text = self.registry.render()
+        assert "# TYPE stage_seconds histogram" in text
+        assert 'stage_seconds_bucket{stage="a",le="0.001"} 1' in text
+        assert 'stage_seconds_bucket{stage="a",le="0.01"} 2' in text
+        assert 'stage_seconds_bucket{stage="a",le="+Inf"} 3' in text
+        assert 'stage_seconds_sum{stage="a"} 0.0525' in text
+        assert 'stage_seconds_count{stage="a"} 3' in text
+
+    def test_counters_and_collectors(self):
+        """Test counters are shared per label set and collectors render as gauges."""
+        first = self.registry.counter("checks_total", "Checks.", {"path": "fast"})
+        assert self.registry.counter("checks_total", "Checks.", {"path": "fast"}) is first
+        first.inc(3)
+        self.registry.register_collector("cache_stat", "Cache.", lambda: [({"stat": "hits"}, 7)])
+
+        text = self.registry.render()
+        assert 'checks_total{path="fast"} 3' in text
+        assert "# TYPE cache_stat gauge" in text
+        assert 'cache_stat{stat="hits"} 7' in text
+
+    def test_kind_conflict(self):
+        """Test a name cannot be reused for a different metric type."""
+        self.registry.counter("x_total", "X.")
+        with pytest.raises(ValueError):
+            self.registry.histogram("x_total", "X.")
+
+
+class TestServiceInstrumentation:
+    """Test cases for stage timings recorded by GeofenceService."""
+
+    @pytest.mark.asyncio
+    async def test_stages_recorded(self):
+        """Test a full check records every stage it passes through."""
+        repository = AsyncMock()
+        repository.get_all_geofences.return_value = [
+            GeofenceModel(id=1, name="Field", center_lat=40.0, center_lon=-95.0, radius_km=1.0)
+        ]
+        repository.get_device_state.return_value = None
+        service = GeofenceService(repository, GeofenceCalculator(), AsyncMock())
+        stages = registry.histograms(
+            "geofence_check_stage_seconds", "", "stage",
+            ("fence_fetch", "state_read", "containment", "state_write", "total")
+        )
+        before = {stage: histogram.count for stage, histogram in stages.items()}
+
+        await service.check_device_location(
+            DeviceLocationModel(device_id="tractor", lat=40.0, lon=-95.0)
+        )
+
+        for stage, histogram in stages.items():
+            assert histogram.count == before[stage] + 1, stage
+
+
+class TestSamplingProfiler:
+    """Test cases for the on-demand sampling profiler."""
+
+    @pytest.mark.asyncio
+    async def test_capture_focuses_on_matching_frames(self):
+        """Test samples are kept only for stacks through the focus file."""
+        profiler = SamplingProfiler(interval_seconds=0.001, focus=("tests/test_metrics.py",))
+        switch_interval = sys.getswitchinterval()
+        done = False
+
+        async def busy():
+            while not done:
+                burn_cpu(0.002)
+                await asyncio.sleep(0)
+
+        task = asyncio.create_task(busy())
+        profile = await profiler.capture(0.2)
+        done = True
+        await task
+
+        assert profile["samples"] > 0
+        assert profile["matched_samples"] > 0
+        assert "test_metrics.py:burn_cpu" in [entry["function"] for entry in profile["top"]]
+        assert "test_metrics.py:busy;test_metrics.py:burn_cpu" in profile["folded"]
+        assert sys.getswitchinterval() == switch_interval
+
+    @pytest.mark.asyncio
+    async def test_one_capture_at_a_time(self):
+        """Test overlapping captures are rejected."""
+        profiler = SamplingProfiler(interval_seconds=0.001)
+        first = asyncio.create_task(profiler.capture(0.05))
+        await asyncio.sleep(0.01)
+        with pytest.raises(ProfilerBusyError):
+            await profiler.capture(0.05)
+        await first
+        assert not profiler.running
+
+
+class TestMetricsApi:
+    """Test cases for the /metrics and /debug/profile routes."""
+
+    def setup_method(self):
+        app = FastAPI()
+        app.include_router(metrics.router)
+        self.client = TestClient(app)
+
+    def test_metrics_endpoint(self):
+        """Test the Prometheus endpoint exposes stage and query histograms."""
+        response = self.client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        assert "# TYPE geofence_check_stage_seconds histogram" in response.text
+        assert "# TYPE geofence_db_query_seconds histogram" in response.text
+        assert "# TYPE geofence_component_stat gauge" in response.text
+
+    def test_profile_disabled_by_default(self, monkeypatch):
+        """Test the profiler route is hidden unless enabled."""
+        monkeypatch.setattr(dependecies, "profiler", None)
+        assert self.client.get("/debug/profile?seconds=0.1").status_code == 404
+
+    def test_profile_capture(self, monkeypatch):
+        """Test an enabled profiler returns JSON or folded stacks."""
+        monkeypatch.setattr(dependecies, "profiler", SamplingProfiler(interval_seconds=0.001, focus=()))
+
+        response = self.client.get("/debug/profile?seconds=0.05")
+        assert response.status_code == 200
+        assert response.json()["samples"] > 0
+
+        response = self.client.get("/debug/profile?seconds=0.05&format=folded")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
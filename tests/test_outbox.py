@@ -0,0 +1,297 @@
+import asyncio
+import os
+import time
+import uuid
+
+import orjson
+import pytest
+import pytest_asyncio
+from unittest.mock import AsyncMock, Mock
+
+from database.db_setup import DatabaseManager
+from domain.geofence_calculator import GeofenceCalculator
+from models.geofence import DeviceLocationModel, GeofenceModel
+from models.records import DeviceStateRecord
+from repositories.geofence_repository import GeofenceRepository
+from services.event_publisher import EventPublisher
+from services.geofence_service import GeofenceService
+from services.outbox_dispatcher import OutboxDispatcher
+from services.state_write_buffer import DeviceStateWriteBuffer
+
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+NORTH_FIELD = GeofenceModel(id=1, name="North Field", center_lat=40.0, center_lon=-95.0, radius_km=1.0)
+
+
+class InMemoryOutbox:
+    """``dispatch_outbox`` over a list: rows leave only if publishing succeeds."""
+
+    def __init__(self):
+        self.rows = []
+
+    def add(self, events):
+        self.rows.extend((event, time.monotonic()) for event in events)
+
+    async def dispatch_outbox(self, limit, publish):
+        claimed = self.rows[:limit]
+        if claimed:
+            await publish([event for event, _ in claimed], [time.monotonic() - at for _, at in claimed])
+            del self.rows[:len(claimed)]
+        return len(claimed)
+
+
+class RecordingPublisher(EventPublisher):
+    """Publisher that records events and can be made to fail."""
+
+    def __init__(self):
+        self.events = []
+        self.failures = 0
+
+    async def publish_geo_event(self, event_data):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("broker down")
+        self.events.append(event_data)
+
+
+def inside_state(device_id="tractor"):
+    return DeviceStateRecord(device_id, 40.0, -95.0, True, 1)
+
+
+class TestServiceOutbox:
+    """Test cases for GeofenceService writing exit events to the outbox."""
+
+    def setup_method(self):
+        self.repository = AsyncMock()
+        self.repository.get_all_geofences.return_value = [NORTH_FIELD]
+        self.publisher = AsyncMock()
+        self.outbox = Mock()
+        self.service = GeofenceService(
+            self.repository, GeofenceCalculator(), self.publisher, outbox=self.outbox
+        )
+
+    @pytest.mark.asyncio
+    async def test_exit_written_with_state(self):
+        """Test an exit event goes into the state write instead of the publisher."""
+        self.repository.get_device_state.return_value = inside_state()
+
+        result = await self.service.check_device_location(
+            DeviceLocationModel(device_id="tractor", lat=41.0, lon=-95.0)
+        )
+
+        assert result["state_changed"] is True
+        args, kwargs = self.repository.update_device_state.call_args
+        assert args == ("tractor", 41.0, -95.0, False, None, ())
+        (event,) = kwargs["events"]
+        assert event["event_type"] == "fence_exit"
+        assert event["geofence_name"] == "North Field"
+        self.publisher.publish_geo_event.assert_not_called()
+        self.outbox.notify.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_no_events_no_transaction(self):
+        """Test writes without events keep the plain call."""
+        self.repository.get_device_state.return_value = None
+
+        await self.service.check_device_location(DeviceLocationModel(device_id="tractor", lat=40.0, lon=-95.0))
+
+        self.repository.update_device_state.assert_called_once_with("tractor", 40.0, -95.0, True, 1, (1,))
+        self.outbox.notify.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_batch_exits_written_with_states(self):
+        """Test a batch writes its states and fence events in one call."""
+        self.repository.get_device_states.return_value = {"a": inside_state("a"), "b": inside_state("b")}
+
+        await self.service.check_device_arrays(["a", "b", "a"], [41.0, 40.0, 40.0], [-95.0, -95.0, -95.0])
+
+        args, kwargs = self.repository.update_device_states.call_args
+        assert [row[0] for row in args[0]] == ["a", "b"]
+        assert [(event["device_id"], event["event_type"]) for event in kwargs["events"]] == [
+            ("a", "fence_exit"), ("a", "fence_enter")
+        ]
+        self.publisher.publish_geo_event.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_single_query_leaves_event_to_statement(self):
+        """Test the single-statement check does not publish when the SQL queued the event."""
+        service = GeofenceService(
+            self.repository, GeofenceCalculator(), self.publisher, single_query=True, outbox=self.outbox
+        )
+        self.repository.check_device_location.return_value = {
+            "previous_geofence_ids": [1], "geofence_ids": [], "is_inside_fence": False,
+            "geofence_id": None, "geofence_name": None, "geofence_names": [],
+            "changes": '[{"event_type": "fence_exit", "geofence_id": 1, "geofence_name": "North Field"}]',
+        }
+
+        await service.check_device_location(DeviceLocationModel(device_id="tractor", lat=41.0, lon=-95.0))
+
+        self.publisher.publish_geo_event.assert_not_called()
+        self.outbox.notify.assert_called_once()
+
+
+class TestBufferOutbox:
+    """Test cases for events passing through the write-behind buffer."""
+
+    @pytest.mark.asyncio
+    async def test_events_flushed_with_pending_states(self):
+        """Test events are written with every pending state and kept if the write fails."""
+        repository = AsyncMock()
+        buffer = DeviceStateWriteBuffer(repository, max_pending=100)
+        await buffer.update_device_state("b", 1.0, 1.0, False, None)
+
+        repository.update_device_states.side_effect = RuntimeError("db down")
+        event = {"event_type": "fence_exit", "device_id": "a"}
+        with pytest.raises(RuntimeError):
+            await buffer.update_device_state("a", 2.0, 2.0, False, None, flush_now=True, events=[event])
+        assert len(buffer) == 2
+
+        repository.update_device_states.side_effect = None
+        await buffer.flush()
+        args, kwargs = repository.update_device_states.call_args
+        assert sorted(row[0] for row in args[0]) == ["a", "b"]
+        assert kwargs["events"] == [event]
+        repository.update_device_state.assert_not_called()
+
+
+class TestOutboxDispatcher:
+    """Test cases for OutboxDispatcher."""
+
+    def setup_method(self):
+        self.outbox = InMemoryOutbox()
+        self.publisher = RecordingPublisher()
+        self.dispatcher = OutboxDispatcher(
+            self.outbox, self.publisher, batch_size=10, poll_interval_seconds=5.0, retry_base_delay=0.001
+        )
+
+    @pytest.mark.asyncio
+    async def test_drains_in_order_and_batches(self):
+        """Test the backlog is published in order, a batch at a time."""
+        self.outbox.add({"device_id": f"d{i}"} for i in range(25))
+
+        assert await self.dispatcher.dispatch_once() == 10
+        self.dispatcher.start()
+        await asyncio.sleep(0.05)
+        await self.dispatcher.close()
+
+        assert [event["device_id"] for event in self.publisher.events] == [f"d{i}" for i in range(25)]
+        assert self.dispatcher.stats()["batches"] == 3
+        assert not self.outbox.rows
+
+    @pytest.mark.asyncio
+    async def test_failed_batch_is_retried(self):
+        """Test a publisher failure keeps the events and the next attempt delivers them."""
+        self.outbox.add([{"device_id": "a"}, {"device_id": "b"}])
+        self.publisher.failures = 3
+        self.dispatcher.start()
+        await asyncio.sleep(0.1)
+        await self.dispatcher.close()
+
+        assert self.dispatcher.failures == 3
+        assert [event["device_id"] for event in self.publisher.events] == ["a", "b"]
+
+    @pytest.mark.asyncio
+    async def test_notify_wakes_before_poll_interval(self):
+        """Test committed events are dispatched without waiting for the next poll."""
+        self.dispatcher.start()
+        await asyncio.sleep(0.01)
+
+        self.outbox.add([{"device_id": "a"}])
+        self.dispatcher.notify()
+        await asyncio.sleep(0.05)
+
+        assert self.publisher.events == [{"device_id": "a"}]
+        assert self.dispatcher.last_lag_seconds < 1.0
+        await self.dispatcher.close()
+
+
+@pytest_asyncio.fixture
+async def outbox_repository():
+    """Repository with outbox SQL on a throwaway schema of TEST_DATABASE_URL."""
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    import asyncpg
+
+    schema = f"test_outbox_{uuid.uuid4().hex[:8]}"
+    admin = await asyncpg.connect(TEST_DATABASE_URL)
+    await admin.execute(f"CREATE SCHEMA {schema}")
+    manager = DatabaseManager(TEST_DATABASE_URL)
+    manager.pool = await asyncpg.create_pool(
+        TEST_DATABASE_URL, min_size=1, max_size=4,
+        server_settings={"search_path": f"{schema},public"}
+    )
+    try:
+        await manager.create_tables()
+        async with manager.pool.acquire() as conn:
+            await conn.execute(
+                "INSERT INTO geofences (name, center_lat, center_lon, radius_km) "
+                "VALUES ('North Field', 40.0, -95.0, 1.0)"
+            )
+        yield GeofenceRepository(manager.pool, outbox=True)
+    finally:
+        await manager.close_pool()
+        await admin.execute(f"DROP SCHEMA {schema} CASCADE")
+        await admin.close()
+
+
+class TestOutboxSql:
+    """Integration tests for the outbox tables against Postgres."""
+
+    @pytest.mark.asyncio
+    async def test_events_commit_with_state(self, outbox_repository):
+        """Test a failing event insert rolls back the state write too."""
+        await outbox_repository.update_device_state("a", 41.0, -95.0, False, None, events=[
+            {"event_type": "fence_exit", "device_id": "a", "geofence_name": "North Field"}
+        ])
+        with pytest.raises(Exception):
+            await outbox_repository.update_device_states([("b", 1.0, 1.0, False, None, ())], events=[
+                {"event_type": "fence_exit", "device_id": None}
+            ])
+
+        assert (await outbox_repository.get_device_state("a")).last_lat == 41.0
+        assert await outbox_repository.get_device_state("b") is None
+        async with outbox_repository.db_pool.acquire() as conn:
+            payloads = [orjson.loads(p) for p in await conn.fetchval("SELECT array_agg(payload) FROM event_outbox")]
+        assert payloads == [{"event_type": "fence_exit", "device_id": "a", "geofence_name": "North Field"}]
+
+    @pytest.mark.asyncio
+    async def test_single_statement_queues_exit(self, outbox_repository):
+        """Test the single-statement check inserts the exit event it reports."""
+        await outbox_repository.check_device_location("tractor", 40.0, -95.0)
+        await outbox_repository.check_device_location("tractor", 41.0, -95.0)
+        await outbox_repository.check_device_location("tractor", 41.0, -95.0)
+
+        events = []
+
+        async def publish(batch, lags):
+            events.extend(batch)
+
+        assert await outbox_repository.dispatch_outbox(10, publish) == 1
+        assert events[0]["geofence_name"] == "North Field"
+        assert events[0]["latitude"] == 41.0
+        assert events[0]["timestamp"].endswith("Z")
+
+    @pytest.mark.asyncio
+    async def test_dispatch_rolls_back_and_skips_locked(self, outbox_repository):
+        """Test failed dispatches keep events and concurrent dispatchers take disjoint rows."""
+        await outbox_repository.update_device_states(
+            [("a", 1.0, 1.0, False, None, ())],
+            events=[{"event_type": "fence_exit", "device_id": f"d{i}"} for i in range(20)]
+        )
+
+        async def fail(batch, lags):
+            raise ConnectionError("broker down")
+
+        with pytest.raises(ConnectionError):
+            await outbox_repository.dispatch_outbox(5, fail)
+
+        seen = []
+
+        async def slow(batch, lags):
+            await asyncio.sleep(0.1)
+            seen.append([event["device_id"] for event in batch])
+
+        counts = await asyncio.gather(*(outbox_repository.dispatch_outbox(5, slow) for _ in range(4)))
+        assert counts == [5, 5, 5, 5]
+        assert sorted(d for batch in seen for d in batch) == sorted(f"d{i}" for i in range(20))
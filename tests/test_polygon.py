@@ -0,0 +1,160 @@
+import math
+import random
+from decimal import Decimal
+
+import numpy as np
+import pytest
+from pydantic import ValidationError
+
+from domain.geofence_calculator import GeofenceCalculator
+from domain.polygon import PreparedPolygon, crossing_number_contains, prepared_polygon
+from models.geofence import DeviceLocationModel, GeofenceModel
+
+
+def star_polygon(rng, vertices, center_lat=40.0, center_lon=-95.0, radius_deg=0.05, jitter=0.7):
+    """Random concave polygon: vertices at sorted angles with jittered radii."""
+    angles = sorted(rng.uniform(0, 2 * math.pi) for _ in range(vertices))
+    return [
+        (center_lat + r * math.sin(a), center_lon + r * math.cos(a))
+        for a, r in ((a, radius_deg * rng.uniform(1.0 - jitter, 1.0)) for a in angles)
+    ]
+
+
+class TestPreparedPolygon:
+    """Test cases for the compiled point-in-polygon test."""
+
+    def setup_method(self):
+        self.rng = random.Random(11)
+
+    @pytest.mark.parametrize("vertices", [3, 10, 200, 1000])
+    def test_matches_reference(self, vertices):
+        """Test single and vectorized tests agree with the reference scan."""
+        polygon = star_polygon(self.rng, vertices)
+        prepared = PreparedPolygon(polygon)
+        lats = np.array([self.rng.uniform(39.94, 40.06) for _ in range(600)])
+        lons = np.array([self.rng.uniform(-95.06, -94.94) for _ in range(600)])
+
+        expected = [crossing_number_contains(polygon, lat, lon) for lat, lon in zip(lats, lons)]
+
+        assert [prepared.contains(lat, lon) for lat, lon in zip(lats, lons)] == expected
+        assert prepared.contains_many(lats, lons).tolist() == expected
+        assert any(expected) and not all(expected)
+
+    def test_grid_sizes_agree(self):
+        """Test the result does not depend on the cell grid resolution."""
+        polygon = star_polygon(self.rng, 300)
+        points = [(self.rng.uniform(39.94, 40.06), self.rng.uniform(-95.06, -94.94)) for _ in range(500)]
+        expected = [crossing_number_contains(polygon, lat, lon) for lat, lon in points]
+
+        for grid_size in [1, 3, 16, 64]:
+            prepared = PreparedPolygon(polygon, grid_size=grid_size)
+            assert [prepared.contains(lat, lon) for lat, lon in points] == expected
+
+    def test_concave_square_with_notch(self):
+        """Test points in a notch of a concave polygon are outside."""
+        u_shape = [(0, 0), (0, 3), (3, 3), (3, 2), (1, 2), (1, 1), (3, 1), (3, 0)]
+        prepared = PreparedPolygon(u_shape)
+
+        assert prepared.contains(0.5, 1.5)
+        assert not prepared.contains(2.0, 1.5)
+        assert prepared.contains(2.0, 2.5)
+        assert not prepared.contains(5.0, 1.5)
+
+    def test_closed_ring_and_too_few_vertices(self):
+        """Test a repeated closing vertex is dropped and tiny rings are rejected."""
+        assert len(PreparedPolygon([(0, 0), (0, 1), (1, 1), (1, 0), (0, 0)])) == 4
+        with pytest.raises(ValueError):
+            PreparedPolygon([(0, 0), (1, 1)])
+
+    def test_most_cells_are_resolved(self):
+        """Test the inside/outside grid covers most of a smooth polygon's bbox."""
+        prepared = PreparedPolygon(star_polygon(self.rng, 10000, jitter=0.02))
+        assert prepared.boundary_cell_ratio < 0.5
+
+
+class TestPolygonGeofences:
+    """Test cases for polygon fences in the model and the calculator."""
+
+    def setup_method(self):
+        self.rng = random.Random(5)
+        self.calculator = GeofenceCalculator(cell_size_deg=0.02)
+        self.vertices = star_polygon(self.rng, 50)
+        self.polygon = GeofenceModel(id=1, name="Orchard", polygon=self.vertices)
+        self.circle = GeofenceModel(
+            id=2, name="Circle", center_lat=40.0, center_lon=-95.0, radius_km=1.0
+        )
+
+    def test_enclosing_circle_is_derived(self):
+        """Test polygon fences get a circle enclosing every inside point."""
+        for _ in range(2000):
+            lat = self.rng.uniform(39.94, 40.06)
+            lon = self.rng.uniform(-95.06, -94.94)
+            if crossing_number_contains(self.vertices, lat, lon):
+                distance = self.calculator.calculate_distance_km(
+                    lat, lon, self.polygon.center_lat, self.polygon.center_lon
+                )
+                assert distance <= self.polygon.radius_km
+
+    def test_given_circle_is_replaced(self):
+        """Test a polygon submitted with a stale circle gets its enclosing circle instead."""
+        edited = GeofenceModel(**{**self.polygon.model_dump(), "radius_km": 0.1})
+
+        assert (edited.center_lat, edited.center_lon, edited.radius_km) == (
+            self.polygon.center_lat, self.polygon.center_lon, self.polygon.radius_km
+        )
+        lats = [self.rng.uniform(39.94, 40.06) for _ in range(500)]
+        lons = [self.rng.uniform(-95.06, -94.94) for _ in range(500)]
+        index = self.calculator.build_index([edited])
+        assert self.calculator.find_containing_geofences_batch(lats, lons, index) == [
+            edited if crossing_number_contains(self.vertices, lat, lon) else None
+            for lat, lon in zip(lats, lons)
+        ]
+
+    def test_circle_survives_storage(self):
+        """Test derived radii are whole metres that still enclose tiny polygons."""
+        for size_deg in (1e-7, 1e-5, 3e-4, 0.05):
+            vertices = star_polygon(self.rng, 12, radius_deg=size_deg)
+            fence = GeofenceModel(id=1, name="Post", polygon=vertices)
+            # As read back from the DECIMAL columns.
+            center_lat = float(Decimal(fence.center_lat).quantize(Decimal("1e-8")))
+            center_lon = float(Decimal(fence.center_lon).quantize(Decimal("1e-8")))
+            radius_km = float(Decimal(str(fence.radius_km)).quantize(Decimal("0.001")))
+
+            assert radius_km == fence.radius_km >= 0.001
+            for lat, lon in vertices:
+                assert self.calculator.calculate_distance_km(lat, lon, center_lat, center_lon) <= radius_km
+
+    def test_invalid_polygon(self):
+        """Test short or out-of-range vertex lists are rejected."""
+        with pytest.raises(ValidationError):
+            GeofenceModel(id=1, name="Bad", polygon=[(0, 0), (1, 1)])
+        with pytest.raises(ValidationError):
+            GeofenceModel(id=1, name="Bad", polygon=[(0, 0), (1, 1), (95, 0)])
+
+    def test_prepared_once(self):
+        """Test the compiled polygon is cached on the fence."""
+        self.calculator.build_index([self.polygon])
+        assert prepared_polygon(self.polygon) is self.polygon._prepared
+
+    def test_calculator_paths_agree(self):
+        """Test list, index and batch lookups agree on mixed fence types."""
+        fences = [self.polygon, self.circle]
+        index = self.calculator.build_index(fences)
+        lats = [self.rng.uniform(39.94, 40.06) for _ in range(1000)]
+        lons = [self.rng.uniform(-95.06, -94.94) for _ in range(1000)]
+
+        expected = []
+        for lat, lon in zip(lats, lons):
+            if crossing_number_contains(self.vertices, lat, lon):
+                expected.append(self.polygon)
+            elif self.calculator.calculate_distance_km(lat, lon, 40.0, -95.0) <= 1.0:
+                expected.append(self.circle)
+            else:
+                expected.append(None)
+
+        locations = [
+            DeviceLocationModel(device_id="d", lat=lat, lon=lon) for lat, lon in zip(lats, lons)
+        ]
+        assert [self.calculator.find_containing_geofence(loc, fences) for loc in locations] == expected
+        assert [self.calculator.find_containing_geofence(loc, index) for loc in locations] == expected
+        assert self.calculator.find_containing_geofences_batch(lats, lons, index) == expected
@@ -0,0 +1,169 @@
+import math
+import random
+
+import pytest
+from unittest.mock import AsyncMock
+
+from domain.geofence_calculator import GeofenceCalculator
+from models.geofence import DeviceLocationModel, GeofenceModel
+from services.device_state_cache import DeviceStateCache
+from services.geofence_cache import GeofenceCache
+from services.geofence_service import GeofenceService
+
+
+def destination(lat, lon, distance_km, bearing):
+    """Point reached from (lat, lon) along a great circle."""
+    delta = distance_km / 6371.0
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    lat2 = math.asin(
+        math.sin(lat1) * math.cos(delta) + math.cos(lat1) * math.sin(delta) * math.cos(bearing)
+    )
+    lon2 = lon1 + math.atan2(
+        math.sin(bearing) * math.sin(delta) * math.cos(lat1),
+        math.cos(delta) - math.sin(lat1) * math.sin(lat2)
+    )
+    return math.degrees(lat2), (math.degrees(lon2) + 540) % 360 - 180
+
+
+def random_fences(rng, count, lat=40.0, lon=-95.0, spread=0.2):
+    """Overlapping circles and concave polygons around (lat, lon)."""
+    fences = []
+    for i in range(count):
+        c_lat = lat + rng.uniform(-spread, spread)
+        c_lon = lon + rng.uniform(-spread, spread)
+        if i % 2:
+            angles = sorted(rng.uniform(0, 2 * math.pi) for _ in range(rng.randint(3, 40)))
+            polygon = [
+                (c_lat + r * math.sin(a), c_lon + r * math.cos(a))
+                for a, r in ((a, rng.uniform(0.01, 0.05)) for a in angles)
+            ]
+            fences.append(GeofenceModel(id=i + 1, name=f"Polygon {i + 1}", polygon=polygon))
+        else:
+            fences.append(GeofenceModel(
+                id=i + 1, name=f"Circle {i + 1}",
+                center_lat=c_lat, center_lon=c_lon, radius_km=rng.uniform(0.5, 4.0)
+            ))
+    return fences
+
+
+class TestSafeRadius:
+    """Property tests: fixes inside the safe radius keep the same result."""
+
+    def setup_method(self):
+        self.rng = random.Random(3)
+        self.calculator = GeofenceCalculator(cell_size_deg=0.05)
+
+    @pytest.mark.parametrize("seed", range(4))
+    def test_membership_constant_within_radius(self, seed):
+        """Test every fix within the safe radius finds the same fence."""
+        rng = random.Random(seed)
+        fences = random_fences(rng, 20)
+        index = self.calculator.build_index(fences)
+
+        positive = 0
+        for _ in range(150):
+            lat = 40.0 + rng.uniform(-0.25, 0.25)
+            lon = -95.0 + rng.uniform(-0.25, 0.25)
+            origin = DeviceLocationModel(device_id="d", lat=lat, lon=lon)
+            expected = self.calculator.find_containing_geofence(origin, fences)
+
+            for geofences in (fences, index):
+                radius = self.calculator.safe_radius_km(lat, lon, geofences)
+                positive += radius > 0
+                for _ in range(10):
+                    q_lat, q_lon = destination(
+                        lat, lon, radius * rng.uniform(0.0, 0.9999), rng.uniform(0, 2 * math.pi)
+                    )
+                    moved = DeviceLocationModel(device_id="d", lat=q_lat, lon=q_lon)
+                    assert self.calculator.find_containing_geofence(moved, fences) == expected
+
+        assert positive > 250
+
+    def test_radius_reaches_the_boundary(self):
+        """Test the radius of a circle fence is tight, not just conservative."""
+        fence = GeofenceModel(id=1, name="Field", center_lat=40.0, center_lon=-95.0, radius_km=2.0)
+        radius = self.calculator.safe_radius_km(40.0, -95.0, [fence])
+        assert radius == pytest.approx(2.0, abs=1e-5)
+
+    def test_radius_is_capped_by_the_grid_cell(self):
+        """Test fences outside the point's cell are covered by the cell edge."""
+        index = self.calculator.build_index([
+            GeofenceModel(id=1, name="Far", center_lat=45.0, center_lon=-95.0, radius_km=1.0)
+        ])
+        radius = self.calculator.safe_radius_km(40.025, -94.975, index)
+        assert 0 < radius <= index.cell_clearance_km(40.025, -94.975)
+
+
+class TestServiceFastPath:
+    """Test cases for the safe-zone fast path in GeofenceService."""
+
+    def setup_method(self):
+        self.rng = random.Random(9)
+        self.fences = random_fences(self.rng, 12)
+        self.calculator = GeofenceCalculator(cell_size_deg=0.05)
+        self.repository = AsyncMock()
+        self.repository.get_all_geofences.return_value = self.fences
+        self.repository.get_geofence_version.return_value = 1
+        self.repository.get_device_state.return_value = None
+        self.state_cache = DeviceStateCache(max_entries=100)
+        self.service = GeofenceService(
+            self.repository,
+            self.calculator,
+            AsyncMock(),
+            geofence_cache=GeofenceCache(self.repository, self.calculator),
+            state_cache=self.state_cache
+        )
+
+    @pytest.mark.asyncio
+    async def test_random_walks_match_full_evaluation(self):
+        """Test fast-path answers equal a full search on random walks."""
+        positions = {
+            f"device_{i}": (40.0 + self.rng.uniform(-0.2, 0.2), -95.0 + self.rng.uniform(-0.2, 0.2))
+            for i in range(10)
+        }
+        previous = {}
+        for _ in range(400):
+            device_id = self.rng.choice(list(positions))
+            lat, lon = positions[device_id]
+            lat, lon = destination(lat, lon, self.rng.expovariate(1 / 0.05), self.rng.uniform(0, 2 * math.pi))
+            positions[device_id] = (lat, lon)
+            location = DeviceLocationModel(device_id=device_id, lat=lat, lon=lon)
+
+            result = await self.service.check_device_location(location)
+
+            expected = self.calculator.find_containing_geofence(location, self.fences)
+            assert result["inside_geofence"] == (expected is not None)
+            assert result["geofence_name"] == (expected.name if expected else None)
+            if device_id in previous:
+                assert result["state_changed"] == (previous[device_id] != (expected is not None))
+            previous[device_id] = expected is not None
+
+        assert self.state_cache.fast_path_hits > 100
+        assert self.repository.update_device_state.call_count == self.state_cache.full_evaluations
+        assert self.state_cache.fast_path_hits + self.state_cache.full_evaluations == 400
+
+    @pytest.mark.asyncio
+    async def test_fence_change_forces_full_evaluation(self):
+        """Test a rebuilt fence index invalidates stored safe radii."""
+        location = DeviceLocationModel(device_id="d", lat=40.012, lon=-94.987)
+        await self.service.check_device_location(location)
+        await self.service.check_device_location(location)
+        assert self.state_cache.fast_path_hits == 1
+
+        self.repository.get_geofence_version.return_value = 2
+        self.service.geofence_cache.invalidate()
+        await self.service.check_device_location(location)
+
+        assert self.state_cache.fast_path_hits == 1
+        assert self.state_cache.full_evaluations == 2
+
+    @pytest.mark.asyncio
+    async def test_disabled_fast_path_writes_every_fix(self):
+        """Test fast_path=False evaluates and persists every fix."""
+        self.service.fast_path = False
+        location = DeviceLocationModel(device_id="d", lat=40.012, lon=-94.987)
+        for _ in range(3):
+            await self.service.check_device_location(location)
+
+        assert self.repository.update_device_state.call_count == 3
+        assert self.state_cache.fast_path_hits == 0
@@ -0,0 +1,133 @@
+import os
+import random
+
+import numpy as np
+import pytest
+from unittest.mock import AsyncMock
+
+from benchmarks.replay import generate_fences
+from domain.geofence_calculator import GeofenceCalculator
+from domain.shared_index import (
+    index_path, load_index_file, remove_stale_index_files, write_index_file
+)
+from models.geofence import DeviceLocationModel, GeofenceModel
+from services.geofence_cache import GeofenceCache
+
+
+class TestSharedIndexFile:
+    """Test cases for writing and mapping fence index files."""
+
+    def setup_method(self):
+        rng = random.Random(5)
+        self.fences = generate_fences(rng, 300, 0.3)
+        # A fence covering too many cells lands in the overflow list.
+        self.fences.append(GeofenceModel(
+            id=999, name="Region", center_lat=40.5, center_lon=-95.5, radius_km=400.0
+        ))
+        self.calculator = GeofenceCalculator()
+        self.index = self.calculator.build_index(self.fences)
+
+    def test_round_trip_matches_built_index(self, tmp_path):
+        """Test a loaded index finds the same fences and safe radii as the built one."""
+        loaded = load_index_file(write_index_file(self.index, str(tmp_path), 3))
+
+        assert loaded.version == 3
+        assert loaded.cell_count == self.index.cell_count
+        assert loaded.overflow_count == self.index.overflow_count == 1
+        assert [f.id for f in loaded] == [f.id for f in self.fences]
+        assert loaded.get(999).name == "Region"
+
+        rng = np.random.default_rng(1)
+        lats = rng.uniform(39.9, 41.1, 3000)
+        lons = rng.uniform(-96.1, -94.9, 3000)
+        for lat, lon in zip(lats[:500], lons[:500]):
+            location = DeviceLocationModel(device_id="d", lat=lat, lon=lon)
+            expected = self.calculator.find_containing_geofence(location, self.index)
+            actual = self.calculator.find_containing_geofence(location, loaded)
+            assert (actual and actual.id) == (expected and expected.id)
+            assert self.calculator.safe_radius_km(lat, lon, loaded) == \
+                self.calculator.safe_radius_km(lat, lon, self.index)
+
+        expected = self.calculator.find_containing_geofences_batch(lats, lons, self.index)
+        actual = self.calculator.find_containing_geofences_batch(lats, lons, loaded)
+        assert [f and f.id for f in actual] == [f and f.id for f in expected]
+
+    def test_loaded_arrays_are_read_only_views(self, tmp_path):
+        """Test cell maps and compiled polygons point into the mapping, not copies."""
+        loaded = load_index_file(write_index_file(self.index, str(tmp_path), 1))
+        polygon = next(f for f in loaded if f.polygon)
+
+        cells, bands = polygon._prepared.compiled_parts()
+        for array in (loaded._cells.positions, cells, bands[0][0]):
+            assert not array.flags.writeable
+            assert array.base is not None
+
+    def test_rejects_other_files(self, tmp_path):
+        """Test a file that is not an index is refused."""
+        path = tmp_path / "geofence-index-1.bin"
+        path.write_bytes(b"x" * 64)
+        with pytest.raises(ValueError):
+            load_index_file(str(path))
+
+    def test_remove_stale_files(self, tmp_path):
+        """Test only the versions asked for are kept."""
+        for version in (1, 2, 3):
+            write_index_file(self.index, str(tmp_path), version)
+
+        assert remove_stale_index_files(str(tmp_path), (3, 2)) == 1
+        assert sorted(os.listdir(tmp_path)) == ["geofence-index-2.bin", "geofence-index-3.bin"]
+
+
+class TestSharedIndexCache:
+    """Test cases for GeofenceCache sharing indexes through files."""
+
+    def setup_method(self):
+        self.fences = generate_fences(random.Random(6), 50, 0.5)
+
+    def make_cache(self, index_dir, version=1):
+        repository = AsyncMock()
+        repository.get_all_geofences.return_value = self.fences
+        repository.get_geofence_version.return_value = version
+        return GeofenceCache(repository, GeofenceCalculator(), index_dir=str(index_dir)), repository
+
+    @pytest.mark.asyncio
+    async def test_second_process_maps_published_index(self, tmp_path):
+        """Test a cache reuses the file another one published instead of reading fences."""
+        builder, _ = self.make_cache(tmp_path)
+        await builder.get_index()
+        assert os.path.exists(index_path(str(tmp_path), 1))
+
+        follower, repository = self.make_cache(tmp_path)
+        index = await follower.get_index()
+
+        repository.get_all_geofences.assert_not_awaited()
+        assert follower.stats()["file_loads"] == 1
+        assert [f.id for f in index] == [f.id for f in self.fences]
+
+    @pytest.mark.asyncio
+    async def test_new_version_is_built_and_published(self, tmp_path):
+        """Test a version without a file is built and replaces older files."""
+        builder, _ = self.make_cache(tmp_path, version=1)
+        await builder.get_index()
+        builder, _ = self.make_cache(tmp_path, version=2)
+        await builder.get_index()
+        builder, repository = self.make_cache(tmp_path, version=3)
+        await builder.get_index()
+
+        repository.get_all_geofences.assert_awaited_once()
+        assert sorted(os.listdir(tmp_path)) == ["geofence-index-2.bin", "geofence-index-3.bin"]
+
+    @pytest.mark.asyncio
+    async def test_other_cell_size_is_rebuilt(self, tmp_path):
+        """Test a file built with another grid is not used."""
+        builder, _ = self.make_cache(tmp_path)
+        await builder.get_index()
+
+        repository = AsyncMock()
+        repository.get_all_geofences.return_value = self.fences
+        repository.get_geofence_version.return_value = 1
+        cache = GeofenceCache(repository, GeofenceCalculator(cell_size_deg=0.5), index_dir=str(tmp_path))
+        index = await cache.get_index()
+
+        repository.get_all_geofences.assert_awaited_once()
+        assert index.cell_size_deg == 0.5
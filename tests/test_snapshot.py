@@ -0,0 +1,190 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock
+
+from api import dependecies
+from api.routers import health
+from benchmarks.replay import generate_fences
+from domain.geofence_calculator import GeofenceCalculator
+from domain.snapshot import load_snapshot, write_snapshot
+from models.geofence import DeviceLocationModel
+from models.records import DeviceStateRecord
+from services.cold_start import ColdStart
+from services.device_state_cache import DeviceStateCache
+from services.geofence_cache import GeofenceCache
+
+
+AS_OF = datetime(2024, 5, 1, 12, 0, 0)
+
+
+class TestSnapshotFile:
+    """Test cases for writing and mapping snapshot files."""
+
+    def setup_method(self):
+        self.fences = generate_fences(random.Random(3), 200, 0.3)
+        self.calculator = GeofenceCalculator()
+        self.index = self.calculator.build_index(self.fences)
+        self.states = [
+            DeviceStateRecord("tractor_1", 40.5, -95.5, True, 7, (3, 7)),
+            DeviceStateRecord("gerät_2", 40.1, -95.9, False, None, ()),
+            DeviceStateRecord("new_device", None, None, False, None),
+        ]
+
+    def test_round_trip(self, tmp_path):
+        """Test the mapped index looks up like the built one and states come back intact."""
+        path = write_snapshot(str(tmp_path / "snapshot.bin"), self.index, 12, self.states, AS_OF)
+        snapshot = load_snapshot(path)
+
+        assert snapshot.fence_version == snapshot.index.version == 12
+        assert snapshot.states_as_of == AS_OF
+        assert [f.id for f in snapshot.index] == [f.id for f in self.fences]
+        for lat, lon in [(40.5, -95.5), (40.2, -95.2), (40.9, -95.1)]:
+            location = DeviceLocationModel(device_id="d", lat=lat, lon=lon)
+            expected = self.calculator.find_containing_geofences(location, self.index)
+            assert [f.id for f in self.calculator.find_containing_geofences(location, snapshot.index)] == \
+                [f.id for f in expected]
+
+        assert len(snapshot) == 3
+        assert [
+            (s.device_id, s.last_lat, s.last_lon, s.is_inside_fence, s.last_geofence_id, s.geofence_ids)
+            for s in snapshot.states()
+        ] == [
+            ("tractor_1", 40.5, -95.5, True, 7, (3, 7)),
+            ("gerät_2", 40.1, -95.9, False, None, ()),
+            ("new_device", None, None, False, None, ()),
+        ]
+
+    def test_fences_only(self, tmp_path):
+        """Test a snapshot without states."""
+        snapshot = load_snapshot(write_snapshot(str(tmp_path / "snapshot.bin"), self.index, 1))
+
+        assert snapshot.states_as_of is None
+        assert len(snapshot) == 0
+        assert list(snapshot.states()) == []
+
+    def test_rejects_other_files(self, tmp_path):
+        """Test an index file or garbage is not taken for a snapshot."""
+        path = tmp_path / "snapshot.bin"
+        path.write_bytes(b"GFIDX001" + bytes(64))
+
+        with pytest.raises(ValueError):
+            load_snapshot(str(path))
+
+
+class TestColdStart:
+    """Test cases for starting from a snapshot and catching up."""
+
+    def setup_method(self):
+        self.fences = generate_fences(random.Random(4), 50, 0.2)
+        self.calculator = GeofenceCalculator()
+        self.repository = AsyncMock()
+        self.repository.get_geofence_version.return_value = 5
+        self.repository.get_all_geofences.return_value = self.fences
+        self.repository.get_device_states_since.return_value = []
+        self.geofence_cache = GeofenceCache(self.repository, self.calculator)
+        self.state_cache = DeviceStateCache(max_entries=100, ttl_seconds=0)
+        self.cold_start = ColdStart(self.repository, self.geofence_cache, self.state_cache)
+
+    def write(self, tmp_path, version=5, states=()):
+        index = self.calculator.build_index(self.fences)
+        return write_snapshot(str(tmp_path / "snapshot.bin"), index, version, list(states), AS_OF)
+
+    @pytest.mark.asyncio
+    async def test_load_serves_without_reading_fences(self, tmp_path):
+        """Test the snapshot index and states are installed without touching Postgres."""
+        path = self.write(tmp_path, states=[DeviceStateRecord("d1", 40.5, -95.5, True, 1, (1,))])
+
+        assert self.cold_start.load(path) is True
+        assert self.cold_start.ready is False
+        assert self.geofence_cache.version == 5
+        assert len(await self.geofence_cache.get_index()) == len(self.fences)
+        assert self.state_cache.peek("d1").geofence_ids == (1,)
+        self.repository.get_all_geofences.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_catch_up_same_version_keeps_index(self, tmp_path):
+        """Test an unchanged fence set is not rebuilt and newer states replace seeded ones."""
+        self.cold_start.load(self.write(tmp_path, states=[DeviceStateRecord("d1", 40.5, -95.5, True, 1, (1,))]))
+        index = self.geofence_cache.current_index
+        self.repository.get_device_states_since.return_value = [
+            DeviceStateRecord("d1", 40.0, -95.0, False, None, ()),
+            DeviceStateRecord("d2", 40.1, -95.1, False, None, ()),
+        ]
+
+        await self.cold_start.catch_up()
+
+        assert self.cold_start.ready is True
+        assert self.geofence_cache.current_index is index
+        self.repository.get_all_geofences.assert_not_awaited()
+        since = self.repository.get_device_states_since.await_args[0][0]
+        assert since == AS_OF - timedelta(seconds=60)
+        assert self.state_cache.peek("d1").is_inside_fence is False
+        assert self.state_cache.peek("d2") is not None
+
+    @pytest.mark.asyncio
+    async def test_catch_up_keeps_states_written_since_load(self, tmp_path):
+        """Test devices checked during the catch-up are not rolled back to older rows."""
+        self.cold_start.load(self.write(tmp_path, states=[DeviceStateRecord("d1", 40.5, -95.5, True, 1, (1,))]))
+        self.state_cache.put("d1", 40.9, -95.9, False, None, ())
+        self.repository.get_device_states_since.return_value = [
+            DeviceStateRecord("d1", 40.5, -95.5, True, 1, (1,)),
+            DeviceStateRecord("d2", 40.1, -95.1, False, None, ()),
+        ]
+
+        await self.cold_start.catch_up()
+
+        assert self.state_cache.peek("d1").last_lat == 40.9
+        assert self.state_cache.peek("d2") is not None
+        assert self.cold_start.stats()["states_caught_up"] == 1
+        # Later writes are no longer tracked.
+        self.state_cache.put("d3", 40.0, -95.0, False, None, ())
+        assert self.state_cache._written is None
+
+    @pytest.mark.asyncio
+    async def test_catch_up_new_version_rebuilds(self, tmp_path):
+        """Test fences changed since the snapshot are reloaded from Postgres."""
+        self.cold_start.load(self.write(tmp_path, version=3))
+        index = self.geofence_cache.current_index
+
+        await self.cold_start.catch_up()
+
+        assert self.geofence_cache.current_index is not index
+        assert self.geofence_cache.version == 5
+        self.repository.get_all_geofences.assert_awaited_once()
+
+    def test_missing_or_mismatched_snapshot_not_loaded(self, tmp_path):
+        """Test a missing file or one indexed with another cell size falls back to Postgres."""
+        assert self.cold_start.load(str(tmp_path / "missing.bin")) is False
+
+        index = GeofenceCalculator(cell_size_deg=0.5).build_index(self.fences)
+        path = write_snapshot(str(tmp_path / "snapshot.bin"), index, 5)
+        assert self.cold_start.load(path) is False
+        assert self.cold_start.ready is True
+        assert self.geofence_cache.current_index is None
+
+
+class TestReadiness:
+    """Test cases for the readiness endpoint."""
+
+    def setup_method(self):
+        app = FastAPI()
+        app.include_router(health.router)
+        self.client = TestClient(app)
+
+    def test_not_ready_until_caught_up(self, monkeypatch, tmp_path):
+        """Test /ready answers 503 between snapshot load and catch-up."""
+        cold_start = ColdStart(AsyncMock(), GeofenceCache(AsyncMock(), GeofenceCalculator()))
+        monkeypatch.setattr(dependecies, "cold_start", cold_start)
+        assert self.client.get("/ready").status_code == 200
+
+        cold_start._loaded = True
+        response = self.client.get("/ready")
+        assert response.status_code == 503
+        assert response.json()["status"] == "starting"
+
+        cold_start._caught_up = True
+        assert self.client.get("/ready").json()["status"] == "ready"
@@ -0,0 +1,200 @@
+import math
+import random
+
+import pytest
+from domain.geofence_calculator import GeofenceCalculator
+from domain.spatial_index import GeofenceGridIndex, circle_bounding_box
+from models.geofence import GeofenceModel, DeviceLocationModel
+
+
+def make_fences(rng: random.Random, count: int, lat_range, lon_range, radius_range):
+    return [
+        GeofenceModel(
+            id=i + 1, name=f"Field {i + 1}",
+            center_lat=rng.uniform(*lat_range),
+            center_lon=rng.uniform(*lon_range),
+            radius_km=rng.uniform(*radius_range)
+        )
+        for i in range(count)
+    ]
+
+
+class TestGeofenceGridIndex:
+    """Test cases for GeofenceGridIndex against the linear scan."""
+
+    def setup_method(self):
+        self.calculator = GeofenceCalculator()
+        self.rng = random.Random(42)
+
+    def assert_matches_linear_scan(self, geofences, points, **index_kwargs):
+        index = GeofenceGridIndex(geofences, **index_kwargs)
+        for lat, lon in points:
+            location = DeviceLocationModel(device_id="d", lat=lat, lon=lon)
+            expected = self.calculator.find_containing_geofence(location, geofences)
+            actual = self.calculator.find_containing_geofence(location, index)
+            assert actual == expected, (lat, lon)
+
+    def test_random_fences_match_linear_scan(self):
+        """Test random fences in a small region match the linear scan."""
+        geofences = make_fences(self.rng, 500, (40.0, 41.0), (-74.5, -73.5), (0.05, 3.0))
+        points = [
+            (self.rng.uniform(39.9, 41.1), self.rng.uniform(-74.6, -73.4))
+            for _ in range(1000)
+        ]
+        self.assert_matches_linear_scan(geofences, points)
+
+    def test_points_on_fence_centers_and_edges(self):
+        """Test points placed on centers and near boundaries."""
+        geofences = make_fences(self.rng, 300, (40.0, 40.5), (-74.0, -73.5), (0.1, 2.0))
+        points = []
+        for gf in geofences:
+            points.append((gf.center_lat, gf.center_lon))
+            # Just inside and just outside the northern edge.
+            offset = gf.radius_km / 111.195
+            points.append((gf.center_lat + offset * 0.9999, gf.center_lon))
+            points.append((gf.center_lat + offset * 1.0001, gf.center_lon))
+        self.assert_matches_linear_scan(geofences, points)
+
+    def test_overlapping_fences_keep_list_order(self):
+        """Test first match follows the original list order."""
+        geofences = [
+            GeofenceModel(id=1, name="Small", center_lat=10.0, center_lon=10.0, radius_km=1.0),
+            GeofenceModel(id=2, name="Huge", center_lat=10.0, center_lon=10.0, radius_km=2000.0),
+            GeofenceModel(id=3, name="Medium", center_lat=10.0, center_lon=10.0, radius_km=50.0),
+        ]
+        index = GeofenceGridIndex(geofences)
+        assert index.overflow_count == 1
+
+        location = DeviceLocationModel(device_id="d", lat=10.0, lon=10.0)
+        assert self.calculator.find_containing_geofence(location, index).name == "Small"
+
+        location = DeviceLocationModel(device_id="d", lat=10.2, lon=10.0)
+        assert self.calculator.find_containing_geofence(location, index).name == "Huge"
+
+    def test_antimeridian_and_poles(self):
+        """Test fences crossing the antimeridian and covering poles."""
+        geofences = [
+            GeofenceModel(id=1, name="Dateline", center_lat=0.0, center_lon=179.95, radius_km=20.0),
+            GeofenceModel(id=2, name="Dateline West", center_lat=-5.0, center_lon=-179.99, radius_km=5.0),
+            GeofenceModel(id=3, name="North Pole", center_lat=89.9, center_lon=0.0, radius_km=50.0),
+            GeofenceModel(id=4, name="South Pole", center_lat=-89.95, center_lon=120.0, radius_km=10.0),
+        ]
+        points = [
+            (0.0, 180.0), (0.0, -180.0), (0.0, -179.9), (0.05, 179.9), (0.0, -179.7),
+            (-5.0, 179.99), (-5.0, -179.95),
+            (90.0, 0.0), (89.8, 180.0), (89.6, -90.0), (89.0, 45.0),
+            (-90.0, 0.0), (-89.95, -60.0), (-89.8, 120.0),
+        ]
+        points += [(self.rng.uniform(-90, 90), self.rng.uniform(-180, 180)) for _ in range(500)]
+        self.assert_matches_linear_scan(geofences, points)
+        self.assert_matches_linear_scan(geofences, points, max_cells_per_fence=10 ** 9)
+
+    def test_global_random_fences_with_coarse_cells(self):
+        """Test worldwide fences with a coarse grid match the linear scan."""
+        geofences = make_fences(self.rng, 300, (-89.0, 89.0), (-180.0, 180.0), (1.0, 500.0))
+        points = [(self.rng.uniform(-90, 90), self.rng.uniform(-180, 180)) for _ in range(1500)]
+        points += [(gf.center_lat, gf.center_lon) for gf in geofences]
+        self.assert_matches_linear_scan(geofences, points, cell_size_deg=1.0)
+
+    def test_empty_index(self):
+        """Test lookups against an empty index."""
+        index = GeofenceGridIndex([])
+        location = DeviceLocationModel(device_id="d", lat=0.0, lon=0.0)
+        assert len(index) == 0
+        assert self.calculator.find_containing_geofence(location, index) is None
+
+    def test_get_by_id(self):
+        """Test fence lookup by id."""
+        geofences = make_fences(self.rng, 10, (0, 1), (0, 1), (0.1, 1.0))
+        index = GeofenceGridIndex(geofences)
+        assert index.get(3) is geofences[2]
+        assert index.get(999) is None
+
+    def test_invalid_cell_size(self):
+        """Test that a non-positive cell size is rejected."""
+        with pytest.raises(ValueError):
+            GeofenceGridIndex([], cell_size_deg=0)
+
+    def test_bounding_box_contains_cap(self):
+        """Test the bounding box encloses points at the fence radius."""
+        calc = self.calculator
+        lat_min, lat_max, lon_min, lon_max = circle_bounding_box(60.0, 30.0, 100.0)
+        for lat, lon in [(lat_min, 30.0), (lat_max, 30.0), (60.0, lon_min), (60.0, lon_max)]:
+            assert calc.calculate_distance_km(60.0, 30.0, lat, lon) >= 100.0 - 1e-6
+
+
+class TestCenterTree:
+    """Test cases for nearest-fence queries against a scan of every fence."""
+
+    def setup_method(self):
+        self.calculator = GeofenceCalculator()
+        self.rng = random.Random(11)
+
+    def assert_matches_scan(self, geofences, points, k=5):
+        index = self.calculator.build_index(geofences)
+        for lat, lon in points:
+            expected = sorted(
+                (self.calculator.signed_distance_km(g, lat, lon), g.id) for g in geofences
+            )[:k]
+            actual = self.calculator.nearest_geofences(lat, lon, index, k)
+            assert [d for d, _ in expected] == pytest.approx([d for _, d in actual], abs=1e-6), (lat, lon)
+
+    def test_random_fences_match_scan(self):
+        """Test circles and polygons in one region, queried inside and around it."""
+        geofences = make_fences(self.rng, 300, (40.0, 41.0), (-96.0, -95.0), (0.2, 2.0))
+        for i in range(100):
+            lat, lon = self.rng.uniform(40.0, 41.0), self.rng.uniform(-96.0, -95.0)
+            angles = sorted(self.rng.uniform(0, 2 * math.pi) for _ in range(12))
+            geofences.append(GeofenceModel(
+                id=1000 + i, name=f"Plot {i}",
+                polygon=[(lat + 0.02 * math.sin(a), lon + 0.02 * math.cos(a)) for a in angles]
+            ))
+        points = [(self.rng.uniform(39.5, 41.5), self.rng.uniform(-96.5, -94.5)) for _ in range(200)]
+        self.assert_matches_scan(geofences, points)
+
+    def test_worldwide_fences_match_scan(self):
+        """Test fences spread over the globe, including near the poles and the antimeridian."""
+        geofences = make_fences(self.rng, 400, (-85.0, 85.0), (-180.0, 180.0), (1.0, 500.0))
+        points = [(self.rng.uniform(-90.0, 90.0), self.rng.uniform(-180.0, 180.0)) for _ in range(100)]
+        points += [(10.0, 179.99), (-10.0, -179.99), (89.9, 0.0)]
+        self.assert_matches_scan(geofences, points, k=3)
+
+    def test_across_antimeridian(self):
+        """Test the nearest fence is found on the other side of the antimeridian."""
+        geofences = [
+            GeofenceModel(id=1, name="East", center_lat=0.0, center_lon=179.9, radius_km=1.0),
+            GeofenceModel(id=2, name="Far", center_lat=0.0, center_lon=170.0, radius_km=1.0),
+        ]
+        index = self.calculator.build_index(geofences)
+        (nearest, distance), _ = self.calculator.nearest_geofences(0.0, -179.9, index, 2)
+        assert nearest.id == 1
+        assert distance == pytest.approx(22.24 - 1.0, abs=0.01)
+
+    def test_inside_fences_first(self):
+        """Test containing fences come first with negative distances, deepest first."""
+        geofences = [
+            GeofenceModel(id=1, name="Big", center_lat=40.0, center_lon=-95.0, radius_km=5.0),
+            GeofenceModel(id=2, name="Small", center_lat=40.0, center_lon=-95.0, radius_km=1.0),
+            GeofenceModel(
+                id=3, name="Square",
+                polygon=[(40.05, -95.05), (40.05, -94.95), (40.15, -94.95), (40.15, -95.05)]
+            ),
+        ]
+        index = self.calculator.build_index(geofences)
+
+        result = self.calculator.nearest_geofences(40.0, -95.0, index, 3)
+        assert [g.id for g, _ in result] == [1, 2, 3]
+        assert [d for _, d in result][:2] == pytest.approx([-5.0, -1.0])
+        assert result[2][1] == pytest.approx(5.56, abs=0.01)
+
+        (square, distance), = self.calculator.nearest_geofences(40.1, -95.0, index, 1)
+        assert square.id == 3 and distance == pytest.approx(-4.26, abs=0.01)
+
+    def test_empty_and_small(self):
+        """Test no fences, and k larger than the fence set."""
+        index = self.calculator.build_index([])
+        assert self.calculator.nearest_geofences(40.0, -95.0, index, 5) == []
+
+        geofences = make_fences(self.rng, 3, (40.0, 41.0), (-96.0, -95.0), (0.2, 2.0))
+        index = self.calculator.build_index(geofences)
+        assert len(self.calculator.nearest_geofences(40.0, -95.0, index, 5)) == 3
@@ -0,0 +1,278 @@
+import json
+import os
+import random
+import uuid
+from decimal import Decimal
+
+import pytest
+import pytest_asyncio
+from unittest.mock import AsyncMock
+
+from database.db_setup import DatabaseManager
+from domain.geofence_calculator import GeofenceCalculator
+from models.geofence import DeviceLocationModel
+from models.records import DeviceStateRecord, GeofenceRecord
+from repositories.geofence_repository import GeofenceRepository, _fence_record_from_row, _state_from_row
+from services.geofence_service import GeofenceService
+
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+
+def check_row(was_inside, is_inside, geofence_name=None, previous_name=None):
+    previous = None if was_inside is None else [1] if was_inside else []
+    current = [1] if is_inside else []
+    changes = []
+    if previous and not current:
+        changes.append({"event_type": "fence_exit", "geofence_id": 1, "geofence_name": previous_name})
+    elif previous == [] and current:
+        changes.append({"event_type": "fence_enter", "geofence_id": 1, "geofence_name": geofence_name})
+    return {
+        "previous_geofence_ids": previous,
+        "geofence_ids": current,
+        "is_inside_fence": is_inside,
+        "geofence_id": 1 if is_inside else None,
+        "geofence_name": geofence_name,
+        "geofence_names": [geofence_name] if is_inside else [],
+        "changes": json.dumps(changes) if changes else None,
+    }
+
+
+class TestRowRecords:
+    """Test cases for building hot-path records from fetched rows."""
+
+    def test_fence_row(self):
+        """Test DECIMAL columns become floats and polygon JSON (lat, lon) tuples."""
+        fence = _fence_record_from_row({
+            "id": 3, "name": "Pivot", "center_lat": Decimal("40.05"), "center_lon": Decimal("-94.95"),
+            "radius_km": Decimal("7.800"), "polygon": "[[40.0, -95.0], [40.0, -94.9], [40.1, -94.9]]"
+        })
+
+        assert isinstance(fence, GeofenceRecord)
+        assert (fence.center_lat, fence.center_lon, fence.radius_km) == (40.05, -94.95, 7.8)
+        assert fence.polygon == [(40.0, -95.0), (40.0, -94.9), (40.1, -94.9)]
+
+    def test_state_row(self):
+        """Test states read before membership was stored default to their one fence."""
+        state = _state_from_row({
+            "device_id": "tractor", "last_lat": Decimal("40.1"), "last_lon": None,
+            "is_inside_fence": True, "last_geofence_id": 4, "geofence_ids": None, "last_updated": None
+        })
+
+        assert isinstance(state, DeviceStateRecord)
+        assert (state.last_lat, state.last_lon, state.geofence_ids) == (40.1, None, (4,))
+
+
+class TestSingleQueryService:
+    """Test cases for GeofenceService with single-query checks."""
+
+    def setup_method(self):
+        self.repository = AsyncMock()
+        self.publisher = AsyncMock()
+        self.service = GeofenceService(
+            self.repository, GeofenceCalculator(), self.publisher, single_query=True
+        )
+        self.location = DeviceLocationModel(device_id="tractor", lat=40.0, lon=-95.0)
+
+    @pytest.mark.asyncio
+    async def test_one_repository_call(self):
+        """Test a check is a single repository call and no separate reads or writes."""
+        self.repository.check_device_location.return_value = check_row(None, True, "North Field")
+
+        result = await self.service.check_device_location(self.location)
+
+        assert result == {
+            "device_id": "tractor",
+            "inside_geofence": True,
+            "geofence_name": "North Field",
+            "geofence_names": ["North Field"],
+            "state_changed": True
+        }
+        self.repository.check_device_location.assert_awaited_once_with("tractor", 40.0, -95.0)
+        self.repository.get_all_geofences.assert_not_called()
+        self.repository.get_device_state.assert_not_called()
+        self.repository.update_device_state.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_exit_publishes_previous_fence(self):
+        """Test leaving a fence publishes an exit event naming the previous fence."""
+        self.repository.check_device_location.return_value = check_row(
+            True, False, previous_name="North Field"
+        )
+
+        result = await self.service.check_device_location(self.location)
+
+        assert result["state_changed"] is True
+        assert result["inside_geofence"] is False
+        event = self.publisher.publish_geo_event.call_args[0][0]
+        assert event["event_type"] == "fence_exit"
+        assert event["geofence_name"] == "North Field"
+
+    @pytest.mark.asyncio
+    async def test_unchanged_state(self):
+        """Test staying inside neither changes state nor publishes."""
+        self.repository.check_device_location.return_value = check_row(True, True, "North Field")
+
+        result = await self.service.check_device_location(self.location)
+
+        assert result["state_changed"] is False
+        self.publisher.publish_geo_event.assert_not_called()
+
+
+@pytest_asyncio.fixture(params=[False, True], ids=["haversine", "postgis"])
+async def sql_repository(request):
+    """Repository on a throwaway schema of TEST_DATABASE_URL."""
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    import asyncpg
+
+    postgis = request.param
+    schema = f"test_sql_check_{uuid.uuid4().hex[:8]}"
+    admin = await asyncpg.connect(TEST_DATABASE_URL)
+    await admin.execute(f"CREATE SCHEMA {schema}")
+    if postgis and not await admin.fetchval(
+        "SELECT count(*) FROM pg_available_extensions WHERE name = 'postgis'"
+    ):
+        await admin.execute(f"DROP SCHEMA {schema}")
+        await admin.close()
+        pytest.skip("PostGIS is not available")
+
+    manager = DatabaseManager(TEST_DATABASE_URL)
+    manager.pool = await asyncpg.create_pool(
+        TEST_DATABASE_URL, min_size=1, max_size=2,
+        server_settings={"search_path": f"{schema},public"}
+    )
+    try:
+        await manager.create_tables(postgis=postgis)
+        yield GeofenceRepository(manager.pool, postgis=postgis)
+    finally:
+        await manager.close_pool()
+        await admin.execute(f"DROP SCHEMA {schema} CASCADE")
+        await admin.close()
+
+
+async def insert_fences(repository, rng, count):
+    async with repository.db_pool.acquire() as conn:
+        for i in range(count):
+            lat = rng.uniform(40.0, 40.2)
+            lon = rng.uniform(-95.2, -95.0)
+            if i % 4 == 0:
+                polygon = [
+                    [lat + rng.uniform(-0.02, 0.02), lon + rng.uniform(-0.02, 0.02)]
+                    for _ in range(rng.randint(3, 12))
+                ]
+                await conn.execute(
+                    "INSERT INTO geofences (name, center_lat, center_lon, radius_km, polygon) "
+                    "VALUES ($1, $2, $3, 5, $4::jsonb)",
+                    f"Field {i}", lat, lon, str(polygon)
+                )
+            else:
+                await conn.execute(
+                    "INSERT INTO geofences (name, center_lat, center_lon, radius_km) "
+                    "VALUES ($1, $2, $3, $4)",
+                    f"Field {i}", lat, lon, rng.uniform(0.5, 3.0)
+                )
+    return await repository.get_all_geofences()
+
+
+class TestSingleQuerySql:
+    """Integration tests for the single-statement check against Postgres."""
+
+    @pytest.mark.asyncio
+    async def test_matches_calculator(self, sql_repository):
+        """Test SQL containment agrees with GeofenceCalculator, polygons included."""
+        rng = random.Random(12)
+        fences = await insert_fences(sql_repository, rng, 40)
+        calculator = GeofenceCalculator()
+
+        for i in range(300):
+            location = DeviceLocationModel(
+                device_id=f"device_{i}",
+                lat=rng.uniform(39.98, 40.22),
+                lon=rng.uniform(-95.22, -94.98)
+            )
+            expected = calculator.find_containing_geofences(location, fences)
+            row = await sql_repository.check_device_location(
+                location.device_id, location.lat, location.lon
+            )
+            assert row["previous_geofence_ids"] is None
+            assert row["is_inside_fence"] is bool(expected)
+            assert row["geofence_id"] == (expected[0].id if expected else None)
+            assert row["geofence_ids"] == [fence.id for fence in expected]
+
+    @pytest.mark.asyncio
+    async def test_overlapping_fences_report_lowest_id(self, sql_repository):
+        """Test in-process and SQL checks report the same fence where two overlap."""
+        async with sql_repository.db_pool.acquire() as conn:
+            ids = [
+                await conn.fetchval(
+                    "INSERT INTO geofences (name, center_lat, center_lon, radius_km) "
+                    "VALUES ($1, 40.0, -95.0, 1.0) RETURNING id",
+                    name
+                )
+                for name in ("North Field", "Pivot")
+            ]
+            # Rewriting the older row moves it behind the newer one in the heap.
+            await conn.execute("UPDATE geofences SET name = 'North Field' WHERE id = $1", ids[0])
+
+        fences = await sql_repository.get_all_geofences()
+        assert [fence.id for fence in fences] == ids
+
+        expected = GeofenceCalculator().find_containing_geofence(
+            DeviceLocationModel(device_id="tractor", lat=40.0, lon=-95.0), fences
+        )
+        row = await sql_repository.check_device_location("tractor", 40.0, -95.0)
+        assert row["geofence_id"] == expected.id == ids[0]
+        assert row["geofence_name"] == "North Field"
+
+    @pytest.mark.asyncio
+    async def test_returns_previous_state(self, sql_repository):
+        """Test each call reports the state written by the one before it."""
+        async with sql_repository.db_pool.acquire() as conn:
+            await conn.execute(
+                "INSERT INTO geofences (name, center_lat, center_lon, radius_km) "
+                "VALUES ('North Field', 40.0, -95.0, 1.0)"
+            )
+
+        entered = await sql_repository.check_device_location("tractor", 40.0, -95.0)
+        left = await sql_repository.check_device_location("tractor", 41.0, -95.0)
+
+        assert entered["previous_geofence_ids"] is None
+        assert entered["geofence_name"] == "North Field"
+        assert entered["changes"] is None
+        assert left["previous_geofence_ids"] == entered["geofence_ids"]
+        assert json.loads(left["changes"]) == [
+            {"event_type": "fence_exit", "geofence_id": entered["geofence_id"], "geofence_name": "North Field"}
+        ]
+        assert left["is_inside_fence"] is False
+        state = await sql_repository.get_device_state("tractor")
+        assert state.is_inside_fence is False
+        assert state.last_lat == 41.0
+
+    @pytest.mark.asyncio
+    async def test_overlapping_fences_diffed(self, sql_repository):
+        """Test moving across overlapping fences reports exits before enters, per fence."""
+        async with sql_repository.db_pool.acquire() as conn:
+            north, pivot = [
+                await conn.fetchval(
+                    "INSERT INTO geofences (name, center_lat, center_lon, radius_km) "
+                    "VALUES ($1, $2, -95.0, 1.0) RETURNING id",
+                    name, lat
+                )
+                for name, lat in (("North Field", 40.0), ("Pivot", 40.012))
+            ]
+
+        await sql_repository.check_device_location("tractor", 39.995, -95.0)
+        both = await sql_repository.check_device_location("tractor", 40.006, -95.0)
+        moved = await sql_repository.check_device_location("tractor", 40.02, -95.0)
+        back = await sql_repository.check_device_location("tractor", 39.995, -95.0)
+
+        assert both["geofence_ids"] == [north, pivot]
+        assert both["geofence_names"] == ["North Field", "Pivot"]
+        assert [c["event_type"] for c in json.loads(both["changes"])] == ["fence_enter"]
+        assert json.loads(moved["changes"])[0]["geofence_id"] == north
+        assert [(c["event_type"], c["geofence_id"]) for c in json.loads(back["changes"])] == [
+            ("fence_exit", pivot), ("fence_enter", north)
+        ]
+        state = await sql_repository.get_device_state("tractor")
+        assert state.geofence_ids == (north,)
@@ -0,0 +1,183 @@
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock
+from domain.geofence_calculator import GeofenceCalculator
+from models.geofence import DeviceLocationModel, DeviceStateModel, GeofenceModel
+from services.geofence_service import GeofenceService
+from services.state_write_buffer import DeviceStateWriteBuffer
+
+
+class RecordingRepository:
+    """In-memory stand-in recording the order rows reach the table."""
+
+    def __init__(self, write_delay: float = 0.0):
+        self.table = {}
+        self.writes = []
+        self.write_delay = write_delay
+
+    async def update_device_state(self, device_id, lat, lon, is_inside_fence, geofence_id=None, geofence_ids=None):
+        await asyncio.sleep(self.write_delay)
+        self.table[device_id] = (device_id, lat, lon, is_inside_fence, geofence_id, geofence_ids)
+        self.writes.append(("single", device_id))
+
+    async def update_device_states(self, states):
+        await asyncio.sleep(self.write_delay)
+        for row in states:
+            self.table[row[0]] = row
+        self.writes.append(("bulk", len(states)))
+
+
+class TestDeviceStateWriteBuffer:
+    """Test cases for DeviceStateWriteBuffer."""
+
+    def setup_method(self):
+        self.repository = RecordingRepository()
+        self.buffer = DeviceStateWriteBuffer(
+            self.repository, max_pending=3, flush_interval_seconds=0.01
+        )
+
+    @pytest.mark.asyncio
+    async def test_coalesces_latest_per_device(self):
+        """Test only the latest update per device is written."""
+        await self.buffer.update_device_state("a", 1.0, 1.0, True, 1)
+        await self.buffer.update_device_state("a", 2.0, 2.0, True, 1)
+        await self.buffer.update_device_state("b", 3.0, 3.0, False, None)
+
+        assert self.repository.writes == []
+        assert self.buffer.get_pending("a").last_lat == 2.0
+
+        assert await self.buffer.flush() == 2
+        assert self.repository.table["a"] == ("a", 2.0, 2.0, True, 1, (1,))
+        assert self.buffer.stats()["coalesced"] == 1
+        assert self.buffer.get_pending("a") is None
+
+    @pytest.mark.asyncio
+    async def test_flushes_by_size(self):
+        """Test reaching max_pending triggers a bulk flush."""
+        for device_id in ["a", "b", "c"]:
+            await self.buffer.update_device_state(device_id, 0.0, 0.0, False)
+
+        assert self.repository.writes == [("bulk", 3)]
+        assert len(self.buffer) == 0
+
+    @pytest.mark.asyncio
+    async def test_flush_now_writes_immediately(self):
+        """Test transitions bypass the buffer."""
+        await self.buffer.update_device_state("a", 1.0, 1.0, True, 1)
+        await self.buffer.update_device_state("a", 5.0, 5.0, False, None, flush_now=True)
+
+        assert self.repository.writes == [("single", "a")]
+        assert self.repository.table["a"] == ("a", 5.0, 5.0, False, None, ())
+        assert len(self.buffer) == 0
+
+    @pytest.mark.asyncio
+    async def test_immediate_write_is_not_overtaken_by_flush(self):
+        """Test an older buffered row never lands after a newer transition."""
+        self.repository.write_delay = 0.01
+        await self.buffer.update_device_state("a", 1.0, 1.0, True, 1)
+
+        flush = asyncio.create_task(self.buffer.flush())
+        await asyncio.sleep(0)
+        await self.buffer.update_device_state("a", 9.0, 9.0, False, None, flush_now=True)
+        await flush
+
+        assert self.repository.table["a"] == ("a", 9.0, 9.0, False, None, ())
+
+    @pytest.mark.asyncio
+    async def test_failed_flush_keeps_rows(self):
+        """Test rows survive a failed flush unless superseded."""
+        self.repository.update_device_states = AsyncMock(side_effect=RuntimeError("db down"))
+        await self.buffer.update_device_state("a", 1.0, 1.0, True, 1)
+
+        with pytest.raises(RuntimeError):
+            await self.buffer.flush()
+
+        assert self.buffer.get_pending("a").last_lat == 1.0
+        assert self.buffer.stats()["flush_errors"] == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_immediate_write_keeps_row(self):
+        """Test a transition whose write fails stays pending for the next flush."""
+        self.repository.update_device_state = AsyncMock(side_effect=RuntimeError("db down"))
+
+        with pytest.raises(RuntimeError):
+            await self.buffer.update_device_state("a", 5.0, 5.0, False, None, flush_now=True)
+
+        assert self.buffer.get_pending("a").last_lat == 5.0
+        assert self.buffer.stats()["flush_errors"] == 1
+        assert await self.buffer.flush() == 1
+        assert self.repository.table["a"] == ("a", 5.0, 5.0, False, None, ())
+
+    @pytest.mark.asyncio
+    async def test_released_fences_dropped_from_pending_rows(self):
+        """Test deleted fences leave pending rows, including rows put back after a failed flush."""
+        await self.buffer.update_device_state("a", 1.0, 1.0, True, 1, (1, 2))
+        await self.buffer.update_device_state("b", 1.0, 1.0, True, 2, (2,))
+        self.buffer.release_geofences({1})
+        assert (self.buffer.get_pending("a").last_geofence_id, self.buffer.get_pending("a").geofence_ids) == (2, (2,))
+
+        self.repository.update_device_states = AsyncMock(side_effect=RuntimeError("fk violation"))
+        flushing = asyncio.create_task(self.buffer.flush())
+        await asyncio.sleep(0)
+        self.buffer.release_geofences({2})
+        with pytest.raises(RuntimeError):
+            await flushing
+
+        for device_id in ("a", "b"):
+            state = self.buffer.get_pending(device_id)
+            assert (state.is_inside_fence, state.last_geofence_id, state.geofence_ids) == (False, None, ())
+
+    @pytest.mark.asyncio
+    async def test_periodic_flush_and_close_drain(self):
+        """Test the background task flushes and close drains the rest."""
+        self.buffer.start()
+        await self.buffer.update_device_state("a", 1.0, 1.0, True, 1)
+        await asyncio.sleep(0.05)
+        assert "a" in self.repository.table
+
+        await self.buffer.update_device_state("b", 2.0, 2.0, True, 1)
+        await self.buffer.close()
+        assert "b" in self.repository.table
+        assert len(self.buffer) == 0
+
+    @pytest.mark.asyncio
+    async def test_service_reads_pending_state(self):
+        """Test the service sees buffered state and flushes on exit."""
+        geofence = GeofenceModel(
+            id=1, name="Test Field",
+            center_lat=40.7831, center_lon=-73.9712,
+            radius_km=2.0
+        )
+        repository = AsyncMock()
+        repository.get_all_geofences.return_value = [geofence]
+        repository.get_device_state.side_effect = [
+            None,
+            DeviceStateModel(
+                device_id="tractor", last_lat=40.7831, last_lon=-73.9712,
+                is_inside_fence=True, last_geofence_id=1, last_updated=None
+            ),
+        ]
+        publisher = AsyncMock()
+        buffer = DeviceStateWriteBuffer(repository, max_pending=100)
+        service = GeofenceService(
+            repository, GeofenceCalculator(), publisher, state_buffer=buffer
+        )
+
+        inside = DeviceLocationModel(device_id="tractor", lat=40.7831, lon=-73.9712)
+        inside_again = DeviceLocationModel(device_id="tractor", lat=40.7832, lon=-73.9712)
+        outside = DeviceLocationModel(device_id="tractor", lat=41.5, lon=-74.0)
+
+        await service.check_device_location(inside)
+        repository.update_device_state.assert_called_once()
+
+        result = await service.check_device_location(inside_again)
+        assert result["state_changed"] is False
+        assert repository.update_device_state.call_count == 1
+        assert len(buffer) == 1
+
+        result = await service.check_device_location(outside)
+        assert result["state_changed"] is True
+        publisher.publish_geo_event.assert_called_once()
+        repository.update_device_state.assert_called_with("tractor", 41.5, -74.0, False, None, ())
+        assert repository.get_device_state.call_count == 2